@@ -0,0 +1,151 @@
+"""
+用戶活躍時段直方圖
+每位用戶一個 7×24 的計數陣列（u16，168 格 = 336 bytes），以 Redis 字串 + BITFIELD 儲存：
+寫入時 O(1) 累加一格，讀取時以 GET 取回整個字串（多位用戶一次 pipeline），
+以 NumPy 解碼並向量化計算
+"""
+
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DAYS = 7
+HOURS = 24
+SLOTS = DAYS * HOURS
+SLOT_DTYPE = np.dtype(">u2")  # BITFIELD u16 為大端序
+WEEKDAY_NAMES = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"]
+
+
+def slot_of(timestamp: float = None) -> int:
+    """時間戳記所在的格子（星期 × 24 + 小時，使用伺服器時區）"""
+    moment = datetime.fromtimestamp(timestamp if timestamp is not None else time.time())
+    return moment.weekday() * HOURS + moment.hour
+
+
+class ActivityHistogram:
+    """7×24 活躍直方圖（Redis BITFIELD u16 陣列，飽和累加）"""
+
+    def __init__(self, redis_client, ttl: int = 90 * 86400, prefix: str = "activity"):
+        """
+        初始化直方圖
+
+        Args:
+            redis_client: 不解碼回應的 Redis 客戶端（直方圖以原始位元組讀取）
+            ttl: 無活動時保留秒數
+            prefix: Redis 鍵前綴
+        """
+        self.redis = redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def record(self, user_id: str, timestamp: float = None) -> None:
+        """記錄一次活動（單一 BITFIELD INCRBY）"""
+        key = self._key(user_id)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.bitfield(key).overflow("SAT").incrby("u16", f"#{slot_of(timestamp)}", 1).execute()
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"記錄活躍時段失敗: {e}")
+
+    def get_many(self, user_ids: Iterable[str]) -> np.ndarray:
+        """以一次 pipeline 往返取得多位用戶的直方圖，形狀 (用戶數, 7, 24)"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return np.zeros((0, DAYS, HOURS), dtype=np.int64)
+
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.get(self._key(user_id))
+        raw_rows = pipe.execute()
+
+        # BITFIELD 只會把字串延伸到寫過的最後一格，不足的部分補零
+        histograms = np.zeros((len(user_ids), SLOTS), dtype=np.int64)
+        for i, raw in enumerate(raw_rows):
+            if raw:
+                row = np.frombuffer(raw[:SLOTS * SLOT_DTYPE.itemsize], dtype=SLOT_DTYPE)
+                histograms[i, :len(row)] = row
+
+        return histograms.reshape(len(user_ids), DAYS, HOURS)
+
+    def get(self, user_id: str) -> np.ndarray:
+        """取得單一用戶的 7×24 直方圖"""
+        return self.get_many([user_id])[0]
+
+    def total_messages(self, user_id: str) -> int:
+        """用戶累計訊息數（直方圖總和）"""
+        return int(self.get(user_id).sum())
+
+    def typically_active(self, user_ids: Iterable[str], timestamp: float = None,
+                         min_share: float = 0.05, min_count: int = 3) -> List[str]:
+        """
+        找出通常在這個時段活躍的用戶
+
+        Args:
+            min_share: 該時段（同星期同小時）佔用戶總活動的最低比例
+            min_count: 該時段最少累計次數
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+
+        counts = self.get_many(user_ids).reshape(len(user_ids), SLOTS)
+        slot_counts = counts[:, slot_of(timestamp)]
+        totals = counts.sum(axis=1)
+        shares = np.divide(slot_counts, totals, out=np.zeros(len(user_ids)), where=totals > 0)
+
+        mask = (slot_counts >= min_count) & (shares >= min_share)
+        return [user_id for user_id, active in zip(user_ids, mask) if active]
+
+    def patterns(self, user_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        批次計算用戶活躍模式
+
+        Returns:
+            {user_id: {"preferred_hour", "active_days", "message_frequency", "total"}}
+            沒有紀錄的用戶 preferred_hour 為 None
+        """
+        user_ids = list(user_ids)
+        histograms = self.get_many(user_ids)
+
+        by_hour = histograms.sum(axis=1)    # (n, 24)
+        by_day = histograms.sum(axis=2)     # (n, 7)
+        totals = by_hour.sum(axis=1)
+        preferred_hours = by_hour.argmax(axis=1)
+        top_days = np.argsort(-by_day, axis=1, kind="stable")[:, :2]
+
+        # 以有紀錄的天數平均估算每日訊息量
+        active_day_count = np.maximum((by_day > 0).sum(axis=1), 1)
+        per_day = totals / active_day_count
+
+        patterns = {}
+        for i, user_id in enumerate(user_ids):
+            if totals[i] == 0:
+                patterns[user_id] = {"preferred_hour": None, "active_days": [],
+                                     "message_frequency": "new", "total": 0}
+                continue
+            patterns[user_id] = {
+                "preferred_hour": int(preferred_hours[i]),
+                "active_days": [WEEKDAY_NAMES[d] for d in top_days[i] if by_day[i, d] > 0],
+                "message_frequency": _frequency_label(per_day[i]),
+                "total": int(totals[i])
+            }
+        return patterns
+
+
+def _frequency_label(messages_per_day: float) -> str:
+    """每日訊息量分級"""
+    if messages_per_day >= 20:
+        return "high"
+    if messages_per_day >= 5:
+        return "medium"
+    return "low"
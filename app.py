@@ -1,10 +1,13 @@
 from flask import Flask, request, abort, jsonify
+from werkzeug.exceptions import HTTPException
 from linebot.v3.webhook import WebhookHandler
 from linebot.v3.messaging import MessagingApi, ReplyMessageRequest, TextMessage, ApiClient, Configuration
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.webhooks import MessageEvent, TextMessageContent
 import os
+import hmac
 import time
+import threading
 from datetime import datetime
 from dotenv import load_dotenv
 import sentry_sdk
@@ -18,17 +21,31 @@ from frequency_bot_firestore import (
 )
 from google.cloud import firestore
 import redis
+from connection_manager import connection_manager
+from health_prober import HealthProber
+from circuit_breaker import breaker_snapshots, open_breakers
 from community_features import (
     CommunityFeatures,
     format_api_stats_message,
     format_emergency_info_message
 )
 from knowledge_graph import KnowledgeGraph
+from conversation_buffer import ConversationBuffer
+from activity_histogram import ActivityHistogram
+from vector_index import MemmapVectorIndex
 from intent_analyzer import IntentAnalyzer
+from intent_pipeline import TieredIntentPipeline
+from command_words import (
+    HELP_COMMANDS, BROADCAST_COMMANDS, STATS_COMMANDS, SYSTEM_COMMANDS, API_STATS_COMMANDS,
+    WORD_CHAIN_STATUS_COMMANDS, VOTE_RESULT_COMMAND, VOTE_EXAMPLE_COMMAND, EMERGENCY_COMMANDS,
+    SHELTER_EXAMPLE_COMMAND, JOKE_COMMANDS, JOKE_LIKE_COMMANDS, GREETING_COMMANDS,
+    WORD_CHAIN_PREFIX, VOTE_PREFIX, SHELTER_PREFIX, JOKE_PREFIX, SEARCH_PREFIXES, vote_option
+)
 from security_filter import SecurityFilter
-from rate_limiter import rate_limit, add_rate_limit_headers, RateLimits
+from rate_limiter import rate_limit, add_rate_limit_headers, RateLimits, user_rate_limiter
+import redis_batch
 from search_service import CustomSearchService # Added for Web Search
-from response_cache import ResponseCache, CacheStrategies
+from response_cache import TieredCache, CacheStrategies
 
 # 導入優化模組
 try:
@@ -90,6 +107,16 @@ except Exception as e:
 # 初始化頻率廣播機器人 (傳入知識圖譜以支援集體記憶)
 frequency_bot = FrequencyBotFirestore(knowledge_graph)
 
+# 歷史廣播向量索引（以語義相似度找出相似的過去時刻）
+if intent_analyzer and intent_analyzer.embedder and frequency_bot.memory_system:
+    try:
+        moment_index = MemmapVectorIndex(os.getenv('MOMENT_INDEX_PATH', '/tmp/broadcast_moments'))
+        frequency_bot.memory_system.attach_moment_index(intent_analyzer.embedder, moment_index)
+        if len(moment_index) == 0:
+            threading.Thread(target=frequency_bot.backfill_moment_index, daemon=True).start()
+    except Exception as e:
+        logger.warning(f"歷史廣播向量索引初始化失敗: {e}")
+
 # 初始化 Redis 和社群功能 (使用連線池)
 try:
     # 使用連線管理器的 Redis 連線池
@@ -101,13 +128,28 @@ try:
     )
     redis_client = redis_pool.get_connection()
     redis_client.ping()
+    # 快取值以 msgpack 編碼，使用不解碼回應的連線
+    redis_binary_client = redis_pool.get_binary_connection()
+    # 用戶最近訊息緩衝區，減少每則訊息的 Neo4j 上下文查詢
+    if knowledge_graph:
+        knowledge_graph.attach_context_buffer(ConversationBuffer(redis_client))
+    # 用戶 7×24 活躍直方圖（廣播提示詞與智慧引導使用）
+    activity_histogram = ActivityHistogram(redis_binary_client)
+    frequency_bot.attach_activity_histogram(activity_histogram)
     # 傳入知識圖譜實例以支援雙寫及 Firestore db
     community = CommunityFeatures(redis_client, knowledge_graph, frequency_bot.db)
+    # 熱鍵的用戶端快取（需要 Redis 6 以上，預設關閉）
+    if os.getenv('REDIS_CLIENT_CACHE', 'false').lower() == 'true':
+        client_cache = redis_pool.enable_client_cache(CommunityFeatures.HOT_KEY_PREFIXES)
+        if client_cache:
+            community.attach_client_cache(client_cache)
     logger.info("Redis 連接成功 (使用連線池), CommunityFeatures 初始化完畢 (含 Firestore DB)")
 except Exception as e:
     logger.warning(f"Redis 連接失敗或 CommunityFeatures 初始化失敗: {e}，社群功能將受限")
     redis_client = None
+    redis_binary_client = None
     community = None
+    activity_histogram = None
 
 # 初始化安全過濾器
 security_filter = SecurityFilter()
@@ -149,9 +191,10 @@ QUICK_MENUS = {
 
 # 初始化優化系統
 if OPTIMIZATIONS_AVAILABLE:
-    smart_onboarding = SmartOnboarding(knowledge_graph)
+    smart_onboarding = SmartOnboarding(knowledge_graph, activity_histogram)
     smart_error_handler = SmartErrorHandler()
     performance_dashboard = PerformanceDashboard(redis_client)
+    performance_dashboard.attach_connection_pools(connection_manager)
     core_optimizer = CoreValueOptimizer(knowledge_graph)
     logger.info("優化系統初始化成功")
 else:
@@ -160,22 +203,98 @@ else:
     performance_dashboard = None
     core_optimizer = None
 
+# 請求範圍的 Redis 批次：不需要結果的寫入在請求結束時以一個 pipeline 送出，並記錄每個請求的往返次數
+redis_batch.install(app, on_finish=performance_dashboard.record_redis_round_trips if performance_dashboard else None)
+
+# 分層意圖分類：精確指令不需要查詢上下文或語義分析
+intent_pipeline = TieredIntentPipeline(
+    intent_analyzer,
+    extra_commands=QUICK_MENUS.keys(),
+    dashboard=performance_dashboard
+)
+
 # Initialize Response Cache
 cache = None
 if redis_client:
-    cache = ResponseCache(redis_client)
+    cache = TieredCache(redis_binary_client, dashboard=performance_dashboard)
     logger.info("Response cache initialized successfully.")
 
 # Initialize Search Service
 search_service = None
 try:
     # Pass the existing redis_client to CustomSearchService
-    search_service = CustomSearchService(redis_client=redis_client)
+    search_service = CustomSearchService(redis_client=redis_client, cache_client=redis_binary_client)
     logger.info("Search Service initialized successfully.")
 except Exception as e:
     logger.error(f"Failed to initialize Search Service: {e}")
     # search_service will remain None, and feature will be handled gracefully
 
+# 背景健康檢查（/health 讀取快照；Firestore 平時只讀取，寫入測試留給深度檢查）
+health_prober = HealthProber()
+
+
+def _firestore_write_check():
+    frequency_bot.db.collection('test').document('health_check').set({'timestamp': firestore.SERVER_TIMESTAMP})
+
+
+health_prober.register(
+    "firestore",
+    lambda: frequency_bot.db.collection('test').document('health_check').get(),
+    interval=int(os.getenv('HEALTH_FIRESTORE_INTERVAL', 60)),
+    deep_check=_firestore_write_check
+)
+if redis_client:
+    health_prober.register("redis", redis_client.ping, interval=int(os.getenv('HEALTH_REDIS_INTERVAL', 15)))
+if knowledge_graph and knowledge_graph.driver:
+    health_prober.register("neo4j", knowledge_graph.driver.verify_connectivity,
+                           interval=int(os.getenv('HEALTH_NEO4J_INTERVAL', 30)))
+health_prober.start()
+
+# 統計與最新廣播回覆快取（單一計算 + 過期先回舊值，避免整分鐘或新廣播時同時打到 Firestore）
+STATS_CACHE_KEY = "stats:current"
+BROADCAST_CACHE_KEY = "broadcast:latest"
+
+
+def _load_stats_reply():
+    return format_stats_message(frequency_bot.get_frequency_stats())
+
+
+def _load_broadcast_reply():
+    latest_broadcast = frequency_bot.get_latest_broadcast()
+    return format_broadcast_message(latest_broadcast) if latest_broadcast else None
+
+
+def get_stats_reply():
+    """即時統計回覆（新鮮 60 秒，之後 60 秒內先回舊值並在背景更新）"""
+    if cache:
+        return cache.get_or_load(STATS_CACHE_KEY, _load_stats_reply, ttl=60, stale_ttl=60)
+    return _load_stats_reply()
+
+
+def get_broadcast_reply():
+    """最新廣播回覆；尚無廣播時回傳 None"""
+    if cache:
+        return cache.get_or_load(BROADCAST_CACHE_KEY, _load_broadcast_reply, ttl=300, stale_ttl=300)
+    return _load_broadcast_reply()
+
+
+def refresh_broadcast_reply():
+    """新廣播產生後直接更新快取，讀取端不會同時未命中"""
+    if cache:
+        try:
+            cache.refresh(BROADCAST_CACHE_KEY, _load_broadcast_reply, ttl=300, stale_ttl=300)
+        except Exception as e:
+            logger.warning(f"更新廣播快取失敗: {e}")
+
+
+def publish_hourly_broadcast():
+    """生成本小時廣播並更新回覆快取（所有觸發廣播的路徑都經過這裡）"""
+    broadcast_data = frequency_bot.generate_hourly_broadcast()
+    if broadcast_data:
+        refresh_broadcast_reply()
+    return broadcast_data
+
+
 # 只在開發環境啟用測試端點
 if os.getenv('ENVIRONMENT', 'production') == 'development':
     @app.route("/test-sentry")
@@ -195,21 +314,19 @@ def index():
 @app.route("/health")
 @rate_limit(**RateLimits.HEALTH)
 def health_check():
-    """健康檢查端點含連線狀態"""
-    from connection_manager import connection_manager
-    
+    """
+    健康檢查端點：回傳背景檢查的快照與連線池指標（過期的結果以短逾時重新檢查，仍過期時只回報不回 503）
+    ?deep=1 並帶上 X-Admin-Token（HEALTH_ADMIN_TOKEN）時立即執行深度檢查（含 Firestore 寫入）
+    """
     try:
-        # 檢查 Firestore 連線
-        firestore_status = "connected"
-        try:
-            test_doc = frequency_bot.db.collection('test').document('health_check')
-            test_doc.set({'timestamp': firestore.SERVER_TIMESTAMP})
-        except Exception as e:
-            firestore_status = "error"
-            logger.error(f"Firestore health check failed: {e}")
-        
-        # 使用連線管理器檢查其他連線
-        connections = connection_manager.health_check()
+        deep = request.args.get('deep') == '1'
+        if deep:
+            admin_token = os.getenv('HEALTH_ADMIN_TOKEN')
+            if not admin_token or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+                abort(403)
+            connections = health_prober.check_now(deep=True)
+        else:
+            connections = health_prober.refresh_stale(timeout=2.0)
         
         # 檢查環境變數
         env_status = {
@@ -219,27 +336,29 @@ def health_check():
             "SENTRY_DSN": bool(os.getenv('SENTRY_DSN'))
         }
         
-        # 判斷整體狀態
-        overall_status = "healthy"
-        if firestore_status != "connected":
-            overall_status = "degraded"
-        if connections and any(not healthy for healthy in connections.values()):
+        breakers = breaker_snapshots()
+        overall_status = health_prober.overall_status(connections)
+        # 只有核心服務的斷路器拒絕呼叫時才降級；Gemini / Custom Search 只回報狀態
+        if overall_status == "healthy" and open_breakers():
             overall_status = "degraded"
         
         response = {
             "status": overall_status, 
             "service": "frequency-bot",
             "timestamp": datetime.now().isoformat(),
-            "connections": {
-                "firestore": firestore_status,
-                **connections
-            },
-            "env_vars": env_status
+            "deep": deep,
+            "connections": connections,
+            "env_vars": env_status,
+            "pools": connection_manager.pool_metrics(),
+            "circuit_breakers": breakers,
+            "client_cache": connection_manager.client_cache_stats()
         }
         
         status_code = 200 if overall_status == "healthy" else 503
         return jsonify(response), status_code
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Health check error: {str(e)}")
         sentry_sdk.capture_exception(e)
@@ -290,7 +409,7 @@ def generate_broadcast():
         logger.info("收到廣播生成請求")
         
         # 生成當前小時的廣播
-        broadcast_data = frequency_bot.generate_hourly_broadcast()
+        broadcast_data = publish_hourly_broadcast()
         
         if broadcast_data:
             logger.info(f"廣播生成成功 - 小時: {broadcast_data.get('hour')}")
@@ -361,25 +480,26 @@ def handle_text_message(event):
     if performance_dashboard:
         performance_dashboard.record_message(event.source.user_id if hasattr(event.source, 'user_id') else 'unknown')
     
-    # 使用意圖分析器分析訊息
+    # 分層意圖分析（指令 → 關鍵詞 → 語義，前一層無法判斷才往下）
     intent_result = None
-    if intent_analyzer:
-        try:
-            # 獲取用戶對話上下文
-            context = []
-            if knowledge_graph and hasattr(event.source, 'user_id'):
-                user_id_hash = f"用戶{hash(event.source.user_id) % 10000:04d}"
-                context = knowledge_graph.get_conversation_context(user_id_hash, limit=3)
-            
-            # 分析意圖
-            intent_result = intent_analyzer.analyze(
-                message=event.message.text,
-                user_id=user_id_hash if hasattr(event.source, 'user_id') else "anonymous",
-                context=context
-            )
-            logger.info(f"意圖分析結果: {intent_result}")
-        except Exception as e:
-            logger.error(f"意圖分析失敗: {e}")
+    try:
+        user_id_hash = "anonymous"
+        if hasattr(event.source, 'user_id'):
+            user_id_hash = f"用戶{hash(event.source.user_id) % 10000:04d}"
+        
+        # 用戶對話上下文只在語義層才查詢
+        context_loader = None
+        if knowledge_graph and user_id_hash != "anonymous":
+            context_loader = lambda: knowledge_graph.get_conversation_context(user_id_hash, limit=3)
+        
+        intent_result = intent_pipeline.classify(
+            event.message.text,
+            user_id=user_id_hash,
+            context_loader=context_loader
+        )
+        logger.info(f"意圖分析結果: {intent_result}")
+    except Exception as e:
+        logger.error(f"意圖分析失敗: {e}")
     
     # 檢查環境變數
     logger.info(f"LINE_CHANNEL_ACCESS_TOKEN exists: {bool(os.getenv('LINE_CHANNEL_ACCESS_TOKEN'))}")
@@ -387,6 +507,7 @@ def handle_text_message(event):
     
     # 獲取用戶ID（匿名化）
     user_id = None
+    line_user_id = getattr(event.source, 'user_id', None)  # 僅用於用戶層級速率限制（內部再雜湊）
     if hasattr(event.source, 'user_id'):
         # 使用匿名化的用戶識別
         user_id = f"用戶{hash(event.source.user_id) % 10000:04d}"
@@ -399,7 +520,7 @@ def handle_text_message(event):
         # 根據意圖自動導向對應功能
         if intent == "use_feature" and feature == "接龍":
             # 檢查是否已經包含詞語
-            if event.message.text.startswith('接龍 ') and len(event.message.text) > 3:
+            if event.message.text.startswith(WORD_CHAIN_PREFIX) and len(event.message.text) > 3:
                 # 讓它繼續往下處理，不要在這裡攔截
                 pass
             else:
@@ -417,26 +538,12 @@ def handle_text_message(event):
                     )
                 )
                 return
-        elif intent == "vote" and feature == "投票":
-            # 處理投票數字
-            option_num = intent_result.get('option', 0)
-            result = community.cast_vote(option_num, user_id)
-            
-            line_bot_api.reply_message(
-                ReplyMessageRequest(
-                    replyToken=event.reply_token,
-                    messages=[TextMessage(text=result['message'])]
-                )
-            )
-            return
         elif intent == "query" and feature:
             # 智慧查詢對應功能
             if feature == "統計":
-                stats = frequency_bot.get_frequency_stats()
-                reply_message = format_stats_message(stats)
+                reply_message = get_stats_reply()
             elif feature == "廣播":
-                latest_broadcast = frequency_bot.get_latest_broadcast()
-                reply_message = format_broadcast_message(latest_broadcast) if latest_broadcast else "📡 目前還沒有廣播"
+                reply_message = get_broadcast_reply() or "📡 目前還沒有廣播"
             else:
                 reply_message = f"🤖 為您查詢「{feature}」相關資訊..."
             
@@ -475,7 +582,7 @@ def handle_text_message(event):
     # If user types "幫助" directly, this handler will catch it.
     # If "幫助" is also a quick menu key, it would be handled by the QUICK_MENUS logic first.
     # Current QUICK_MENUS keys are "玩", "看", "救", so "幫助" is fine here.
-    if event.message.text.lower() in ['幫助', 'help', '說明', '?']:
+    if event.message.text.lower() in HELP_COMMANDS:
         help_message = """🌊 頻率共振 Bot 使用說明
 ━━━━━━━━━━━━━━
 👋 你好！我是大家的AI夥伴。試試輸入以下關鍵字探索功能：
@@ -515,11 +622,10 @@ def handle_text_message(event):
         return
 
     # Web Search Handler
-    SEARCH_KEYWORDS = ["搜尋 ", "search ", "找一下 ", "查一下 ", "搜 ", "查 "]
     user_message_text = event.message.text # Store original case for query, but compare lower for trigger
     user_message_lower = user_message_text.lower()
     search_trigger_word = None
-    for keyword in SEARCH_KEYWORDS:
+    for keyword in SEARCH_PREFIXES:
         if user_message_lower.startswith(keyword):
             search_trigger_word = keyword
             break
@@ -532,6 +638,8 @@ def handle_text_message(event):
             reply_text = "請輸入您想搜尋的關鍵字。\n例如：「搜尋 今天天氣如何」"
         elif not search_service:
             reply_text = "抱歉，網路搜尋功能目前暫時無法使用，請稍後再試。"
+        elif not user_rate_limiter.check(line_user_id, "search")[0]:
+            reply_text = "⏳ 搜尋次數有點多，請過幾分鐘再試。"
         else:
             search_result = search_service.perform_search(query, num_results=3) # Get top 3 results
 
@@ -565,13 +673,9 @@ def handle_text_message(event):
         return
 
     # 檢查是否為查詢廣播
-    if event.message.text.lower() in ['廣播', 'broadcast', 'b', '頻率', 'freq']:
+    if event.message.text.lower() in BROADCAST_COMMANDS:
         # 回傳最新廣播
-        latest_broadcast = frequency_bot.get_latest_broadcast()
-        if latest_broadcast:
-            reply_message = format_broadcast_message(latest_broadcast)
-        else:
-            reply_message = "📡 目前還沒有廣播，請稍後再試"
+        reply_message = get_broadcast_reply() or "📡 目前還沒有廣播，請稍後再試"
         
         line_bot_api.reply_message(
             ReplyMessageRequest(
@@ -582,21 +686,9 @@ def handle_text_message(event):
         return
     
     # 檢查是否為查詢統計
-    if event.message.text.lower() in ['統計', 'stats', '進度', 'progress', '排行']:
-        # 使用快取減少計算
-        cache_key = f"stats:{int(time.time()) // 60}"  # 每分鐘更新一次
-        
-        if cache and redis_client:
-            cached_stats = cache.get(cache_key)
-            if cached_stats:
-                reply_message = cached_stats
-            else:
-                stats = frequency_bot.get_frequency_stats()
-                reply_message = format_stats_message(stats)
-                cache.set(cache_key, reply_message, ttl=60)  # 快取1分鐘
-        else:
-            stats = frequency_bot.get_frequency_stats()
-            reply_message = format_stats_message(stats)
+    if event.message.text.lower() in STATS_COMMANDS:
+        # 使用快取減少計算（同一時間只有一個請求重新計算）
+        reply_message = get_stats_reply()
         
         line_bot_api.reply_message(
             ReplyMessageRequest(
@@ -607,7 +699,7 @@ def handle_text_message(event):
         return
     
     # 效能儀表板（Jensen Huang 要求的功能）
-    if event.message.text.lower() in ['系統狀態', 'system', 'performance', '效能']:
+    if event.message.text.lower() in SYSTEM_COMMANDS:
         if performance_dashboard:
             reply_message = performance_dashboard.format_dashboard()
         else:
@@ -622,7 +714,7 @@ def handle_text_message(event):
         return
     
     # API 統計
-    if event.message.text.lower() in ['api統計', 'api stats', 'api']:
+    if event.message.text.lower() in API_STATS_COMMANDS:
         if not community:
             reply_message = "❌ 社群功能暫時無法使用"
         else:
@@ -638,7 +730,7 @@ def handle_text_message(event):
         return
     
     # 文字接龍
-    if event.message.text.startswith('接龍 '):
+    if event.message.text.startswith(WORD_CHAIN_PREFIX):
         word = event.message.text[3:].strip()
         if not community:
             reply_message = "❌ 社群功能暫時無法使用"
@@ -671,7 +763,7 @@ def handle_text_message(event):
         return
     
     # 接龍狀態查詢
-    if event.message.text in ['接龍狀態', '接龍進度', '接龍']:
+    if event.message.text in WORD_CHAIN_STATUS_COMMANDS:
         if not community:
             reply_message = "❌ 社群功能暫時無法使用"
         else:
@@ -703,7 +795,7 @@ def handle_text_message(event):
         return
     
     # 投票功能
-    if event.message.text.startswith('投票 '):
+    if event.message.text.startswith(VOTE_PREFIX):
         parts = event.message.text[3:].split('/')
         if len(parts) >= 3:
             topic = parts[0].strip()
@@ -727,7 +819,7 @@ def handle_text_message(event):
         return
     
     # 投票結果
-    if event.message.text == '投票結果':
+    if event.message.text == VOTE_RESULT_COMMAND:
         result = community.get_vote_results()
         
         line_bot_api.reply_message(
@@ -739,7 +831,7 @@ def handle_text_message(event):
         return
     
     # 防空資訊
-    if event.message.text.startswith('防空 '):
+    if event.message.text.startswith(SHELTER_PREFIX):
         parts = event.message.text[3:].split(' ')
         if len(parts) >= 3:
             location = parts[0]
@@ -767,7 +859,7 @@ def handle_text_message(event):
         return
     
     # 範例展示
-    if event.message.text == '投票範例':
+    if event.message.text == VOTE_EXAMPLE_COMMAND:
         example_message = """📊 投票範例集：
 
 🍽 餐廳選擇
@@ -789,7 +881,7 @@ def handle_text_message(event):
         )
         return
     
-    if event.message.text == '防空範例':
+    if event.message.text == SHELTER_EXAMPLE_COMMAND:
         example_message = """🏠 避難所資訊範例：
 
 防空 信義區市政府站 捷運站地下層 500
@@ -808,7 +900,7 @@ def handle_text_message(event):
         return
     
     # 防災資訊總覽
-    if event.message.text in ['防災資訊', '緊急']:
+    if event.message.text in EMERGENCY_COMMANDS:
         summary = community.get_emergency_summary()
         reply_message = format_emergency_info_message(summary)
         
@@ -820,9 +912,9 @@ def handle_text_message(event):
         )
         return
     
-    # 檢查是否為數字（投票）
-    if event.message.text.isdigit():
-        option_num = int(event.message.text)
+    # 檢查是否為數字（投票，與意圖管線第 0 層相同的判斷）
+    option_num = vote_option(event.message.text)
+    if option_num is not None:
         result = community.cast_vote(option_num, user_id)
 
         if result.get('success') and knowledge_graph and knowledge_graph.connected: # Ensure success before logging
@@ -844,24 +936,9 @@ def handle_text_message(event):
     # explicit "接龍 <word>" is handled by the "接龍 " startswith handler.
     # For implicit, if continue_word_chain is successful, it means user participated.
     if community and community.connected and len(event.message.text) >= 2 and \
-       not event.message.text.startswith('接龍 ') and \
-       not event.message.text.startswith('投票 ') and \
-       not event.message.text.startswith('防空 ') and \
-       not event.message.text.startswith('笑話 ') and \
-       event.message.text not in ['接龍狀態', '接龍進度', '接龍', '投票結果', '防災資訊', '緊急'] and \
-       text_lower not in QUICK_MENUS and \
-       text_lower not in ['幫助', 'help', '說明', '?'] and \
-       text_lower not in ['廣播', 'broadcast', 'b', '頻率', 'freq'] and \
-       text_lower not in ['統計', 'stats', '進度', 'progress', '排行'] and \
-       text_lower not in ['系統狀態', 'system', 'performance', '效能'] and \
-       text_lower not in ['api統計', 'api stats', 'api'] and \
-       text_lower not in ['說個笑話', '聽笑話'] and \
-       text_lower not in ['讚', '👍', 'like joke', '讚笑話', '推'] and \
-       text_lower not in ['hi', 'hello', '你好', '嗨', '哈囉', '安安'] and \
-       not event.message.text.isdigit() : # Avoid conflict with other command words
-
-        chain_data_str = community.redis.get("word_chain:current")
-        if chain_data_str:
+       intent_pipeline.match_command(event.message.text) is None: # Avoid conflict with other command words
+
+        if community.has_active_word_chain():
             # Attempt to continue the chain implicitly
             potential_word = event.message.text.strip()
             # Call a modified or existing method that attempts to continue without starting a new one if it fails.
@@ -875,7 +952,7 @@ def handle_text_message(event):
 
 
     # 笑話功能
-    if event.message.text.startswith('笑話 '):
+    if event.message.text.startswith(JOKE_PREFIX):
         if community: # Check if community features are available
             joke_text = event.message.text[3:].strip()
             if not joke_text:
@@ -899,7 +976,7 @@ def handle_text_message(event):
         )
         return
 
-    if event.message.text.lower() in ['說個笑話', '聽笑話']:
+    if event.message.text.lower() in JOKE_COMMANDS:
         if community: # Check if community features are available
             # Pass user_id (which is the hashed user_id) for caching last seen joke
             result = community.get_random_joke(user_id_for_cache=user_id)
@@ -921,7 +998,7 @@ def handle_text_message(event):
         )
         return
 
-    if event.message.text.lower() in ['讚', '👍', 'like joke', '讚笑話', '推']:
+    if event.message.text.lower() in JOKE_LIKE_COMMANDS:
         if community: # Check if community features are available
             result = community.like_last_joke(user_id)
             reply_message = result['message']
@@ -942,7 +1019,7 @@ def handle_text_message(event):
         return
 
     # 檢查是否為新用戶的第一次互動
-    if event.message.text.lower() in ['hi', 'hello', '你好', '嗨', '哈囉', '安安']:
+    if event.message.text.lower() in GREETING_COMMANDS:
         is_new_user = False # Default to false
         if smart_onboarding and user_id:
             is_new_user = smart_onboarding.is_new_user(user_id)
@@ -1000,6 +1077,17 @@ def handle_text_message(event):
         )
         return
     
+    # 用戶層級限制：單一用戶洗版時不收錄到廣播池
+    allowed, limit_info = user_rate_limiter.check(line_user_id, "chat")
+    if not allowed:
+        line_bot_api.reply_message(
+            ReplyMessageRequest(
+                replyToken=event.reply_token,
+                messages=[TextMessage(text=f"💬 訊息有點太快了，請 {limit_info['retry_after']} 秒後再繼續分享")]
+            )
+        )
+        return
+    
     # 檢查是否為新用戶第一則訊息
     is_new_user = False
     if user_id:
@@ -1040,9 +1128,9 @@ def handle_text_message(event):
     else:
         feedback = format_instant_feedback(message_count, user_rank, user_id, frequency_bot.db)
     
-    # 如果達到1000則，立即生成廣播
-    if message_count >= 1000:
-        frequency_bot.generate_hourly_broadcast()
+    # 如果達到1000則，立即生成廣播（每位用戶觸發次數有限）
+    if message_count >= 1000 and user_rate_limiter.check(line_user_id, "broadcast")[0]:
+        publish_hourly_broadcast()
         feedback += "\n🎆 廣播已生成！輸入「廣播」查看"
     
     # 回覆即時回饋
@@ -1140,7 +1228,7 @@ def scheduled_broadcast():
     if not request.headers.get('X-Cloudscheduler'):
         abort(403)
     
-    result = frequency_bot.generate_hourly_broadcast()
+    result = publish_hourly_broadcast()
     if result:
         return jsonify({
             "status": "success",
@@ -1169,7 +1257,7 @@ if os.getenv('ENVIRONMENT', 'production') == 'development':
     @rate_limit(**RateLimits.ADMIN)
     def trigger_broadcast():
         """手動觸發廣播生成（測試用）"""
-        result = frequency_bot.generate_hourly_broadcast()
+        result = publish_hourly_broadcast()
         if result:
             return f"廣播已生成：{result['message_count']} 則訊息"
         return "沒有訊息可生成廣播"
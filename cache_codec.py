@@ -0,0 +1,147 @@
+"""
+快取序列化編碼
+提供可替換的編碼器：JSON（文字，相容舊資料）與 msgpack（二進位、保留 datetime/set 等型別，
+超過大小門檻時以 zlib 或 zstd 壓縮）；編碼結果第一個位元組標示格式，解碼時可辨識舊的 JSON 值
+"""
+
+import json
+import zlib
+import logging
+from datetime import date, datetime
+from typing import Any, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    logger.warning("msgpack 未安裝，快取將使用 JSON 編碼")
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# 格式標頭
+_RAW = b"M"
+_ZLIB = b"Z"
+_ZSTD = b"S"
+
+# msgpack 擴充型別代碼
+_EXT_DATETIME = 1
+_EXT_DATE = 2
+_EXT_SET = 3
+
+
+class JsonCodec:
+    """JSON 文字編碼（適用 decode_responses=True 的連線）"""
+
+    name = "json"
+    binary = False
+
+    def encode(self, value: Any) -> str:
+        return json.dumps(value, default=str, ensure_ascii=False)
+
+    def decode(self, raw: Union[str, bytes]) -> Any:
+        return json.loads(raw)
+
+
+class MsgpackCodec:
+    """msgpack 二進位編碼，保留型別並壓縮大型內容"""
+
+    name = "msgpack"
+    binary = True
+
+    def __init__(self, compress_threshold: int = 1024, compression: str = "zlib", level: int = 6):
+        """
+        初始化編碼器
+
+        Args:
+            compress_threshold: 超過此位元組數才壓縮
+            compression: "zlib" 或 "zstd"（未安裝 zstandard 時改用 zlib）
+            level: 壓縮等級
+        """
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("msgpack 未安裝")
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("zstandard 未安裝，改用 zlib 壓縮")
+            compression = "zlib"
+
+        self.compress_threshold = compress_threshold
+        self.compression = compression
+        self.level = level
+        if compression == "zstd":
+            self._zstd_compressor = zstandard.ZstdCompressor(level=level)
+            self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, value: Any) -> bytes:
+        packed = msgpack.packb(value, default=_encode_ext, use_bin_type=True, datetime=False)
+        if len(packed) >= self.compress_threshold:
+            if self.compression == "zstd":
+                compressed, header = self._zstd_compressor.compress(packed), _ZSTD
+            else:
+                compressed, header = zlib.compress(packed, self.level), _ZLIB
+            # 壓縮後沒有變小就保留原樣
+            if len(compressed) < len(packed):
+                return header + compressed
+        return _RAW + packed
+
+    def decode(self, raw: Union[str, bytes]) -> Any:
+        if isinstance(raw, str):
+            return json.loads(raw)
+
+        header, body = raw[:1], raw[1:]
+        if header == _RAW:
+            return self._unpack(body)
+        if header == _ZLIB:
+            return self._unpack(zlib.decompress(body))
+        if header == _ZSTD:
+            if not ZSTD_AVAILABLE:
+                raise ValueError("需要 zstandard 才能解碼此快取值")
+            return self._unpack(zstandard.ZstdDecompressor().decompress(body))
+        # 切換編碼前寫入的 JSON
+        return json.loads(raw)
+
+    @staticmethod
+    def _unpack(data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, ext_hook=_decode_ext, strict_map_key=False)
+
+
+def _encode_ext(value: Any):
+    """msgpack 不支援的型別：datetime/date/set 轉為擴充型別，其餘比照 JSON 轉成字串"""
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(_EXT_DATE, value.isoformat().encode())
+    if isinstance(value, (set, frozenset)):
+        return msgpack.ExtType(_EXT_SET, msgpack.packb(list(value), default=_encode_ext, use_bin_type=True))
+    if hasattr(value, "to_native"):  # Neo4j DateTime
+        return _encode_ext(value.to_native())
+    return str(value)
+
+
+def _decode_ext(code: int, data: bytes):
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == _EXT_SET:
+        return set(msgpack.unpackb(data, raw=False, ext_hook=_decode_ext))
+    return msgpack.ExtType(code, data)
+
+
+def codec_for_client(redis_client):
+    """
+    依 Redis 連線選擇編碼器：
+    decode_responses=True 的文字連線只能存 JSON，二進位連線使用 msgpack
+    """
+    if not MSGPACK_AVAILABLE:
+        return JsonCodec()
+    if redis_client is not None:
+        kwargs = getattr(getattr(redis_client, "connection_pool", None), "connection_kwargs", {})
+        if not isinstance(kwargs, dict) or kwargs.get("decode_responses", False):
+            return JsonCodec()
+    return MsgpackCodec()
@@ -0,0 +1,284 @@
+"""
+斷路器
+包在實際的外部呼叫（Firestore、Neo4j、Redis、Gemini、Custom Search）外面：
+連續失敗或滾動窗口內失敗率過高時開啟，開啟期間直接拒絕（不佔用請求執行緒等待逾時），
+恢復時間過後只放行有限數量的試探呼叫；狀態以鎖保護，可在多執行緒下共用
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+# 各相依服務的預設設定（slow_call_threshold 秒：超過視為失敗，避免慢服務拖住執行緒）
+DEPENDENCY_SETTINGS = {
+    "redis": {"failure_threshold": 5, "recovery_timeout": 15, "slow_call_threshold": 0.5},
+    "neo4j": {"failure_threshold": 5, "recovery_timeout": 30, "slow_call_threshold": 3.0},
+    "firestore": {"failure_threshold": 5, "recovery_timeout": 30, "slow_call_threshold": 5.0},
+    "gemini": {"failure_threshold": 3, "recovery_timeout": 60, "slow_call_threshold": 30.0},
+    "custom_search": {"failure_threshold": 3, "recovery_timeout": 60, "slow_call_threshold": 8.0},
+}
+
+# 核心相依服務：斷路器開啟時服務整體視為降級（其餘服務只回報狀態）
+CORE_DEPENDENCIES = ("redis", "neo4j", "firestore")
+
+_breakers: Dict[str, "CircuitBreaker"] = {}
+_registry_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，呼叫未執行"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"斷路器開啟中，服務暫時無法使用: {name}")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    斷路器：CLOSED → OPEN（連續 failure_threshold 次失敗，或窗口內呼叫數達 min_calls 且失敗率達
+    failure_rate_threshold）→ 經過 recovery_timeout 秒後 HALF_OPEN（同時最多 half_open_max_calls 個試探）
+    → 試探成功回到 CLOSED，失敗再次 OPEN
+
+    只有 failure_exceptions 與超過 slow_call_threshold 的呼叫算失敗；其他例外（例如查詢語法錯誤）
+    表示服務有回應，照常拋出但不影響狀態；ignored_exceptions 表示呼叫沒有到達服務（例如連線池用完），
+    不計入成功或失敗
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: int = 60, name: str = None,
+                 failure_rate_threshold: float = 0.5, window: float = 60.0, min_calls: int = 20,
+                 half_open_max_calls: int = 1, slow_call_threshold: float = None,
+                 failure_exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+                 ignored_exceptions: Tuple[Type[BaseException], ...] = (),
+                 max_transitions: int = 50):
+        """
+        初始化斷路器
+
+        Args:
+            failure_threshold: 連續失敗幾次後開啟
+            recovery_timeout: 開啟後多少秒進入半開
+            name: 名稱（有名稱時登錄以供匯出狀態）
+            failure_rate_threshold: 滾動窗口失敗率門檻
+            window: 滾動窗口秒數
+            min_calls: 窗口內至少幾次呼叫才以失敗率判斷
+            half_open_max_calls: 半開時同時允許的試探呼叫數
+            slow_call_threshold: 超過此秒數的呼叫視為失敗（None 表示不判斷）
+            failure_exceptions: 視為失敗的例外類型
+            ignored_exceptions: 不影響狀態的例外類型（優先於 failure_exceptions）
+            max_transitions: 保留的狀態轉換紀錄數
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window = window
+        self.min_calls = min_calls
+        self.half_open_max_calls = half_open_max_calls
+        self.slow_call_threshold = slow_call_threshold
+        self.failure_exceptions = failure_exceptions
+        self.ignored_exceptions = ignored_exceptions
+
+        self.state = self.CLOSED
+        self.failure_count = 0  # 連續失敗次數
+        self.last_failure_time: Optional[float] = None
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "slow_calls": 0, "rejected": 0}
+        self.transitions = deque(maxlen=max_transitions)
+        self.listeners: List[Callable[[str, str, str, str], None]] = []
+
+        self._lock = threading.Lock()
+        self._half_open_calls = 0
+        self._bucket_width = window / 10
+        self._buckets = deque()  # [起始時間, 呼叫數, 失敗數]
+        self._latency_total = 0.0
+
+        if name:
+            with _registry_lock:
+                _breakers[name] = self
+
+    @classmethod
+    def for_dependency(cls, name: str, **overrides) -> "CircuitBreaker":
+        """
+        取得相依服務的斷路器（同一服務在行程內共用一個；第一次以 DEPENDENCY_SETTINGS 的預設值建立）
+        """
+        with _registry_lock:
+            breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = cls(name=name, **{**DEPENDENCY_SETTINGS.get(name, {}), **overrides})
+        return breaker
+
+    @property
+    def is_open(self) -> bool:
+        """開啟中且尚未到恢復時間（呼叫會被直接拒絕）"""
+        return self.state == self.OPEN and time.time() - self.last_failure_time <= self.recovery_timeout
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """執行函數並處理斷路器邏輯"""
+        return self._call(func, args, kwargs)
+
+    def call_excluding(self, excluded: Callable[[], float], func: Callable, *args, **kwargs) -> Any:
+        """
+        執行函數；呼叫結束後 excluded() 回傳的秒數（例如等待連線池的時間）不計入延遲與慢呼叫判斷
+        """
+        return self._call(func, args, kwargs, excluded)
+
+    def _call(self, func: Callable, args: tuple, kwargs: dict,
+              excluded: Callable[[], float] = None) -> Any:
+        probe = self._acquire()
+        start = time.perf_counter()
+
+        def elapsed_since_start() -> float:
+            elapsed = time.perf_counter() - start
+            return max(0.0, elapsed - excluded()) if excluded else elapsed
+
+        try:
+            result = func(*args, **kwargs)
+        except self.ignored_exceptions:
+            self._release(probe)
+            raise
+        except self.failure_exceptions:
+            self._record(False, probe, elapsed_since_start())
+            raise
+        except BaseException:
+            # 服務有回應（或呼叫被中斷），不計為失敗
+            self._record(True, probe, elapsed_since_start())
+            raise
+        elapsed = elapsed_since_start()
+        slow = self.slow_call_threshold is not None and elapsed > self.slow_call_threshold
+        self._record(not slow, probe, elapsed, slow=slow)
+        return result
+
+    def _acquire(self) -> bool:
+        """檢查是否放行；回傳此呼叫是否為半開試探"""
+        with self._lock:
+            if self.state == self.OPEN:
+                waited = time.time() - self.last_failure_time
+                if waited <= self.recovery_timeout:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.name or "unnamed", self.recovery_timeout - waited)
+                self._transition(self.HALF_OPEN, "恢復時間已到")
+            if self.state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.name or "unnamed", 0)
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def _release(self, probe: bool):
+        """呼叫沒有到達服務：只歸還半開試探名額"""
+        if probe:
+            with self._lock:
+                self._half_open_calls -= 1
+
+    def _record(self, success: bool, probe: bool, elapsed: float, slow: bool = False):
+        now = time.time()
+        with self._lock:
+            if probe:
+                self._half_open_calls -= 1
+            self.stats["calls"] += 1
+            self.stats["successes" if success else "failures"] += 1
+            if slow:
+                self.stats["slow_calls"] += 1
+            self._latency_total += elapsed
+            calls, failures = self._add_to_window(now, success)
+
+            if success:
+                self.failure_count = 0
+                if probe and self.state == self.HALF_OPEN:
+                    self._transition(self.CLOSED, "試探呼叫成功")
+                return
+
+            self.failure_count += 1
+            self.last_failure_time = now
+            if probe or self.state == self.HALF_OPEN:
+                self._transition(self.OPEN, "試探呼叫失敗" + ("（過慢）" if slow else ""))
+            elif self.state == self.CLOSED:
+                if self.failure_count >= self.failure_threshold:
+                    self._transition(self.OPEN, f"連續失敗 {self.failure_count} 次")
+                elif calls >= self.min_calls and failures / calls >= self.failure_rate_threshold:
+                    self._transition(self.OPEN, f"失敗率 {failures / calls:.0%}（{failures}/{calls}）")
+
+    def _add_to_window(self, now: float, success: bool) -> Tuple[int, int]:
+        """記錄到滾動窗口並回傳窗口內 (呼叫數, 失敗數)（呼叫端需持有鎖）"""
+        start = now - now % self._bucket_width
+        if not self._buckets or self._buckets[-1][0] != start:
+            self._buckets.append([start, 0, 0])
+        bucket = self._buckets[-1]
+        bucket[1] += 1
+        if not success:
+            bucket[2] += 1
+        while self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+        return sum(b[1] for b in self._buckets), sum(b[2] for b in self._buckets)
+
+    def _transition(self, state: str, reason: str):
+        """切換狀態並通知（呼叫端需持有鎖）"""
+        previous, self.state = self.state, state
+        if state == self.CLOSED:
+            self.failure_count = 0
+            self._buckets.clear()
+        self.transitions.append({"from": previous, "to": state, "at": time.time(), "reason": reason})
+
+        name = self.name or "unnamed"
+        if state == self.OPEN:
+            logger.error(f"斷路器開啟: {name} - {reason}")
+        else:
+            logger.info(f"斷路器 {name}: {previous} → {state}（{reason}）")
+        for listener in self.listeners:
+            try:
+                listener(name, previous, state, reason)
+            except Exception as e:
+                logger.warning(f"斷路器狀態通知失敗: {e}")
+
+    def snapshot(self) -> Dict:
+        """目前狀態、統計與最近的狀態轉換"""
+        with self._lock:
+            calls = sum(b[1] for b in self._buckets)
+            failures = sum(b[2] for b in self._buckets)
+            executed = self.stats["calls"]
+            return {
+                "state": self.state,
+                "failure_count": self.failure_count,
+                "window_calls": calls,
+                "window_failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "avg_latency_ms": round(self._latency_total / executed * 1000, 2) if executed else 0.0,
+                **self.stats,
+                "transitions": list(self.transitions)[-10:]
+            }
+
+
+def guarded(attribute: str):
+    """方法裝飾器：透過實例屬性 attribute 上的斷路器執行"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            return getattr(self, attribute).call(func, self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_breaker(name: str) -> Optional[CircuitBreaker]:
+    """依名稱取得已登錄的斷路器"""
+    with _registry_lock:
+        return _breakers.get(name)
+
+
+def breaker_snapshots() -> Dict[str, Dict]:
+    """所有已登錄斷路器的狀態"""
+    with _registry_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.snapshot() for name, breaker in sorted(breakers.items())}
+
+
+def open_breakers(names=CORE_DEPENDENCIES) -> List[str]:
+    """指定服務中目前拒絕呼叫的斷路器名稱（已過恢復時間的 OPEN 不算）"""
+    with _registry_lock:
+        breakers = [(name, _breakers.get(name)) for name in names]
+    return [name for name, breaker in breakers if breaker is not None and breaker.is_open]
@@ -10,11 +10,23 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from collections import Counter
 from knowledge_graph import KnowledgeGraph
+from keyword_automaton import keyword_index
+from hour_analytics import analyze_hour
+from stream_analytics import HourStream
 import json
 import re
 
 logger = logging.getLogger(__name__)
 
+# 功能使用偵測詞典
+FEATURE_USAGE_KEYWORDS = {
+    "接龍": ["接龍", "詞語接龍", "文字接龍"],
+    "投票": ["投票", "選擇", "票"],
+    "統計": ["統計", "數據", "進度"],
+    "廣播": ["廣播", "頻率"],
+    "防災": ["防空", "避難", "物資"]
+}
+
 
 class CollectiveMemorySystem:
     """集體記憶系統 - 融合個人記憶與集體意識"""
@@ -22,6 +34,9 @@ class CollectiveMemorySystem:
     def __init__(self, knowledge_graph: KnowledgeGraph):
         self.graph = knowledge_graph
         self.memory_window = 3600  # 1小時的記憶窗口
+        self.activity_histogram = None  # 用戶 7×24 活躍直方圖（ActivityHistogram）
+        self.embedder = None            # 語義嵌入服務（EmbeddingService）
+        self.moment_index = None        # 歷史廣播向量索引（MemmapVectorIndex）
         
         # 情緒詞典
         self.emotion_keywords = {
@@ -33,6 +48,45 @@ class CollectiveMemorySystem:
             "tired": ["累", "睏", "疲憊", "想睡", "沒力", "😴", "💤"]
         }
         
+        # 註冊到共用關鍵詞自動機
+        keyword_index.register("emotion", self.emotion_keywords)
+        keyword_index.register("feature_usage", FEATURE_USAGE_KEYWORDS)
+        
+        # 本小時的串流分析（訊息進來時即時更新）
+        self.hour_stream = HourStream(self._detect_emotion, self._extract_topics)
+        
+    def attach_moment_index(self, embedder, index) -> None:
+        """設定語義嵌入服務與歷史廣播向量索引"""
+        self.embedder = embedder
+        self.moment_index = index
+    
+    def remember_broadcast(self, hour: int, content: str) -> None:
+        """把這一小時的廣播加入向量索引，供之後引用相似時刻"""
+        self.remember_broadcasts([(hour, content)])
+    
+    def remember_broadcasts(self, broadcasts: List[Tuple[int, str]]) -> None:
+        """批次加入多個小時的廣播（一次模型呼叫）"""
+        if not self.embedder or self.moment_index is None:
+            return
+        broadcasts = [(hour, content) for hour, content in broadcasts if content]
+        if not broadcasts:
+            return
+        try:
+            vectors = self.embedder.encode_many([content for _, content in broadcasts])
+            self.moment_index.add_many(
+                (str(hour), vector, {"hour": hour, "preview": content[:30]})
+                for (hour, content), vector in zip(broadcasts, vectors)
+            )
+        except Exception as e:
+            logger.warning(f"無法加入廣播向量索引: {e}")
+    
+    def observe_message(self, message: str, timestamp: float = None) -> None:
+        """把新訊息送入本小時的串流分析"""
+        try:
+            self.hour_stream.observe(message, timestamp)
+        except Exception as e:
+            logger.warning(f"串流分析失敗: {e}")
+    
     def process_message(self, user_id: str, message: str) -> Dict:
         """處理新訊息並儲存到集體記憶"""
         try:
@@ -81,14 +135,15 @@ class CollectiveMemorySystem:
         # 1. 獲取本小時的所有訊息和用戶
         hour_data = self._get_hour_data(hour)
         
-        # 2. 分析集體情緒
-        collective_emotion = self._analyze_collective_emotion(hour_data["messages"])
+        # 2. 集體情緒與話題：串流狀態已涵蓋本小時時直接取用，否則批次分析
+        hour_analysis = self._analyze_hour(hour_data["messages"], hour)
+        collective_emotion = hour_analysis["emotion"]
         
         # 3. 獲取活躍用戶的個人記憶
         user_memories = self._get_user_memories(hour_data["active_users"])
         
         # 4. 找出熱門話題和關聯
-        topic_network = self._analyze_topic_network(hour_data["messages"])
+        topic_network = self._build_topic_network(hour_analysis)
         
         # 5. 生成記憶觸發詞
         memory_triggers = self._generate_memory_triggers(user_memories)
@@ -107,6 +162,7 @@ class CollectiveMemorySystem:
 訊息總數：{len(hour_data['messages'])}
 活躍人數：{len(hour_data['active_users'])}
 能量等級：{self._calculate_energy_level(hour_data)}
+本時段常客：{len(self._get_regulars_this_hour(hour_data['active_users']))} 人
 
 ## 訊息片段（按時間順序）
 {self._format_messages_for_prompt(hour_data['messages'][:50])}  # 限制50則避免太長
@@ -117,7 +173,7 @@ class CollectiveMemorySystem:
 # 🌈 情緒地圖
 主導情緒：{collective_emotion['dominant']}
 情緒分佈：{collective_emotion['distribution']}
-情緒轉折點：{collective_emotion['turning_points']}
+情緒轉折點：{self._format_turning_points(collective_emotion['turning_points'])}
 
 # 🔗 話題網絡
 熱門話題：{', '.join(topic_network['hot_topics'][:5])}
@@ -206,12 +262,7 @@ class CollectiveMemorySystem:
     
     def _detect_emotion(self, message: str) -> str:
         """偵測訊息情緒"""
-        emotion_scores = {}
-        
-        for emotion, keywords in self.emotion_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in message)
-            if score > 0:
-                emotion_scores[emotion] = score
+        emotion_scores = keyword_index.keyword_counts(message, "emotion")
         
         if not emotion_scores:
             return "neutral"
@@ -241,28 +292,17 @@ class CollectiveMemorySystem:
     
     def _detect_feature_usage(self, message: str) -> Optional[str]:
         """偵測功能使用意圖"""
-        feature_keywords = {
-            "接龍": ["接龍", "詞語接龍", "文字接龍"],
-            "投票": ["投票", "選擇", "票"],
-            "統計": ["統計", "數據", "進度"],
-            "廣播": ["廣播", "頻率"],
-            "防災": ["防空", "避難", "物資"]
-        }
-        
-        for feature, keywords in feature_keywords.items():
-            if any(keyword in message for keyword in keywords):
-                return feature
-        
-        return None
+        return keyword_index.first_category(message, "feature_usage")
     
-    def _generate_simple_embedding(self, message: str) -> List[float]:
-        """生成簡單的訊息嵌入向量"""
-        # 使用哈希值生成偽嵌入向量
-        embedding = []
-        for i in range(10):
-            hash_val = hash(message + str(i))
-            embedding.append((hash_val % 1000) / 1000.0)
-        return embedding
+    def _generate_simple_embedding(self, message: str) -> Optional[List[float]]:
+        """生成訊息嵌入向量（沒有語義模型時不儲存向量）"""
+        if not self.embedder:
+            return None
+        try:
+            return self.embedder.encode(message)
+        except Exception as e:
+            logger.warning(f"訊息嵌入失敗: {e}")
+            return None
     
     def _get_hour_data(self, hour: int) -> Dict:
         """獲取特定小時的資料"""
@@ -276,7 +316,7 @@ class CollectiveMemorySystem:
         try:
             # 獲取該小時的所有訊息
             hour_ref = db.collection('broadcasts').document(str(hour))
-            messages_ref = hour_ref.collection('messages')
+            messages_ref = hour_ref.collection('messages').order_by('timestamp')
             
             for msg_doc in messages_ref.stream():
                 msg_data = msg_doc.to_dict()
@@ -298,68 +338,86 @@ class CollectiveMemorySystem:
             "hour": hour
         }
     
+    def _analyze_hour(self, messages: List[Dict], hour: int = None) -> Dict:
+        """整點分析（情緒分佈、轉折點、話題）"""
+        if hour is not None and self.hour_stream.covers(hour, len(messages)):
+            return self.hour_stream.snapshot()
+        return analyze_hour(messages, self._detect_emotion)
+    
     def _analyze_collective_emotion(self, messages: List[Dict]) -> Dict:
         """分析集體情緒"""
-        emotions = []
-        for msg in messages:
-            emotion = self._detect_emotion(msg.get("content", ""))
-            emotions.append(emotion)
-        
-        # 統計情緒分佈
-        emotion_counter = Counter(emotions)
-        total = len(emotions) or 1
-        
-        return {
-            "dominant": emotion_counter.most_common(1)[0][0] if emotion_counter else "neutral",
-            "distribution": {k: f"{v/total*100:.1f}%" for k, v in emotion_counter.items()},
-            "turning_points": []  # 簡化版本
-        }
+        return self._analyze_hour(messages)["emotion"]
+    
+    def _format_turning_points(self, turning_points: List[Dict]) -> str:
+        """格式化情緒轉折點"""
+        if not turning_points:
+            return "無明顯轉折"
+        return "、".join(
+            f"{point.get('time') or '第' + str(point['index'] + 1) + '則'} {point['from']}→{point['to']}"
+            for point in turning_points
+        )
     
     def _get_user_memories(self, user_ids: List[str]) -> Dict[str, Dict]:
-        """獲取用戶的個人記憶"""
+        """獲取用戶的個人記憶（一次批次查詢）"""
         memories = {}
+        user_ids = user_ids[:20]  # 限制數量避免太長
         
-        for user_id in user_ids[:20]:  # 限制數量避免太長
-            try:
-                # 獲取用戶偏好
-                preferences = self.graph.get_user_preferences(user_id)
-                
-                # 獲取最近對話
-                recent_context = self.graph.get_conversation_context(user_id, limit=5)
-                
-                memories[user_id] = {
-                    "preferences": preferences,
-                    "recent_messages": recent_context,
-                    "active_times": self._get_user_active_pattern(user_id)
-                }
-            except Exception as e:
-                logger.warning(f"獲取用戶 {user_id} 記憶失敗: {e}")
+        try:
+            batch = self.graph.get_user_memories(user_ids, context_limit=5)
+        except Exception as e:
+            logger.warning(f"批次獲取用戶記憶失敗: {e}")
+            return memories
+        
+        active_patterns = self._get_user_active_patterns(user_ids)
+        
+        for user_id in user_ids:
+            if user_id not in batch:
+                continue
+            memories[user_id] = {
+                **batch[user_id],
+                "active_times": active_patterns[user_id]
+            }
         
         return memories
     
     def _get_user_active_pattern(self, user_id: str) -> Dict:
         """獲取用戶活躍模式"""
-        # 簡化版本，實際應該分析歷史資料
+        return self._get_user_active_patterns([user_id])[user_id]
+    
+    def _get_user_active_patterns(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """批次獲取用戶活躍模式（從活躍直方圖一次計算）"""
+        if self.activity_histogram:
+            try:
+                return self.activity_histogram.patterns(user_ids)
+            except Exception as e:
+                logger.warning(f"讀取活躍直方圖失敗: {e}")
+        
         return {
-            "preferred_hour": 21,  # 晚上9點
-            "active_days": ["週二", "週五"],
-            "message_frequency": "medium"
+            user_id: {"preferred_hour": None, "active_days": [], "message_frequency": "unknown"}
+            for user_id in user_ids
         }
     
+    def _get_regulars_this_hour(self, user_ids: List[str]) -> List[str]:
+        """找出通常在這個時段出現的用戶"""
+        if not self.activity_histogram or not user_ids:
+            return []
+        try:
+            return self.activity_histogram.typically_active(user_ids)
+        except Exception as e:
+            logger.warning(f"讀取活躍直方圖失敗: {e}")
+            return []
+    
     def _analyze_topic_network(self, messages: List[Dict]) -> Dict:
         """分析話題網絡"""
-        all_topics = []
-        
-        for msg in messages:
-            topics = self._extract_topics(msg.get("content", ""))
-            all_topics.extend(topics)
-        
-        topic_counter = Counter(all_topics)
-        
+        return self._build_topic_network(self._analyze_hour(messages))
+    
+    def _build_topic_network(self, hour_analysis: Dict) -> Dict:
+        """由整點分析結果建立話題網絡（關聯與新興話題來自串流分析）"""
+        topics = hour_analysis["topics"]
         return {
-            "hot_topics": [topic for topic, _ in topic_counter.most_common(10)],
-            "connections": {},  # 簡化版本
-            "emerging": []  # 簡化版本
+            "hot_topics": topics["hot_topics"],
+            "connections": topics.get("connections", {}),
+            "emerging": topics.get("emerging", [])
         }
     
     def _generate_memory_triggers(self, user_memories: Dict) -> Dict:
@@ -430,6 +488,11 @@ class CollectiveMemorySystem:
                 features = [f["name"] for f in memory["preferences"]["preferred_features"][:2]]
                 user_summary += f"\n常用功能：{', '.join(features)}"
             
+            # 活躍時段
+            active_times = memory.get("active_times", {})
+            if active_times.get("preferred_hour") is not None:
+                user_summary += f"\n常出現時段：{'、'.join(active_times['active_days'])} {active_times['preferred_hour']}點前後"
+            
             # 最近情緒
             recent_emotions = []
             for msg in memory.get("recent_messages", [])[:3]:
@@ -464,9 +527,30 @@ class CollectiveMemorySystem:
         return weekdays[weekday]
     
     def _find_similar_past_moment(self, hour_data: Dict) -> str:
-        """找出相似的過去時刻"""
-        # 簡化版本
-        return "上週同一時間"
+        """找出語義最相似的過去廣播時刻"""
+        fallback = "上週同一時間"
+        if not self.embedder or not self.moment_index or not hour_data.get("messages"):
+            return fallback
+        
+        try:
+            text = "\n".join(msg.get("content", "") for msg in hour_data["messages"][:50])
+            matches = self.moment_index.search(
+                self.embedder.encode(text), k=1, exclude=[str(hour_data.get("hour"))]
+            )
+        except Exception as e:
+            logger.warning(f"搜尋相似時刻失敗: {e}")
+            return fallback
+        
+        if not matches:
+            return fallback
+        
+        moment_id, score = matches[0]
+        moment = self.moment_index.metadata.get(moment_id, {})
+        past_hour = moment.get("hour", int(moment_id))
+        description = f"{self._time_ago(past_hour * 3600)}的{self._get_time_description(past_hour)}"
+        if moment.get("preview"):
+            description += f"（那時的廣播：「{moment['preview']}…」）"
+        return description
     
     def _time_ago(self, timestamp: Optional[float]) -> str:
         """計算時間差描述"""
@@ -0,0 +1,56 @@
+"""
+指令詞定義
+app.py 的處理器與分層意圖分類管線共用同一份指令詞（比對時忽略大小寫）
+"""
+
+from typing import Optional
+
+HELP_COMMANDS = ("幫助", "help", "說明", "?")
+BROADCAST_COMMANDS = ("廣播", "broadcast", "b", "頻率", "freq")
+STATS_COMMANDS = ("統計", "stats", "進度", "progress", "排行")
+SYSTEM_COMMANDS = ("系統狀態", "system", "performance", "效能")
+API_STATS_COMMANDS = ("api統計", "api stats", "api")
+WORD_CHAIN_STATUS_COMMANDS = ("接龍狀態", "接龍進度", "接龍")
+WORD_CHAIN_EXAMPLE_COMMAND = "接龍範例"
+VOTE_RESULT_COMMAND = "投票結果"
+VOTE_EXAMPLE_COMMAND = "投票範例"
+EMERGENCY_COMMANDS = ("防災資訊", "緊急")
+SHELTER_EXAMPLE_COMMAND = "防空範例"
+JOKE_COMMANDS = ("說個笑話", "聽笑話")
+JOKE_LIKE_COMMANDS = ("讚", "👍", "like joke", "讚笑話", "推")
+GREETING_COMMANDS = ("hi", "hello", "你好", "嗨", "哈囉", "安安")
+
+# 帶參數的指令前綴
+WORD_CHAIN_PREFIX = "接龍 "
+VOTE_PREFIX = "投票 "
+SHELTER_PREFIX = "防空 "
+JOKE_PREFIX = "笑話 "
+SEARCH_PREFIXES = ("搜尋 ", "search ", "找一下 ", "查一下 ", "搜 ", "查 ")
+
+# 功能 -> 精確指令
+EXACT_COMMANDS = {
+    "幫助": HELP_COMMANDS,
+    "廣播": BROADCAST_COMMANDS,
+    "統計": STATS_COMMANDS,
+    "系統狀態": SYSTEM_COMMANDS,
+    "API統計": API_STATS_COMMANDS,
+    "接龍": WORD_CHAIN_STATUS_COMMANDS + (WORD_CHAIN_EXAMPLE_COMMAND,),
+    "投票": (VOTE_RESULT_COMMAND, VOTE_EXAMPLE_COMMAND),
+    "防空": EMERGENCY_COMMANDS + (SHELTER_EXAMPLE_COMMAND,),
+    "笑話": JOKE_COMMANDS + JOKE_LIKE_COMMANDS,
+    "問候": GREETING_COMMANDS,
+}
+
+# (前綴, 功能)
+COMMAND_PREFIXES = [
+    (WORD_CHAIN_PREFIX, "接龍"),
+    (VOTE_PREFIX, "投票"),
+    (SHELTER_PREFIX, "防空"),
+    (JOKE_PREFIX, "笑話"),
+] + [(prefix, "網路搜尋") for prefix in SEARCH_PREFIXES]
+
+
+def vote_option(text: str) -> Optional[int]:
+    """數字投票的選項編號（忽略前後空白），不是數字時回傳 None"""
+    text = text.strip()
+    return int(text) if text.isdecimal() else None
@@ -15,25 +15,115 @@ from word_chain_formatter import (
     format_chain_error,
     format_chain_status
 )
+from redis_batch import deferred, read_many
 from google.cloud import firestore # Added for joke feature
 import random # For new get_random_joke strategy
 
 logger = logging.getLogger(__name__)
 
 
+# 進行中的接龍：metadata（hash）、詞語（list）、已用詞語（set，檢查重複）、參與者（set）
+WORD_CHAIN_KEYS = [
+    "word_chain:current:meta",
+    "word_chain:current:words",
+    "word_chain:current:used",
+    "word_chain:current:participants",
+]
+WORD_CHAIN_TTL = 3600
+
+# 開始接龍：已有進行中的接龍時回傳 0
+# ARGV: 詞語, 最後一個字, 用戶, chain_id, 建立時間, 目標長度, TTL
+_WORD_CHAIN_START_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('del', KEYS[2], KEYS[3], KEYS[4])
+redis.call('hset', KEYS[1], 'chain_id', ARGV[4], 'current_word', ARGV[1], 'last_char', ARGV[2],
+           'created_at', ARGV[5], 'target_length', ARGV[6])
+redis.call('rpush', KEYS[2], ARGV[1])
+redis.call('sadd', KEYS[3], ARGV[1])
+redis.call('sadd', KEYS[4], ARGV[3])
+for i = 1, 4 do
+    redis.call('expire', KEYS[i], ARGV[7])
+end
+return 1
+"""
+
+# 繼續接龍：回傳 {狀態, JSON}；狀態為 no_chain / wrong_start / duplicate / continued / completed
+# （開頭字與最後一個字由呼叫端計算，Lua 5.1 沒有 UTF-8 字元處理）
+# ARGV: 詞語, 第一個字, 最後一個字, 用戶, TTL, 完成紀錄鍵前綴, 完成紀錄 TTL
+_WORD_CHAIN_CONTINUE_SCRIPT = """
+local meta = redis.call('hmget', KEYS[1], 'chain_id', 'current_word', 'last_char', 'created_at', 'target_length')
+if not meta[1] then
+    return {'no_chain', '{}'}
+end
+if ARGV[2] ~= meta[3] then
+    return {'wrong_start', cjson.encode({expected = meta[3]})}
+end
+if redis.call('sismember', KEYS[3], ARGV[1]) == 1 then
+    return {'duplicate', cjson.encode({recent_words = redis.call('lrange', KEYS[2], -5, -1)})}
+end
+
+local length = redis.call('rpush', KEYS[2], ARGV[1])
+redis.call('sadd', KEYS[3], ARGV[1])
+redis.call('sadd', KEYS[4], ARGV[4])
+redis.call('hset', KEYS[1], 'current_word', ARGV[1], 'last_char', ARGV[3])
+
+local chain = {
+    chain_id = meta[1],
+    current_word = ARGV[1],
+    created_at = tonumber(meta[4]),
+    target_length = tonumber(meta[5]),
+    chain = redis.call('lrange', KEYS[2], 0, -1),
+    participants = redis.call('smembers', KEYS[4])
+}
+if length >= chain.target_length then
+    local record = cjson.encode(chain)
+    redis.call('del', KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+    redis.call('setex', ARGV[6] .. meta[1], ARGV[7], record)
+    return {'completed', record}
+end
+for i = 1, 4 do
+    redis.call('expire', KEYS[i], ARGV[5])
+end
+return {'continued', cjson.encode(chain)}
+"""
+
+_WORD_CHAIN_SCRIPTS = {"start": _WORD_CHAIN_START_SCRIPT, "continue": _WORD_CHAIN_CONTINUE_SCRIPT}
+
+
 class CommunityFeatures:
+    # 幾乎每個相關指令都會讀取的熱鍵前綴（用戶端快取追蹤）
+    HOT_KEY_PREFIXES = ["votes:current", "word_chain:current", "shelters:", "user:"]
+
     def __init__(self, redis_client, knowledge_graph=None, db=None): # Added db
         self.redis = redis_client
         self.graph = knowledge_graph
         self.db = db # Store db instance
         self.api_usage_key = "api:usage:gemini"
         self.not_connected_message = "❌ 社群功能暫時無法使用"
+        self.client_cache = None
+        self._scripts = {}
+
+    def attach_client_cache(self, cache):
+        """設定 Redis 用戶端快取（只用於唯讀的熱鍵讀取）"""
+        self.client_cache = cache
+
+    @property
+    def _reader(self):
+        """唯讀查詢用：有可用的用戶端快取時從快取讀取"""
+        if self.client_cache is not None and self.client_cache.ready:
+            return self.client_cache
+        return self.redis
         
     @property
     def connected(self):
         """檢查 Redis 是否連接"""
         if not self.redis:
             return False
+        if self.client_cache is not None and self.client_cache.ready:
+            # 失效通知連線正常（會定期 PING），不必每次再 PING
+            return True
         try:
             self.redis.ping()
             return True
@@ -47,23 +137,27 @@ class CommunityFeatures:
         today = datetime.now().strftime("%Y-%m-%d")
         month = datetime.now().strftime("%Y-%m")
         
-        # 記錄每日和每月使用量
-        self.redis.hincrby(f"{self.api_usage_key}:daily:{today}", "count", 1)
-        self.redis.hincrby(f"{self.api_usage_key}:daily:{today}", "tokens", tokens_used)
-        self.redis.hincrby(f"{self.api_usage_key}:monthly:{month}", "count", 1)
-        self.redis.hincrby(f"{self.api_usage_key}:monthly:{month}", "tokens", tokens_used)
-        
-        # 設定過期時間
-        self.redis.expire(f"{self.api_usage_key}:daily:{today}", 86400 * 7)  # 保留7天
-        self.redis.expire(f"{self.api_usage_key}:monthly:{month}", 86400 * 35)  # 保留35天
+        # 不需要結果，請求結束時與其他寫入一起送出
+        with deferred(self.redis) as writer:
+            # 記錄每日和每月使用量
+            writer.hincrby(f"{self.api_usage_key}:daily:{today}", "count", 1)
+            writer.hincrby(f"{self.api_usage_key}:daily:{today}", "tokens", tokens_used)
+            writer.hincrby(f"{self.api_usage_key}:monthly:{month}", "count", 1)
+            writer.hincrby(f"{self.api_usage_key}:monthly:{month}", "tokens", tokens_used)
+            
+            # 設定過期時間
+            writer.expire(f"{self.api_usage_key}:daily:{today}", 86400 * 7)  # 保留7天
+            writer.expire(f"{self.api_usage_key}:monthly:{month}", 86400 * 35)  # 保留35天
         
     def get_api_stats(self) -> Dict:
         """獲取 API 使用統計"""
         today = datetime.now().strftime("%Y-%m-%d")
         month = datetime.now().strftime("%Y-%m")
         
-        daily_stats = self.redis.hgetall(f"{self.api_usage_key}:daily:{today}")
-        monthly_stats = self.redis.hgetall(f"{self.api_usage_key}:monthly:{month}")
+        daily_stats, monthly_stats = read_many(self.redis, [
+            ("hgetall", f"{self.api_usage_key}:daily:{today}"),
+            ("hgetall", f"{self.api_usage_key}:monthly:{month}")
+        ])
         
         # 免費額度
         daily_limit = 1500
@@ -93,17 +187,28 @@ class CommunityFeatures:
         }
     
     # ========== 文字接龍功能 ==========
+    def _word_chain_script(self, name: str):
+        """註冊（並快取）接龍的 Lua 腳本"""
+        if name not in self._scripts:
+            self._scripts[name] = self.redis.register_script(_WORD_CHAIN_SCRIPTS[name])
+        return self._scripts[name]
+
+    def _word_chain_changed(self):
+        """腳本寫入後立即丟棄本機快取（伺服器的失效通知是非同步送達的）"""
+        if self.client_cache is not None:
+            self.client_cache.invalidate(WORD_CHAIN_KEYS)
+
+    def has_active_word_chain(self) -> bool:
+        """是否有進行中的接龍"""
+        return bool(self._reader.hgetall(WORD_CHAIN_KEYS[0]))
+
     def start_word_chain(self, word: str, user_id: str) -> Dict:
         """開始文字接龍"""
         if not self.connected:
             return {'success': False, 'message': self.not_connected_message}
             
-        chain_key = "word_chain:current"
-        
-        # 檢查是否已有進行中的接龍
-        existing = self.redis.get(chain_key)
-        if existing:
-            # 如果已有接龍，當作繼續接龍
+        # 如果已有接龍，當作繼續接龍
+        if self.has_active_word_chain():
             return self.continue_word_chain(word, user_id)
             
         chain_data = {
@@ -115,7 +220,14 @@ class CommunityFeatures:
             'target_length': 10
         }
         
-        self.redis.setex(chain_key, 3600, json.dumps(chain_data))  # 1小時過期
+        # 腳本只在沒有進行中的接龍時建立（1小時過期）；同時有人開始時其餘的人改為繼續接龍
+        created = self._word_chain_script('start')(keys=WORD_CHAIN_KEYS, args=[
+            word, word[-1:], user_id, chain_data['chain_id'], chain_data['created_at'],
+            chain_data['target_length'], WORD_CHAIN_TTL
+        ])
+        self._word_chain_changed()
+        if not created:
+            return self.continue_word_chain(word, user_id)
         
         return {
             'success': True,
@@ -123,65 +235,51 @@ class CommunityFeatures:
         }
     
     def continue_word_chain(self, word: str, user_id: str) -> Dict:
-        """繼續文字接龍"""
+        """繼續文字接龍（檢查開頭字、重複與完成都在同一個腳本中原子執行）"""
         if not self.connected:
             return {'success': False, 'message': self.not_connected_message}
             
-        chain_key = "word_chain:current"
-        chain_data = self.redis.get(chain_key)
-        
-        if not chain_data:
+        status, payload = self._word_chain_script('continue')(keys=WORD_CHAIN_KEYS, args=[
+            word, word[:1], word[-1:], user_id, WORD_CHAIN_TTL, "word_chain:complete:", 86400
+        ])
+        details = json.loads(payload)
+        if status in ('continued', 'completed'):
+            self._word_chain_changed()
+        
+        if status == 'no_chain':
             return {'success': False, 'message': format_chain_error('no_chain', {})}
             
-        chain = json.loads(chain_data)
-        current_word = chain['current_word']
-        
         # 檢查接龍是否有效（最後一個字要相同）
-        if word[0] != current_word[-1]:
+        if status == 'wrong_start':
             return {
                 'success': False, 
                 'message': format_chain_error('wrong_start', {
                     'word': word,
-                    'expected': current_word[-1]
+                    'expected': details['expected']
                 })
             }
             
         # 檢查是否重複
-        if word in chain['chain']:
+        if status == 'duplicate':
             return {
                 'success': False,
                 'message': format_chain_error('duplicate', {
                     'word': word,
-                    'recent_words': chain['chain']
+                    'recent_words': details['recent_words']
                 })
             }
-            
-        # 更新接龍
-        chain['chain'].append(word)
-        chain['current_word'] = word
-        if user_id not in chain['participants']:
-            chain['participants'].append(user_id)
-            
-        progress = len(chain['chain'])
-        
-        # 檢查是否完成
-        if progress >= chain['target_length']:
-            self.redis.delete(chain_key)
-            # 保存完成的接龍
-            complete_key = f"word_chain:complete:{chain['chain_id']}"
-            self.redis.setex(complete_key, 86400, json.dumps(chain))
-            
+        
+        # 已完成：腳本已刪除進行中的接龍並保存完成的接龍
+        if status == 'completed':
             return {
                 'success': True,
                 'completed': True,
-                'message': format_chain_complete(chain)
+                'message': format_chain_complete(details)
             }
         
-        self.redis.setex(chain_key, 3600, json.dumps(chain))
-        
         return {
             'success': True,
-            'message': format_word_chain_display(chain)
+            'message': format_word_chain_display(details)
         }
     
     def get_word_chain_status(self) -> Dict:
@@ -189,16 +287,26 @@ class CommunityFeatures:
         if not self.connected:
             return {'success': False, 'message': self.not_connected_message}
             
-        chain_key = "word_chain:current"
-        chain_data = self.redis.get(chain_key)
+        meta, words, participants = read_many(self._reader, [
+            ("hgetall", WORD_CHAIN_KEYS[0]),
+            ("lrange", WORD_CHAIN_KEYS[1], 0, -1),
+            ("smembers", WORD_CHAIN_KEYS[3])
+        ])
         
-        if not chain_data:
+        if not meta:
             return {
                 'success': True,
                 'message': format_chain_status()
             }
         
-        chain = json.loads(chain_data)
+        chain = {
+            'chain_id': meta.get('chain_id'),
+            'current_word': meta.get('current_word', ''),
+            'chain': words,
+            'participants': list(participants),
+            'created_at': int(meta.get('created_at', 0)),
+            'target_length': int(meta.get('target_length', 10))
+        }
         return {
             'success': True,
             'message': format_word_chain_display(chain)
@@ -232,7 +340,7 @@ class CommunityFeatures:
     
     def cast_vote(self, option_num: int, user_id: str) -> Dict:
         """投票"""
-        current_vote_id = self.redis.get("votes:current")
+        current_vote_id = self._reader.get("votes:current")
         if not current_vote_id:
             return {'success': False, 'message': '目前沒有進行中的投票'}
             
@@ -279,7 +387,7 @@ class CommunityFeatures:
     
     def get_vote_results(self) -> Dict:
         """獲取投票結果"""
-        current_vote_id = self.redis.get("votes:current")
+        current_vote_id = self._reader.get("votes:current")
         if not current_vote_id:
             return {'success': False, 'message': '目前沒有進行中的投票'}
             
@@ -417,13 +525,17 @@ class CommunityFeatures:
                 'shelters': {'total': 0, 'verified': 0, 'capacity': 0},
                 'supplies': {'available': 0}
             }
-        # 統計避難所
-        shelter_ids = list(self.redis.smembers("shelters:all"))
+        # 統計避難所（彼此獨立的讀取合併為一次往返）
+        shelters, supplies = read_many(self._reader, [
+            ("smembers", "shelters:all"),
+            ("smembers", "supplies:available")
+        ])
+        shelter_ids = list(shelters)
         verified_shelters = 0
         total_capacity = 0
         
-        for shelter_id in shelter_ids:
-            shelter_data = self.redis.get(f"shelters:{shelter_id}")
+        shelter_records = read_many(self._reader, [("get", f"shelters:{shelter_id}") for shelter_id in shelter_ids])
+        for shelter_data in shelter_records:
             if shelter_data:
                 shelter = json.loads(shelter_data)
                 if shelter['status'] == 'verified':
@@ -431,8 +543,7 @@ class CommunityFeatures:
                     total_capacity += shelter.get('capacity', 0)
         
         # 統計物資
-        supply_ids = list(self.redis.smembers("supplies:available"))
-        available_supplies = len(supply_ids)
+        available_supplies = len(supplies)
         
         return {
             'shelters': {
@@ -554,7 +665,8 @@ class CommunityFeatures:
             if user_id_for_cache and self.connected:
                 try:
                     redis_key = f"user:{user_id_for_cache}:last_joke_id"
-                    self.redis.setex(redis_key, 300, joke_firestore_id)
+                    with deferred(self.redis) as writer:
+                        writer.setex(redis_key, 300, joke_firestore_id)
                     logger.info(f"Cached last joke ID {joke_firestore_id} for user {user_id_for_cache}")
                 except Exception as e_redis:
                     logger.error(f"Failed to cache last joke ID for user {user_id_for_cache}: {e_redis}")
@@ -620,7 +732,7 @@ class CommunityFeatures:
 
         try:
             redis_key = f"user:{user_id}:last_joke_id"
-            last_joke_id = self.redis.get(redis_key)
+            last_joke_id = self._reader.get(redis_key)
 
             if not last_joke_id:
                 return {'success': False, 'message': '您最近沒有看過笑話，或者時間太久了，無法評價。'}
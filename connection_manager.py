@@ -3,84 +3,522 @@
 處理 Neo4j 和 Redis 的連線穩定性問題
 """
 
+import os
 import time
+import bisect
 import logging
-from typing import Optional, Callable, Any, Dict
+import threading
+from queue import Empty
+from collections import OrderedDict
+from typing import Optional, Callable, Any, Dict, List
 from functools import wraps
 import redis
 from neo4j import GraphDatabase
 from neo4j.exceptions import ServiceUnavailable, SessionExpired
+from circuit_breaker import CircuitBreaker
+from redis_batch import record_round_trip
 
 logger = logging.getLogger(__name__)
 
 
-class CircuitBreaker:
-    """斷路器模式實作 - 防止連續失敗"""
-    def __init__(self, failure_threshold: int = 5, recovery_timeout: int = 60):
-        self.failure_threshold = failure_threshold
-        self.recovery_timeout = recovery_timeout
-        self.failure_count = 0
-        self.last_failure_time: Optional[float] = None
-        self.state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
-        
-    def call(self, func: Callable, *args, **kwargs) -> Any:
-        """執行函數並處理斷路器邏輯"""
-        if self.state == "OPEN":
-            if time.time() - self.last_failure_time > self.recovery_timeout:
-                self.state = "HALF_OPEN"
-                logger.info(f"斷路器進入半開狀態: {func.__name__}")
-            else:
-                raise Exception(f"斷路器開啟中，服務暫時無法使用: {func.__name__}")
-        
-        try:
-            result = func(*args, **kwargs)
-            if self.state == "HALF_OPEN":
-                self.state = "CLOSED"
-                self.failure_count = 0
-                logger.info(f"斷路器恢復正常: {func.__name__}")
-            return result
-            
-        except Exception as e:
-            self.failure_count += 1
-            self.last_failure_time = time.time()
-            
-            if self.failure_count >= self.failure_threshold:
-                self.state = "OPEN"
-                logger.error(f"斷路器開啟: {func.__name__} - 連續失敗 {self.failure_count} 次")
-            
-            raise e
-
-
 class ConnectionPool:
     """連線池基礎類別"""
     def __init__(self, max_connections: int = 10, connection_timeout: int = 30):
         self.max_connections = max_connections
         self.connection_timeout = connection_timeout
-        self.connections = []
-        self.available_connections = []
         
     def get_connection(self):
         """獲取可用連線"""
         raise NotImplementedError
         
-    def return_connection(self, conn):
-        """歸還連線"""
-        if conn and conn not in self.available_connections:
-            self.available_connections.append(conn)
+    def get_metrics(self) -> Dict:
+        """連線池指標"""
+        raise NotImplementedError
             
     def close_all(self):
         """關閉所有連線"""
         raise NotImplementedError
 
 
+class PoolMetrics:
+    """連線池指標：取得連線的等待時間直方圖、使用中連線數、建立與錯誤次數"""
+
+    WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait_counts = [0] * (len(self.WAIT_BUCKETS_MS) + 1)  # 最後一格為超過 5 秒
+        self.wait_total_ms = 0.0
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.window_peak = 0  # 自上次 take_window() 以來的最高使用數
+        self.created = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def record_checkout(self, wait_seconds: float):
+        wait_ms = wait_seconds * 1000
+        with self._lock:
+            self.wait_counts[bisect.bisect_left(self.WAIT_BUCKETS_MS, wait_ms)] += 1
+            self.wait_total_ms += wait_ms
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.window_peak = max(self.window_peak, self.in_use)
+
+    def record_release(self):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def record_created(self):
+        with self._lock:
+            self.created += 1
+
+    def record_error(self, timeout: bool = False):
+        with self._lock:
+            self.errors += 1
+            if timeout:
+                self.timeouts += 1
+
+    def take_window(self):
+        """回傳 (等待直方圖, 期間最高使用數) 並開始新的觀察期間"""
+        with self._lock:
+            window = (list(self.wait_counts), self.window_peak)
+            self.window_peak = self.in_use
+        return window
+
+    @classmethod
+    def percentile(cls, counts: List[int], fraction: float) -> float:
+        """由直方圖估算百分位數（回傳所在區間的上界，毫秒）"""
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        target = total * fraction
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= target:
+                return float(cls.WAIT_BUCKETS_MS[min(index, len(cls.WAIT_BUCKETS_MS) - 1)])
+        return float(cls.WAIT_BUCKETS_MS[-1])
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts = list(self.wait_counts)
+            result = {
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "created": self.created,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total_ms / self.checkouts, 3) if self.checkouts else 0.0
+            }
+        labels = [f"<={bound}ms" for bound in self.WAIT_BUCKETS_MS] + [f">{self.WAIT_BUCKETS_MS[-1]}ms"]
+        result["wait_p50_ms"] = self.percentile(counts, 0.5)
+        result["wait_p95_ms"] = self.percentile(counts, 0.95)
+        result["wait_histogram"] = {label: count for label, count in zip(labels, counts) if count}
+        return result
+
+
+class PoolExhaustedError(redis.ConnectionError):
+    """等待逾時仍取不到連線（連線池用完，並非 Redis 本身失敗）"""
+
+
+# 目前執行緒在這次指令中等待取得連線的秒數（斷路器的慢呼叫判斷不含這段等待）
+_checkout_wait = threading.local()
+
+
+def take_checkout_wait() -> float:
+    """取出並歸零目前執行緒累計的連線等待時間"""
+    wait = getattr(_checkout_wait, "seconds", 0.0)
+    _checkout_wait.seconds = 0.0
+    return wait
+
+
+class InstrumentedRedisPool(redis.BlockingConnectionPool):
+    """
+    記錄指標的 Redis 連線池
+    連線用完時等待（最多 timeout 秒，即取得連線的逾時）而不是立即丟出 Too many connections，等待時間即為瓶頸指標；
+    支援執行中調整連線數上限（縮小時先關閉閒置連線，其餘在歸還時關閉）
+    """
+
+    def __init__(self, policy: "AdaptivePoolPolicy" = None, **kwargs):
+        self.metrics = PoolMetrics()
+        self.policy = policy
+        self._resize_lock = threading.Lock()
+        self._excess = 0  # 縮小後仍在使用中、歸還時要關閉的連線數
+        self._checked_out = set()
+        super().__init__(**kwargs)
+
+    def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as e:
+            exhausted = "No connection available" in str(e)
+            self.metrics.record_error(timeout=exhausted)
+            if exhausted:
+                raise PoolExhaustedError(str(e)) from e
+            raise
+        except Exception:
+            self.metrics.record_error()
+            raise
+        finally:
+            _checkout_wait.seconds = getattr(_checkout_wait, "seconds", 0.0) + time.perf_counter() - start
+        self.metrics.record_checkout(time.perf_counter() - start)
+        self._checked_out.add(id(connection))
+        if self.policy:
+            self.policy.maybe_evaluate(self)
+        return connection
+
+    def make_connection(self):
+        connection = super().make_connection()
+        self.metrics.record_created()
+        return connection
+
+    def release(self, connection):
+        if id(connection) in self._checked_out:
+            self._checked_out.discard(id(connection))
+            self.metrics.record_release()
+        with self._resize_lock:
+            if self._excess > 0 and self.owns_connection(connection):
+                self._excess -= 1
+                self.pool.maxsize -= 1
+                self._discard(connection)
+                return
+        super().release(connection)
+
+    def _discard(self, connection):
+        connection.disconnect()
+        try:
+            self._connections.remove(connection)
+        except ValueError:
+            pass
+
+    def resize(self, max_connections: int):
+        """調整連線數上限"""
+        with self._resize_lock:
+            delta = max_connections - self.max_connections
+            self.max_connections = max_connections
+            if delta > 0:
+                cancelled = min(delta, self._excess)
+                self._excess -= cancelled
+                self.pool.maxsize += delta - cancelled
+                for _ in range(delta - cancelled):
+                    self.pool.put_nowait(None)
+            for _ in range(-delta):
+                try:
+                    connection = self.pool.get_nowait()
+                except Empty:
+                    self._excess += 1
+                    continue
+                self.pool.maxsize -= 1
+                if connection is not None:
+                    self._discard(connection)
+        logger.info(f"Redis 連線池上限調整為 {max_connections}")
+
+    def get_metrics(self) -> Dict:
+        return {"max_connections": self.max_connections, **self.metrics.snapshot()}
+
+
+class AdaptivePoolPolicy:
+    """
+    依觀察到的等待時間調整連線池大小：
+    期間內 p95 等待超過 grow_wait_ms 時增加，最高使用數低於上限的 shrink_utilization 時減少
+    """
+
+    def __init__(self, min_connections: int = 5, max_connections: int = 50, grow_wait_ms: float = 10.0,
+                 shrink_utilization: float = 0.5, step: int = 2, interval: float = 30.0,
+                 min_samples: int = 20):
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.grow_wait_ms = grow_wait_ms
+        self.shrink_utilization = shrink_utilization
+        self.step = step
+        self.interval = interval
+        self.min_samples = min_samples
+        self._last_counts: Optional[List[int]] = None
+        self._last_run = time.time()
+        self._lock = threading.Lock()
+
+    def maybe_evaluate(self, pool: InstrumentedRedisPool) -> Optional[int]:
+        """距離上次評估超過 interval 秒時評估一次（由取得連線的執行緒順便執行）"""
+        if time.time() - self._last_run < self.interval or not self._lock.acquire(blocking=False):
+            return None
+        try:
+            self._last_run = time.time()
+            return self.evaluate(pool)
+        finally:
+            self._lock.release()
+
+    def evaluate(self, pool: InstrumentedRedisPool) -> Optional[int]:
+        """回傳新的連線數上限（不需調整時回傳 None）"""
+        counts, window_peak = pool.metrics.take_window()
+        previous = self._last_counts or [0] * len(counts)
+        self._last_counts = counts
+        window = [now - before for now, before in zip(counts, previous)]
+        if sum(window) < self.min_samples:
+            return None
+
+        current = pool.max_connections
+        target = current
+        if PoolMetrics.percentile(window, 0.95) > self.grow_wait_ms:
+            target = min(self.max_connections, current + self.step)
+        elif window_peak < current * self.shrink_utilization:
+            target = max(self.min_connections, window_peak + self.step, current - self.step)
+            target = min(target, current)
+
+        if target == current:
+            return None
+        pool.resize(target)
+        return target
+
+
+class GuardedRedis(redis.Redis):
+    """
+    每個指令（與 pipeline 的 execute）都經過斷路器的 Redis 用戶端；往返次數計入目前的請求批次
+    等待連線池的時間不計入慢呼叫判斷
+    """
+
+    def __init__(self, *args, circuit_breaker: CircuitBreaker = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.circuit_breaker = circuit_breaker
+
+    def execute_command(self, *args, **options):
+        record_round_trip()
+        take_checkout_wait()
+        return self.circuit_breaker.call_excluding(take_checkout_wait, super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint,
+                               circuit_breaker=self.circuit_breaker)
+
+
+def redis_breaker(client) -> CircuitBreaker:
+    """用戶端使用的 Redis 斷路器（GuardedRedis 自帶的，否則為共用的 redis 斷路器）"""
+    if isinstance(client, GuardedRedis):
+        return client.circuit_breaker
+    return CircuitBreaker.for_dependency("redis")
+
+
+def call_through_breaker(client, breaker: CircuitBreaker, operation: Callable) -> Any:
+    """執行 Redis 操作；GuardedRedis 的指令已經過同一個斷路器時不再重複包一層"""
+    if isinstance(client, GuardedRedis) and client.circuit_breaker is breaker:
+        return operation()
+    return breaker.call(operation)
+
+
+class GuardedPipeline(redis.client.Pipeline):
+    """execute 經過斷路器的 pipeline"""
+
+    def __init__(self, *args, circuit_breaker: CircuitBreaker = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.circuit_breaker = circuit_breaker
+
+    def execute(self, raise_on_error=True):
+        if self.command_stack:
+            record_round_trip(len(self.command_stack))
+        take_checkout_wait()
+        return self.circuit_breaker.call_excluding(take_checkout_wait, super().execute, raise_on_error)
+
+
+class _TrackingPubSub(redis.client.PubSub):
+    """訂閱失效通知的連線；每次（重新）連線後先啟用 CLIENT TRACKING 再重新訂閱"""
+
+    def __init__(self, cache: "ClientSideCache", **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def start_tracking(self):
+        # 第一個指令建立連線並註冊重新連線的回呼
+        self.execute_command("CLIENT", "ID")
+        client_id = self.parse_response(block=True)
+        self.cache._enable_tracking(self.connection, client_id)
+        self.subscribe(ClientSideCache.INVALIDATE_CHANNEL)
+
+    def on_connect(self, connection):
+        self.cache._enable_tracking(connection)
+        super().on_connect(connection)
+
+
+class ClientSideCache:
+    """
+    Redis 用戶端快取（伺服器協助失效）
+    以 CLIENT TRACKING BCAST 追蹤指定前綴，失效通知導向本快取自己的訂閱連線（RESP2 REDIRECT），
+    讀取先查行程記憶體；收到失效通知、通知連線中斷或超過 ttl 時丟棄。
+    只適合讀多寫少的熱鍵，讀取後要修改再寫回的流程仍應直接讀 Redis
+    """
+
+    INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+    def __init__(self, client: redis.Redis, prefixes: List[str], max_keys: int = 10000, ttl: float = 60.0):
+        """
+        Args:
+            client: 讀取用的 Redis 用戶端（decode_responses=True）
+            prefixes: 追蹤的鍵前綴
+            max_keys: 最多快取的鍵數（超過時淘汰最久未使用的）
+            ttl: 項目最長保留秒數（通知遺失時的保險）
+        """
+        self.client = client
+        self.prefixes = tuple(prefixes)
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.ready = False  # 追蹤已啟用且通知連線正常時才使用快取
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "flushes": 0}
+
+        self._entries: "OrderedDict[str, Dict[str, tuple]]" = OrderedDict()  # 鍵 → {指令: (值, 到期時間)}
+        self._epoch = 0  # 每次失效遞增；讀取期間有失效時不寫入快取
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.pubsub = _TrackingPubSub(self, connection_pool=client.connection_pool,
+                                      ignore_subscribe_messages=True)
+
+    def start(self):
+        """啟用追蹤並啟動接收失效通知的背景執行緒（伺服器不支援時拋出 redis.ResponseError）"""
+        self.pubsub.start_tracking()
+        self._thread = threading.Thread(target=self._listen, name="redis-client-cache", daemon=True)
+        self._thread.start()
+        logger.info(f"Redis 用戶端快取已啟用: {', '.join(self.prefixes)}")
+
+    def _enable_tracking(self, connection, client_id: int = None):
+        """在訂閱連線上啟用 BCAST 追蹤並導向自己（重新連線時再次呼叫）"""
+        if client_id is None:
+            connection.send_command("CLIENT", "ID")
+            client_id = connection.read_response()
+        args = ["CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST"]
+        for prefix in self.prefixes:
+            args += ["PREFIX", prefix]
+        connection.send_command(*args)
+        connection.read_response()
+        # 中斷期間的通知已遺失，重新開始
+        self.invalidate_all()
+        self.ready = True
+
+    def _listen(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                message = self.pubsub.get_message(timeout=1.0)
+                backoff = 1.0
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                if self.ready:
+                    logger.warning(f"Redis 失效通知連線中斷，暫停用戶端快取: {e}")
+                self.ready = False
+                self.invalidate_all()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            if message and message.get("type") == "message":
+                self._handle_invalidation(message["data"])
+
+    def _handle_invalidation(self, data):
+        # 通知內容為鍵列表；None 表示 FLUSHALL/FLUSHDB
+        if data is None:
+            self.invalidate_all()
+        elif isinstance(data, (str, bytes)):
+            self.invalidate([data])
+        else:
+            self.invalidate(data)
+
+    def tracks(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    def invalidate(self, keys):
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                if isinstance(key, bytes):
+                    key = key.decode()
+                if self._entries.pop(key, None) is not None:
+                    self.stats["invalidations"] += 1
+
+    def invalidate_all(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self.stats["flushes"] += 1
+
+    def _read(self, command: str, key: str, loader: Callable[[], Any]) -> Any:
+        if not self.ready or not self.tracks(key):
+            return loader()
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key, {}).get(command)
+            if item is not None and item[1] > now:
+                self.stats["hits"] += 1
+                self._entries.move_to_end(key)
+                return _copy(item[0])
+            self.stats["misses"] += 1
+            epoch = self._epoch
+
+        value = loader()
+
+        with self._lock:
+            # 讀取期間收到失效通知時，讀到的值可能已過時
+            if self.ready and epoch == self._epoch:
+                self._entries.setdefault(key, {})[command] = (_copy(value), now + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        return self._read("GET", key, lambda: self.client.get(key))
+
+    def smembers(self, key: str) -> set:
+        return self._read("SMEMBERS", key, lambda: self.client.smembers(key))
+
+    def hgetall(self, key: str) -> dict:
+        return self._read("HGETALL", key, lambda: self.client.hgetall(key))
+
+    def lrange(self, key: str, start: int, end: int) -> list:
+        return self._read(f"LRANGE:{start}:{end}", key, lambda: self.client.lrange(key, start, end))
+
+    def report(self) -> Dict:
+        """命中率與目前快取的鍵數"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                "keys": len(self._entries),
+                "ready": self.ready,
+                "prefixes": list(self.prefixes)
+            }
+
+    def close(self):
+        self._stop.set()
+        self.ready = False
+        self.invalidate_all()
+        try:
+            self.pubsub.close()
+        except Exception as e:
+            logger.debug(f"關閉失效通知連線失敗: {e}")
+
+
+def _copy(value):
+    # 回傳副本，避免呼叫端修改到快取內容
+    if isinstance(value, (set, dict, list)):
+        return type(value)(value)
+    return value
+
+
 class Neo4jConnectionPool(ConnectionPool):
-    """Neo4j 連線池實作"""
+    """
+    Neo4j 連線池實作
+    驅動程式沒有公開連線池指標，因此包裝工作階段取得/歸還連線的內部方法來量測等待時間與使用中連線數；
+    建立次數由驅動程式連線池的連線總數變化推算（近似值）
+    """
     def __init__(self, uri: str, auth: tuple, **kwargs):
         super().__init__(**kwargs)
         self.uri = uri
         self.auth = auth
         self.driver = None
-        self.circuit_breaker = CircuitBreaker()
+        self.metrics = PoolMetrics()
         
     def _create_driver(self):
         """建立 Neo4j 驅動程式"""
@@ -94,13 +532,68 @@ class Neo4jConnectionPool(ConnectionPool):
             )
             logger.info("Neo4j 驅動程式已建立")
             
+    def get_driver(self):
+        """取得（必要時建立）Neo4j 驅動程式"""
+        self._create_driver()
+        return self.driver
+            
     def get_connection(self):
-        """獲取 Neo4j 工作階段"""
-        def _get_session():
+        """獲取 Neo4j 工作階段（建立工作階段不連線；查詢由呼叫端經 neo4j 斷路器執行）"""
+        try:
             self._create_driver()
-            return self.driver.session()
-            
-        return self.circuit_breaker.call(_get_session)
+            return self._instrument(self.driver.session())
+        except Exception:
+            self.metrics.record_error()
+            raise
+        
+    def _instrument(self, session):
+        """包裝工作階段的 _connect / _disconnect（驅動程式版本不支援時原樣回傳）"""
+        connect = getattr(session, "_connect", None)
+        disconnect = getattr(session, "_disconnect", None)
+        if connect is None or disconnect is None or not hasattr(session, "_connection"):
+            return session
+        metrics = self.metrics
+
+        def _connect(*args, **kwargs):
+            opened = self._open_connections()
+            start = time.perf_counter()
+            try:
+                result = connect(*args, **kwargs)
+            except Exception as e:
+                metrics.record_error(timeout="acquisition" in str(e).lower() or "obtain" in str(e).lower())
+                raise
+            metrics.record_checkout(time.perf_counter() - start)
+            for _ in range(max(0, self._open_connections() - opened)):
+                metrics.record_created()
+            return result
+
+        def _disconnect(*args, **kwargs):
+            connected = session._connection is not None
+            try:
+                return disconnect(*args, **kwargs)
+            finally:
+                if connected and session._connection is None:
+                    metrics.record_release()
+
+        session._connect = _connect
+        session._disconnect = _disconnect
+        return session
+        
+    def _open_connections(self) -> int:
+        """驅動程式連線池目前的連線總數"""
+        pool = getattr(self.driver, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if not isinstance(connections, dict):
+            return 0
+        return sum(len(items) for items in connections.values())
+        
+    def get_metrics(self) -> Dict:
+        """連線池指標"""
+        return {
+            "max_connections": self.max_connections,
+            "open_connections": self._open_connections(),
+            **self.metrics.snapshot()
+        }
         
     def verify_connectivity(self) -> bool:
         """驗證連線狀態"""
@@ -121,40 +614,88 @@ class Neo4jConnectionPool(ConnectionPool):
 
 class RedisConnectionPool(ConnectionPool):
     """Redis 連線池實作"""
-    def __init__(self, host: str, port: int, password: str, username: str = None, **kwargs):
+    def __init__(self, host: str, port: int, password: str, username: str = None,
+                 adaptive: bool = None, checkout_timeout: float = None, **kwargs):
         super().__init__(**kwargs)
         self.host = host
         self.port = port
         self.password = password
         self.username = username
+        # 連線用完時最多等待的秒數（預設讀取 REDIS_POOL_CHECKOUT_TIMEOUT）；
+        # 與 socket 逾時分開，避免請求執行緒為了取得連線等待 connection_timeout 之久
+        if checkout_timeout is None:
+            checkout_timeout = float(os.getenv('REDIS_POOL_CHECKOUT_TIMEOUT', '1.0'))
+        self.checkout_timeout = checkout_timeout
+        # 依等待時間自動調整連線數上限（預設讀取 REDIS_POOL_ADAPTIVE）
+        if adaptive is None:
+            adaptive = os.getenv('REDIS_POOL_ADAPTIVE', 'false').lower() == 'true'
+        self.adaptive = adaptive
         self.pool = None
-        self.circuit_breaker = CircuitBreaker()
+        self.binary_pool = None  # 不解碼回應的連線池（二進位快取值使用）
+        self.client_cache: Optional[ClientSideCache] = None
+        # 包在每個 Redis 指令外（兩個連線池共用）；指令錯誤（例如 NOSCRIPT）不算服務失敗，
+        # 連線池用完記在連線池指標，也不算 Redis 失敗
+        self.circuit_breaker = CircuitBreaker.for_dependency(
+            "redis", failure_exceptions=(redis.ConnectionError, redis.TimeoutError),
+            ignored_exceptions=(PoolExhaustedError,)
+        )
+        
+    def _build_pool(self, decode_responses: bool) -> InstrumentedRedisPool:
+        policy = None
+        if self.adaptive:
+            policy = AdaptivePoolPolicy(
+                min_connections=min(5, self.max_connections),
+                max_connections=max(int(os.getenv('REDIS_POOL_MAX_CONNECTIONS', '50')), self.max_connections)
+            )
+        return InstrumentedRedisPool(
+            policy=policy,
+            timeout=self.checkout_timeout,
+            host=self.host,
+            port=self.port,
+            password=self.password,
+            username=self.username,
+            decode_responses=decode_responses,
+            max_connections=self.max_connections,
+            socket_connect_timeout=self.connection_timeout,
+            socket_timeout=self.connection_timeout,
+            retry_on_timeout=True,
+            health_check_interval=30
+        )
         
     def _create_pool(self):
         """建立 Redis 連線池"""
         if not self.pool:
-            self.pool = redis.ConnectionPool(
-                host=self.host,
-                port=self.port,
-                password=self.password,
-                username=self.username,
-                decode_responses=True,
-                max_connections=self.max_connections,
-                socket_connect_timeout=self.connection_timeout,
-                socket_timeout=self.connection_timeout,
-                retry_on_timeout=True,
-                health_check_interval=30
-            )
+            self.pool = self._build_pool(decode_responses=True)
             logger.info("Redis 連線池已建立")
             
     def get_connection(self) -> redis.Redis:
         """獲取 Redis 連線"""
-        def _get_redis():
-            self._create_pool()
-            return redis.Redis(connection_pool=self.pool)
-            
-        return self.circuit_breaker.call(_get_redis)
+        self._create_pool()
+        return GuardedRedis(connection_pool=self.pool, circuit_breaker=self.circuit_breaker)
         
+    def get_binary_connection(self) -> redis.Redis:
+        """獲取回傳 bytes 的 Redis 連線（msgpack / 壓縮後的快取值）"""
+        if not self.binary_pool:
+            self.binary_pool = self._build_pool(decode_responses=False)
+            logger.info("Redis 二進位連線池已建立")
+        return GuardedRedis(connection_pool=self.binary_pool, circuit_breaker=self.circuit_breaker)
+        
+    def enable_client_cache(self, prefixes: List[str], **kwargs) -> Optional[ClientSideCache]:
+        """
+        啟用用戶端快取（需要 Redis 6 以上；伺服器不支援 CLIENT TRACKING 時回傳 None）
+        """
+        if self.client_cache:
+            return self.client_cache
+        cache = ClientSideCache(self.get_connection(), prefixes, **kwargs)
+        try:
+            cache.start()
+        except (redis.ResponseError, redis.ConnectionError) as e:
+            logger.warning(f"無法啟用 Redis 用戶端快取: {e}")
+            cache.close()
+            return None
+        self.client_cache = cache
+        return cache
+
     def verify_connectivity(self) -> bool:
         """驗證連線狀態"""
         try:
@@ -165,11 +706,25 @@ class RedisConnectionPool(ConnectionPool):
             logger.error(f"Redis 連線驗證失敗: {e}")
             return False
             
+    def get_metrics(self) -> Dict:
+        """連線池指標（一般與二進位連線池）"""
+        return {
+            name: pool.get_metrics()
+            for name, pool in (("main", self.pool), ("binary", self.binary_pool))
+            if pool is not None
+        }
+            
     def close_all(self):
         """關閉連線池"""
+        if self.client_cache:
+            self.client_cache.close()
+            self.client_cache = None
         if self.pool:
             self.pool.disconnect()
             self.pool = None
+        if self.binary_pool:
+            self.binary_pool.disconnect()
+            self.binary_pool = None
 
 
 def retry_on_connection_error(max_retries: int = 3, delay: float = 1.0, backoff: float = 2.0):
@@ -244,6 +799,21 @@ class ConnectionManager:
         
         return status
         
+    def pool_metrics(self) -> Dict:
+        """各連線池的指標"""
+        metrics = {}
+        if self.neo4j_pool:
+            metrics['neo4j'] = self.neo4j_pool.get_metrics()
+        if self.redis_pool:
+            metrics['redis'] = self.redis_pool.get_metrics()
+        return metrics
+
+    def client_cache_stats(self) -> Optional[Dict]:
+        """Redis 用戶端快取命中率（未啟用時為 None）"""
+        if self.redis_pool and self.redis_pool.client_cache:
+            return self.redis_pool.client_cache.report()
+        return None
+        
     def close_all(self):
         """關閉所有連線"""
         if self.neo4j_pool:
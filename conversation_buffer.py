@@ -0,0 +1,146 @@
+"""
+對話上下文環形緩衝區
+每位用戶在 Redis 保留最近 N 則訊息（LPUSH + LTRIM），
+寫入時更新、讀取只需一次往返，並支援以 pipeline 一次取回多位用戶
+"""
+
+import json
+import time
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 標記「更早的訊息不存在」：緩衝區從完整歷史建立時放在尾端
+_HISTORY_START = "__start__"
+
+# 只在緩衝區不存在時建立（檢查與寫入在同一個腳本內，避免與 push 或其他 seed 交錯）
+# ARGV: TTL, 訊息...
+_SEED_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('rpush', KEYS[1], unpack(ARGV, 2))
+redis.call('expire', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class ConversationBuffer:
+    """每位用戶最近訊息的有界緩衝區（Redis list，新訊息在前）"""
+
+    def __init__(self, redis_client, size: int = 20, ttl: int = 86400, prefix: str = "ctx"):
+        """
+        初始化緩衝區
+
+        Args:
+            redis_client: Redis 客戶端
+            size: 每位用戶保留的訊息數
+            ttl: 無新訊息時緩衝區保留秒數
+            prefix: Redis 鍵前綴
+        """
+        self.redis = redis_client
+        self.size = size
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = {"hits": 0, "misses": 0}
+        self._seed_script = None
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    @staticmethod
+    def _encode(message: Dict) -> str:
+        return json.dumps({
+            "id": message.get("id"),
+            "content": message.get("content"),
+            "time": _to_timestamp(message.get("time"))
+        }, ensure_ascii=False)
+
+    def push(self, user_id: str, message: Dict) -> None:
+        """寫入新訊息（緩衝區尚未建立時略過，避免只有部分歷史）"""
+        key = self._key(user_id)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.lpushx(key, self._encode(message))
+            pipe.ltrim(key, 0, self.size - 1)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"寫入對話緩衝失敗: {e}")
+
+    def seed(self, user_id: str, messages: List[Dict], complete: bool) -> None:
+        """
+        以資料庫查詢結果建立緩衝區
+
+        Args:
+            messages: 最近訊息（新到舊）
+            complete: messages 是否已包含該用戶全部歷史
+        """
+        key = self._key(user_id)
+        items = [self._encode(message) for message in messages[:self.size]]
+        if complete and len(items) < self.size:
+            items.append(_HISTORY_START)
+        if not items:
+            return
+
+        try:
+            if self._seed_script is None:
+                self._seed_script = self.redis.register_script(_SEED_SCRIPT)
+            self._seed_script(keys=[key], args=[self.ttl, *items])
+        except Exception as e:
+            logger.warning(f"建立對話緩衝失敗: {e}")
+
+    def _parse(self, raw: List[str], limit: int) -> Optional[List[Dict]]:
+        """解析 LRANGE 結果；無法確定是否完整時回傳 None"""
+        if not raw:
+            return None
+
+        messages = []
+        for item in raw:
+            if item == _HISTORY_START:
+                return messages[:limit]
+            messages.append(json.loads(item))
+
+        return messages[:limit] if len(messages) >= limit else None
+
+    def get(self, user_id: str, limit: int = 5) -> Optional[List[Dict]]:
+        """取得最近 limit 則訊息；緩衝區無法回答時回傳 None"""
+        return self.get_many([user_id], limit).get(user_id)
+
+    def get_many(self, user_ids: Iterable[str], limit: int = 5) -> Dict[str, Optional[List[Dict]]]:
+        """以一次 pipeline 往返取得多位用戶的最近訊息"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.lrange(self._key(user_id), 0, limit)
+            results = pipe.execute()
+        except Exception as e:
+            logger.warning(f"讀取對話緩衝失敗: {e}")
+            results = [None] * len(user_ids)
+
+        contexts = {}
+        for user_id, raw in zip(user_ids, results):
+            contexts[user_id] = self._parse(raw, limit)
+            if contexts[user_id] is None:
+                self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
+        return contexts
+
+
+def _to_timestamp(value) -> Optional[float]:
+    """轉換 Neo4j DateTime / datetime / 數字為 epoch 秒"""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if hasattr(value, "to_native"):
+        value = value.to_native()
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    return None
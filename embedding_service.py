@@ -0,0 +1,244 @@
+"""
+語義嵌入服務
+提供延遲載入的句子嵌入模型、以正規化文本為鍵的 LRU 快取，
+並把多個 webhook 執行緒同時送出的請求合併成一次模型呼叫（micro-batching）
+"""
+
+import os
+import re
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMER_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMER_AVAILABLE = False
+
+DEFAULT_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+# 支援的模型後端
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+BACKEND_QUANTIZED = "quantized"
+
+
+def normalize_text(text: str) -> str:
+    """正規化文本作為快取鍵（去除多餘空白、轉小寫）"""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class _MicroBatcher:
+    """把短時間內的多個編碼請求合併成一次批次呼叫"""
+
+    def __init__(self, encode_batch, window_ms: float, max_batch_size: int):
+        self.encode_batch = encode_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "items": 0}
+
+    def submit(self, text: str) -> Future:
+        """提交一個文本，回傳 Future"""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.encode_batch(texts)
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                logger.error(f"批次嵌入失敗: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+
+
+class EmbeddingService:
+    """句子嵌入服務 - 延遲載入模型、LRU 快取、跨執行緒批次合併"""
+
+    def __init__(self, model_name: str = None, backend: str = None, model=None,
+                 cache_size: int = 2048, batch_window_ms: float = None, max_batch_size: int = 32):
+        """
+        初始化嵌入服務
+
+        Args:
+            model_name: 模型名稱（預設讀取 SENTENCE_TRANSFORMER_MODEL）
+            backend: torch / onnx / quantized（預設讀取 SENTENCE_TRANSFORMER_BACKEND）
+            model: 直接注入已載入的模型（需提供 encode(List[str])）
+            cache_size: LRU 快取大小
+            batch_window_ms: 批次合併等待時間，0 表示不合併（預設讀取 EMBEDDING_BATCH_WINDOW_MS）
+            max_batch_size: 單次批次上限
+        """
+        self.model_name = model_name or os.getenv('SENTENCE_TRANSFORMER_MODEL', DEFAULT_MODEL)
+        self.backend = (backend or os.getenv('SENTENCE_TRANSFORMER_BACKEND', BACKEND_TORCH)).lower()
+        self._model = model
+        self._model_lock = threading.Lock()
+
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._cache_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "model_calls": 0}
+
+        if batch_window_ms is None:
+            batch_window_ms = float(os.getenv('EMBEDDING_BATCH_WINDOW_MS', 5))
+        self._batcher = _MicroBatcher(self._encode_batch, batch_window_ms, max_batch_size) if batch_window_ms > 0 else None
+
+    @property
+    def available(self) -> bool:
+        """是否有可用的嵌入模型"""
+        return self._model is not None or SENTENCE_TRANSFORMER_AVAILABLE
+
+    @property
+    def model(self):
+        """第一次使用時才載入模型"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    def _load_model(self):
+        """依後端設定載入模型"""
+        if not SENTENCE_TRANSFORMER_AVAILABLE:
+            raise RuntimeError("sentence_transformers 未安裝")
+
+        start = time.time()
+        if self.backend == BACKEND_ONNX:
+            try:
+                # 需要 sentence-transformers>=3.2 與 optimum[onnxruntime]
+                model = SentenceTransformer(self.model_name, backend="onnx", device="cpu")
+            except Exception as e:
+                logger.warning(f"ONNX 後端載入失敗，改用 torch: {e}")
+                model = SentenceTransformer(self.model_name, device="cpu")
+        elif self.backend == BACKEND_QUANTIZED:
+            import torch
+            model = SentenceTransformer(self.model_name, device="cpu")
+            # 動態量化：Linear 層權重轉 int8，CPU 推論較快
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            model = SentenceTransformer(self.model_name)
+
+        logger.info(f"載入語義模型: {self.model_name} ({self.backend}) - {time.time() - start:.1f}s")
+        return model
+
+    def _encode_batch(self, texts: List[str]) -> List[List[float]]:
+        """呼叫模型編碼一批文本"""
+        self.stats["model_calls"] += 1
+        vectors = self.model.encode(texts)
+        return [vector.tolist() if hasattr(vector, "tolist") else list(vector) for vector in vectors]
+
+    def encode(self, text: str) -> List[float]:
+        """編碼單一文本（優先使用快取，同時進行中的相同文本只計算一次）"""
+        key = normalize_text(text)
+
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached
+
+            self.stats["misses"] += 1
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            if self._batcher:
+                vector = self._batcher.submit(key).result()
+            else:
+                vector = self._encode_batch([key])[0]
+        except Exception as e:
+            with self._cache_lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._cache_lock:
+            self._cache[key] = vector
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(vector)
+        return vector
+
+    def encode_many(self, texts: List[str]) -> List[List[float]]:
+        """編碼多個文本（未命中快取者合併為一次模型呼叫）"""
+        keys = [normalize_text(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        missing = []
+        with self._cache_lock:
+            for key in keys:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self.stats["hits"] += 1
+                    found[key] = cached
+                elif key not in missing:
+                    self.stats["misses"] += 1
+                    missing.append(key)
+
+        if missing:
+            vectors = self._encode_batch(missing)
+            found.update(zip(missing, vectors))
+            with self._cache_lock:
+                for key, vector in zip(missing, vectors):
+                    self._cache[key] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [found[key] for key in keys]
+
+    def get_stats(self) -> Dict:
+        """獲取快取與批次統計"""
+        total = self.stats["hits"] + self.stats["misses"]
+        batch_stats = self._batcher.stats if self._batcher else {"batches": 0, "items": 0}
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / total * 100, 2) if total else 0,
+            "cache_size": len(self._cache),
+            "avg_batch_size": round(batch_stats["items"] / batch_stats["batches"], 2) if batch_stats["batches"] else 0,
+            "backend": self.backend
+        }
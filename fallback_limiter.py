@@ -0,0 +1,72 @@
+"""
+行程內備援速率限制
+Redis 無法使用（斷路器開啟）時改用本機 token bucket：每個執行個體分到 limit / expected_instances 的額度，
+避免 Redis 中斷時所有限制同時失效；Redis 恢復後由呼叫端交還 Redis
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FallbackLimiter:
+    """
+    每個識別符一個 token bucket：容量為 limit / expected_instances，並在 window 秒內補滿
+    各執行個體合計的放行量約為全域限制（實際執行個體數多於預期時按比例放寬）
+    """
+
+    def __init__(self, expected_instances: int = None, max_buckets: int = 10000):
+        """
+        初始化備援限制
+
+        Args:
+            expected_instances: 預期的執行個體數（預設讀取 RATE_LIMIT_EXPECTED_INSTANCES，預設 2）
+            max_buckets: 保留的 bucket 數上限（超過時淘汰最久未使用者）
+        """
+        self.expected_instances = max(1, expected_instances or int(os.getenv('RATE_LIMIT_EXPECTED_INSTANCES', '2')))
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Tuple[str, int, int], list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"allowed": 0, "rejected": 0}
+
+    def is_allowed(self, identifier: str, limit: int, window: int, now: float = None) -> Tuple[bool, Dict]:
+        """檢查請求是否允許（回傳格式與 RateLimiter.is_allowed 相同）"""
+        now = now if now is not None else time.time()
+        capacity = max(1.0, limit / self.expected_instances)
+        refill_rate = capacity / window
+        key = (identifier, limit, window)
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + max(0.0, now - bucket[1]) * refill_rate)
+                self._buckets.move_to_end(key)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = [tokens, now]
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            self.stats["allowed" if allowed else "rejected"] += 1
+
+        return allowed, {
+            "allowed": allowed,
+            "limit": limit,
+            "remaining": int(tokens),
+            "reset": int(math.ceil(now + (capacity - tokens) / refill_rate)),
+            "retry_after": None if allowed else max(1, int(math.ceil((1 - tokens) / refill_rate)))
+        }
+
+    def clear(self):
+        """清除所有 bucket"""
+        with self._lock:
+            self._buckets.clear()
@@ -12,6 +12,7 @@ from google.cloud.firestore_v1 import Increment
 from google.api_core import retry
 import google.generativeai as genai
 import sentry_sdk
+from circuit_breaker import CircuitBreaker, guarded
 from knowledge_graph import KnowledgeGraph
 from collective_memory import CollectiveMemorySystem, MemoryAnalyzer
 
@@ -25,6 +26,16 @@ CONTRIBUTION_BADGES = [
     (500, "🏆", "傳奇")
 ]
 
+EMOTION_LABELS = {
+    "positive": "😊 開心",
+    "negative": "😔 低落",
+    "excited": "🔥 興奮",
+    "calm": "🍃 平靜",
+    "curious": "🤔 好奇",
+    "tired": "😴 疲憊",
+    "neutral": "😐 平常"
+}
+
 def get_contribution_badge(count):
     """根據訊息數量獲取貢獻徽章"""
     badge_str = ""
@@ -45,6 +56,10 @@ class FrequencyBotFirestore:
         genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
         self.model = genai.GenerativeModel('gemini-1.5-flash')
         
+        # 外部服務斷路器（服務變慢或中斷時直接失敗，不佔用請求執行緒）
+        self.firestore_breaker = CircuitBreaker.for_dependency("firestore")
+        self.gemini_breaker = CircuitBreaker.for_dependency("gemini")
+        
         # 設定集合名稱
         self.broadcasts_collection = 'broadcasts'
         self.generated_collection = 'generated_broadcasts'
@@ -58,6 +73,15 @@ class FrequencyBotFirestore:
             self.memory_system = None
             self.memory_analyzer = None
         
+        # 用戶活躍直方圖（由 attach_activity_histogram 設定）
+        self.activity_histogram = None
+        
+    def attach_activity_histogram(self, histogram):
+        """設定用戶活躍直方圖（寫入訊息時累加，廣播提示詞使用）"""
+        self.activity_histogram = histogram
+        if self.memory_system:
+            self.memory_system.activity_histogram = histogram
+        
     def add_to_broadcast(self, message: str, user_id: str = None):
         """將訊息加入廣播池並同步到集體記憶"""
         current_hour = int(time.time()) // 3600
@@ -96,12 +120,20 @@ class FrequencyBotFirestore:
 
         # 執行批次寫入 (包含重試機制)
         try:
-            batch.commit()
+            self.firestore_breaker.call(batch.commit)
         except Exception as e:
             logger.error(f"批次寫入失敗，重試中: {e}")
             # 使用指數退避重試
             time.sleep(0.1)
-            batch.commit()
+            self.firestore_breaker.call(batch.commit)
+        
+        # 更新本小時的串流分析
+        if self.memory_system:
+            self.memory_system.observe_message(message)
+        
+        # 累加用戶活躍時段
+        if self.activity_histogram and user_id:
+            self.activity_histogram.record(user_id)
         
         # 異步處理集體記憶系統 (不阻塞主流程)
         if self.memory_system and user_id:
@@ -113,12 +145,13 @@ class FrequencyBotFirestore:
                 logger.warning(f"無法加入集體記憶: {e}")
         
         # 獲取並返回當前訊息數 (使用緩存減少讀取)
-        doc = stats_ref.get()
+        doc = self.firestore_breaker.call(stats_ref.get)
         message_count = doc.to_dict().get('message_count', 1) if doc.exists else 1
         
         logger.info(f"訊息已加入廣播池 - 小時: {current_hour}, 總數: {message_count}")
         return message_count
         
+    @guarded("firestore_breaker")
     def get_frequency_stats(self):
         """獲取當前頻率統計"""
         current_hour = int(time.time()) // 3600
@@ -151,9 +184,20 @@ class FrequencyBotFirestore:
         next_hour = ((current_hour + 1) * 3600)
         time_until_broadcast = next_hour - current_time
         
-        # 簡單的詞頻分析（為了節省讀取次數，只在訊息少於100時執行）
+        # 熱門話題與趨勢：優先取用串流分析，不需重新讀取訊息
         top_frequencies = []
-        if message_count < 100:
+        trends = {}
+        stream = self.memory_system.hour_stream if self.memory_system else None
+        if stream and stream.covers(current_hour, message_count):
+            snapshot = stream.snapshot()
+            top_frequencies = snapshot['topics']['counts'].most_common(5)
+            trends = {
+                'current_emotion': snapshot['emotion']['current'],
+                'turning_points': snapshot['emotion']['turning_points'][-3:],
+                'emerging': snapshot['topics']['emerging'][:3]
+            }
+        elif message_count < 100:
+            # 簡單的詞頻分析（為了節省讀取次數，只在訊息少於100時執行）
             word_freq = {}
             messages_query = doc_ref.collection('messages').limit(100)
             for msg_doc in messages_query.stream():
@@ -174,6 +218,7 @@ class FrequencyBotFirestore:
                 'seconds': time_until_broadcast % 60
             },
             'top_frequencies': top_frequencies,
+            'trends': trends,
             'contributors': {
                 'total_users': total_users,
                 'top_contributors': contributors
@@ -233,8 +278,8 @@ class FrequencyBotFirestore:
         # 如果10x失敗，嘗試集體記憶系統
         if not broadcast_content and self.memory_system and len(messages) >= 10:
             try:
-                prompt = self.memory_system.generate_broadcast_prompt(current_hour % 24)
-                response = self.model.generate_content(prompt)
+                prompt = self.memory_system.generate_broadcast_prompt(current_hour)
+                response = self.gemini_breaker.call(self.model.generate_content, prompt)
                 if response and response.candidates:
                     broadcast_content = response.candidates[0].content.parts[0].text
                     optimization_type = "collective_memory"
@@ -246,7 +291,7 @@ class FrequencyBotFirestore:
         if not broadcast_content:
             prompt = self._create_prompt(messages)
             try:
-                response = self.model.generate_content(prompt)
+                response = self.gemini_breaker.call(self.model.generate_content, prompt)
                 if response and response.candidates:
                     broadcast_content = response.candidates[0].content.parts[0].text
                     optimization_type = "standard"
@@ -270,6 +315,10 @@ class FrequencyBotFirestore:
         
         self.db.collection(self.generated_collection).document(str(current_hour)).set(broadcast_data)
         
+        # 加入歷史廣播向量索引（之後的廣播可引用相似時刻）
+        if self.memory_system:
+            self.memory_system.remember_broadcast(current_hour, broadcast_content)
+        
         logger.info(f"廣播生成成功 - 小時: {current_hour}, 類型: {optimization_type}")
         
         # 觸發清理任務
@@ -277,6 +326,7 @@ class FrequencyBotFirestore:
         
         return broadcast_data
     
+    @guarded("firestore_breaker")
     def get_latest_broadcast(self):
         """獲取最新的廣播"""
         # 查詢最近24小時的廣播
@@ -293,6 +343,29 @@ class FrequencyBotFirestore:
             
         return None
     
+    def backfill_moment_index(self, limit: int = 720):
+        """把最近的歷史廣播補進向量索引（索引檔遺失或首次啟用時使用）"""
+        if not self.memory_system or self.memory_system.moment_index is None:
+            return 0
+        
+        index = self.memory_system.moment_index
+        broadcasts = self.db.collection(self.generated_collection)\
+            .order_by('timestamp', direction=firestore.Query.DESCENDING)\
+            .limit(limit)\
+            .stream()
+        
+        missing = []
+        for doc in broadcasts:
+            data = doc.to_dict()
+            hour = data.get('hour')
+            if hour is not None and str(hour) not in index.metadata:
+                missing.append((hour, data.get('content', '')))
+        
+        self.memory_system.remember_broadcasts(missing)
+        logger.info(f"歷史廣播向量索引補齊: {len(missing)} 筆")
+        return len(missing)
+    
+    @guarded("firestore_breaker")
     def get_broadcast_by_time(self, hour: int):
         """獲取特定時間的廣播"""
         doc = self.db.collection(self.generated_collection).document(str(hour)).get()
@@ -484,6 +557,17 @@ def format_stats_message(stats):
         hot_words.append(f"「{word}」×{count}")
     hot_words_str = " ".join(hot_words) if hot_words else "等待更多訊息..."
     
+    # 建立情緒走向與新興話題（串流分析）
+    trends = stats.get('trends') or {}
+    trend_lines = []
+    if trends.get('current_emotion'):
+        path = [EMOTION_LABELS.get(p['from'], p['from']) for p in trends.get('turning_points', [])]
+        path.append(EMOTION_LABELS.get(trends['current_emotion'], trends['current_emotion']))
+        trend_lines.append(f"🌈 情緒走向：{' → '.join(path)}")
+    if trends.get('emerging'):
+        trend_lines.append(f"🌱 新興話題：{'、'.join(trends['emerging'])}")
+    trends_str = "\n" + "\n".join(trend_lines) + "\n" if trend_lines else ""
+    
     # 建立貢獻者排行
     contributors_str = ""
     if stats['contributors']['top_contributors']:
@@ -506,7 +590,7 @@ def format_stats_message(stats):
 
 🔥 熱門頻率
 {hot_words_str}
-
+{trends_str}
 🏆 參與排行榜 (共{stats['contributors']['total_users']}人)
 {contributors_str}
 
@@ -0,0 +1,174 @@
+"""
+背景健康檢查
+每個相依服務在自己的執行緒中依各自的間隔檢查並量測延遲，結果存放在記憶體；
+/health 直接讀取快照；只有結果過期的服務（例如 CPU 節流時背景執行緒來不及更新）才在請求中以短逾時重新檢查
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Probe:
+    """單一相依服務的檢查設定與最近結果"""
+
+    def __init__(self, name: str, check: Callable[[], Any], interval: float,
+                 deep_check: Optional[Callable[[], Any]] = None, stale_after: Optional[float] = None):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self.deep_check = deep_check
+        self.stale_after = stale_after or interval * 3
+        self.result: Optional[Dict] = None
+        self.consecutive_failures = 0
+        self.thread: Optional[threading.Thread] = None
+        self.refreshing = False  # 請求中的重新檢查尚未完成（檢查卡住時不重複啟動）
+
+
+class HealthProber:
+    """
+    背景健康檢查器
+    檢查函式回傳 False 或丟出例外視為失敗；超過 stale_after 秒沒有新結果時標記為過期（只回報，不算失敗）
+    """
+
+    def __init__(self):
+        self._probes: Dict[str, _Probe] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.started = False
+
+    def register(self, name: str, check: Callable[[], Any], interval: float = 30.0,
+                 deep_check: Callable[[], Any] = None, stale_after: float = None):
+        """
+        註冊相依服務
+
+        Args:
+            name: 服務名稱
+            check: 背景定期執行的輕量檢查
+            interval: 檢查間隔（秒）
+            deep_check: 深度檢查（例如寫入測試），只在 check_now(deep=True) 時執行
+            stale_after: 結果視為過期的秒數（預設為間隔的 3 倍）
+        """
+        probe = _Probe(name, check, interval, deep_check, stale_after)
+        with self._lock:
+            self._probes[name] = probe
+        if self.started:
+            self._start_probe(probe)
+
+    def start(self):
+        """啟動背景檢查（每個服務一條執行緒，啟動後立即檢查一次）"""
+        if self.started:
+            return
+        self.started = True
+        self._stop.clear()
+        for probe in list(self._probes.values()):
+            self._start_probe(probe)
+        logger.info(f"背景健康檢查已啟動: {', '.join(self._probes) or '無'}")
+
+    def _start_probe(self, probe: _Probe):
+        probe.thread = threading.Thread(target=self._run, args=(probe,), name=f"health-probe:{probe.name}",
+                                        daemon=True)
+        probe.thread.start()
+
+    def _run(self, probe: _Probe):
+        while not self._stop.is_set():
+            self._probe(probe, probe.check)
+            if self._stop.wait(probe.interval):
+                break
+
+    def _probe(self, probe: _Probe, check: Callable[[], Any]) -> Dict:
+        """執行一次檢查並記錄結果"""
+        start = time.perf_counter()
+        error = None
+        try:
+            healthy = check() is not False
+        except Exception as e:
+            healthy = False
+            error = str(e)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            probe.consecutive_failures = 0 if healthy else probe.consecutive_failures + 1
+            probe.result = {
+                "healthy": healthy,
+                "latency_ms": round(latency_ms, 2),
+                "checked_at": time.time(),
+                "consecutive_failures": probe.consecutive_failures,
+                "error": error
+            }
+            result = dict(probe.result)
+
+        if not healthy and probe.consecutive_failures == 1:
+            logger.warning(f"健康檢查失敗 {probe.name}: {error or '回傳 False'}")
+        return result
+
+    def check_now(self, names: List[str] = None, deep: bool = False) -> Dict[str, Dict]:
+        """立即檢查（deep=True 時改用深度檢查）並回傳最新快照"""
+        for probe in [p for p in list(self._probes.values()) if names is None or p.name in names]:
+            self._probe(probe, probe.deep_check if deep and probe.deep_check else probe.check)
+        return self.snapshot()
+
+    def refresh_stale(self, timeout: float = 2.0) -> Dict[str, Dict]:
+        """結果過期的服務立即重新檢查，最多等待 timeout 秒後回傳最新快照（逾時者維持 stale）"""
+        now = time.time()
+        with self._lock:
+            stale = [
+                probe for probe in self._probes.values()
+                if probe.result is not None and not probe.refreshing
+                and now - probe.result["checked_at"] > probe.stale_after
+            ]
+            for probe in stale:
+                probe.refreshing = True
+
+        threads = [
+            threading.Thread(target=self._refresh, args=(probe,), name=f"health-refresh:{probe.name}", daemon=True)
+            for probe in stale
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return self.snapshot()
+
+    def _refresh(self, probe: _Probe):
+        try:
+            self._probe(probe, probe.check)
+        finally:
+            with self._lock:
+                probe.refreshing = False
+
+    def snapshot(self, now: float = None) -> Dict[str, Dict]:
+        """各服務最近結果與距今秒數（尚未檢查過的服務 status 為 pending）"""
+        now = now if now is not None else time.time()
+        snapshot = {}
+        with self._lock:
+            for name, probe in self._probes.items():
+                if probe.result is None:
+                    snapshot[name] = {"status": "pending"}
+                    continue
+                age = now - probe.result["checked_at"]
+                stale = age > probe.stale_after
+                status = "stale" if stale else ("healthy" if probe.result["healthy"] else "unhealthy")
+                snapshot[name] = {
+                    **probe.result,
+                    "status": status,
+                    "age_seconds": round(age, 1),
+                    "stale": stale
+                }
+        return snapshot
+
+    def overall_status(self, snapshot: Dict[str, Dict] = None) -> str:
+        """整體狀態：任一服務失敗時為 degraded（過期結果只回報在快照中）"""
+        snapshot = snapshot if snapshot is not None else self.snapshot()
+        if any(item["status"] == "unhealthy" for item in snapshot.values()):
+            return "degraded"
+        return "healthy"
+
+    def stop(self):
+        """停止背景檢查"""
+        self._stop.set()
+        self.started = False
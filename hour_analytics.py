@@ -0,0 +1,200 @@
+"""
+整點批次分析引擎
+一次把整個小時的訊息轉成字元碼陣列，用 NumPy 計算所有 2-4 字中文詞組，
+並在單次掃描中得到情緒分佈與情緒轉折點，取代逐則訊息的 Python 迴圈
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CJK_START = 0x4e00
+CJK_END = 0x9fff
+NGRAM_LENGTHS = (2, 3, 4)
+
+
+def _char_codes(texts: Sequence[str]):
+    """把所有訊息串接成一個 uint32 字元碼陣列（訊息之間以 0 分隔）"""
+    joined = "\x00".join(texts)
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+
+    # 每個字元所屬的訊息編號
+    lengths = np.fromiter((len(text) + 1 for text in texts), dtype=np.int64, count=len(texts))
+    message_ids = np.repeat(np.arange(len(texts)), lengths)[:len(codes)]
+    return codes, message_ids
+
+
+def _ngram_keys(codes: np.ndarray):
+    """
+    計算所有純中文 2-4 字詞組的 64-bit 鍵（每字 16 bits，短詞補 0）
+
+    Returns:
+        (鍵, 起始位置, 詞長) 三個等長陣列，依原本「位置 → 詞長」的列舉順序排列
+    """
+    is_cjk = (codes >= CJK_START) & (codes <= CJK_END)
+    wide = codes.astype(np.uint64)
+    size = len(codes)
+
+    keys, starts, lengths = [], [], []
+    for length in NGRAM_LENGTHS:
+        count = size - length + 1
+        if count <= 0:
+            continue
+        valid = np.ones(count, dtype=bool)
+        key = np.zeros(count, dtype=np.uint64)
+        for offset in range(length):
+            valid &= is_cjk[offset:offset + count]
+            key |= wide[offset:offset + count] << np.uint64(48 - 16 * offset)
+        positions = np.flatnonzero(valid)
+        keys.append(key[positions])
+        starts.append(positions)
+        lengths.append(np.full(len(positions), length, dtype=np.int64))
+
+    if not keys:
+        empty = np.zeros(0, dtype=np.int64)
+        return np.zeros(0, dtype=np.uint64), empty, empty
+
+    keys = np.concatenate(keys)
+    starts = np.concatenate(starts)
+    lengths = np.concatenate(lengths)
+    order = np.lexsort((lengths, starts))
+    return keys[order], starts[order], lengths[order]
+
+
+def _decode_key(key: int) -> str:
+    chars = []
+    for shift in (48, 32, 16, 0):
+        code = (key >> shift) & 0xFFFF
+        if code:
+            chars.append(chr(code))
+    return "".join(chars)
+
+
+def extract_topics_batch(texts: Sequence[str], top_k: int = 3) -> List[List[str]]:
+    """
+    批次提取每則訊息最常出現的 2-4 字詞組
+    結果與逐則計算 Counter(...).most_common(top_k) 相同（同次數時先出現者優先）
+    """
+    if not texts:
+        return []
+
+    codes, message_ids = _char_codes(texts)
+    keys, starts, _ = _ngram_keys(codes)
+    topics: List[List[str]] = [[] for _ in texts]
+    if len(keys) == 0:
+        return topics
+
+    owners = message_ids[starts]
+    sequence = np.arange(len(keys))
+
+    # 以（訊息, 詞組）分組：次數與第一次出現的順序
+    order = np.lexsort((sequence, keys, owners))
+    owners_sorted, keys_sorted = owners[order], keys[order]
+    boundary = np.ones(len(order), dtype=bool)
+    boundary[1:] = (owners_sorted[1:] != owners_sorted[:-1]) | (keys_sorted[1:] != keys_sorted[:-1])
+    group_starts = np.flatnonzero(boundary)
+    group_counts = np.diff(np.append(group_starts, len(order)))
+    group_owner = owners_sorted[group_starts]
+    group_key = keys_sorted[group_starts]
+    group_first = sequence[order][group_starts]
+
+    # 每則訊息內依次數遞減、首次出現遞增排序，取前 top_k
+    ranked = np.lexsort((group_first, -group_counts, group_owner))
+    ranked_owner = group_owner[ranked]
+    first_of_owner = np.ones(len(ranked), dtype=bool)
+    first_of_owner[1:] = ranked_owner[1:] != ranked_owner[:-1]
+    owner_start = np.maximum.accumulate(np.where(first_of_owner, np.arange(len(ranked)), 0))
+    keep = ranked[(np.arange(len(ranked)) - owner_start) < top_k]
+
+    for owner, key in zip(group_owner[keep].tolist(), group_key[keep].tolist()):
+        topics[owner].append(_decode_key(key))
+    return topics
+
+
+def emotion_turning_points(emotions: Sequence[str], timestamps: Sequence = None,
+                           window: int = None, max_points: int = 5) -> List[Dict]:
+    """
+    以滑動視窗內的主導情緒找出轉折點（單次累加和計算所有視窗）
+
+    Args:
+        emotions: 依時間排序的每則訊息情緒
+        timestamps: 對應的時間（datetime 或 epoch 秒），用於標示轉折時間
+        window: 視窗大小（預設為訊息數的 1/10，至少 5 則）
+    """
+    count = len(emotions)
+    window = window or max(5, count // 10)
+    if count < window * 2:
+        return []
+
+    labels, codes = np.unique(np.asarray(emotions, dtype=object).astype(str), return_inverse=True)
+    one_hot = np.zeros((count + 1, len(labels)), dtype=np.int32)
+    one_hot[np.arange(1, count + 1), codes] = 1
+    cumulative = one_hot.cumsum(axis=0)
+
+    # 每個不重疊視窗的情緒計數與主導情緒
+    edges = np.arange(0, count + 1, window)
+    window_counts = cumulative[edges[1:]] - cumulative[edges[:-1]]
+    dominant = window_counts.argmax(axis=1)
+    changes = np.flatnonzero(dominant[1:] != dominant[:-1]) + 1
+
+    points = []
+    for change in changes[:max_points]:
+        index = int(edges[change])
+        point = {
+            "index": index,
+            "from": str(labels[dominant[change - 1]]),
+            "to": str(labels[dominant[change]])
+        }
+        if timestamps is not None and index < len(timestamps):
+            point["time"] = _format_time(timestamps[index])
+        points.append(point)
+    return points
+
+
+def _format_time(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        value = datetime.fromtimestamp(value)
+    return value.strftime("%H:%M") if hasattr(value, "strftime") else str(value)
+
+
+def analyze_hour(messages: List[Dict], detect_emotion: Callable[[str], str],
+                 hot_topic_count: int = 10) -> Dict:
+    """
+    整點批次分析
+
+    Args:
+        messages: [{"content", "timestamp", ...}]，依時間排序
+        detect_emotion: 單則訊息情緒偵測（關鍵詞自動機）
+
+    Returns:
+        {"emotion": {"dominant", "distribution", "turning_points"},
+         "topics": {"hot_topics", "counts", "per_message"}}
+    """
+    texts = [msg.get("content", "") or "" for msg in messages]
+
+    emotions = [detect_emotion(text) for text in texts]
+    emotion_counter = Counter(emotions)
+    total = len(emotions) or 1
+
+    per_message = extract_topics_batch(texts)
+    topic_counter = Counter(topic for topics in per_message for topic in topics)
+
+    return {
+        "emotion": {
+            "dominant": emotion_counter.most_common(1)[0][0] if emotion_counter else "neutral",
+            "distribution": {k: f"{v/total*100:.1f}%" for k, v in emotion_counter.items()},
+            "turning_points": emotion_turning_points(emotions, [msg.get("timestamp") for msg in messages])
+        },
+        "topics": {
+            "hot_topics": [topic for topic, _ in topic_counter.most_common(hot_topic_count)],
+            "counts": topic_counter,
+            "per_message": per_message
+        }
+    }
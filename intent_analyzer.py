@@ -7,19 +7,12 @@ import os
 import logging
 from typing import Dict, List, Optional, Tuple
 from knowledge_graph import KnowledgeGraph
+from keyword_automaton import keyword_index
+from embedding_service import EmbeddingService, SENTENCE_TRANSFORMER_AVAILABLE
+from intent_classifier import PrototypeIntentClassifier, NUMPY_AVAILABLE
 import jieba
 import re
 
-# 嘗試導入 sentence_transformers，如果失敗則使用簡化版本
-try:
-    from sentence_transformers import SentenceTransformer
-    import numpy as np
-    SENTENCE_TRANSFORMER_AVAILABLE = True
-except ImportError:
-    logger = logging.getLogger(__name__)
-    logger.warning("SentenceTransformer not available, using simplified intent analysis")
-    SENTENCE_TRANSFORMER_AVAILABLE = False
-
 logger = logging.getLogger(__name__)
 
 
@@ -28,13 +21,11 @@ class IntentAnalyzer:
         """初始化意圖分析器"""
         self.graph = graph or KnowledgeGraph()
         
-        # 初始化句子嵌入模型（如果可用）
+        # 初始化句子嵌入服務（如果可用）；模型在第一次需要嵌入時才載入
         if SENTENCE_TRANSFORMER_AVAILABLE:
-            model_name = os.getenv('SENTENCE_TRANSFORMER_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
-            logger.info(f"載入語義模型: {model_name}")
-            self.embedder = SentenceTransformer(model_name)
+            self.embedder = EmbeddingService()
         else:
-            logger.info("使用簡化的意圖分析（無語義嵌入）")
+            logger.warning("SentenceTransformer not available, using simplified intent analysis")
             self.embedder = None
         
         # 初始化中文分詞
@@ -62,45 +53,44 @@ class IntentAnalyzer:
             "結束": ["結束", "停止", "不玩了", "停止遊戲", "不要了", "結束目前功能"]
         }
         
+        # 註冊到共用關鍵詞自動機（一次掃描取得所有命中）
+        keyword_index.register("feature", self.feature_keywords)
+        keyword_index.register("intent", self.intent_patterns)
+        
+        # 本地原型分類器（原型嵌入在第一次分類時才計算）
+        if self.embedder and NUMPY_AVAILABLE:
+            self.classifier = PrototypeIntentClassifier(self.embedder, self.feature_keywords)
+        else:
+            self.classifier = None
+        
     def analyze(self, message: str, user_id: str, context: List[Dict] = None) -> Dict:
         """分析用戶意圖"""
         try:
-            # 1. 基礎文本處理
-            cleaned_message = self._preprocess_text(message)
-            
-            # 2. 生成語義嵌入（如果可用）
-            if self.embedder:
-                embedding = self.embedder.encode(message).tolist()
-            else:
-                # 使用簡單的哈希值作為替代
-                embedding = [float(hash(message + str(i)) % 1000) / 1000 for i in range(10)]
+            # 1. 規則基礎匹配（快速路徑，不需要分詞與語義嵌入）
+            direct_result = self.quick_match(message)
+            if direct_result:
+                return direct_result
             
-            # 3. 提取關鍵詞和實體
+            # 2. 基礎文本處理、提取關鍵詞和實體
+            cleaned_message = self._preprocess_text(message)
             keywords = self._extract_keywords(cleaned_message)
             entities = self._extract_entities(cleaned_message)
             
-            # 4. 規則基礎匹配（快速路徑）
-            direct_match = self._match_feature_keywords(cleaned_message)
-            if direct_match:
-                logger.info(f"直接匹配到功能: {direct_match}")
-                return {
-                    "intent": "use_feature",
-                    "feature": direct_match,
-                    "confidence": 0.95,
-                    "entities": entities,
-                    "embedding": embedding
-                }
+            # 3. 生成語義嵌入（僅在後續階段需要時計算）
+            embedding = self._get_embedding(message)
             
-            # 5. 圖資料庫查詢相似意圖
-            similar_intents = self.graph.find_similar_intents(user_id, embedding)
+            # 4. 本地原型分類，信心不足時才查詢圖資料庫
+            similar_intents, confident = self._similar_intents(user_id, embedding)
             
-            # 6. 獲取用戶偏好
-            user_preferences = self.graph.get_user_preferences(user_id)
+            # 5. 獲取用戶偏好（本地分類有把握或圖資料庫無法使用時略過）
+            user_preferences = {}
+            if not confident and self._graph_available():
+                user_preferences = self.graph.get_user_preferences(user_id) or {}
             
-            # 7. 分析上下文
+            # 6. 分析上下文
             context_features = self._analyze_context(context) if context else []
             
-            # 8. 綜合判斷意圖
+            # 7. 綜合判斷意圖
             intent_result = self._determine_intent(
                 message=cleaned_message,
                 keywords=keywords,
@@ -111,8 +101,8 @@ class IntentAnalyzer:
                 embedding=embedding
             )
             
-            # 9. 儲存到知識圖譜
-            if intent_result["confidence"] > 0.7:
+            # 8. 儲存到知識圖譜
+            if intent_result["confidence"] > 0.7 and self._graph_available():
                 message_id = self._save_to_graph(
                     message=message,
                     user_id=user_id,
@@ -131,6 +121,54 @@ class IntentAnalyzer:
                 "error": str(e)
             }
     
+    def quick_match(self, message: str) -> Optional[Dict]:
+        """只用關鍵詞自動機判斷功能意圖（不做任何 I/O），無法判斷時回傳 None"""
+        cleaned_message = self._preprocess_text(message)
+        direct_match = self._match_feature_keywords(cleaned_message)
+        if not direct_match:
+            return None
+        
+        logger.info(f"直接匹配到功能: {direct_match}")
+        return {
+            "intent": "use_feature",
+            "feature": direct_match,
+            "confidence": 0.95,
+            "entities": self._extract_entities(cleaned_message)
+        }
+    
+    def _get_embedding(self, message: str) -> List[float]:
+        """取得語義嵌入（經快取與批次合併）"""
+        if self.embedder:
+            return self.embedder.encode(message)
+        # 使用簡單的哈希值作為替代
+        return [float(hash(message + str(i)) % 1000) / 1000 for i in range(10)]
+    
+    def _graph_available(self) -> bool:
+        """知識圖譜可以查詢（已連線且斷路器未開啟）"""
+        return self.graph is not None and getattr(self.graph, "connected", True)
+    
+    def _find_similar_intents(self, user_id: str, embedding: List[float]) -> List[Dict]:
+        """找出相似的功能意圖（優先使用本地原型分類器）"""
+        return self._similar_intents(user_id, embedding)[0]
+    
+    def _similar_intents(self, user_id: str, embedding: List[float]) -> Tuple[List[Dict], bool]:
+        """回傳 (相似意圖, 本地分類是否有把握)；沒把握且知識圖譜可用時才查詢圖資料庫"""
+        if self.classifier:
+            try:
+                prediction = self.classifier.classify(embedding)
+                if prediction["confident"]:
+                    return [
+                        {"feature": c["feature"], "score": c["score"]}
+                        for c in prediction["candidates"]
+                        if c["score"] >= self.classifier.min_confidence
+                    ], True
+            except Exception as e:
+                logger.warning(f"原型分類失敗，改用知識圖譜: {e}")
+        
+        if not self._graph_available():
+            return [], False
+        return self.graph.find_similar_intents(user_id, embedding) or [], False
+    
     def _preprocess_text(self, text: str) -> str:
         """預處理文本"""
         # 移除多餘空白
@@ -178,11 +216,7 @@ class IntentAnalyzer:
     
     def _match_feature_keywords(self, text: str) -> Optional[str]:
         """匹配功能關鍵詞"""
-        for feature, keywords in self.feature_keywords.items():
-            for keyword in keywords:
-                if keyword in text:
-                    return feature
-        return None
+        return keyword_index.first_category(text, "feature")
     
     def _analyze_context(self, context: List[Dict]) -> List[str]:
         """分析上下文獲取相關功能"""
@@ -215,13 +249,9 @@ class IntentAnalyzer:
                 "embedding": embedding
             }
         
-        # 2. 檢查意圖模式
-        detected_intent = None
-        for intent_type, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if pattern in message:
-                    detected_intent = intent_type
-                    break
+        # 2. 檢查意圖模式（多個命中時以字典順序最後者為準）
+        detected_intents = keyword_index.categories(message, "intent")
+        detected_intent = detected_intents[-1] if detected_intents else None
         
         # 3. 基於用戶歷史偏好
         if user_preferences.get("preferred_features"):
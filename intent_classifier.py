@@ -0,0 +1,123 @@
+"""
+原型向量意圖分類器
+以功能關鍵詞與標註範例的語義嵌入建立各功能的原型矩陣，
+用向量化的餘弦相似度在本地完成分類，信心不足時才交給知識圖譜
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 標註範例（不含功能關鍵詞的自然說法，補足關鍵詞的語義覆蓋）
+LABELED_EXAMPLES = {
+    "接龍": ["我們來玩詞語遊戲", "換我接下一個詞", "用最後一個字開頭造詞"],
+    "投票": ["大家來決定一下晚餐", "幫我看看哪個選項比較多人要", "我要舉手表決"],
+    "統計": ["現在累積多少訊息了", "這小時有幾個人在聊天", "誰講最多話"],
+    "廣播": ["大家剛剛都在聊什麼", "上一小時的內容是什麼", "想聽聽今天的摘要"],
+    "防空": ["附近有地下室可以躲嗎", "警報響了要去哪裡", "哪裡比較安全"],
+    "物資": ["我這裡有多的水可以給人", "有人缺泡麵嗎", "哪裡可以領食物"],
+    "API統計": ["今天呼叫了幾次模型", "配額還剩多少", "額度快用完了嗎"],
+    "幫助": ["這個機器人可以做什麼", "我不會用", "有什麼指令"],
+    "笑話": ["來點好笑的", "講個好笑的故事", "讓我笑一下"],
+}
+
+
+class PrototypeIntentClassifier:
+    """最近鄰原型分類器 - 每個功能一組原型向量，存放於連續的 NumPy 矩陣"""
+
+    def __init__(self, embedder, feature_keywords: Dict[str, List[str]],
+                 examples: Dict[str, List[str]] = None, min_confidence: float = 0.6):
+        """
+        初始化分類器
+
+        Args:
+            embedder: 嵌入服務（需提供 encode_many / encode）
+            feature_keywords: 功能關鍵詞映射
+            examples: 額外標註範例（預設使用 LABELED_EXAMPLES）
+            min_confidence: 低於此相似度視為信心不足
+        """
+        self.embedder = embedder
+        self.feature_keywords = feature_keywords
+        self.examples = LABELED_EXAMPLES if examples is None else examples
+        self.min_confidence = min_confidence
+
+        self.features: List[str] = []
+        self._matrix = None          # (原型數, 維度) float32，已正規化
+        self._segment_starts = None  # 每個功能在矩陣中的起始列
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._matrix is not None
+
+    def build(self) -> None:
+        """計算所有原型嵌入並建立矩陣（同一功能的原型連續存放）"""
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy 未安裝，無法建立原型分類器")
+
+        with self._lock:
+            if self._matrix is not None:
+                return
+
+            features = []
+            texts = []
+            starts = []
+            for feature in list(self.feature_keywords) + [f for f in self.examples if f not in self.feature_keywords]:
+                prototypes = list(dict.fromkeys(self.feature_keywords.get(feature, []) + self.examples.get(feature, [])))
+                if not prototypes:
+                    continue
+                features.append(feature)
+                starts.append(len(texts))
+                texts.extend(prototypes)
+
+            vectors = np.asarray(self.embedder.encode_many(texts), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+
+            self.features = features
+            self._segment_starts = np.asarray(starts, dtype=np.intp)
+            self._matrix = np.ascontiguousarray(vectors / norms)
+
+        logger.info(f"原型分類器已建立: {len(features)} 個功能, {len(texts)} 個原型")
+
+    def scores(self, embedding: List[float]) -> "np.ndarray":
+        """各功能的最高餘弦相似度（依 self.features 順序）"""
+        if not self.ready:
+            self.build()
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return np.zeros(len(self.features), dtype=np.float32)
+
+        similarities = self._matrix @ (vector / norm)
+        return np.maximum.reduceat(similarities, self._segment_starts)
+
+    def classify(self, embedding: List[float], top_k: int = 3) -> Dict:
+        """分類單一嵌入向量"""
+        feature_scores = self.scores(embedding)
+        order = np.argsort(feature_scores)[::-1][:top_k]
+        candidates = [
+            {"feature": self.features[i], "score": round(float(feature_scores[i]), 4)}
+            for i in order
+        ]
+
+        best = candidates[0] if candidates else {"feature": None, "score": 0.0}
+        return {
+            "feature": best["feature"],
+            "confidence": best["score"],
+            "confident": best["score"] >= self.min_confidence,
+            "candidates": candidates
+        }
+
+    def classify_text(self, text: str, top_k: int = 3) -> Dict:
+        """分類文本（透過嵌入服務取得向量）"""
+        return self.classify(self.embedder.encode(text), top_k=top_k)
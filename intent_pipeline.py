@@ -0,0 +1,119 @@
+"""
+分層意圖分類管線
+第 0 層：精確指令/前綴比對（零 I/O）
+第 1 層：關鍵詞自動機
+第 2 層：語義嵌入 + 知識圖譜（含對話上下文查詢）
+每一層只有在前一層無法判斷時才執行，各層命中次數與延遲記錄在 PerformanceDashboard
+"""
+
+import time
+import logging
+from typing import Callable, Dict, Iterable, List, Optional
+
+from command_words import EXACT_COMMANDS, COMMAND_PREFIXES, vote_option
+
+logger = logging.getLogger(__name__)
+
+TIER_COMMAND = 0
+TIER_KEYWORD = 1
+TIER_SEMANTIC = 2
+
+TIER_NAMES = {
+    TIER_COMMAND: "指令",
+    TIER_KEYWORD: "關鍵詞",
+    TIER_SEMANTIC: "語義",
+}
+
+
+class TieredIntentPipeline:
+    """分層意圖分類 - 便宜的層先跑，無法判斷才往下一層"""
+
+    def __init__(self, analyzer=None, extra_commands: Iterable[str] = (), dashboard=None):
+        """
+        初始化分類管線
+
+        Args:
+            analyzer: IntentAnalyzer（提供 quick_match 與 analyze），None 時只執行第 0 層
+            extra_commands: 額外的精確指令（如快捷選單關鍵字）
+            dashboard: PerformanceDashboard，記錄各層命中與延遲
+        """
+        self.analyzer = analyzer
+        self.dashboard = dashboard
+
+        self._commands: Dict[str, str] = {}
+        for feature, commands in EXACT_COMMANDS.items():
+            for command in commands:
+                self._commands[command.lower()] = feature
+        for command in extra_commands:
+            self._commands.setdefault(command.lower(), "選單")
+
+    def match_command(self, message: str) -> Optional[Dict]:
+        """第 0 層：精確指令、指令前綴與數字投票"""
+        text = message.strip()
+        feature = self._commands.get(text.lower())
+
+        if feature is None and vote_option(text) is not None:
+            feature = "投票"
+
+        if feature is None:
+            text_lower = message.lower()
+            for prefix, prefix_feature in COMMAND_PREFIXES:
+                if text_lower.startswith(prefix):
+                    feature = prefix_feature
+                    break
+
+        if feature is None:
+            return None
+
+        # intent 為 command：交給 app.py 既有的精確指令處理器
+        return {"intent": "command", "feature": feature, "confidence": 1.0}
+
+    def classify(self, message: str, user_id: str = "anonymous",
+                 context_loader: Callable[[], List[Dict]] = None) -> Dict:
+        """
+        分類訊息意圖
+
+        Args:
+            message: 用戶訊息
+            user_id: 匿名化用戶 ID
+            context_loader: 取得對話上下文的函式（只在第 2 層才呼叫）
+        """
+        start = time.perf_counter()
+
+        result = self.match_command(message)
+        tier = TIER_COMMAND
+
+        if result is None and self.analyzer:
+            result = self.analyzer.quick_match(message)
+            tier = TIER_KEYWORD
+
+        if result is None and self.analyzer:
+            context = []
+            if context_loader:
+                try:
+                    context = context_loader() or []
+                except Exception as e:
+                    logger.warning(f"獲取對話上下文失敗: {e}")
+            result = self.analyzer.analyze(message=message, user_id=user_id, context=context)
+            tier = TIER_SEMANTIC
+
+        if result is None:
+            return None
+
+        self._record(tier, (time.perf_counter() - start) * 1000)
+        result["tier"] = tier
+        return result
+
+    def _record(self, tier: int, latency_ms: float):
+        """記錄分類在哪一層完成"""
+        if self.dashboard:
+            self.dashboard.record_intent_tier(tier, latency_ms)
+
+    def get_stats(self) -> Dict:
+        """各層命中次數、比例與平均延遲（來自 dashboard）"""
+        if not self.dashboard:
+            return {}
+        return {
+            TIER_NAMES.get(tier, tier): stats
+            for tier, stats in self.dashboard.get_intent_tier_stats().items()
+        }
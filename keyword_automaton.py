@@ -0,0 +1,193 @@
+"""
+關鍵詞自動機模組
+以 Aho-Corasick 多模式匹配取代各模組重複的 `for keyword in ...: if keyword in text` 掃描，
+一次掃描即可取得意圖、情緒、功能等所有字典的命中結果
+"""
+
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordHit(NamedTuple):
+    """單一關鍵詞命中"""
+    namespace: str
+    category: str
+    keyword: str
+    position: int
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 多模式字串匹配自動機"""
+
+    def __init__(self):
+        # 每個節點: 轉移表、失敗連結、輸出（模式索引）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._patterns: List[Tuple[str, str, str]] = []
+        self._built = True
+
+    def add(self, namespace: str, category: str, keyword: str) -> None:
+        """加入一個模式"""
+        if not keyword:
+            return
+
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+
+        self._output[node].append(len(self._patterns))
+        self._patterns.append((namespace, category, keyword))
+        self._built = False
+
+    def build(self) -> None:
+        """以 BFS 建立失敗連結，並把失敗鏈上的輸出合併到各節點"""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail_target = self._goto[fail].get(char, 0)
+                self._fail[child] = fail_target if fail_target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+        self._built = True
+
+    def scan(self, text: str) -> List[KeywordHit]:
+        """單次掃描文本，回傳所有命中（依結束位置排序）"""
+        if not self._built:
+            self.build()
+
+        hits = []
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        patterns = self._patterns
+
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            for pattern_index in output[node]:
+                namespace, category, keyword = patterns[pattern_index]
+                hits.append(KeywordHit(namespace, category, keyword, index - len(keyword) + 1))
+
+        return hits
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+
+class KeywordIndex:
+    """共用關鍵詞索引 - 各模組在啟動時註冊字典，共用同一個自動機與訊息結果快取"""
+
+    def __init__(self, memo_size: int = 4096):
+        self._lock = threading.Lock()
+        self._dictionaries: "OrderedDict[str, Dict[str, List[str]]]" = OrderedDict()
+        self._category_order: Dict[str, Dict[str, int]] = {}
+        self._automaton = KeywordAutomaton()
+        self._memo: "OrderedDict[str, Tuple[List[KeywordHit], Dict[str, Dict[str, set]]]]" = OrderedDict()
+        self.memo_size = memo_size
+        self.stats = {"scans": 0, "memo_hits": 0}
+
+    def register(self, namespace: str, mapping: Dict[str, List[str]]) -> None:
+        """註冊（或更新）一組分類字典，內容相同時不重建"""
+        snapshot = {category: list(keywords) for category, keywords in mapping.items()}
+
+        with self._lock:
+            if self._dictionaries.get(namespace) == snapshot:
+                return
+
+            self._dictionaries[namespace] = snapshot
+            self._category_order[namespace] = {category: i for i, category in enumerate(snapshot)}
+
+            automaton = KeywordAutomaton()
+            for ns, dictionary in self._dictionaries.items():
+                for category, keywords in dictionary.items():
+                    for keyword in keywords:
+                        automaton.add(ns, category, keyword)
+            automaton.build()
+
+            self._automaton = automaton
+            self._memo.clear()
+
+        logger.debug(f"關鍵詞索引已更新: {namespace} ({len(automaton)} 個模式)")
+
+    def scan(self, text: str) -> List[KeywordHit]:
+        """取得文本的所有命中（同一訊息重複查詢時直接使用快取）"""
+        return self._lookup(text)[0]
+
+    def _lookup(self, text: str) -> Tuple[List[KeywordHit], Dict[str, Dict[str, set]]]:
+        """回傳 (命中列表, 依 namespace/分類分組的關鍵詞)"""
+        with self._lock:
+            cached = self._memo.get(text)
+            if cached is not None:
+                self._memo.move_to_end(text)
+                self.stats["memo_hits"] += 1
+                return cached
+            automaton = self._automaton
+
+        hits = automaton.scan(text)
+        grouped: Dict[str, Dict[str, set]] = {}
+        for hit in hits:
+            grouped.setdefault(hit.namespace, {}).setdefault(hit.category, set()).add(hit.keyword)
+        result = (hits, grouped)
+
+        with self._lock:
+            self.stats["scans"] += 1
+            if automaton is self._automaton and self.memo_size > 0:
+                self._memo[text] = result
+                if len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+
+        return result
+
+    def categories(self, text: str, namespace: str) -> List[str]:
+        """命中的分類（依註冊字典中的順序）"""
+        found = self._lookup(text)[1].get(namespace)
+        if not found:
+            return []
+        order = self._category_order.get(namespace, {})
+        return sorted(found, key=lambda category: order.get(category, len(order)))
+
+    def first_category(self, text: str, namespace: str) -> Optional[str]:
+        """字典順序中第一個命中的分類"""
+        categories = self.categories(text, namespace)
+        return categories[0] if categories else None
+
+    def keyword_counts(self, text: str, namespace: str) -> Dict[str, int]:
+        """各分類命中的不重複關鍵詞數（依字典順序）"""
+        found = self._lookup(text)[1].get(namespace)
+        if not found:
+            return {}
+        return {category: len(found[category]) for category in self.categories(text, namespace)}
+
+    def clear_memo(self) -> None:
+        """清空訊息結果快取"""
+        with self._lock:
+            self._memo.clear()
+
+
+# 全域共用索引
+keyword_index = KeywordIndex()
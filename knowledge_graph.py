@@ -8,20 +8,51 @@ import time
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from neo4j import GraphDatabase
+from neo4j.exceptions import CypherSyntaxError, ServiceUnavailable, SessionExpired, TransientError
+from circuit_breaker import CircuitBreaker
+from connection_manager import connection_manager
 import hashlib
 import json
 
 logger = logging.getLogger(__name__)
 
 
+class _GuardedSession:
+    """session.run 經過斷路器的工作階段包裝（其他屬性直接轉給原工作階段）"""
+
+    def __init__(self, session, breaker: CircuitBreaker):
+        self._session = session
+        self._breaker = breaker
+
+    def __enter__(self):
+        return _GuardedSession(self._session.__enter__(), self._breaker)
+
+    def __exit__(self, *exc_info):
+        return self._session.__exit__(*exc_info)
+
+    def run(self, *args, **kwargs):
+        return self._breaker.call(self._session.run, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
 class KnowledgeGraph:
     def __init__(self, uri: str = None, user: str = None, password: str = None):
         """初始化 Neo4j 連接"""
         self.uri = uri or os.getenv('NEO4J_URI')
         self.user = user or os.getenv('NEO4J_USER', 'neo4j')
         self.password = password or os.getenv('NEO4J_PASSWORD')
+        # 連線或逾時錯誤才算失敗；查詢語法等錯誤表示服務有回應
+        self.circuit_breaker = CircuitBreaker.for_dependency(
+            "neo4j", failure_exceptions=(ServiceUnavailable, SessionExpired, TransientError, OSError)
+        )
         self.connected = False
+        self.context_buffer = None  # 最近訊息緩衝區（由 attach_context_buffer 設定）
+        self.supports_batch_queries = True  # 後端不支援 UNWIND 子查詢時改用執行緒池
+        self.pool = None  # 連線管理器的 Neo4j 連線池（工作階段的取得/歸還計入連線池指標）
         
         if not all([self.uri, self.user, self.password]):
             logger.warning("Neo4j connection parameters missing")
@@ -29,7 +60,8 @@ class KnowledgeGraph:
             return
             
         try:
-            self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+            self.pool = connection_manager.setup_neo4j(self.uri, self.user, self.password)
+            self.driver = self.pool.get_driver()
             # 測試連接
             self.driver.verify_connectivity()
             self.connected = True
@@ -37,12 +69,14 @@ class KnowledgeGraph:
             self._init_schema()
         except Exception as e:
             logger.error(f"Neo4j 連接失敗: {e}")
+            if self.pool:
+                self.pool.close_all()
             self.driver = None
             self.connected = False
         
     def _init_schema(self):
         """初始化資料庫 schema"""
-        with self.driver.session() as session:
+        with self._session() as session:
             # 創建索引
             constraints = [
                 "CREATE CONSTRAINT IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
@@ -59,9 +93,30 @@ class KnowledgeGraph:
                 except Exception as e:
                     logger.warning(f"Schema creation warning: {e}")
                     
+    @property
+    def connected(self) -> bool:
+        """已連線且斷路器未開啟（開啟期間各方法直接走未連線的降級路徑）"""
+        return self._connected and not self.circuit_breaker.is_open
+        
+    @connected.setter
+    def connected(self, value: bool):
+        self._connected = value
+        
+    def _session(self) -> _GuardedSession:
+        """取得查詢經過斷路器的工作階段"""
+        session = self.pool.get_connection() if self.pool else self.driver.session()
+        return _GuardedSession(session, self.circuit_breaker)
+        
     def close(self):
         """關閉連接"""
-        self.driver.close()
+        if self.pool:
+            self.pool.close_all()
+        else:
+            self.driver.close()
+        
+    def attach_context_buffer(self, buffer):
+        """設定最近訊息緩衝區（ConversationBuffer），對話上下文優先從緩衝區讀取"""
+        self.context_buffer = buffer
         
     # ========== 基礎 CRUD 操作 ==========
     
@@ -71,7 +126,7 @@ class KnowledgeGraph:
             logger.warning("Neo4j not connected, skipping add_user")
             return {"user": {"id": user_id}}
             
-        with self.driver.session() as session:
+        with self._session() as session:
             result = session.run("""
                 MERGE (u:User {id: $user_id})
                 ON CREATE SET 
@@ -90,9 +145,9 @@ class KnowledgeGraph:
         """新增訊息節點並建立關聯"""
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping add_message")
-            return {{}}
+            return {}
             
-        with self.driver.session() as session:
+        with self._session() as session:
             # 產生訊息 ID
             if not message_id:
                 message_id = f"msg_{user_id}_{int(time.time() * 1000)}"
@@ -112,6 +167,10 @@ class KnowledgeGraph:
                 user_id=user_id, embedding=embedding)
             
             record = result.single()
+            
+            if self.context_buffer and record:
+                self.context_buffer.push(user_id, {"id": message_id, "content": content, "time": time.time()})
+            
             return {
                 "message": record["m"],
                 "user": record["u"]
@@ -121,9 +180,9 @@ class KnowledgeGraph:
         """建立訊息與功能的關聯"""
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping link_message_to_feature")
-            return {{}}
+            return {}
             
-        with self.driver.session() as session:
+        with self._session() as session:
             session.run("""
                 MATCH (m:Message {id: $message_id})
                 MERGE (f:Feature {name: $feature_name})
@@ -140,9 +199,9 @@ class KnowledgeGraph:
         """為訊息加入主題標籤"""
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping add_topic")
-            return {{}}
+            return {}
             
-        with self.driver.session() as session:
+        with self._session() as session:
             for topic in topics:
                 session.run("""
                     MATCH (m:Message {id: $message_id})
@@ -158,7 +217,7 @@ class KnowledgeGraph:
             logger.warning(f"Neo4j not connected, skipping link_message_sequence")
             return {}
             
-        with self.driver.session() as session:
+        with self._session() as session:
             session.run("""
                 MATCH (m1:Message {id: $prev_id})
                 MATCH (m2:Message {id: $curr_id})
@@ -172,9 +231,9 @@ class KnowledgeGraph:
         """找出相似的使用意圖"""
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping find_similar_intents")
-            return {{}}
+            return []
             
-        with self.driver.session() as session:
+        with self._session() as session:
             # 注意：Neo4j 的向量相似度功能需要企業版
             # 這裡使用簡化的查詢
             result = session.run("""
@@ -193,9 +252,9 @@ class KnowledgeGraph:
         """獲取用戶偏好"""
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping get_user_preferences")
-            return {{}}
+            return {}
             
-        with self.driver.session() as session:
+        with self._session() as session:
             # 最常用功能
             features = session.run("""
                 MATCH (u:User {id: $user_id})-[:SENT]->(:Message)
@@ -221,13 +280,123 @@ class KnowledgeGraph:
                                     for r in topics]
             }
             
+    def get_user_memories(self, user_ids: List[str], context_limit: int = 5,
+                          max_workers: int = 8) -> Dict[str, Dict]:
+        """
+        批次獲取多位用戶的偏好與最近對話
+        
+        以一次 UNWIND 查詢取回所有用戶；後端無法批次查詢時改用執行緒池平行查詢
+        
+        Returns:
+            {user_id: {"preferences": {...}, "recent_messages": [...]}}
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        if not self.connected or not self.driver:
+            # 資料庫無法使用時仍回傳緩衝區中的最近訊息
+            logger.warning(f"Neo4j not connected, get_user_memories uses the conversation buffer only")
+            memories = {}
+        elif self.supports_batch_queries:
+            try:
+                memories = self._query_user_memories_batch(user_ids, context_limit)
+            except CypherSyntaxError as e:
+                # 後端版本不支援子查詢語法：之後都改用執行緒池
+                logger.warning(f"批次查詢不支援，改用執行緒池: {e}")
+                self.supports_batch_queries = False
+                memories = self._query_user_memories_threaded(user_ids, context_limit, max_workers)
+        else:
+            memories = self._query_user_memories_threaded(user_ids, context_limit, max_workers)
+        
+        # 緩衝區中的最近訊息比資料庫新（包含剛寫入的訊息）
+        if self.context_buffer:
+            buffered = self.context_buffer.get_many(user_ids, context_limit)
+            for user_id, context in buffered.items():
+                if context is None:
+                    continue
+                memory = memories.setdefault(user_id, {
+                    "preferences": {"preferred_features": [], "interested_topics": []}
+                })
+                memory["recent_messages"] = context
+        
+        return memories
+    
+    def _query_user_memories_batch(self, user_ids: List[str], context_limit: int) -> Dict[str, Dict]:
+        """以單一 UNWIND 查詢取得所有用戶的偏好與最近訊息"""
+        with self._session() as session:
+            result = session.run("""
+                UNWIND $user_ids AS user_id
+                OPTIONAL MATCH (u:User {id: user_id})
+                CALL {
+                    WITH u
+                    OPTIONAL MATCH (u)-[:SENT]->(:Message)-[:TRIGGERS]->(f:Feature)
+                    WITH f.name AS feature, count(f) AS count
+                    WHERE feature IS NOT NULL
+                    ORDER BY count DESC
+                    LIMIT 5
+                    RETURN collect({name: feature, count: count}) AS features
+                }
+                CALL {
+                    WITH u
+                    OPTIONAL MATCH (u)-[:SENT]->(:Message)-[:MENTIONS]->(t:Topic)
+                    WITH t.name AS topic, count(t) AS count
+                    WHERE topic IS NOT NULL
+                    ORDER BY count DESC
+                    LIMIT 5
+                    RETURN collect({name: topic, count: count}) AS topics
+                }
+                CALL {
+                    WITH u
+                    OPTIONAL MATCH (u)-[:SENT]->(m:Message)
+                    WITH m
+                    ORDER BY m.timestamp DESC
+                    LIMIT $context_limit
+                    RETURN collect(CASE WHEN m IS NULL THEN NULL ELSE {
+                        id: m.id,
+                        content: m.content,
+                        time: m.timestamp.epochMillis / 1000.0
+                    } END) AS context
+                }
+                RETURN user_id, features, topics, context
+            """, user_ids=user_ids, context_limit=context_limit)
+            
+            return {
+                r["user_id"]: {
+                    "preferences": {
+                        "preferred_features": list(r["features"]),
+                        "interested_topics": list(r["topics"])
+                    },
+                    "recent_messages": list(r["context"])
+                }
+                for r in result
+            }
+    
+    def _query_user_memories_threaded(self, user_ids: List[str], context_limit: int,
+                                      max_workers: int) -> Dict[str, Dict]:
+        """以執行緒池平行執行每位用戶的偏好與上下文查詢"""
+        def fetch(user_id):
+            return {
+                "preferences": self.get_user_preferences(user_id),
+                "recent_messages": self._load_conversation_context(user_id, context_limit)
+            }
+        
+        memories = {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(user_ids))) as pool:
+            futures = {user_id: pool.submit(fetch, user_id) for user_id in user_ids}
+            for user_id, future in futures.items():
+                try:
+                    memories[user_id] = future.result()
+                except Exception as e:
+                    logger.warning(f"獲取用戶 {user_id} 記憶失敗: {e}")
+        return memories
+    
     def get_social_recommendations(self, user_id: str) -> List[str]:
         """基於社交圖譜的功能推薦"""
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping get_social_recommendations")
-            return {{}}
+            return []
             
-        with self.driver.session() as session:
+        with self._session() as session:
             # 找出互動過的用戶常用的功能
             result = session.run("""
                 MATCH (u1:User {id: $user_id})-[:SENT]->(:Message)<-[:SENT]-(u2:User)
@@ -247,15 +416,36 @@ class KnowledgeGraph:
             return [r["feature"] for r in result]
             
     def get_conversation_context(self, user_id: str, limit: int = 5) -> List[Dict]:
-        """獲取用戶最近的對話上下文"""
+        """獲取用戶最近的對話上下文（優先讀取最近訊息緩衝區）"""
+        if self.context_buffer:
+            buffered = self.context_buffer.get(user_id, limit)
+            if buffered is not None:
+                return buffered
+        
+        return self._load_conversation_context(user_id, limit)
+    
+    def _load_conversation_context(self, user_id: str, limit: int) -> List[Dict]:
+        """從 Neo4j 讀取對話上下文並建立緩衝區"""
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping get_conversation_context")
-            return {{}}
-            
-        with self.driver.session() as session:
+            return []
+        
+        # 緩衝區未命中時多查一些，用來建立緩衝區
+        query_limit = max(limit, self.context_buffer.size) if self.context_buffer else limit
+        context = self._query_conversation_context(user_id, query_limit)
+        
+        if self.context_buffer:
+            self.context_buffer.seed(user_id, context, complete=len(context) < query_limit)
+        
+        return context[:limit]
+    
+    def _query_conversation_context(self, user_id: str, limit: int) -> List[Dict]:
+        """從 Neo4j 查詢用戶最近訊息"""
+        with self._session() as session:
             result = session.run("""
                 MATCH (u:User {id: $user_id})-[:SENT]->(m:Message)
-                RETURN m.id as id, m.content as content, m.timestamp as time
+                RETURN m.id as id, m.content as content,
+                       m.timestamp.epochMillis / 1000.0 as time
                 ORDER BY m.timestamp DESC
                 LIMIT $limit
             """, user_id=user_id, limit=limit)
@@ -267,9 +457,9 @@ class KnowledgeGraph:
         """分析訊息流動模式"""
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping analyze_message_flow")
-            return {{}}
+            return {}
             
-        with self.driver.session() as session:
+        with self._session() as session:
             cutoff_time = datetime.now().timestamp() - (hours * 3600)
             
             # 熱門話題流
@@ -307,9 +497,9 @@ class KnowledgeGraph:
         """獲取社群洞察"""
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping get_community_insights")
-            return {{}}
+            return {}
             
-        with self.driver.session() as session:
+        with self._session() as session:
             stats = session.run("""
                 MATCH (u:User)
                 WITH count(u) as total_users
@@ -378,7 +568,7 @@ class KnowledgeGraph:
             return
 
         try:
-            with self.driver.session() as session:
+            with self._session() as session:
                 session.run("""
                     MERGE (u:User {id: $user_id})
                     MERGE (f:Feature {name: $feature_name})
@@ -406,7 +596,7 @@ class KnowledgeGraph:
             return
 
         try:
-            with self.driver.session() as session:
+            with self._session() as session:
                 session.run("""
                     MERGE (u:User {id: $user_id})
                     MERGE (v:Vote {id: $vote_id})
@@ -433,7 +623,7 @@ class KnowledgeGraph:
             logger.warning(f"Neo4j not connected, skipping log_joke_submission for user {user_id}, joke {joke_id}")
             return
         try:
-            with self.driver.session() as session:
+            with self._session() as session:
                 result = session.run("""
                     MERGE (u:User {id: $user_id})
                     MERGE (j:Joke {id: $joke_id})
@@ -456,7 +646,7 @@ class KnowledgeGraph:
             logger.warning(f"Neo4j not connected, skipping log_joke_like for user {user_id}, joke {joke_id}")
             return
         try:
-            with self.driver.session() as session:
+            with self._session() as session:
                 result = session.run("""
                     MERGE (u:User {id: $user_id})
                     MERGE (j:Joke {id: $joke_id})
@@ -480,7 +670,7 @@ class KnowledgeGraph:
             return []
         
         try:
-            with self.driver.session() as session:
+            with self._session() as session:
                 # Query for other users who liked the same joke, excluding the current user.
                 result = session.run("""
                     MATCH (currentUser:User {id: $user_id})-[:LIKED]->(j:Joke {id: $joke_id})
@@ -504,7 +694,7 @@ class KnowledgeGraph:
             logger.warning("Neo4j not connected, cannot export graph data.")
             return json.dumps({"nodes": [], "edges": []}) if format == "json" else {"nodes": [], "edges": []}
 
-        with self.driver.session() as session:
+        with self._session() as session:
             nodes_query = """
                 MATCH (n)
                 WHERE n:User OR n:Feature OR n:Topic OR n:Vote OR n:Joke // Added Joke
@@ -45,7 +45,7 @@ def patch_knowledge_graph():
                 check_code = '''
         if not self.connected or not self.driver:
             logger.warning(f"Neo4j not connected, skipping {method}")
-            return {{}}
+            return {}
             '''
                 
                 # 只有在還沒有檢查的情況下才插入
@@ -3,6 +3,7 @@
 """
 
 import time
+import logging
 try:
     import psutil
 except ImportError:
@@ -12,6 +13,10 @@ from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from collections import deque
 import json
+from circuit_breaker import breaker_snapshots
+from redis_batch import deferred
+
+logger = logging.getLogger(__name__)
 
 class PerformanceDashboard:
     """系統效能監控儀表板"""
@@ -27,7 +32,10 @@ class PerformanceDashboard:
             "message_throughput": deque(maxlen=60), # 每分鐘訊息吞吐量
             "concurrent_users": deque(maxlen=60),   # 並發用戶數
             "cache_hits": 0,
-            "cache_misses": 0
+            "cache_misses": 0,
+            "intent_tiers": {},                     # 分層意圖分類 {層: {"hits", "latency"}}
+            "cache_namespaces": {},                 # 兩層快取 {命名空間: {"l1", "l2", "miss"}}
+            "redis_round_trips": {}                 # 每個請求的 Redis 指令數與往返數 {端點: deque}
         }
         
         # Gemini API 指標
@@ -40,6 +48,9 @@ class PerformanceDashboard:
         # 優化建議
         self.optimization_suggestions = []
         
+        # 連線池（ConnectionManager，由 attach_connection_pools 設定）
+        self.connection_pools = None
+        
         # 啟動時間
         self.start_time = time.time()
     
@@ -51,10 +62,11 @@ class PerformanceDashboard:
             "timestamp": time.time()
         })
         
-        # 儲存到 Redis（如果可用）
+        # 儲存到 Redis（如果可用；請求結束時與其他寫入一起送出）
         if self.redis:
             key = f"metrics:api:{endpoint}:{int(time.time())}"
-            self.redis.setex(key, 3600, latency_ms)  # 保留1小時
+            with deferred(self.redis) as writer:
+                writer.setex(key, 3600, latency_ms)  # 保留1小時
     
     def record_db_operation(self, operation: str, duration_ms: float):
         """記錄資料庫操作"""
@@ -84,6 +96,48 @@ class PerformanceDashboard:
                 "count": 1
             })
     
+    def record_redis_round_trips(self, endpoint: str, stats: Dict):
+        """記錄一個請求的 Redis 指令數與實際往返次數（redis_batch 請求結束時呼叫）"""
+        self.metrics_cache["redis_round_trips"].setdefault(endpoint, deque(maxlen=100)).append(
+            (stats["commands"], stats["round_trips"])
+        )
+    
+    def get_redis_round_trip_stats(self) -> Dict[str, Dict]:
+        """各端點每個請求平均的 Redis 指令數（未批次時的往返數）與批次後的往返數"""
+        stats = {}
+        for endpoint, samples in self.metrics_cache["redis_round_trips"].items():
+            if not samples:
+                continue
+            commands = sum(c for c, _ in samples) / len(samples)
+            round_trips = sum(r for _, r in samples) / len(samples)
+            stats[endpoint] = {
+                "requests": len(samples),
+                "avg_commands": round(commands, 1),
+                "avg_round_trips": round(round_trips, 1)
+            }
+        return stats
+    
+    def record_intent_tier(self, tier: int, latency_ms: float):
+        """記錄意圖分類在哪一層完成及其延遲"""
+        tier_metrics = self.metrics_cache["intent_tiers"].setdefault(
+            tier, {"hits": 0, "latency": deque(maxlen=100)}
+        )
+        tier_metrics["hits"] += 1
+        tier_metrics["latency"].append(latency_ms)
+    
+    def get_intent_tier_stats(self) -> Dict[int, Dict]:
+        """各層意圖分類的命中次數、比例與平均延遲"""
+        tiers = self.metrics_cache["intent_tiers"]
+        total = sum(m["hits"] for m in tiers.values())
+        return {
+            tier: {
+                "hits": m["hits"],
+                "ratio": round(m["hits"] / total * 100, 1) if total else 0,
+                "avg_ms": round(sum(m["latency"]) / len(m["latency"]), 2) if m["latency"] else 0
+            }
+            for tier, m in sorted(tiers.items())
+        }
+    
     def update_concurrent_users(self, count: int):
         """更新並發用戶數"""
         self.metrics_cache["concurrent_users"].append({
@@ -98,6 +152,57 @@ class PerformanceDashboard:
         else:
             self.metrics_cache["cache_misses"] += 1
     
+    def record_cache_lookup(self, namespace: str, level: str):
+        """記錄一次快取查詢的命中層級（l1 / l2 / miss）"""
+        counts = self.metrics_cache["cache_namespaces"].setdefault(
+            namespace, {"l1": 0, "l2": 0, "miss": 0}
+        )
+        counts[level] += 1
+        self.update_cache_stats(level != "miss")
+    
+    def get_cache_namespace_stats(self) -> Dict[str, Dict]:
+        """各命名空間的 L1 命中率與 L1 未命中時的 L2 命中率"""
+        stats = {}
+        for namespace, counts in sorted(self.metrics_cache["cache_namespaces"].items()):
+            total = counts["l1"] + counts["l2"] + counts["miss"]
+            reached_l2 = counts["l2"] + counts["miss"]
+            stats[namespace] = {
+                "requests": total,
+                "l1_hit_rate": round(counts["l1"] / total * 100, 1) if total else 0,
+                "l2_hit_rate": round(counts["l2"] / reached_l2 * 100, 1) if reached_l2 else 0
+            }
+        return stats
+    
+    def attach_connection_pools(self, manager):
+        """設定要顯示指標的連線管理器"""
+        self.connection_pools = manager
+    
+    def get_pool_stats(self) -> Dict[str, Dict]:
+        """各連線池指標 {名稱: 指標}（Redis 依一般/二進位連線池分開）"""
+        if not self.connection_pools:
+            return {}
+        try:
+            metrics = self.connection_pools.pool_metrics()
+        except Exception as e:
+            logger.error(f"讀取連線池指標失敗: {e}")
+            return {}
+        stats = {}
+        if "neo4j" in metrics:
+            stats["neo4j"] = metrics["neo4j"]
+        for name, pool in metrics.get("redis", {}).items():
+            stats[f"redis:{name}"] = pool
+        return stats
+    
+    def get_client_cache_stats(self) -> Optional[Dict]:
+        """Redis 用戶端快取命中率（未啟用時為 None）"""
+        if not self.connection_pools:
+            return None
+        return self.connection_pools.client_cache_stats()
+    
+    def get_circuit_breaker_stats(self) -> Dict[str, Dict]:
+        """各相依服務斷路器的狀態與統計"""
+        return breaker_snapshots()
+    
     def get_system_metrics(self) -> Dict:
         """獲取系統資源使用情況"""
         if psutil:
@@ -184,6 +289,12 @@ class PerformanceDashboard:
         if self.gemini_metrics["avg_response_time"] > 1000:
             suggestions.append("⚡ Gemini API 回應較慢，考慮使用快取")
         
+        # 基於連線池等待
+        for name, pool in self.get_pool_stats().items():
+            if pool["wait_p95_ms"] > 50 or pool["timeouts"]:
+                suggestions.append(f"🔌 {name} 連線池等待偏高（p95 {pool['wait_p95_ms']:.0f}ms），建議提高連線數上限")
+                break
+        
         # 基於記憶體
         system_metrics = self.get_system_metrics()
         if system_metrics["memory"]["percent"] > 80:
@@ -219,7 +330,13 @@ class PerformanceDashboard:
 📊 知識圖譜
 • 節點總數: {self._get_graph_stats().get('nodes', 'N/A')}
 • 查詢 QPS: {throughput['current_per_sec']}
-• 快取命中率: {cache_eff}%
+• 快取命中率: {cache_eff}%{self._format_cache_namespaces()}
+
+🧭 意圖分類{self._format_intent_tiers()}
+
+🔌 連線池{self._format_connection_pools()}
+
+🛡️ 斷路器{self._format_circuit_breakers()}
 
 🔧 資源使用
 • CPU: {system['cpu']['percent']}% ({system['cpu']['cores']} cores)
@@ -259,6 +376,55 @@ class PerformanceDashboard:
         
         return details
     
+    def _format_intent_tiers(self) -> str:
+        """格式化分層意圖分類統計"""
+        tier_stats = self.get_intent_tier_stats()
+        if not tier_stats:
+            return "\n• 尚無資料"
+        return "".join(
+            f"\n• 第 {tier} 層: {m['hits']} 次 ({m['ratio']}%) 平均 {m['avg_ms']}ms"
+            for tier, m in tier_stats.items()
+        )
+    
+    def _format_cache_namespaces(self) -> str:
+        """格式化各命名空間的兩層快取命中率"""
+        return "".join(
+            f"\n  ◦ {namespace}: L1 {m['l1_hit_rate']}% / L2 {m['l2_hit_rate']}% ({m['requests']} 次)"
+            for namespace, m in self.get_cache_namespace_stats().items()
+        )
+    
+    def _format_connection_pools(self) -> str:
+        """格式化連線池使用數與等待時間"""
+        pool_stats = self.get_pool_stats()
+        if not pool_stats:
+            return "\n• 尚無資料"
+        lines = "".join(
+            f"\n• {name}: 使用中 {m['in_use']}/{m['max_connections']} (峰值 {m['peak_in_use']}) "
+            f"等待 p95 {m['wait_p95_ms']:.0f}ms 錯誤 {m['errors']}"
+            for name, m in pool_stats.items()
+        )
+        for endpoint, m in self.get_redis_round_trip_stats().items():
+            lines += (f"\n• Redis 往返 {endpoint}: 每請求 {m['avg_round_trips']} 次"
+                      f"（{m['avg_commands']} 個指令）")
+        cache = self.get_client_cache_stats()
+        if cache:
+            lines += (f"\n• Redis 用戶端快取: 命中率 {cache['hit_rate'] * 100:.0f}% "
+                      f"({cache['hits']}/{cache['hits'] + cache['misses']}) 失效 {cache['invalidations']} 次"
+                      + ("" if cache['ready'] else " ⚠️ 暫停中"))
+        return lines
+    
+    def _format_circuit_breakers(self) -> str:
+        """格式化各斷路器狀態（開啟或半開者標示）"""
+        breakers = self.get_circuit_breaker_stats()
+        if not breakers:
+            return "\n• 尚無資料"
+        icons = {"CLOSED": "🟢", "HALF_OPEN": "🟡", "OPEN": "🔴"}
+        return "".join(
+            f"\n• {icons.get(m['state'], '')} {name}: 失敗率 {m['window_failure_rate'] * 100:.0f}% "
+            f"拒絕 {m['rejected']} 次"
+            for name, m in breakers.items()
+        )
+    
     def _get_graph_stats(self) -> Dict:
         """獲取圖資料庫統計（簡化版）"""
         # 實際應該從 Neo4j 查詢
@@ -280,7 +446,13 @@ class PerformanceDashboard:
             "performance": {
                 "p95_latency": self.calculate_p95_latency(),
                 "throughput": self.get_throughput_stats(),
-                "cache_efficiency": self.get_cache_efficiency()
+                "cache_efficiency": self.get_cache_efficiency(),
+                "intent_tiers": self.get_intent_tier_stats(),
+                "cache_namespaces": self.get_cache_namespace_stats(),
+                "connection_pools": self.get_pool_stats(),
+                "circuit_breakers": self.get_circuit_breaker_stats(),
+                "client_cache": self.get_client_cache_stats(),
+                "redis_round_trips": self.get_redis_round_trip_stats()
             },
             "suggestions": self.generate_optimization_suggestions()
         }
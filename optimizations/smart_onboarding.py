@@ -5,12 +5,14 @@
 import time
 from typing import Dict, Optional
 from datetime import datetime
+from keyword_automaton import keyword_index
 
 class SmartOnboarding:
     """智慧引導系統，根據用戶階段提供個人化指引"""
     
-    def __init__(self, knowledge_graph=None):
+    def __init__(self, knowledge_graph=None, activity_histogram=None):
         self.graph = knowledge_graph
+        self.activity_histogram = activity_histogram  # 用戶 7×24 活躍直方圖
         
         # 用戶階段定義
         self.stages = {
@@ -53,7 +55,9 @@ class SmartOnboarding:
             
             "milestone_celebration": "🎉 恭喜達成 {count} 則訊息！\n{achievement}\n\n繼續保持，下個里程碑：{next_milestone}",
             
-            "return_greeting": "💫 歡迎回來！距離上次見面已經 {days} 天了\n\n最近大家在{hot_topic}，要加入討論嗎？"
+            "return_greeting": "💫 歡迎回來！距離上次見面已經 {days} 天了\n\n最近大家在{hot_topic}，要加入討論嗎？",
+            
+            "usual_hour": "🕘 又到了你常出現的 {hour} 點！\n\n💡 小提示：輸入「{suggestion}」可以{action}"
         }
         
         # 個人化建議
@@ -82,12 +86,10 @@ class SmartOnboarding:
     
     def get_user_stage(self, user_id: str) -> str:
         """判斷用戶所在階段"""
-        if not self.graph:
+        if not self.graph and not self.activity_histogram:
             return "new"
         
         try:
-            # 從知識圖譜獲取用戶資料
-            user_data = self.graph.get_user_preferences(user_id)
             message_count = self._get_user_message_count(user_id)
             
             # 根據訊息數量判斷階段
@@ -99,6 +101,10 @@ class SmartOnboarding:
         except:
             return "new"
     
+    def is_new_user(self, user_id: str) -> bool:
+        """是否為尚未發送過訊息的用戶"""
+        return self._get_user_message_count(user_id) == 0
+    
     def get_smart_greeting(self, user_id: str, context: Dict = None) -> str:
         """生成智慧問候語"""
         stage = self.get_user_stage(user_id)
@@ -117,12 +123,15 @@ class SmartOnboarding:
                 hot_topic=hot_topic
             )
         
-        # 根據時間提供建議
+        # 根據時間提供建議（在用戶慣常時段時特別提及）
         hour = datetime.now().hour
+        usual_hour = self._get_preferred_hour(user_id)
         for time_period, data in self.suggestions.items():
             start, end = data["time_range"]
             if start <= hour < end or (start > end and (hour >= start or hour < end)):
-                return self.smart_prompts["after_first_message"].format(
+                template = "usual_hour" if usual_hour == hour else "after_first_message"
+                return self.smart_prompts[template].format(
+                    hour=hour,
                     suggestion=data["suggestion"],
                     action=data["action"]
                 )
@@ -189,7 +198,13 @@ class SmartOnboarding:
             return f"{achievement}\n\n你已經是頻率大師了！🌟"
     
     def _get_user_message_count(self, user_id: str) -> int:
-        """獲取用戶訊息數量"""
+        """獲取用戶訊息數量（活躍直方圖總和）"""
+        if self.activity_histogram:
+            try:
+                return self.activity_histogram.total_messages(user_id)
+            except Exception:
+                return 0
+        
         if not self.graph:
             return 0
         
@@ -200,6 +215,15 @@ class SmartOnboarding:
         except:
             return 0
     
+    def _get_preferred_hour(self, user_id: str) -> Optional[int]:
+        """獲取用戶最常活躍的小時"""
+        if not self.activity_histogram:
+            return None
+        try:
+            return self.activity_histogram.patterns([user_id])[user_id]["preferred_hour"]
+        except Exception:
+            return None
+    
     def _get_last_seen(self, user_id: str) -> Optional[float]:
         """獲取用戶最後活躍時間"""
         # 實際實作應該從資料庫查詢
@@ -251,19 +275,26 @@ class SmartErrorHandler:
                 "廣播": ["廣播", "光波", "廣撥"]
             }
         }
+        
+        # 需要檢查格式的指令關鍵詞
+        self.format_keywords = {
+            "接龍": ["接龍"],
+            "投票": ["投票"],
+            "防空": ["防空"]
+        }
+        keyword_index.register("command_format", self.format_keywords)
     
     def suggest_correction(self, user_input: str, error_type: str = None) -> str:
         """提供智慧錯誤修正建議"""
         # 檢查是否為格式錯誤
-        for feature, keywords in [("接龍", ["接龍"]), ("投票", ["投票"]), ("防空", ["防空"])]:
-            if any(k in user_input for k in keywords):
-                # 檢查格式是否正確
-                if feature == "接龍" and len(user_input.split()) < 2:
-                    return self.error_patterns["format_error"]["接龍"]
-                elif feature == "投票" and "/" not in user_input:
-                    return self.error_patterns["format_error"]["投票"]
-                elif feature == "防空" and len(user_input.split()) < 4:
-                    return self.error_patterns["format_error"]["防空"]
+        for feature in keyword_index.categories(user_input, "command_format"):
+            # 檢查格式是否正確
+            if feature == "接龍" and len(user_input.split()) < 2:
+                return self.error_patterns["format_error"]["接龍"]
+            elif feature == "投票" and "/" not in user_input:
+                return self.error_patterns["format_error"]["投票"]
+            elif feature == "防空" and len(user_input.split()) < 4:
+                return self.error_patterns["format_error"]["防空"]
         
         # 模糊匹配可能的錯字
         from difflib import get_close_matches
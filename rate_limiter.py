@@ -1,30 +1,178 @@
 """
 API 速率限制中間件
-使用滑動視窗算法實現速率限制
+提供三種以 Lua 腳本原子執行的演算法：
+- gcra: 每個識別符只存一個時間戳記（理論到達時間）
+- sliding_window: 兩個固定窗口計數加權估算滑動窗口（一個小 hash）
+- sliding_log: 每個請求一筆 sorted set 成員（精確但記憶體與限制數成正比）
 """
 
+import os
+import math
+import hashlib
+import uuid
 import time
 import logging
+import threading
 from functools import wraps
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, Optional, Tuple
 from flask import request, jsonify, g
 import redis
 from datetime import timedelta
-from connection_manager import connection_manager
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from connection_manager import call_through_breaker, connection_manager, redis_breaker
+from fallback_limiter import FallbackLimiter
 
 logger = logging.getLogger(__name__)
 
 
+# 腳本時間單位皆為毫秒；回傳 {是否允許, 剩餘次數, 重置時間(epoch 毫秒), 需等待毫秒}
+
+_GCRA_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local interval = period / limit
+
+local tat = tonumber(redis.call('get', key)) or now
+if tat < now then
+    tat = now
+end
+
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if now < allow_at then
+    return {0, 0, math.ceil(tat), math.ceil(allow_at - now)}
+end
+
+redis.call('set', key, math.ceil(new_tat), 'px', math.ceil(new_tat - now))
+local remaining = math.floor((now - allow_at) / interval)
+return {1, remaining, math.ceil(new_tat), 0}
+"""
+
+_SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local index = math.floor(now / window)
+
+local data = redis.call('hmget', key, 'w', 'c', 'p')
+local stored = tonumber(data[1])
+local current = tonumber(data[2]) or 0
+local previous = tonumber(data[3]) or 0
+if stored == nil or stored < index - 1 then
+    current, previous = 0, 0
+elseif stored == index - 1 then
+    current, previous = 0, current
+end
+
+local elapsed = now - index * window
+local estimated = previous * (window - elapsed) / window + current
+local reset = (index + 1) * window
+
+if estimated + 1 > limit then
+    -- 等到上一窗口的權重降到足以容納一次請求（本窗口已滿則等到下一窗口）
+    local wait = window - elapsed
+    if previous > 0 and current + 1 <= limit then
+        wait = math.ceil(window * (1 - (limit - current - 1) / previous) - elapsed)
+    end
+    return {0, 0, reset, wait}
+end
+
+redis.call('hset', key, 'w', index, 'c', current + 1, 'p', previous)
+redis.call('pexpire', key, window * 2)
+return {1, math.floor(limit - estimated - 1), reset, 0}
+"""
+
+_SLIDING_LOG_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+
+-- 移除過期記錄
+redis.call('zremrangebyscore', key, 0, now - window)
+local current = redis.call('zcard', key)
+
+if current < limit then
+    redis.call('zadd', key, now, ARGV[4])
+    redis.call('pexpire', key, window)
+end
+
+local earliest = redis.call('zrange', key, 0, 0, 'WITHSCORES')
+local reset = tonumber(earliest[2]) + window
+if current < limit then
+    return {1, limit - current - 1, reset, 0}
+end
+return {0, 0, reset, reset - now}
+"""
+
+# GCRA 批次租用：一次預支最多 want 個額度，並歸還上次租約未用完的 returned 個
+# 回傳 {取得數量, 需等待毫秒, 重置時間(epoch 毫秒)}
+_GCRA_LEASE_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local want = tonumber(ARGV[4])
+local returned = tonumber(ARGV[5])
+local interval = period / limit
+
+local tat = tonumber(redis.call('get', key)) or now
+tat = tat - returned * interval
+if tat < now then
+    tat = now
+end
+
+local available = math.floor((now + period - tat) / interval)
+local granted = math.min(want, available)
+if granted < 0 then
+    granted = 0
+end
+
+local new_tat = tat + granted * interval
+if new_tat > now then
+    redis.call('set', key, math.ceil(new_tat), 'px', math.ceil(new_tat - now))
+else
+    redis.call('del', key)
+end
+
+if granted == 0 then
+    return {0, math.ceil(tat + interval - period - now), math.ceil(tat)}
+end
+return {granted, 0, math.ceil(new_tat)}
+"""
+
+_SCRIPTS = {
+    "gcra": _GCRA_SCRIPT,
+    "sliding_window": _SLIDING_WINDOW_SCRIPT,
+    "sliding_log": _SLIDING_LOG_SCRIPT
+}
+
+
 class RateLimiter:
     """速率限制器實作"""
     
-    def __init__(self, redis_client: Optional[redis.Redis] = None):
-        """初始化速率限制器"""
+    def __init__(self, redis_client: Optional[redis.Redis] = None, algorithm: str = None,
+                 fallback: FallbackLimiter = None, circuit_breaker: CircuitBreaker = None):
+        """
+        初始化速率限制器
+
+        Args:
+            redis_client: Redis 客戶端（None 時依環境變數建立）
+            algorithm: 預設演算法（未指定時讀取 RATE_LIMIT_ALGORITHM，預設 gcra）
+            fallback: Redis 無法使用時的行程內限制
+            circuit_breaker: Redis 斷路器（預設為 GuardedRedis 的斷路器或共用的 redis 斷路器）
+        """
         self.redis = redis_client
         self.redis_pool = None
+        self.algorithm = algorithm or os.getenv('RATE_LIMIT_ALGORITHM', 'gcra')
+        self._scripts = {}
+        self.fallback = fallback or FallbackLimiter()
+        self.fallback_active = False
         
         if not self.redis:
-            import os
             redis_host = os.getenv('REDIS_HOST')
             redis_port = int(os.getenv('REDIS_PORT', 6379))
             redis_password = os.getenv('REDIS_PASSWORD')
@@ -43,92 +191,79 @@ class RateLimiter:
                 except Exception as e:
                     logger.error(f"Rate limiter Redis 連接失敗: {e}")
                     self.redis = None
+
+        # 斷路器依相依服務共用：開啟期間直接使用備援限制，不再等待 Redis 逾時
+        self.circuit_breaker = circuit_breaker or redis_breaker(self.redis)
     
-    def is_allowed(self, identifier: str, limit: int, window: int) -> Tuple[bool, Dict]:
+    def is_allowed(self, identifier: str, limit: int, window: int,
+                   algorithm: str = None, now: float = None) -> Tuple[bool, Dict]:
         """
-        檢查請求是否允許 (優化版本)
-        
+        檢查請求是否允許
+
         Args:
             identifier: 識別符（如 IP 或用戶 ID）
             limit: 時間窗口內的請求限制
             window: 時間窗口（秒）
-            
+            algorithm: "gcra"、"sliding_window" 或 "sliding_log"（預設為 self.algorithm）
+            now: 目前時間（預設 time.time()）
+
         Returns:
             (是否允許, 詳細資訊)
         """
         if not self.redis:
-            # Redis 不可用時，允許所有請求但記錄警告
-            logger.warning("Rate limiter Redis not available, allowing request")
-            return True, {"allowed": True, "limit": limit, "remaining": limit, "reset": 0}
-        
+            # Redis 不可用時改用行程內備援限制
+            return self.fallback.is_allowed(identifier, limit, window, now=now)
+
+        algorithm = algorithm or self.algorithm
+        now = now if now is not None else time.time()
+        now_ms = int(now * 1000)
+
+        script = self._get_script(algorithm)
         try:
-            now = time.time()
-            window_start = now - window
-            key = f"rate_limit:{identifier}"
-            
-            # 使用 Lua 腳本原子性執行，減少網路往返
-            lua_script = """
-            local key = KEYS[1]
-            local now = tonumber(ARGV[1])
-            local window_start = tonumber(ARGV[2])
-            local limit = tonumber(ARGV[3])
-            local window = tonumber(ARGV[4])
-            
-            -- 移除過期記錄
-            redis.call('zremrangebyscore', key, 0, window_start)
-            
-            -- 獲取當前請求數
-            local current = redis.call('zcard', key)
-            
-            if current < limit then
-                -- 允許請求，添加記錄
-                redis.call('zadd', key, now, now)
-                redis.call('expire', key, window)
-                
-                -- 獲取最早的請求時間
-                local earliest = redis.call('zrange', key, 0, 0, 'WITHSCORES')
-                local reset_time = 0
-                if earliest[1] then
-                    reset_time = earliest[2] + window
-                else
-                    reset_time = now + window
-                end
-                
-                return {1, current + 1, limit - current - 1, reset_time}
-            else
-                -- 拒絕請求
-                local earliest = redis.call('zrange', key, 0, 0, 'WITHSCORES')
-                local reset_time = earliest[2] + window
-                return {0, current, 0, reset_time}
-            end
-            """
-            
-            # 註冊並執行 Lua 腳本
-            if not hasattr(self, '_script'):
-                self._script = self.redis.register_script(lua_script)
-            
-            result = self._script(
-                keys=[key],
-                args=[now, window_start, limit, window]
-            )
-            
-            allowed = bool(result[0])
-            current_requests = result[1]
-            remaining = result[2]
-            reset_time = int(result[3])
-            
+            if algorithm == "sliding_log":
+                key = f"rate_limit:{identifier}"
+                args = [now_ms, limit, window * 1000, f"{now_ms}:{uuid.uuid4().hex[:8]}"]
+            else:
+                key = f"rate_limit:{algorithm}:{identifier}"
+                args = [now_ms, limit, window * 1000]
+
+            allowed, remaining, reset_ms, retry_ms = self.call_redis(lambda: script(keys=[key], args=args))
+            allowed = bool(allowed)
+
             return allowed, {
                 "allowed": allowed,
                 "limit": limit,
-                "remaining": remaining,
-                "reset": reset_time,
-                "retry_after": reset_time - int(now) if not allowed else None
+                "remaining": int(remaining),
+                "reset": int(math.ceil(int(reset_ms) / 1000)),
+                "retry_after": None if allowed else max(1, int(math.ceil(int(retry_ms) / 1000)))
             }
-            
-        except Exception as e:
+
+        except (CircuitOpenError, redis.RedisError) as e:
             logger.error(f"Rate limiter error: {e}")
-            # 發生錯誤時允許請求通過
-            return True, {"allowed": True, "limit": limit, "remaining": limit, "reset": 0}
+            return self.use_fallback(identifier, limit, window, now)
+
+    def call_redis(self, operation: Callable):
+        """經由斷路器執行 Redis 操作；成功時結束備援模式"""
+        result = call_through_breaker(self.redis, self.circuit_breaker, operation)
+        if self.fallback_active:
+            self.fallback_active = False
+            logger.info("Redis 已恢復，速率限制交還 Redis")
+        return result
+
+    def use_fallback(self, identifier: str, limit: int, window: int, now: float = None) -> Tuple[bool, Dict]:
+        """Redis 操作失敗或斷路時改用行程內備援限制"""
+        if not self.fallback_active:
+            self.fallback_active = True
+            logger.warning(f"Redis 無法使用，速率限制改用行程內備援（每個執行個體 1/{self.fallback.expected_instances} 額度）")
+        return self.fallback.is_allowed(identifier, limit, window, now=now)
+
+    def _get_script(self, algorithm: str):
+        """註冊（並快取）演算法對應的 Lua 腳本"""
+        if algorithm not in _SCRIPTS:
+            raise ValueError(f"未知的速率限制演算法: {algorithm}")
+        if algorithm not in self._scripts:
+            self._scripts[algorithm] = self.redis.register_script(_SCRIPTS[algorithm])
+        return self._scripts[algorithm]
     
     def get_identifier(self) -> str:
         """獲取請求識別符"""
@@ -146,11 +281,180 @@ class RateLimiter:
         return f"ip:{ip}"
 
 
+class _Lease:
+    """本機持有的額度租約（tokens 為 0 且 retry_at 未到時代表暫時拒絕）"""
+    __slots__ = ("tokens", "expires_at", "retry_at", "reset")
+
+    def __init__(self, tokens: int, expires_at: float, retry_at: float, reset: float):
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.retry_at = retry_at
+        self.reset = reset
+
+
+class LeasedRateLimiter:
+    """
+    混合式速率限制：每個執行個體向 Redis（GCRA）預支一部分額度，在記憶體中扣減，
+    額度用完或租約過期時才再連線 Redis；被拒絕時也在本機記住到可重試的時間
+
+    以 f = lease_fraction 表示，每次租用 ceil(limit × f) 個額度、租約有效 window × f 秒。
+    與所有請求直接走 Redis 的 GCRA 相比：
+    - 超量上限：額度都經 Redis 計數，只是最晚在租用後 window × f 秒才用掉，
+      任一時段的放行數最多多出 ceil(limit × f) + 1 個
+    - 不足上限：其他執行個體手上未用完的額度（每個 ≤ ceil(limit × f)）暫時無法使用，
+      會在該執行個體下次租用時歸還；執行個體結束時未歸還的額度由 GCRA 自然恢復
+    - 本機記住的拒絕只持續到 Redis 回報的可重試時間
+    只有 gcra 演算法支援租用，其他演算法直接交給 RateLimiter
+    """
+
+    def __init__(self, limiter: RateLimiter, lease_fraction: float = 0.1, max_leases: int = 10000):
+        """
+        初始化混合式速率限制
+
+        Args:
+            limiter: 共用的 RateLimiter（提供 Redis 連線與預設演算法）
+            lease_fraction: 每次租用的額度比例（0 表示停用租用）
+            max_leases: 本機保留的租約數上限
+        """
+        self.limiter = limiter
+        self.lease_fraction = lease_fraction
+        self.max_leases = max_leases
+        self._leases: Dict[Tuple[str, int, int], _Lease] = {}
+        self._lock = threading.Lock()
+        self._script = None
+        self.stats = {"local": 0, "remote": 0}
+
+    def is_allowed(self, identifier: str, limit: int, window: int,
+                   algorithm: str = None, now: float = None) -> Tuple[bool, Dict]:
+        """檢查請求是否允許（介面與 RateLimiter.is_allowed 相同，remaining 為本機租約剩餘數）"""
+        algorithm = algorithm or self.limiter.algorithm
+        if algorithm != "gcra" or self.lease_fraction <= 0 or not self.limiter.redis:
+            return self.limiter.is_allowed(identifier, limit, window, algorithm=algorithm, now=now)
+
+        now = now if now is not None else time.time()
+        key = (identifier, limit, window)
+
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease and now < lease.expires_at:
+                if lease.tokens > 0:
+                    lease.tokens -= 1
+                    self.stats["local"] += 1
+                    return True, self._info(limit, lease, True, now)
+                if now < lease.retry_at:
+                    self.stats["local"] += 1
+                    return False, self._info(limit, lease, False, now)
+            # 租約過期或用完：未用的額度在下次租用時一併歸還
+            returned = self._leases.pop(key).tokens if lease else 0
+
+        try:
+            granted, retry_ms, reset_ms = self._acquire(identifier, limit, window, now, returned)
+        except (CircuitOpenError, redis.RedisError) as e:
+            logger.error(f"Rate limiter lease error: {e}")
+            return self.limiter.use_fallback(identifier, limit, window, now)
+
+        reset = int(reset_ms) / 1000
+        with self._lock:
+            self.stats["remote"] += 1
+            if granted > 0:
+                lease = _Lease(granted - 1, now + window * self.lease_fraction, 0.0, reset)
+            else:
+                retry_at = now + int(retry_ms) / 1000
+                lease = _Lease(0, retry_at, retry_at, reset)
+
+            current = self._leases.get(key)
+            if current and now < current.expires_at and current.tokens > 0:
+                # 同時有其他執行緒租到額度：合併
+                lease.tokens += current.tokens
+                lease.retry_at = 0.0
+                lease.expires_at = min(lease.expires_at, current.expires_at) if granted else current.expires_at
+            self._leases[key] = lease
+            if len(self._leases) > self.max_leases:
+                self._prune(now)
+
+        return granted > 0, self._info(limit, lease, granted > 0, now)
+
+    def _acquire(self, identifier: str, limit: int, window: int, now: float, returned: int):
+        """向 Redis 租用額度"""
+        if self._script is None:
+            self._script = self.limiter.redis.register_script(_GCRA_LEASE_SCRIPT)
+        want = max(1, math.ceil(limit * self.lease_fraction))
+        granted, retry_ms, reset_ms = self.limiter.call_redis(lambda: self._script(
+            keys=[f"rate_limit:gcra:{identifier}"],
+            args=[int(now * 1000), limit, window * 1000, want, returned]
+        ))
+        return int(granted), retry_ms, reset_ms
+
+    def _prune(self, now: float):
+        """移除已過期的租約（過期租約的額度由 GCRA 自然恢復）"""
+        expired = [key for key, lease in self._leases.items() if lease.expires_at <= now]
+        for key in expired:
+            del self._leases[key]
+
+    @staticmethod
+    def _info(limit: int, lease: _Lease, allowed: bool, now: float) -> Dict:
+        return {
+            "allowed": allowed,
+            "limit": limit,
+            "remaining": lease.tokens,
+            "reset": int(math.ceil(lease.reset)),
+            "retry_after": None if allowed else max(1, int(math.ceil(lease.retry_at - now)))
+        }
+
+
+def line_user_key(user_id: str) -> str:
+    """
+    LINE 用戶 ID 的匿名化鍵（SHA-256 前 16 碼）
+    內建 hash() 每個行程的結果不同，不能作為跨執行個體共用的計數鍵
+    """
+    return hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:16]
+
+
+class UserRateLimiter:
+    """
+    LINE 用戶層級速率限制
+    webhook 請求都來自 LINE 伺服器，因此在簽章驗證後逐事件依匿名化用戶 ID 檢查，
+    收錄訊息、搜尋、觸發廣播生成各有獨立額度；透過 LeasedRateLimiter 在本機扣減
+    """
+
+    def __init__(self, limiter: LeasedRateLimiter, limits: Dict[str, Dict] = None):
+        """
+        初始化用戶層級限制
+
+        Args:
+            limiter: 本機租用額度的速率限制器
+            limits: {動作: {"requests", "window"}}（預設為 UserRateLimits）
+        """
+        self.limiter = limiter
+        self.limits = limits or {
+            "chat": UserRateLimits.CHAT,
+            "search": UserRateLimits.SEARCH,
+            "broadcast": UserRateLimits.BROADCAST
+        }
+
+    def check(self, user_id: Optional[str], action: str) -> Tuple[bool, Dict]:
+        """檢查用戶的某個動作是否允許（沒有用戶 ID 的事件不限制）"""
+        limit = self.limits[action]
+        if not user_id:
+            return True, {"allowed": True, "limit": limit["requests"], "remaining": limit["requests"], "reset": 0}
+
+        allowed, info = self.limiter.is_allowed(
+            f"line:{action}:{line_user_key(user_id)}", limit["requests"], limit["window"]
+        )
+        if not allowed:
+            logger.info(f"用戶層級限制: {action} 超過 {limit['requests']}/{limit['window']}s")
+        return allowed, info
+
+
 # 全域速率限制器實例
 rate_limiter = RateLimiter()
+leased_rate_limiter = LeasedRateLimiter(
+    rate_limiter, lease_fraction=float(os.getenv('RATE_LIMIT_LEASE_FRACTION', '0.1'))
+)
 
 
-def rate_limit(requests: int = 60, window: int = 60, identifier_func: Optional[callable] = None):
+def rate_limit(requests: int = 60, window: int = 60, identifier_func: Optional[callable] = None,
+               algorithm: Optional[str] = None):
     """
     速率限制裝飾器
     
@@ -158,6 +462,7 @@ def rate_limit(requests: int = 60, window: int = 60, identifier_func: Optional[c
         requests: 時間窗口內允許的請求數
         window: 時間窗口（秒）
         identifier_func: 自定義識別符函數
+        algorithm: 速率限制演算法（預設使用 rate_limiter.algorithm）
     """
     def decorator(f):
         @wraps(f)
@@ -169,7 +474,7 @@ def rate_limit(requests: int = 60, window: int = 60, identifier_func: Optional[c
                 identifier = rate_limiter.get_identifier()
             
             # 檢查速率限制
-            allowed, info = rate_limiter.is_allowed(identifier, requests, window)
+            allowed, info = leased_rate_limiter.is_allowed(identifier, requests, window, algorithm=algorithm)
             
             # 設置響應頭
             g.rate_limit_headers = {
@@ -214,8 +519,8 @@ def add_rate_limit_headers(response):
 class RateLimits:
     """預定義的速率限制設定"""
     
-    # Webhook 端點：每分鐘 120 次（LINE 平台限制）
-    WEBHOOK = {"requests": 120, "window": 60}
+    # Webhook 端點：請求都來自 LINE 伺服器，只防止灌爆（用戶層級見 UserRateLimits）
+    WEBHOOK = {"requests": 3000, "window": 60}
     
     # 廣播端點：每小時 5 次
     BROADCAST = {"requests": 5, "window": 3600}
@@ -230,6 +535,23 @@ class RateLimits:
     HEALTH = {"requests": 60, "window": 60}
 
 
+class UserRateLimits:
+    """LINE 用戶層級的速率限制設定（每位用戶）"""
+    
+    # 收錄到廣播池的訊息：每分鐘 20 則
+    CHAT = {"requests": 20, "window": 60}
+    
+    # 網路搜尋：每 10 分鐘 5 次（Custom Search API 每日配額有限）
+    SEARCH = {"requests": 5, "window": 600}
+    
+    # 訊息達門檻時觸發廣播生成：每小時 1 次
+    BROADCAST = {"requests": 1, "window": 3600}
+
+
+# 用戶層級限制租用較大比例的額度，讓連續發言只需一次 Redis 往返
+user_rate_limiter = UserRateLimiter(LeasedRateLimiter(rate_limiter, lease_fraction=0.25))
+
+
 # 使用範例
 if __name__ == "__main__":
     # 測試速率限制器
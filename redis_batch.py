@@ -0,0 +1,158 @@
+"""
+請求範圍的 Redis 指令批次
+一個 webhook 事件會發出許多彼此獨立的 Redis 指令，各自一次往返。
+請求期間不需要結果的寫入（統計計數、指標、快取回填）先排入批次，請求結束時每個連線池以一個 pipeline 送出；
+同時需要的多個讀取以 read_many 一次往返取得。沒有進行中的批次時（排程、測試），deferred 的寫入照常立即執行
+"""
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_current_batch: ContextVar[Optional["RequestBatch"]] = ContextVar("redis_request_batch", default=None)
+
+
+class RequestBatch:
+    """
+    一個請求的延後寫入與往返統計
+    延後的寫入在請求結束才送出，同一請求內之後的讀取看不到；只延後請求中不會再讀回的鍵
+    """
+
+    def __init__(self):
+        self._groups: Dict[int, Tuple[Any, List[Tuple[str, tuple, dict]]]] = {}  # 連線池 → (用戶端, 指令)
+        self.round_trips = 0
+        self.commands = 0
+        self.deferred = 0
+        self._token = None
+
+    def __enter__(self) -> "RequestBatch":
+        self._token = _current_batch.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.flush()
+        finally:
+            _current_batch.reset(self._token)
+            self._token = None
+
+    def defer(self, client, command: str, *args, **kwargs):
+        """排入延後寫入（同一連線池的指令合併在一個 pipeline）"""
+        group = self._groups.setdefault(id(client.connection_pool), (client, []))
+        group[1].append((command, args, kwargs))
+        self.deferred += 1
+
+    def flush(self) -> int:
+        """送出延後的寫入；失敗只記錄（延後的都是盡力而為的寫入），回傳送出的指令數"""
+        groups, self._groups = self._groups, {}
+        sent = 0
+        for client, commands in groups.values():
+            pipe = client.pipeline(transaction=False)
+            for command, args, kwargs in commands:
+                getattr(pipe, command)(*args, **kwargs)
+            try:
+                results = pipe.execute(raise_on_error=False)
+            except Exception as e:
+                logger.warning(f"延後的 Redis 寫入失敗（{len(commands)} 個指令）: {e}")
+                continue
+            sent += len(commands)
+            for (command, args, _), result in zip(commands, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"延後的 Redis 指令失敗 {command} {args[:1]}: {result}")
+        return sent
+
+    def stats(self) -> Dict[str, int]:
+        """本次請求的 Redis 指令數與實際往返次數（未批次時兩者相同）"""
+        return {
+            "commands": self.commands,
+            "round_trips": self.round_trips,
+            "deferred": self.deferred,
+            "saved": self.commands - self.round_trips
+        }
+
+
+class _DeferredWriter:
+    """把指令呼叫排入請求批次的代理"""
+
+    def __init__(self, batch: RequestBatch, client):
+        self._batch = batch
+        self._client = client
+
+    def __getattr__(self, command: str):
+        def queue(*args, **kwargs):
+            self._batch.defer(self._client, command, *args, **kwargs)
+            return self
+        return queue
+
+
+def current_batch() -> Optional[RequestBatch]:
+    return _current_batch.get()
+
+
+def record_round_trip(commands: int = 1):
+    """記錄一次 Redis 往返（由用戶端在送出指令或 pipeline 時呼叫）"""
+    batch = _current_batch.get()
+    if batch is not None:
+        batch.round_trips += 1
+        batch.commands += commands
+
+
+@contextmanager
+def deferred(client):
+    """
+    取得寫入用的物件：有請求批次時排入批次，否則就是用戶端本身（立即執行，錯誤照常拋出）
+
+        with deferred(redis_client) as writer:
+            writer.hincrby(key, "count", 1)
+            writer.expire(key, 86400)
+    """
+    batch = _current_batch.get()
+    yield _DeferredWriter(batch, client) if batch is not None else client
+
+
+def read_many(client, calls: Sequence[Tuple]) -> List[Any]:
+    """
+    以一次往返執行多個彼此獨立的讀取，例如 [("get", key1), ("smembers", key2)]；
+    沒有 pipeline 的讀取端（用戶端快取）逐一讀取
+    """
+    if not calls:
+        return []
+    if not hasattr(client, "pipeline"):
+        return [getattr(client, command)(*args) for command, *args in calls]
+    pipe = client.pipeline(transaction=False)
+    for command, *args in calls:
+        getattr(pipe, command)(*args)
+    return pipe.execute()
+
+
+def install(app, on_finish=None):
+    """
+    為 Flask app 的每個請求建立批次，請求結束（含發生例外）時送出
+
+    Args:
+        app: Flask app
+        on_finish: 請求結束時以 (端點, 統計) 呼叫，例如記錄到效能儀表板
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _begin_redis_batch():
+        g.redis_batch = RequestBatch().__enter__()
+
+    @app.teardown_request
+    def _finish_redis_batch(exc):
+        batch = g.pop("redis_batch", None)
+        if batch is None:
+            return
+        batch.__exit__(None, None, None)
+        stats = batch.stats()
+        if stats["commands"]:
+            logger.debug(f"Redis 往返 {request.endpoint}: {stats}")
+        if on_finish and stats["commands"]:
+            try:
+                on_finish(request.endpoint or "unknown", stats)
+            except Exception as e:
+                logger.warning(f"記錄 Redis 往返統計失敗: {e}")
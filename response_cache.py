@@ -3,35 +3,54 @@ Response Caching Module - 減少重複計算和 API 呼叫
 實現 LRU 快取機制以提升效能
 """
 
+import sys
+import math
 import time
 import json
+import uuid
+import random
 import hashlib
-from typing import Any, Optional, Dict, Callable
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Optional, Dict, Callable, List
 from functools import wraps
 import logging
 
+from cache_codec import codec_for_client
+
 logger = logging.getLogger(__name__)
 
 
 class ResponseCache:
     """回應快取實作 - 使用 Redis 作為後端"""
     
-    def __init__(self, redis_client=None, default_ttl: int = 300):
+    def __init__(self, redis_client=None, default_ttl: int = 300, codec=None):
         """
         初始化快取
         
         Args:
-            redis_client: Redis 客戶端
+            redis_client: Redis 客戶端（二進位連線可使用 msgpack 編碼）
             default_ttl: 預設快取時間（秒）
+            codec: 序列化編碼器（預設依連線型態自動選擇，見 cache_codec）
         """
         self.redis = redis_client
         self.default_ttl = default_ttl
+        self.codec = codec or codec_for_client(redis_client)
         self.cache_prefix = "cache:response:"
         self.stats = {
             "hits": 0,
             "misses": 0,
-            "errors": 0
+            "errors": 0,
+            "loads": 0,
+            "coalesced": 0,
+            "stale_served": 0,
+            "early_refreshes": 0
         }
+        
+        # 防止快取擊穿：行程內進行中的計算與跨執行個體鎖的逾時
+        self.lock_timeout = 10.0
+        self._flights: Dict[str, "_Flight"] = {}
+        self._flights_lock = threading.Lock()
     
     def _generate_key(self, func_name: str, args: tuple, kwargs: dict) -> str:
         """生成快取鍵值"""
@@ -55,7 +74,7 @@ class ResponseCache:
             cached_data = self.redis.get(key)
             if cached_data:
                 self.stats["hits"] += 1
-                return json.loads(cached_data)
+                return self.codec.decode(cached_data)
             self.stats["misses"] += 1
             return None
         except Exception as e:
@@ -63,31 +82,73 @@ class ResponseCache:
             self.stats["errors"] += 1
             return None
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """設定快取資料"""
+    def set(self, key: str, value: Any, ttl: Optional[int] = None,
+            tags: Optional[List[str]] = None) -> bool:
+        """
+        設定快取資料
+        
+        Args:
+            tags: 標籤（例如 "user:<id>"），之後可用 invalidate_tag 一次清除同標籤的項目
+        """
         if not self.redis:
             return False
             
         try:
             ttl = ttl or self.default_ttl
-            serialized = json.dumps(value, default=str, ensure_ascii=False)
-            self.redis.setex(key, ttl, serialized)
+            serialized = self.codec.encode(value)
+            self._write(key, serialized, ttl, tags)
             return True
         except Exception as e:
             logger.error(f"快取寫入錯誤: {e}")
             self.stats["errors"] += 1
             return False
     
-    def delete(self, pattern: str) -> int:
-        """刪除符合模式的快取"""
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.cache_prefix}tag:{tag}"
+    
+    def _write(self, key: str, serialized: str, ttl: int, tags: Optional[List[str]] = None):
+        """寫入 Redis；有標籤時以腳本同時登記到標籤集合（集合存活時間不短於項目）"""
+        if not tags:
+            self.redis.setex(key, ttl, serialized)
+            return
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        self.redis.eval(_SET_WITH_TAGS_SCRIPT, 1 + len(tag_keys), key, *tag_keys, serialized, ttl)
+    
+    def _invalidate_tag_keys(self, tag: str) -> List[str]:
+        """刪除標籤下的所有項目，回傳被刪除的鍵（O(標籤內項目數)）"""
+        if not self.redis:
+            return []
+        try:
+            keys = self.redis.eval(_INVALIDATE_TAG_SCRIPT, 1, self._tag_key(tag)) or []
+            return [key.decode() if isinstance(key, bytes) else key for key in keys]
+        except Exception as e:
+            logger.error(f"快取標籤清除錯誤: {e}")
+            self.stats["errors"] += 1
+            return []
+    
+    def invalidate_tag(self, tag: str) -> int:
+        """清除標籤下的所有快取項目"""
+        return len(self._invalidate_tag_keys(tag))
+    
+    def delete(self, pattern: str, batch_size: int = 500) -> int:
+        """
+        刪除符合模式的快取（管理用備援）
+        以 SCAN 分批掃描，不會像 KEYS 一樣阻塞 Redis；一般失效請使用 invalidate_tag
+        """
         if not self.redis:
             return 0
             
         try:
-            keys = self.redis.keys(f"{self.cache_prefix}{pattern}*")
-            if keys:
-                return self.redis.delete(*keys)
-            return 0
+            deleted = 0
+            batch = []
+            for key in self.redis.scan_iter(match=f"{self.cache_prefix}{pattern}*", count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += self.redis.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += self.redis.unlink(*batch)
+            return deleted
         except Exception as e:
             logger.error(f"快取刪除錯誤: {e}")
             return 0
@@ -103,9 +164,174 @@ class ResponseCache:
             "hit_rate": round(hit_rate, 2)
         }
     
-    def cache(self, ttl: Optional[int] = None, key_prefix: Optional[str] = None):
-        """快取裝飾器"""
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Optional[int] = None,
+                    stale_ttl: Optional[int] = None, beta: float = 1.0,
+                    tags: Optional[List[str]] = None) -> Any:
+        """
+        讀取快取，必要時以 loader 重新計算（防止快取擊穿）
+        
+        - 同一行程內同一個鍵只會有一個 loader 在執行，其餘請求等待其結果
+        - 跨執行個體以 Redis 鎖協調，沒拿到鎖的一方等待對方寫入
+        - 過期後 stale_ttl 秒內仍回傳舊值，並在背景更新
+        - 接近過期時依計算耗時以機率提前更新（XFetch）
+        
+        Args:
+            key: 快取鍵
+            loader: 重新計算的函數
+            ttl: 新鮮時間（秒）
+            stale_ttl: 過期後仍可回傳舊值的時間（秒，預設與 ttl 相同）
+            beta: 提前更新的積極程度（越大越早更新）
+            tags: 寫入時登記的標籤
+        """
+        ttl = ttl or self.default_ttl
+        stale_ttl = ttl if stale_ttl is None else stale_ttl
+        
+        envelope = self.get(key)
+        if _is_envelope(envelope):
+            now = time.time()
+            if now < envelope["exp"]:
+                # XFetch：剩餘時間越短、計算越久，越可能提前更新
+                if now - envelope["delta"] * beta * math.log(random.random() or 1e-12) >= envelope["exp"]:
+                    self.stats["early_refreshes"] += 1
+                    self._refresh_in_background(key, loader, ttl, stale_ttl, tags)
+                return envelope["v"]
+            
+            self.stats["stale_served"] += 1
+            self._refresh_in_background(key, loader, ttl, stale_ttl, tags)
+            return envelope["v"]
+        
+        return self._load_single_flight(key, loader, ttl, stale_ttl, tags)
+    
+    def refresh(self, key: str, loader: Callable[[], Any], ttl: Optional[int] = None,
+                stale_ttl: Optional[int] = None, tags: Optional[List[str]] = None) -> Any:
+        """立即重新計算並寫入（例如新廣播產生後），讀取端不會遇到未命中"""
+        ttl = ttl or self.default_ttl
+        return self._store_loaded(key, loader, ttl, ttl if stale_ttl is None else stale_ttl, tags)
+    
+    def _store_loaded(self, key: str, loader: Callable[[], Any], ttl: int, stale_ttl: int,
+                      tags: Optional[List[str]] = None) -> Any:
+        """執行 loader 並以含邏輯過期時間的格式寫入"""
+        start = time.time()
+        value = loader()
+        delta = time.time() - start
+        self.stats["loads"] += 1
+        self.set(key, {_ENVELOPE_MARK: 1, "v": value, "exp": time.time() + ttl, "delta": delta},
+                 math.ceil(ttl + stale_ttl), tags=tags)
+        return value
+    
+    def _begin_flight(self, key: str):
+        """登記行程內的計算；已有其他執行緒在計算時回傳 (該計算, False)"""
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+    
+    def _end_flight(self, key: str, flight: "_Flight"):
+        with self._flights_lock:
+            self._flights.pop(key, None)
+        flight.done.set()
+    
+    def _load_single_flight(self, key: str, loader: Callable[[], Any], ttl: int, stale_ttl: int,
+                            tags: Optional[List[str]] = None) -> Any:
+        """未命中：同一個鍵只讓一個請求呼叫 loader"""
+        flight, leader = self._begin_flight(key)
+        if not leader:
+            self.stats["coalesced"] += 1
+            if flight.done.wait(self.lock_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                if flight.loaded:
+                    return flight.value
+            # 逾時或背景更新讓給了其他執行個體
+            return self._load_with_lock(key, loader, ttl, stale_ttl, tags)
+        
+        try:
+            flight.value = self._load_with_lock(key, loader, ttl, stale_ttl, tags)
+            flight.loaded = True
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            self._end_flight(key, flight)
+    
+    def _load_with_lock(self, key: str, loader: Callable[[], Any], ttl: int, stale_ttl: int,
+                        tags: Optional[List[str]] = None) -> Any:
+        """取得跨執行個體鎖後計算；其他執行個體正在計算時等待其結果"""
+        token = self._acquire_lock(key)
+        if token is None:
+            deadline = time.time() + self.lock_timeout
+            while time.time() < deadline:
+                time.sleep(0.05)
+                envelope = self.get(key)
+                if _is_envelope(envelope):
+                    self.stats["coalesced"] += 1
+                    return envelope["v"]
+            logger.warning(f"等待其他執行個體計算逾時，自行計算: {key}")
+        
+        try:
+            return self._store_loaded(key, loader, ttl, stale_ttl, tags)
+        finally:
+            if token:
+                self._release_lock(key, token)
+    
+    def _refresh_in_background(self, key: str, loader: Callable[[], Any], ttl: int, stale_ttl: int,
+                               tags: Optional[List[str]] = None):
+        """背景更新（本行程或其他執行個體已在更新時略過）"""
+        flight, leader = self._begin_flight(key)
+        if not leader:
+            return
+        
+        def refresh():
+            token = self._acquire_lock(key)
+            try:
+                if token is not None:
+                    flight.value = self._store_loaded(key, loader, ttl, stale_ttl, tags)
+                    flight.loaded = True
+            except Exception as e:
+                logger.warning(f"背景更新快取失敗 {key}: {e}")
+            finally:
+                if token:
+                    self._release_lock(key, token)
+                self._end_flight(key, flight)
+        
+        threading.Thread(target=refresh, name=f"cache-refresh:{key}", daemon=True).start()
+    
+    def _acquire_lock(self, key: str) -> Optional[str]:
+        """取得 Redis 鎖；沒有 Redis 時視為取得（只需行程內協調）"""
+        token = uuid.uuid4().hex
+        if not self.redis:
+            return token
+        try:
+            if self.redis.set(f"lock:{key}", token, nx=True, px=int(self.lock_timeout * 1000)):
+                return token
+            return None
+        except Exception as e:
+            logger.warning(f"快取鎖取得失敗，改為行程內協調: {e}")
+            return token
+    
+    def _release_lock(self, key: str, token: str):
+        """只釋放自己持有的鎖"""
+        if not self.redis:
+            return
+        try:
+            self.redis.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            logger.warning(f"快取鎖釋放失敗: {e}")
+
+    def cache(self, ttl: Optional[int] = None, key_prefix: Optional[str] = None,
+              tags: Optional[Callable[..., List[str]]] = None):
+        """
+        快取裝飾器
+        
+        Args:
+            tags: 由呼叫參數產生額外標籤的函數，例如 lambda user_id: [f"user:{user_id}"]
+        """
         def decorator(func: Callable) -> Callable:
+            func_tag = f"func:{key_prefix or ''}{func.__name__}"
+            
             @wraps(func)
             def wrapper(*args, **kwargs):
                 # 生成快取鍵
@@ -124,68 +350,414 @@ class ResponseCache:
                 # 執行函數
                 result = func(*args, **kwargs)
                 
-                # 存入快取
-                self.set(cache_key, result, ttl)
+                # 存入快取（登記到函數標籤與額外標籤）
+                entry_tags = [func_tag] + (list(tags(*args, **kwargs)) if tags else [])
+                self.set(cache_key, result, ttl, tags=entry_tags)
                 
                 return result
             
             # 添加清除快取的方法
-            wrapper.clear_cache = lambda: self.delete(f"{key_prefix or ''}{func.__name__}")
+            wrapper.clear_cache = lambda: self.invalidate_tag(func_tag)
             
             return wrapper
         return decorator
 
 
+_ENVELOPE_MARK = "__swr__"
+
+# 寫入項目並登記到各標籤集合；標籤集合的存活時間延長到至少與項目相同
+_SET_WITH_TAGS_SCRIPT = """
+redis.call('setex', KEYS[1], ARGV[2], ARGV[1])
+for i = 2, #KEYS do
+    redis.call('sadd', KEYS[i], KEYS[1])
+    if redis.call('ttl', KEYS[i]) < tonumber(ARGV[2]) then
+        redis.call('expire', KEYS[i], ARGV[2])
+    end
+end
+return 1
+"""
+
+# 刪除標籤集合中的所有項目與集合本身，回傳被刪除的鍵
+_INVALIDATE_TAG_SCRIPT = """
+local members = redis.call('smembers', KEYS[1])
+for i = 1, #members, 500 do
+    redis.call('del', unpack(members, i, math.min(i + 499, #members)))
+end
+redis.call('del', KEYS[1])
+return members
+"""
+
+# 只刪除值仍為自己 token 的鎖
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _is_envelope(value: Any) -> bool:
+    return isinstance(value, dict) and value.get(_ENVELOPE_MARK) == 1
+
+
+class _Flight:
+    """行程內一次進行中的計算"""
+    __slots__ = ("done", "value", "error", "loaded")
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.loaded = False
+
+
 class LocalMemoryCache:
-    """本地記憶體快取 - 用於極高頻率的查詢"""
+    """
+    本地記憶體快取 - 用於極高頻率的查詢
+    以 OrderedDict 實作 LRU（存取時移到尾端、淘汰最前端，皆為 O(1)），
+    可同時限制項目數與近似記憶體用量；過期項目於讀取時移除，並由背景執行緒定期清掃
+    """
     
-    def __init__(self, max_size: int = 1000, default_ttl: int = 60):
+    def __init__(self, max_size: int = 1000, default_ttl: int = 60,
+                 max_bytes: Optional[int] = None, sweep_interval: float = 30.0):
         """
         初始化本地快取
         
         Args:
             max_size: 最大快取項目數
             default_ttl: 預設快取時間（秒）
+            max_bytes: 近似記憶體用量上限（None 表示不限制）
+            sweep_interval: 背景清掃過期項目的間隔（秒，0 表示不啟動）
         """
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
         self.max_size = max_size
         self.default_ttl = default_ttl
-        self.access_times: Dict[str, float] = {}
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.size_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_sweeper = threading.Event()
+    
+    def __len__(self) -> int:
+        return len(self.cache)
     
     def get(self, key: str) -> Optional[Any]:
         """獲取快取項目"""
-        if key in self.cache:
-            item = self.cache[key]
-            if time.time() < item["expires_at"]:
-                self.access_times[key] = time.time()
-                return item["value"]
-            else:
-                # 過期，刪除
-                del self.cache[key]
-                if key in self.access_times:
-                    del self.access_times[key]
-        return None
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry.value
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """設定快取項目"""
-        # 如果超過大小限制，移除最少使用的項目
-        if len(self.cache) >= self.max_size:
-            # LRU 淘汰策略
-            lru_key = min(self.access_times, key=self.access_times.get)
-            del self.cache[lru_key]
-            del self.access_times[lru_key]
-        
+        """設定快取項目（超過項目數或記憶體上限時淘汰最久未使用者）"""
         ttl = ttl or self.default_ttl
-        self.cache[key] = {
-            "value": value,
-            "expires_at": time.time() + ttl
-        }
-        self.access_times[key] = time.time()
+        entry = _CacheEntry(value, time.time() + ttl, _approximate_size(value))
+        
+        with self._lock:
+            if key in self.cache:
+                self._remove(key)
+            self.cache[key] = entry
+            self.size_bytes += entry.size
+            
+            while len(self.cache) > self.max_size or (
+                self.max_bytes is not None and self.size_bytes > self.max_bytes and len(self.cache) > 1
+            ):
+                oldest = next(iter(self.cache))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+        
+        if self._sweeper is None and self.sweep_interval:
+            self._start_sweeper()
+    
+    def _remove(self, key: str) -> None:
+        """移除項目（呼叫端需持有鎖）"""
+        entry = self.cache.pop(key)
+        self.size_bytes -= entry.size
+    
+    def delete(self, key: str) -> None:
+        """刪除單一項目"""
+        with self._lock:
+            if key in self.cache:
+                self._remove(key)
+    
+    def delete_prefix(self, prefix: str) -> None:
+        """刪除以 prefix 開頭的所有項目"""
+        with self._lock:
+            for key in [k for k in self.cache if k.startswith(prefix)]:
+                self._remove(key)
     
     def clear(self) -> None:
         """清空快取"""
-        self.cache.clear()
-        self.access_times.clear()
+        with self._lock:
+            self.cache.clear()
+            self.size_bytes = 0
+    
+    def sweep(self, batch_size: int = 1000) -> int:
+        """移除所有過期項目（分批持有鎖，避免長時間阻塞讀寫）"""
+        with self._lock:
+            keys = list(self.cache)
+        
+        removed = 0
+        for start in range(0, len(keys), batch_size):
+            now = time.time()
+            with self._lock:
+                for key in keys[start:start + batch_size]:
+                    entry = self.cache.get(key)
+                    if entry is not None and entry.expires_at <= now:
+                        self._remove(key)
+                        self.stats["expirations"] += 1
+                        removed += 1
+        return removed
+    
+    def _start_sweeper(self) -> None:
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="local-cache-sweeper", daemon=True)
+        self._sweeper.start()
+    
+    def _sweep_loop(self) -> None:
+        while not self._stop_sweeper.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"本地快取清掃失敗: {e}")
+    
+    def close(self) -> None:
+        """停止背景清掃"""
+        self._stop_sweeper.set()
+
+
+class _CacheEntry:
+    __slots__ = ("value", "expires_at", "size")
+    
+    def __init__(self, value: Any, expires_at: float, size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
+def _approximate_size(value: Any, depth: int = 3) -> int:
+    """估算物件佔用的位元組數（遞迴有限層數的容器）"""
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+    if isinstance(value, dict):
+        size += sum(_approximate_size(k, depth - 1) + _approximate_size(v, depth - 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_approximate_size(item, depth - 1) for item in value)
+    return size
+
+
+class TieredCache(ResponseCache):
+    """
+    兩層快取：L1 為行程內 LocalMemoryCache，L2 為 Redis
+    寫入與刪除透過 Redis 頻道廣播，讓其他 worker / 執行個體丟棄過期的 L1 項目
+    """
+    
+    INVALIDATION_CHANNEL = "cache:invalidate"
+    
+    def __init__(self, redis_client=None, default_ttl: int = 300, local_ttl: int = 30,
+                 local_max_size: int = 1000, local_max_bytes: Optional[int] = 32 * 1024 * 1024,
+                 dashboard=None, listen: bool = True, codec=None):
+        """
+        初始化兩層快取
+        
+        Args:
+            redis_client: Redis 客戶端
+            default_ttl: L2 預設快取時間（秒）
+            local_ttl: L1 最長保留時間（秒），限制錯過失效通知時的過期時間
+            local_max_size: L1 最大項目數
+            local_max_bytes: L1 近似記憶體上限（位元組）
+            dashboard: PerformanceDashboard（記錄各命名空間命中率）
+            listen: 是否啟動失效通知訂閱執行緒
+            codec: 序列化編碼器（L1 也保存編碼後的內容，每次讀取都回傳新物件）
+        """
+        super().__init__(redis_client, default_ttl, codec)
+        self.local = LocalMemoryCache(max_size=local_max_size, default_ttl=local_ttl,
+                                      max_bytes=local_max_bytes)
+        self.local_ttl = local_ttl
+        self.dashboard = dashboard
+        self.instance_id = uuid.uuid4().hex
+        self.stats.update({"l1_hits": 0, "l2_hits": 0, "invalidations": 0})
+        self.namespace_stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+        )
+        
+        self._pubsub = None
+        self._listener = None
+        if redis_client and listen:
+            self._start_listener()
+    
+    def _start_listener(self):
+        """訂閱失效通知頻道（背景執行緒）"""
+        try:
+            self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{self.INVALIDATION_CHANNEL: self._on_invalidation})
+            self._listener = self._pubsub.run_in_thread(
+                sleep_time=1.0, daemon=True, exception_handler=self._on_listener_error
+            )
+        except Exception as e:
+            logger.warning(f"無法訂閱快取失效通知，L1 僅依 TTL 過期: {e}")
+    
+    def _on_listener_error(self, error, pubsub, thread):
+        """訂閱中斷期間可能錯過通知，清空 L1 以免讀到舊資料"""
+        logger.warning(f"快取失效通知中斷: {error}")
+        self.local.clear()
+        time.sleep(1.0)
+    
+    def _on_invalidation(self, message):
+        """處理其他執行個體發出的失效通知"""
+        try:
+            payload = json.loads(message["data"])
+        except (TypeError, ValueError):
+            return
+        if payload.get("origin") == self.instance_id:
+            return
+        
+        self.stats["invalidations"] += 1
+        for key in payload.get("keys", []):
+            self.local.delete(key)
+        if "prefix" in payload:
+            self.local.delete_prefix(payload["prefix"])
+    
+    def _publish_invalidation(self, **payload):
+        try:
+            self.redis.publish(self.INVALIDATION_CHANNEL,
+                               json.dumps({"origin": self.instance_id, **payload}, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"快取失效通知發送失敗: {e}")
+    
+    def _namespace(self, key: str) -> str:
+        """鍵的命名空間（去掉共用前綴後的第一段）"""
+        if key.startswith(self.cache_prefix):
+            key = key[len(self.cache_prefix):]
+        return key.split(":", 1)[0]
+    
+    def _record(self, key: str, level: str):
+        """記錄命中層級：l1 / l2 / miss"""
+        namespace = self._namespace(key)
+        if level == "l1":
+            self.stats["hits"] += 1
+            self.stats["l1_hits"] += 1
+            self.namespace_stats[namespace]["l1_hits"] += 1
+        elif level == "l2":
+            self.stats["hits"] += 1
+            self.stats["l2_hits"] += 1
+            self.namespace_stats[namespace]["l2_hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            self.namespace_stats[namespace]["misses"] += 1
+        if self.dashboard:
+            self.dashboard.record_cache_lookup(namespace, level)
+    
+    def get(self, key: str) -> Optional[Any]:
+        """先查 L1，未命中再查 Redis 並回填 L1"""
+        serialized = self.local.get(key)
+        if serialized is not None:
+            self._record(key, "l1")
+            return self.codec.decode(serialized)
+        
+        if not self.redis:
+            self._record(key, "miss")
+            return None
+        
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            serialized, remaining = pipe.execute()
+        except Exception as e:
+            logger.error(f"快取讀取錯誤: {e}")
+            self.stats["errors"] += 1
+            return None
+        
+        if not serialized:
+            self._record(key, "miss")
+            return None
+        
+        # L1 不可比 L2 活得久
+        if remaining and remaining > 0:
+            self.local.set(key, serialized, ttl=min(self.local_ttl, remaining))
+        self._record(key, "l2")
+        return self.codec.decode(serialized)
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None,
+            tags: Optional[List[str]] = None) -> bool:
+        """寫入兩層快取，並通知其他執行個體丟棄舊的 L1"""
+        ttl = ttl or self.default_ttl
+        serialized = self.codec.encode(value)
+        self.local.set(key, serialized, ttl=min(self.local_ttl, ttl))
+        
+        if not self.redis:
+            return False
+        try:
+            self._write(key, serialized, ttl, tags)
+        except Exception as e:
+            logger.error(f"快取寫入錯誤: {e}")
+            self.stats["errors"] += 1
+            return False
+        
+        self._publish_invalidation(keys=[key])
+        return True
+    
+    def invalidate_tag(self, tag: str) -> int:
+        """清除標籤下的項目（兩層），並通知其他執行個體"""
+        keys = self._invalidate_tag_keys(tag)
+        for key in keys:
+            self.local.delete(key)
+        if keys:
+            self._publish_invalidation(keys=keys)
+        return len(keys)
+    
+    def delete(self, pattern: str, batch_size: int = 500) -> int:
+        """刪除符合模式的快取（兩層），並廣播失效通知"""
+        prefix = f"{self.cache_prefix}{pattern}"
+        self.local.delete_prefix(prefix)
+        deleted = super().delete(pattern, batch_size)
+        if self.redis:
+            self._publish_invalidation(prefix=prefix)
+        return deleted
+    
+    def get_namespace_stats(self) -> Dict[str, Dict]:
+        """各命名空間的 L1 / L2 命中率"""
+        result = {}
+        for namespace, counts in self.namespace_stats.items():
+            total = counts["l1_hits"] + counts["l2_hits"] + counts["misses"]
+            reached_l2 = total - counts["l1_hits"]
+            result[namespace] = {
+                **counts,
+                "total": total,
+                "l1_hit_rate": round(counts["l1_hits"] / total * 100, 2) if total else 0,
+                "l2_hit_rate": round(counts["l2_hits"] / reached_l2 * 100, 2) if reached_l2 else 0
+            }
+        return result
+    
+    def get_stats(self) -> Dict:
+        """獲取快取統計（含各層與各命名空間）"""
+        return {**super().get_stats(), "namespaces": self.get_namespace_stats()}
+    
+    def close(self):
+        """停止訂閱執行緒"""
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+        if self._pubsub:
+            self._pubsub.close()
+            self._pubsub = None
+        self.local.close()
 
 
 # 全域快取實例（需要在 app.py 中初始化）
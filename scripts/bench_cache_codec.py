@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+快取編碼效能比較
+以實際會被快取的內容（統計回覆、廣播回覆、搜尋結果、get_or_load 信封、含 datetime 的用戶資料）
+比較 JSON、msgpack、msgpack+壓縮 的編碼/解碼時間與儲存大小；
+可連上 Redis（REDIS_URL）時以 MEMORY USAGE 量測實際佔用，否則以位元組數代替
+
+用法: python scripts/bench_cache_codec.py [重複次數]
+"""
+
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_codec import JsonCodec, MsgpackCodec, ZSTD_AVAILABLE
+from frequency_bot_firestore import format_broadcast_message, format_stats_message
+
+WORDS = ["天氣", "咖啡", "工作", "週末", "電影", "音樂", "加班", "旅行", "下雨", "晚餐", "考試", "貓咪"]
+
+
+def build_payloads():
+    random.seed(0)
+    now = datetime(2024, 5, 1, 14, 0)
+
+    stats_reply = format_stats_message({
+        "progress_percent": 42,
+        "top_frequencies": [(word, random.randint(5, 80)) for word in WORDS[:5]],
+        "trends": {"current_emotion": "happy",
+                   "turning_points": [{"from": "neutral", "to": "happy"}],
+                   "emerging": ["下雨", "晚餐"]},
+        "contributors": {"total_users": 57,
+                         "top_contributors": [(f"用戶{i}", 30 - i) for i in range(5)]},
+        "time_until_broadcast": {"minutes": 17, "seconds": 3},
+        "message_count": 420
+    })
+
+    content = "".join(f"有人說{random.choice(WORDS)}讓今天變得不一樣，{random.choice(WORDS)}的頻率在空氣中共振。"
+                      for _ in range(40))
+    broadcast_reply = format_broadcast_message({
+        "timestamp": now.timestamp(), "content": content, "message_count": 863
+    })
+
+    search_result = {
+        "success": True,
+        "query": "台北 咖啡廳 推薦",
+        "results": [{"title": f"台北{random.choice(WORDS)}咖啡廳推薦 Top {i}",
+                     "link": f"https://example.com/article/{i}",
+                     "snippet": "這家店的手沖咖啡很有名，平日下午人不多，適合工作或看書。" * 2}
+                    for i in range(5)],
+        "total_results_available": "123000"
+    }
+
+    envelope = {"__swr__": 1, "v": stats_reply, "exp": time.time() + 60, "delta": 0.12}
+
+    user_context = {
+        "user_id": "U1234567890abcdef",
+        "last_seen": now,
+        "joined": now.date(),
+        "badges": {"early_bird", "night_owl", "top_contributor"},
+        "recent_messages": [{"content": f"今天{random.choice(WORDS)}好棒", "timestamp": now - timedelta(minutes=i)}
+                            for i in range(20)]
+    }
+
+    return {
+        "stats_reply": stats_reply,
+        "broadcast_reply": broadcast_reply,
+        "search_result": search_result,
+        "swr_envelope": envelope,
+        "user_context": user_context
+    }
+
+
+def build_codecs():
+    codecs = {
+        "json": JsonCodec(),
+        "msgpack": MsgpackCodec(compress_threshold=1 << 30),
+        "msgpack+zlib": MsgpackCodec(compress_threshold=1024, compression="zlib")
+    }
+    if ZSTD_AVAILABLE:
+        codecs["msgpack+zstd"] = MsgpackCodec(compress_threshold=1024, compression="zstd", level=3)
+    return codecs
+
+
+def time_per_call(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def connect_redis():
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return None
+    try:
+        import redis
+        client = redis.from_url(url)
+        client.ping()
+        return client
+    except Exception as e:
+        print(f"無法連線 Redis（{e}），改以位元組數比較")
+        return None
+
+
+def stored_size(client, name: str, encoded) -> int:
+    """Redis MEMORY USAGE（含鍵與物件額外開銷）；無 Redis 時回傳內容位元組數"""
+    data = encoded.encode() if isinstance(encoded, str) else encoded
+    if client is None:
+        return len(data)
+    key = f"bench:codec:{name}"
+    client.set(key, data)
+    try:
+        return client.memory_usage(key, samples=0)
+    finally:
+        client.delete(key)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    payloads = build_payloads()
+    codecs = build_codecs()
+    client = connect_redis()
+    size_label = "MEMORY USAGE" if client else "bytes"
+
+    print(f"{'payload':<16} {'codec':<14} {'encode µs':>10} {'decode µs':>10} {size_label:>13}")
+    totals = {name: 0 for name in codecs}
+    for payload_name, value in payloads.items():
+        for codec_name, codec in codecs.items():
+            encoded = codec.encode(value)
+            encode_us = time_per_call(lambda: codec.encode(value), repeat)
+            decode_us = time_per_call(lambda: codec.decode(encoded), repeat)
+            size = stored_size(client, f"{payload_name}:{codec_name}", encoded)
+            totals[codec_name] += size
+            print(f"{payload_name:<16} {codec_name:<14} {encode_us:>10.1f} {decode_us:>10.1f} {size:>13}")
+        print()
+
+    baseline = totals["json"]
+    for codec_name, total in totals.items():
+        print(f"{codec_name:<14} 合計 {total:>7} ({total / baseline * 100:.0f}% of json)")
+
+
+if __name__ == "__main__":
+    main()
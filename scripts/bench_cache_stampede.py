@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+快取擊穿壓力測試
+100 個讀取者（分散在 4 個模擬執行個體，共用同一個 Redis）持續讀取統計，
+比較原本「每分鐘一個鍵、未命中就各自計算」與 get_or_load（單一計算 + 過期先回舊值 + 提前更新）
+每分鐘呼叫後端（Firestore）的次數；時間縮放為 1 秒 = 1 分鐘
+
+用法: python scripts/bench_cache_stampede.py [模擬分鐘數]
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakeredis
+from response_cache import ResponseCache
+
+READERS = 100
+INSTANCES = 4
+MINUTE = 1            # 縮放後的一分鐘（秒）
+BACKEND_LATENCY = 0.05
+
+
+class Backend:
+    """模擬 get_frequency_stats：固定延遲並計數"""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(BACKEND_LATENCY)
+        return "📊 即時頻率統計"
+
+
+def legacy_read(cache, backend):
+    """原本 app.py 的做法"""
+    key = f"stats:{int(time.time() / MINUTE)}"
+    value = cache.get(key)
+    if not value:
+        value = backend.load()
+        cache.set(key, value, ttl=MINUTE)
+    return value
+
+
+def guarded_read(cache, backend):
+    return cache.get_or_load("stats:current", backend.load, ttl=MINUTE, stale_ttl=MINUTE)
+
+
+def run_readers(read, minutes: float):
+    server = fakeredis.FakeServer()
+    caches = [ResponseCache(fakeredis.FakeRedis(server=server, decode_responses=True))
+              for _ in range(INSTANCES)]
+    backend = Backend()
+    stop = time.time() + minutes * MINUTE
+    reads = [0] * READERS
+
+    def reader(index):
+        cache = caches[index % INSTANCES]
+        rng = random.Random(index)
+        while time.time() < stop:
+            read(cache, backend)
+            reads[index] += 1
+            time.sleep(rng.uniform(0, 0.02))
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return backend.calls / minutes, sum(reads)
+
+
+def run(minutes: float = 10):
+    print(f"{READERS} 個讀取者 / {INSTANCES} 個執行個體，模擬 {minutes:.0f} 分鐘")
+    legacy_rate, legacy_reads = run_readers(legacy_read, minutes)
+    guarded_rate, guarded_reads = run_readers(guarded_read, minutes)
+    print(f"原本每分鐘鍵:   後端呼叫 {legacy_rate:6.1f} 次/分鐘  (讀取 {legacy_reads} 次)")
+    print(f"get_or_load:    後端呼叫 {guarded_rate:6.1f} 次/分鐘  (讀取 {guarded_reads} 次)")
+
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 10)
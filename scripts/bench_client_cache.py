@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Redis 用戶端快取命中率
+模擬社群指令的熱鍵讀取（votes:current、word_chain:current:*、shelters:*、user:<id>:last_joke_id），
+穿插一定比例的寫入，回報命中率、失效次數與省下的往返次數，並比較直接讀取與經快取讀取的平均延遲
+
+連上 Redis 6 以上（REDIS_URL）時使用真正的 CLIENT TRACKING；否則使用 fakeredis，
+由寫入端代替伺服器發布失效通知（延遲數字僅供參考）
+
+用法: python scripts/bench_client_cache.py [讀取次數] [寫入比例]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from community_features import CommunityFeatures
+from connection_manager import ClientSideCache
+
+USERS = 200
+SHELTERS = 20
+
+
+class StandInCache(ClientSideCache):
+    """fakeredis 不支援 CLIENT TRACKING，略過啟用"""
+
+    def _enable_tracking(self, connection, client_id=None):
+        self.invalidate_all()
+        self.ready = True
+
+
+def connect():
+    url = os.getenv("REDIS_URL")
+    if url:
+        import redis
+        client = redis.from_url(url, decode_responses=True)
+        client.ping()
+        return client, True
+    import fakeredis
+    return fakeredis.FakeRedis(decode_responses=True), False
+
+
+def seed(client):
+    client.set("votes:current", "vote_1")
+    client.hset("word_chain:current:meta", mapping={"current_word": "蘋果", "last_char": "果"})
+    for i in range(SHELTERS):
+        client.sadd("shelters:all", str(i))
+        client.set(f"shelters:{i}", '{"status": "verified", "capacity": 50}')
+    for i in range(USERS):
+        client.set(f"user:{i}:last_joke_id", f"joke_{i}")
+
+
+def workload(count: int, rng: random.Random):
+    """(指令, 鍵) 序列：多數指令讀取全域熱鍵，少數讀取個別用戶的鍵"""
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.35:
+            yield "get", "votes:current"
+        elif roll < 0.65:
+            yield "hgetall", "word_chain:current:meta"
+        elif roll < 0.75:
+            yield "smembers", "shelters:all"
+        elif roll < 0.85:
+            yield "get", f"shelters:{rng.randrange(SHELTERS)}"
+        else:
+            yield "get", f"user:{rng.randrange(USERS)}:last_joke_id"
+
+
+def run(count: int = 20000, write_ratio: float = 0.02):
+    client, real_redis = connect()
+    seed(client)
+    cache_class = ClientSideCache if real_redis else StandInCache
+    cache = cache_class(client, CommunityFeatures.HOT_KEY_PREFIXES)
+    cache.start()
+    rng = random.Random(0)
+    operations = list(workload(count, rng))
+
+    try:
+        start = time.perf_counter()
+        for command, key in operations:
+            getattr(client, command)(key)
+        direct = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for command, key in operations:
+            if command != "smembers" and rng.random() < write_ratio:
+                if command == "get":
+                    client.set(key, client.get(key))
+                else:
+                    client.hset(key, "updated_at", int(time.time()))
+                if not real_redis:
+                    client.publish(ClientSideCache.INVALIDATE_CHANNEL, key)
+            getattr(cache, command)(key)
+        cached = time.perf_counter() - start
+        time.sleep(0.2)  # 等待最後的失效通知
+
+        report = cache.report()
+        print(f"{'Redis' if real_redis else 'fakeredis（代替伺服器發布通知）'}，讀取 {count} 次，寫入比例 {write_ratio:.0%}")
+        print(f"命中率: {report['hit_rate']:.1%}  命中 {report['hits']} / 未命中 {report['misses']}")
+        print(f"失效通知: {report['invalidations']} 個鍵，快取中 {report['keys']} 個鍵")
+        print(f"省下往返: {report['hits']} 次")
+        print(f"平均讀取: 直接 {direct / count * 1e6:.1f}µs，經快取 {cached / count * 1e6:.1f}µs（含寫入）")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 0.02)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+語義嵌入效能比較
+比較 torch / onnx / quantized 三種後端，以及快取與跨執行緒批次合併的延遲與吞吐量
+
+用法: python scripts/bench_embeddings.py [torch onnx quantized]
+"""
+
+import os
+import sys
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_service import EmbeddingService, SENTENCE_TRANSFORMER_AVAILABLE
+
+MESSAGES = [
+    "今天天氣真好，心情也跟著好起來了",
+    "好累啊，想要放鬆一下",
+    "有人要一起玩接龍嗎？",
+    "晚餐吃什麼好呢？火鍋還是燒烤",
+    "哪裡有避難所？我需要物資",
+    "剛剛看到一隻貓在路邊睡覺",
+    "下班了超興奮",
+    "為什麼今天這麼安靜",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def bench_backend(backend: str, threads: int = 8, requests_per_thread: int = 16):
+    """測量單一後端的冷/熱延遲與並發吞吐量"""
+    print(f"\n=== 後端: {backend} ===")
+
+    start = time.perf_counter()
+    service = EmbeddingService(backend=backend, batch_window_ms=0)
+    service.encode("暖身")
+    print(f"模型載入+首次編碼: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    # 單筆延遲（未命中快取）
+    latencies = []
+    for i, message in enumerate(MESSAGES * 4):
+        start = time.perf_counter()
+        service.encode(f"{message} #{i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"單筆（未命中）p50={statistics.median(latencies):.2f} ms  p95={percentile(latencies, 0.95):.2f} ms")
+
+    # 單筆延遲（命中快取）
+    latencies = []
+    for i, message in enumerate(MESSAGES * 4):
+        start = time.perf_counter()
+        service.encode(f"{message} #{i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"單筆（命中快取）p50={statistics.median(latencies) * 1000:.1f} µs")
+
+    # 並發吞吐量：不合併 vs 合併
+    for window_ms in (0, 5):
+        concurrent_service = EmbeddingService(backend=backend, model=service.model, batch_window_ms=window_ms)
+        texts = [f"{MESSAGES[i % len(MESSAGES)]} ({window_ms}-{i})" for i in range(threads * requests_per_thread)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(concurrent_service.encode, texts))
+        elapsed = time.perf_counter() - start
+
+        stats = concurrent_service.get_stats()
+        label = "批次合併" if window_ms else "逐筆呼叫"
+        print(f"{threads} 執行緒 {label}: {len(texts) / elapsed:7.1f} 則/秒  "
+              f"模型呼叫 {stats['model_calls']} 次  平均批次 {stats['avg_batch_size'] or 1}")
+
+
+def main():
+    if not SENTENCE_TRANSFORMER_AVAILABLE:
+        print("sentence_transformers 未安裝，無法執行嵌入效能測試")
+        return
+
+    backends = sys.argv[1:] or ["torch", "onnx", "quantized"]
+    for backend in backends:
+        try:
+            bench_backend(backend)
+        except Exception as e:
+            print(f"後端 {backend} 測試失敗: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+整點分析效能比較
+比較原本逐則訊息的情緒/話題分析迴圈與批次分析引擎（目標：10,000 則 < 1 秒）
+
+用法: python scripts/bench_hour_analysis.py [訊息數]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unittest.mock import MagicMock
+from collective_memory import CollectiveMemorySystem
+from hour_analytics import analyze_hour
+from keyword_automaton import keyword_index
+from bench_keyword_automaton import build_corpus
+
+TARGET_SECONDS = 1.0
+
+
+def legacy_extract_topics(message):
+    """原本的 _extract_topics：每個 2-4 字子字串各做一次正規表示式比對"""
+    topics = []
+    for i in range(len(message) - 1):
+        for length in [2, 3, 4]:
+            if i + length <= len(message):
+                word = message[i:i+length]
+                if re.match(r'^[一-鿿]+$', word):
+                    topics.append(word)
+    if topics:
+        return [word for word, _ in Counter(topics).most_common(3)]
+    return []
+
+
+def legacy_analysis(memory, messages):
+    """原本 _analyze_collective_emotion + _analyze_topic_network 的逐則迴圈"""
+    emotions = Counter(memory._detect_emotion(msg["content"]) for msg in messages)
+    all_topics = []
+    for msg in messages:
+        all_topics.extend(legacy_extract_topics(msg["content"]))
+    return emotions, [topic for topic, _ in Counter(all_topics).most_common(10)]
+
+
+def run(count: int = 10000):
+    memory = CollectiveMemorySystem(MagicMock())
+    base = time.time() - 3600
+    messages = [{"content": text, "timestamp": base + i * 3600 / count}
+                for i, text in enumerate(build_corpus(count, seed=7))]
+
+    keyword_index.clear_memo()
+    start = time.perf_counter()
+    legacy_emotions, legacy_hot = legacy_analysis(memory, messages)
+    legacy_elapsed = time.perf_counter() - start
+
+    keyword_index.clear_memo()
+    start = time.perf_counter()
+    result = analyze_hour(messages, memory._detect_emotion)
+    batch_elapsed = time.perf_counter() - start
+
+    assert result["topics"]["hot_topics"] == legacy_hot, "熱門話題與原本結果不一致"
+    assert result["emotion"]["dominant"] == legacy_emotions.most_common(1)[0][0]
+
+    print(f"訊息數: {count}")
+    print(f"逐則迴圈: {legacy_elapsed * 1000:8.1f} ms")
+    print(f"批次引擎: {batch_elapsed * 1000:8.1f} ms  加速 {legacy_elapsed / batch_elapsed:.1f}x"
+          f"  {'✅' if batch_elapsed < TARGET_SECONDS else '❌'} 目標 < {TARGET_SECONDS:.0f}s")
+    print(f"熱門話題: {result['topics']['hot_topics'][:5]}")
+    print(f"情緒轉折點: {len(result['emotion']['turning_points'])} 個")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+關鍵詞自動機效能比較
+比較原本各模組的巢狀 `keyword in text` 掃描與共用 Aho-Corasick 自動機（含訊息快取）
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unittest.mock import MagicMock
+from keyword_automaton import keyword_index
+from intent_analyzer import IntentAnalyzer
+from collective_memory import CollectiveMemorySystem, FEATURE_USAGE_KEYWORDS
+from optimizations.smart_onboarding import SmartErrorHandler
+
+# 模擬真實對話的訊息樣板
+TEMPLATES = [
+    "今天天氣真好，心情也跟著好起來了",
+    "好累啊，想要放鬆一下😴",
+    "有人要一起玩接龍嗎？",
+    "我也想玩！",
+    "看看統計",
+    "最新廣播是什麼",
+    "哈哈哈太好笑了，再來一個笑話",
+    "晚餐吃什麼好呢？火鍋還是燒烤",
+    "哪裡有避難所？我需要物資",
+    "投票 週末活動/爬山/看電影",
+    "為什麼今天這麼安靜…",
+    "下班了🎉 超興奮",
+    "嗯，還好啦，普通的一天",
+    "剛剛看到一隻貓在路邊睡覺",
+    "今天的頻率共振內容好有趣",
+]
+
+
+def build_corpus(size: int, seed: int = 42):
+    """產生測試語料"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        message = rng.choice(TEMPLATES)
+        if rng.random() < 0.5:
+            message += rng.choice(["", "！", "～", "？", "啊", "耶", "😊"]) * rng.randint(1, 3)
+        corpus.append(message)
+    return corpus
+
+
+def naive_request(message, analyzer, memory, format_keywords):
+    """原本每則訊息的掃描：功能、意圖模式、情緒、功能使用、格式檢查"""
+    for feature, keywords in analyzer.feature_keywords.items():
+        if any(keyword in message for keyword in keywords):
+            break
+
+    for intent_type, patterns in analyzer.intent_patterns.items():
+        for pattern in patterns:
+            if pattern in message:
+                break
+
+    scores = {}
+    for emotion, keywords in memory.emotion_keywords.items():
+        score = sum(1 for keyword in keywords if keyword in message)
+        if score:
+            scores[emotion] = score
+
+    for feature, keywords in FEATURE_USAGE_KEYWORDS.items():
+        if any(keyword in message for keyword in keywords):
+            break
+
+    for feature, keywords in format_keywords.items():
+        if any(keyword in message for keyword in keywords):
+            pass
+
+
+def automaton_request(message):
+    """共用自動機：一次掃描，其餘查詢命中快取"""
+    keyword_index.first_category(message, "feature")
+    keyword_index.categories(message, "intent")
+    keyword_index.keyword_counts(message, "emotion")
+    keyword_index.first_category(message, "feature_usage")
+    keyword_index.categories(message, "command_format")
+
+
+def run(corpus_size: int = 20000):
+    analyzer = IntentAnalyzer(graph=MagicMock())
+    memory = CollectiveMemorySystem(MagicMock())
+    error_handler = SmartErrorHandler()
+    corpus = build_corpus(corpus_size)
+
+    start = time.perf_counter()
+    for message in corpus:
+        naive_request(message, analyzer, memory, error_handler.format_keywords)
+    naive_elapsed = time.perf_counter() - start
+
+    # 冷快取：每則訊息都是第一次出現（只掃描一次，各模組共用結果）
+    start = time.perf_counter()
+    for message in corpus:
+        keyword_index.clear_memo()
+        automaton_request(message)
+    cold_elapsed = time.perf_counter() - start
+
+    # 熱快取：重複出現的訊息（如常用指令）直接命中快取
+    keyword_index.clear_memo()
+    start = time.perf_counter()
+    for message in corpus:
+        automaton_request(message)
+    warm_elapsed = time.perf_counter() - start
+
+    print(f"語料: {corpus_size} 則訊息")
+    print(f"巢狀掃描:         {naive_elapsed * 1000:8.1f} ms ({naive_elapsed / corpus_size * 1e6:.1f} µs/則)")
+    print(f"自動機（冷快取）: {cold_elapsed * 1000:8.1f} ms ({cold_elapsed / corpus_size * 1e6:.1f} µs/則)"
+          f"  加速 {naive_elapsed / cold_elapsed:.1f}x")
+    print(f"自動機（熱快取）: {warm_elapsed * 1000:8.1f} ms ({warm_elapsed / corpus_size * 1e6:.1f} µs/則)"
+          f"  加速 {naive_elapsed / warm_elapsed:.1f}x")
+    print(f"快取統計: {keyword_index.stats}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
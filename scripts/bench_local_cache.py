@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+本地快取效能比較
+比較原本以 min(access_times) 淘汰的 LocalMemoryCache 與 OrderedDict LRU 版本，
+在 1k / 100k 項目、8 個執行緒同時讀寫（80% 讀 / 20% 寫，鍵空間為容量的 2 倍）下的吞吐量
+
+用法: python scripts/bench_local_cache.py [每個執行緒操作數]
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import LocalMemoryCache
+
+THREADS = 8
+
+
+class LegacyLocalMemoryCache:
+    """原本的實作：寫滿後每次寫入以 O(n) 掃描找出最久未使用的項目，且沒有鎖"""
+
+    def __init__(self, max_size: int = 1000, default_ttl: int = 60):
+        self.cache = {}
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.access_times = {}
+
+    def get(self, key):
+        if key in self.cache:
+            item = self.cache[key]
+            if time.time() < item["expires_at"]:
+                self.access_times[key] = time.time()
+                return item["value"]
+            else:
+                del self.cache[key]
+                if key in self.access_times:
+                    del self.access_times[key]
+        return None
+
+    def set(self, key, value, ttl=None):
+        if len(self.cache) >= self.max_size:
+            lru_key = min(self.access_times, key=self.access_times.get)
+            del self.cache[lru_key]
+            del self.access_times[lru_key]
+        ttl = ttl or self.default_ttl
+        self.cache[key] = {"value": value, "expires_at": time.time() + ttl}
+        self.access_times[key] = time.time()
+
+
+def run_workload(cache, capacity: int, ops_per_thread: int):
+    """8 個執行緒同時讀寫，回傳 (每秒操作數, 例外次數)"""
+    for i in range(capacity):
+        cache.set(f"key:{i}", i)
+
+    errors = []
+    barrier = threading.Barrier(THREADS + 1)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        keys = [f"key:{rng.randrange(capacity * 2)}" for _ in range(ops_per_thread)]
+        writes = [rng.random() < 0.2 for _ in range(ops_per_thread)]
+        barrier.wait()
+        for key, write in zip(keys, writes):
+            try:
+                if write:
+                    cache.set(key, key)
+                else:
+                    cache.get(key)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return THREADS * ops_per_thread / elapsed, len(errors)
+
+
+def run(ops_per_thread: int = 5000):
+    print(f"{THREADS} 個執行緒，每個 {ops_per_thread} 次操作")
+    print(f"{'項目數':>8} {'原本 ops/s':>14} {'LRU ops/s':>14} {'加速':>8} {'原本例外':>8}")
+    for capacity in (1000, 100000):
+        legacy_ops, legacy_errors = run_workload(LegacyLocalMemoryCache(max_size=capacity), capacity, ops_per_thread)
+        lru = LocalMemoryCache(max_size=capacity, sweep_interval=0)
+        lru_ops, lru_errors = run_workload(lru, capacity, ops_per_thread)
+        assert lru_errors == 0 and len(lru) <= capacity
+        print(f"{capacity:>8} {legacy_ops:>14,.0f} {lru_ops:>14,.0f} {lru_ops / legacy_ops:>7.0f}x {legacy_errors:>8}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+速率限制演算法比較
+以 120 次/60 秒的限制比較 gcra、sliding_window、sliding_log 的每秒判斷次數，
+以及每個識別符在 Redis 中的記憶體用量（識別符皆已用滿額度）；
+gcra+lease 為 LeasedRateLimiter（本機租用額度），另列出未超量時免連線 Redis 的比例
+
+連上 Redis（REDIS_URL）時以 MEMORY USAGE 量測；否則使用 fakeredis，並以 DUMP 長度近似記憶體
+
+用法: python scripts/bench_rate_limiter.py [每個演算法的判斷次數]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import LeasedRateLimiter, RateLimiter
+
+ALGORITHMS = ["gcra", "gcra+lease", "sliding_window", "sliding_log"]
+IDENTIFIERS = 200
+LIMIT, WINDOW = 120, 60
+
+
+def connect():
+    url = os.getenv("REDIS_URL")
+    if url:
+        import redis
+        client = redis.from_url(url, decode_responses=True)
+        client.ping()
+        return client, True
+    import fakeredis
+    return fakeredis.FakeRedis(decode_responses=True), False
+
+
+def key_size(client, key: str, real_redis: bool) -> int:
+    if real_redis:
+        return client.memory_usage(key, samples=0) or 0
+    dumped = client.dump(key)
+    return len(dumped) if dumped else 0
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    client, real_redis = connect()
+    limit, window = LIMIT, WINDOW
+    limiter = RateLimiter(client)
+    leased = LeasedRateLimiter(limiter)
+
+    print(f"後端: {'Redis' if real_redis else 'fakeredis（記憶體為 DUMP 長度）'}  限制: {limit}/{window}s")
+    print(f"{'algorithm':<16} {'ops/sec':>10} {'bytes/identifier':>18}")
+    for algorithm in ALGORITHMS:
+        client.delete(*client.keys("rate_limit:*") or ["rate_limit:none"])
+
+        # 輪流使用多個識別符，模擬各用戶累積到限制數的情況
+        check = leased.is_allowed if algorithm == "gcra+lease" else limiter.is_allowed
+        name = "gcra" if algorithm == "gcra+lease" else algorithm
+        start = time.perf_counter()
+        for i in range(operations):
+            check(f"bench:{i % IDENTIFIERS}", limit, window, algorithm=name)
+        ops_per_sec = operations / (time.perf_counter() - start)
+
+        keys = client.keys("rate_limit:*")
+        size = sum(key_size(client, key, real_redis) for key in keys) / max(len(keys), 1)
+        print(f"{algorithm:<16} {ops_per_sec:>10.0f} {size:>18.0f}")
+
+    # 未超量（每個識別符只用到一半額度）時的本機判斷比例
+    client.delete(*client.keys("rate_limit:*") or ["rate_limit:none"])
+    leased = LeasedRateLimiter(limiter)
+    for i in range(IDENTIFIERS * limit // 2):
+        leased.is_allowed(f"bench:{i % IDENTIFIERS}", limit, window)
+    total = leased.stats["local"] + leased.stats["remote"]
+    print(f"gcra+lease 未超量時 {leased.stats['local'] / total * 100:.0f}% 的判斷不需連線 Redis")
+
+    client.delete(*client.keys("rate_limit:*") or ["rate_limit:none"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+請求範圍 Redis 批次的往返次數
+模擬幾種 webhook 事件實際會執行的 Redis 操作，列出每個事件的指令數（未批次時即往返次數）
+與批次後的往返次數；指定每次往返的延遲時，另估算省下的等待時間
+
+使用 fakeredis（往返次數與伺服器無關）
+
+用法: python scripts/bench_request_batching.py [每次往返延遲毫秒]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakeredis
+import redis
+
+from circuit_breaker import CircuitBreaker
+from community_features import CommunityFeatures
+from connection_manager import GuardedRedis
+from optimizations.performance_dashboard import PerformanceDashboard
+from redis_batch import RequestBatch
+from search_service import CustomSearchService
+
+SHELTERS = 20
+
+
+def connect():
+    pool = redis.ConnectionPool(
+        connection_class=getattr(fakeredis, "FakeRedisConnection", fakeredis.FakeConnection),
+        server=fakeredis.FakeServer(), decode_responses=True
+    )
+    return GuardedRedis(connection_pool=pool, circuit_breaker=CircuitBreaker())
+
+
+def seed(community):
+    for i in range(SHELTERS):
+        community.add_shelter_info(f"台北市{i}號", "學校", 100, f"user_{i}")
+    community.create_vote("午餐", ["麵", "飯"], "user_0")
+
+
+def scenarios(community, search):
+    def api_stats():
+        community.track_api_usage(tokens_used=120)
+        community.get_api_stats()
+
+    def emergency():
+        community.get_emergency_summary()
+
+    def vote():
+        community.cast_vote(1, f"voter_{vote.count}")
+        vote.count += 1
+    vote.count = 0
+
+    def search_quota():
+        search._check_and_increment_usage()
+
+    return {"API 統計": api_stats, "防災資訊": emergency, "投票": vote, "搜尋配額": search_quota}
+
+
+def run(latency_ms: float = 1.0):
+    client = connect()
+    community = CommunityFeatures(client)
+    dashboard = PerformanceDashboard(client)
+    search = CustomSearchService(redis_client=client)
+    seed(community)
+
+    print(f"{'事件':<10} {'批次前':>6} {'批次後':>6} {'省下':>6} {'省下等待':>10}")
+    for name, handle in scenarios(community, search).items():
+        with RequestBatch() as batch:
+            handle()
+            dashboard.record_api_latency("webhook", 12.5)
+        stats = batch.stats()
+        print(f"{name:<10} {stats['commands']:>6} {stats['round_trips']:>6} {stats['saved']:>6} "
+              f"{stats['saved'] * latency_ms:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
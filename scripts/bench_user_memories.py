@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+用戶記憶批次查詢效能比較
+比較逐一查詢（原本 _get_user_memories 的 3 次查詢/人）、執行緒池平行查詢與單一 UNWIND 查詢
+
+設定 NEO4J_URI / NEO4J_USER / NEO4J_PASSWORD 時連線真實資料庫（使用已存在的用戶），
+否則使用模擬往返延遲的假驅動程式
+
+用法: python scripts/bench_user_memories.py [往返延遲ms]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_graph import KnowledgeGraph
+
+
+class _SimulatedResult(list):
+    def single(self):
+        return self[0] if self else None
+
+
+class _SimulatedSession:
+    """每次 run 模擬一次網路往返與伺服器處理時間"""
+
+    def __init__(self, rtt_ms: float, per_row_ms: float):
+        self.rtt = rtt_ms / 1000
+        self.per_row = per_row_ms / 1000
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def run(self, query, **params):
+        user_ids = params.get("user_ids")
+        rows = len(user_ids) if user_ids else 1
+        time.sleep(self.rtt + self.per_row * rows)
+        if user_ids:
+            return _SimulatedResult(
+                {"user_id": user_id, "features": [], "topics": [], "context": []} for user_id in user_ids
+            )
+        return _SimulatedResult()
+
+
+class _SimulatedDriver:
+    def __init__(self, rtt_ms: float, per_row_ms: float = 0.2):
+        self.rtt_ms = rtt_ms
+        self.per_row_ms = per_row_ms
+
+    def session(self):
+        return _SimulatedSession(self.rtt_ms, self.per_row_ms)
+
+
+def build_graph(rtt_ms: float):
+    """建立知識圖譜（真實或模擬）"""
+    graph = KnowledgeGraph()
+    if graph.connected:
+        return graph, "Neo4j"
+
+    graph.driver = _SimulatedDriver(rtt_ms)
+    graph.connected = True
+    return graph, f"模擬驅動（往返 {rtt_ms}ms）"
+
+
+def sample_user_ids(graph, count: int):
+    """真實資料庫取現有用戶，不足時補上不存在的 ID"""
+    user_ids = []
+    if not isinstance(graph.driver, _SimulatedDriver):
+        with graph.driver.session() as session:
+            result = session.run("MATCH (u:User) RETURN u.id AS id LIMIT $limit", limit=count)
+            user_ids = [r["id"] for r in result]
+    user_ids += [f"bench_user_{i}" for i in range(count - len(user_ids))]
+    return user_ids
+
+
+def sequential(graph, user_ids):
+    """原本的做法：每位用戶依序查詢偏好（2 次）與上下文（1 次）"""
+    for user_id in user_ids:
+        graph.get_user_preferences(user_id)
+        graph._query_conversation_context(user_id, 5)
+
+
+def run(rtt_ms: float = 5.0):
+    graph, backend = build_graph(rtt_ms)
+    print(f"後端: {backend}")
+    print(f"{'用戶數':>6} {'逐一查詢':>12} {'執行緒池(8)':>12} {'UNWIND':>12}")
+
+    for count in (20, 200):
+        user_ids = sample_user_ids(graph, count)
+        timings = []
+
+        for fetch in (
+            lambda: sequential(graph, user_ids),
+            lambda: graph._query_user_memories_threaded(user_ids, 5, max_workers=8),
+            lambda: graph._query_user_memories_batch(user_ids, 5),
+        ):
+            start = time.perf_counter()
+            fetch()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        print(f"{count:>6} " + " ".join(f"{t:>10.1f}ms" for t in timings)
+              + f"   UNWIND 加速 {timings[0] / timings[2]:.0f}x")
+
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 5.0)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+原型意圖分類器評估
+以標註測試集計算準確率、信心不足比例（交給知識圖譜的比例）與單次分類延遲
+
+用法: python scripts/evaluate_intent_classifier.py [min_confidence]
+"""
+
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unittest.mock import MagicMock
+from embedding_service import EmbeddingService, SENTENCE_TRANSFORMER_AVAILABLE
+from intent_analyzer import IntentAnalyzer
+from intent_classifier import PrototypeIntentClassifier
+
+# 評估集（不與 LABELED_EXAMPLES 重複）
+EVAL_SET = [
+    ("來玩接字遊戲吧", "接龍"),
+    ("下一個詞換你接", "接龍"),
+    ("我們表決一下要去哪", "投票"),
+    ("大家選一個吧，A 還是 B", "投票"),
+    ("目前聊天室有多少人", "統計"),
+    ("這個小時的訊息數量", "統計"),
+    ("剛剛大家聊了些什麼", "廣播"),
+    ("給我最近一小時的重點", "廣播"),
+    ("地震了要躲在哪", "防空"),
+    ("最近的避難地點在哪裡", "防空"),
+    ("誰需要礦泉水", "物資"),
+    ("我可以提供一些罐頭", "物資"),
+    ("模型用量還剩多少", "API統計"),
+    ("今天的額度用了多少", "API統計"),
+    ("要怎麼使用這個機器人", "幫助"),
+    ("有哪些功能可以用", "幫助"),
+    ("說個好笑的", "笑話"),
+    ("我需要一點幽默", "笑話"),
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    if not SENTENCE_TRANSFORMER_AVAILABLE:
+        print("sentence_transformers 未安裝，無法評估分類器")
+        return
+
+    min_confidence = float(sys.argv[1]) if len(sys.argv) > 1 else 0.6
+    embedder = EmbeddingService(batch_window_ms=0)
+    feature_keywords = IntentAnalyzer(graph=MagicMock()).feature_keywords
+    classifier = PrototypeIntentClassifier(embedder, feature_keywords, min_confidence=min_confidence)
+
+    start = time.perf_counter()
+    classifier.build()
+    print(f"建立原型矩陣: {(time.perf_counter() - start) * 1000:.0f} ms  形狀 {classifier._matrix.shape}")
+
+    embeddings = embedder.encode_many([text for text, _ in EVAL_SET])
+
+    correct = confident = confident_correct = 0
+    latencies = []
+    for (text, label), embedding in zip(EVAL_SET, embeddings):
+        start = time.perf_counter()
+        result = classifier.classify(embedding)
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+        hit = result["feature"] == label
+        correct += hit
+        if result["confident"]:
+            confident += 1
+            confident_correct += hit
+        elif not hit:
+            print(f"  ✗ {text} → {result['feature']} ({result['confidence']:.2f})，應為 {label}")
+
+    total = len(EVAL_SET)
+    print(f"Top-1 準確率: {correct / total:.1%} ({correct}/{total})")
+    print(f"高信心比例: {confident / total:.1%}  高信心準確率: "
+          f"{confident_correct / confident:.1%}" if confident else "高信心比例: 0%")
+    print(f"交給知識圖譜: {total - confident} 則")
+    print(f"分類延遲（不含嵌入）p50={statistics.median(latencies):.1f} µs  p95={percentile(latencies, 0.95):.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,27 @@ import os
 import requests
 import json
 import logging
+import redis
 from datetime import datetime # Added for rate limiting
+from cache_codec import codec_for_client
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from connection_manager import call_through_breaker, redis_breaker
+from fallback_limiter import FallbackLimiter
+from redis_batch import deferred
 
 logger = logging.getLogger(__name__)
 
 class CustomSearchService:
-    def __init__(self, redis_client=None): # Added redis_client
+    def __init__(self, redis_client=None, cache_client=None, circuit_breaker=None): # Added redis_client
         """
         Initializes the Custom Search Service.
         API Key is read from the CUSTOM_SEARCH_API_KEY environment variable.
         CX ID is hardcoded for a specific search engine.
-        Redis client is used for rate limiting.
+        Redis client is used for rate limiting (with an in-process fallback when Redis is down).
+        cache_client (optional, binary connection) stores cached results with the msgpack codec;
+        defaults to redis_client.
+        circuit_breaker (optional) guards the usage counter; defaults to the client's shared
+        "redis" breaker.
         """
         self.api_key = os.getenv('CUSTOM_SEARCH_API_KEY')
         self.cx_id = "f4bbd246ef2324d78"  # Predefined CX ID
@@ -20,43 +30,62 @@ class CustomSearchService:
         self.redis = redis_client
         self.daily_limit = 100 # As per plan
         self.redis_usage_key_prefix = "custom_search_api:usage:"
+        self.cache_redis = cache_client or redis_client
+        self.codec = codec_for_client(self.cache_redis)
+        self.circuit_breaker = circuit_breaker or redis_breaker(redis_client)
+        self.fallback_limiter = FallbackLimiter()
+        # Shared breaker around the Custom Search API itself (timeouts / connection errors only)
+        self.api_breaker = CircuitBreaker.for_dependency(
+            "custom_search", failure_exceptions=(requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        )
 
         if not self.api_key:
             logger.warning("CUSTOM_SEARCH_API_KEY environment variable not found. Search functionality will be disabled.")
         if not self.redis:
-            logger.warning("Redis client not provided to CustomSearchService. Rate limiting will be disabled (fail open).")
+            logger.warning("Redis client not provided to CustomSearchService. Using in-process fallback rate limiting.")
 
     def _check_and_increment_usage(self) -> bool:
         """
         Checks if the API usage is within the daily limit and increments the count.
         Returns True if the request can proceed, False otherwise.
-        Fails open (returns True) if Redis is unavailable.
+        If Redis is unavailable (or its circuit breaker is open), an in-process token bucket
+        holding daily_limit / expected_instances requests per day is used instead.
         """
         if not self.redis:
-            logger.warning("Rate limiting disabled: Redis client not available.")
-            return True # Fail open
+            logger.warning("Redis client not available. Using in-process fallback limit.")
+            return self._check_fallback_usage()
 
         try:
-            today_str = datetime.now().strftime("%Y-%m-%d")
-            usage_key = f"{self.redis_usage_key_prefix}{today_str}"
+            return call_through_breaker(self.redis, self.circuit_breaker, self._check_redis_usage)
+        except (CircuitOpenError, redis.RedisError) as e:
+            logger.error(f"Redis error during API usage check: {e}. Using in-process fallback limit.")
+            return self._check_fallback_usage()
 
-            current_usage_str = self.redis.get(usage_key)
-            current_usage = int(current_usage_str) if current_usage_str else 0
+    def _check_redis_usage(self) -> bool:
+        today_str = datetime.now().strftime("%Y-%m-%d")
+        usage_key = f"{self.redis_usage_key_prefix}{today_str}"
 
-            if current_usage >= self.daily_limit:
-                logger.warning(f"Custom Search API daily limit of {self.daily_limit} reached for key {usage_key}.")
-                return False # Limit exceeded
+        current_usage_str = self.redis.get(usage_key)
+        current_usage = int(current_usage_str) if current_usage_str else 0
 
-            new_count = self.redis.incr(usage_key)
-            if new_count == 1: # First increment for the day
-                self.redis.expire(usage_key, 86400) # Set expiry for 24 hours
+        if current_usage >= self.daily_limit:
+            logger.warning(f"Custom Search API daily limit of {self.daily_limit} reached for key {usage_key}.")
+            return False # Limit exceeded
 
-            logger.info(f"Custom Search API usage for {today_str}: {new_count}/{self.daily_limit}")
-            return True # Request allowed
+        new_count = self.redis.incr(usage_key)
+        if new_count == 1: # First increment for the day
+            # Nothing reads the TTL during the request; send it with the request's other writes
+            with deferred(self.redis) as writer:
+                writer.expire(usage_key, 86400) # Set expiry for 24 hours
 
-        except Exception as e:
-            logger.error(f"Redis error during API usage check: {e}. Allowing request (fail open).")
-            return True # Fail open if Redis operations fail
+        logger.info(f"Custom Search API usage for {today_str}: {new_count}/{self.daily_limit}")
+        return True # Request allowed
+
+    def _check_fallback_usage(self) -> bool:
+        allowed, _ = self.fallback_limiter.is_allowed("custom_search_api", self.daily_limit, 86400)
+        if not allowed:
+            logger.warning("Custom Search API in-process fallback limit reached.")
+        return allowed
 
     def perform_search(self, query: str, num_results: int = 5) -> dict:
         """
@@ -75,17 +104,26 @@ class CustomSearchService:
 
         # 檢查快取
         cache_key = f"search:{query}:{num_results}"
-        if self.redis:
+        if self.cache_redis:
             try:
-                cached_result = self.redis.get(cache_key)
+                cached_result = self.cache_redis.get(cache_key)
                 if cached_result:
                     logger.info(f"Search cache hit for query: '{query}'")
-                    result = json.loads(cached_result)
+                    result = self.codec.decode(cached_result)
                     result['from_cache'] = True
                     return result
             except Exception as e:
                 logger.warning(f"Cache retrieval failed: {e}")
 
+        # Fail fast without spending quota while the API breaker is open
+        if self.api_breaker.is_open:
+            logger.warning("Custom Search circuit breaker is open. Skipping search.")
+            return {
+                'success': False,
+                'error': 'Search temporarily unavailable',
+                'message': '搜尋服務暫時無法使用，請稍後再試。'
+            }
+
         # Check rate limit before proceeding
         if not self._check_and_increment_usage():
             return {
@@ -103,7 +141,7 @@ class CustomSearchService:
 
         try:
             logger.info(f"Performing custom search for query: '{query}' with {num_results} results.")
-            response = requests.get(self.base_url, params=params, timeout=10) # Added timeout
+            response = self.api_breaker.call(requests.get, self.base_url, params=params, timeout=10)
             response.raise_for_status()  # Raises an HTTPError for bad responses (4XX or 5XX)
 
             response_json = response.json()
@@ -134,15 +172,19 @@ class CustomSearchService:
             }
 
             # 快取結果 (15分鐘)
-            if self.redis and results:
+            if self.cache_redis and results:
                 try:
-                    self.redis.setex(cache_key, 900, json.dumps(search_result))
+                    with deferred(self.cache_redis) as writer:
+                        writer.setex(cache_key, 900, self.codec.encode(search_result))
                     logger.info(f"Search results cached for query: '{query}'")
                 except Exception as e:
                     logger.warning(f"Failed to cache search results: {e}")
 
             return search_result
 
+        except CircuitOpenError as open_err:
+            logger.warning(f"Custom Search circuit breaker rejected the request: {open_err}")
+            return {'success': False, 'error': 'Search temporarily unavailable', 'details': str(open_err)}
         except requests.exceptions.HTTPError as http_err:
             logger.error(f"HTTP error occurred during custom search: {http_err} - Response: {response.text}")
             return {'success': False, 'error': 'API request failed (HTTP error)', 'details': str(http_err)}
@@ -168,8 +210,8 @@ if __name__ == '__main__':
     else:
         # For local testing, you might need a mock Redis or a real Redis instance.
         # For this example, we'll proceed without Redis for the __main__ block,
-        # which means rate limiting will be effectively off here.
-        print("Note: For __main__ test, Redis client is not provided, so rate limiting is off.")
+        # so only the in-process fallback limit applies here.
+        print("Note: For __main__ test, Redis client is not provided, so the in-process fallback limit applies.")
         search_service = CustomSearchService(redis_client=None)
         if search_service.api_key:
             test_query = "Python programming"
@@ -0,0 +1,266 @@
+"""
+整點串流分析
+訊息進來時即時更新本小時的每分鐘情緒/話題時間序列與指數衰減計數器，
+線上偵測情緒轉折與新興話題；廣播提示詞與「統計」指令直接讀取快照，不需重新掃描訊息
+"""
+
+import math
+import time
+import logging
+import threading
+from collections import Counter, defaultdict
+from itertools import combinations
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MINUTES = 60
+
+
+class DecayedCounter:
+    """
+    指數衰減計數器（半衰期以秒計）
+    以固定基準時間儲存放大後的值，累加為 O(1)，讀取時再乘上衰減係數
+    """
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self.rate = math.log(2) / half_life
+        self.landmark: Optional[float] = None
+        self.values: Dict[str, float] = defaultdict(float)
+
+    def add(self, key: str, timestamp: float, amount: float = 1.0) -> None:
+        if self.landmark is None:
+            self.landmark = timestamp
+        exponent = self.rate * (timestamp - self.landmark)
+        if exponent > 50:
+            # 放大倍數過大時重設基準，避免浮點溢位
+            self._rebase(timestamp)
+            exponent = 0.0
+        self.values[key] += amount * math.exp(exponent)
+
+    def _rebase(self, timestamp: float) -> None:
+        factor = math.exp(-self.rate * (timestamp - self.landmark))
+        for key in self.values:
+            self.values[key] *= factor
+        self.landmark = timestamp
+
+    def _decay(self, timestamp: float) -> float:
+        if self.landmark is None:
+            return 0.0
+        return math.exp(-self.rate * (timestamp - self.landmark))
+
+    def get(self, key: str, timestamp: float) -> float:
+        return self.values.get(key, 0.0) * self._decay(timestamp)
+
+    def items(self, timestamp: float) -> Dict[str, float]:
+        decay = self._decay(timestamp)
+        return {key: value * decay for key, value in self.values.items()}
+
+    def rate_of(self, key: str, timestamp: float) -> float:
+        """換算為每秒事件率（穩定狀態下計數值 = 事件率 × 平均壽命）"""
+        return self.get(key, timestamp) * self.rate
+
+    def discard(self, keys) -> None:
+        for key in keys:
+            self.values.pop(key, None)
+
+
+class HourStream:
+    """本小時的串流分析狀態（每個新小時自動重設）"""
+
+    def __init__(self, detect_emotion: Callable[[str], str],
+                 extract_topics: Callable[[str], List[str]],
+                 fast_half_life: float = 180, slow_half_life: float = 1200,
+                 change_min_mass: float = 5.0, change_margin: float = 0.15,
+                 emerging_ratio: float = 2.0, emerging_min_count: float = 3.0,
+                 max_topics: int = 5000):
+        """
+        初始化串流分析
+
+        Args:
+            detect_emotion: 單則訊息情緒偵測
+            extract_topics: 單則訊息話題提取
+            fast_half_life: 短期計數器半衰期（秒），反映「現在」
+            slow_half_life: 長期計數器半衰期（秒），作為基準
+            change_min_mass: 判定情緒轉折時短期計數的最低總量
+            change_margin: 新情緒在短期分佈中需領先原情緒的比例
+            emerging_ratio: 短期事件率需達長期事件率的倍數才算新興話題
+            emerging_min_count: 新興話題的短期計數下限
+            max_topics: 追蹤的話題數上限（超過時淘汰最冷門者）
+        """
+        self.detect_emotion = detect_emotion
+        self.extract_topics = extract_topics
+        self.fast_half_life = fast_half_life
+        self.slow_half_life = slow_half_life
+        self.change_min_mass = change_min_mass
+        self.change_margin = change_margin
+        self.emerging_ratio = emerging_ratio
+        self.emerging_min_count = emerging_min_count
+        self.max_topics = max_topics
+
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, hour: Optional[int]) -> None:
+        self.hour = hour
+        self.message_count = 0
+
+        # 每分鐘時間序列
+        self.emotion_series: Dict[str, List[int]] = defaultdict(lambda: [0] * MINUTES)
+        self.topic_series: Dict[str, List[int]] = defaultdict(lambda: [0] * MINUTES)
+
+        # 整點累計
+        self.emotion_totals: Counter = Counter()
+        self.topic_totals: Counter = Counter()
+        self.topic_pairs: Counter = Counter()
+
+        # 衰減計數器
+        self.fast_emotions = DecayedCounter(self.fast_half_life)
+        self.fast_topics = DecayedCounter(self.fast_half_life)
+        self.slow_topics = DecayedCounter(self.slow_half_life)
+
+        # 線上偵測結果
+        self.regime: Optional[str] = None
+        self.change_points: List[Dict] = []
+        self.emerged: Dict[str, float] = {}  # 話題 → 首次被判定為新興的時間
+
+    def observe(self, message: str, timestamp: float = None) -> None:
+        """處理一則新訊息"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        hour = int(timestamp) // 3600
+
+        emotion = self.detect_emotion(message)
+        topics = self.extract_topics(message)
+
+        with self._lock:
+            if self.hour is None or hour > self.hour:
+                self._reset(hour)
+            elif hour < self.hour:
+                return  # 上一小時的遲到訊息
+
+            minute = int(timestamp % 3600) // 60
+            self.message_count += 1
+
+            self.emotion_totals[emotion] += 1
+            self.emotion_series[emotion][minute] += 1
+            self.fast_emotions.add(emotion, timestamp)
+            self._detect_change(timestamp)
+
+            for topic in topics:
+                self.topic_totals[topic] += 1
+                self.topic_series[topic][minute] += 1
+                self.fast_topics.add(topic, timestamp)
+                self.slow_topics.add(topic, timestamp)
+                if topic not in self.emerged and self._is_emerging(topic, timestamp):
+                    self.emerged[topic] = timestamp
+
+            # 同一則訊息中不重疊的詞組視為相關話題
+            for a, b in combinations(sorted(set(topics)), 2):
+                if not set(a) & set(b):
+                    self.topic_pairs[(a, b)] += 1
+
+            if len(self.slow_topics.values) > self.max_topics:
+                self._prune(timestamp)
+
+    def _detect_change(self, timestamp: float) -> None:
+        """短期情緒分佈的主導者明顯超越目前情緒基調時記錄轉折點"""
+        recent = self.fast_emotions.items(timestamp)
+        mass = sum(recent.values())
+        if mass < self.change_min_mass:
+            return
+
+        leader = max(recent, key=recent.get)
+        if self.regime is None:
+            self.regime = leader
+            return
+        if leader == self.regime:
+            return
+
+        lead = (recent[leader] - recent.get(self.regime, 0.0)) / mass
+        if lead >= self.change_margin:
+            self.change_points.append({
+                "index": self.message_count - 1,
+                "from": self.regime,
+                "to": leader,
+                "time": time.strftime("%H:%M", time.localtime(timestamp))
+            })
+            self.regime = leader
+
+    def _is_rising(self, topic: str, timestamp: float) -> bool:
+        """短期事件率遠高於長期事件率（突然被大量提起）"""
+        slow_rate = self.slow_topics.rate_of(topic, timestamp)
+        return self.fast_topics.rate_of(topic, timestamp) >= self.emerging_ratio * slow_rate > 0
+
+    def _is_emerging(self, topic: str, timestamp: float) -> bool:
+        """升溫且短期內已被提起足夠次數"""
+        return (self.fast_topics.get(topic, timestamp) >= self.emerging_min_count
+                and self._is_rising(topic, timestamp))
+
+    def _prune(self, timestamp: float) -> None:
+        """淘汰長期計數最低的一半話題"""
+        ranked = sorted(self.slow_topics.items(timestamp).items(), key=lambda item: item[1])
+        stale = [topic for topic, _ in ranked[:len(ranked) // 2]]
+        self.slow_topics.discard(stale)
+        self.fast_topics.discard(stale)
+
+    def covers(self, hour: int, message_count: int = 0) -> bool:
+        """串流狀態是否已看過該小時（至少 message_count 則）的訊息"""
+        return self.hour == hour and self.message_count > 0 and self.message_count >= message_count
+
+    def emerging_topics(self, timestamp: float = None, limit: int = 5) -> List[str]:
+        """目前仍在升溫的新興話題（依短期熱度排序）"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            active = [(self.fast_topics.get(topic, timestamp), topic) for topic in self.emerged
+                      if self._is_rising(topic, timestamp)]
+        return [topic for _, topic in sorted(active, reverse=True)[:limit]]
+
+    def connections(self, topics: List[str], per_topic: int = 3) -> Dict[str, List[str]]:
+        """指定話題在同一則訊息中最常一起出現的話題"""
+        related = defaultdict(Counter)
+        wanted = set(topics)
+        with self._lock:
+            for (a, b), count in self.topic_pairs.items():
+                if a in wanted:
+                    related[a][b] += count
+                if b in wanted:
+                    related[b][a] += count
+        return {topic: [other for other, _ in related[topic].most_common(per_topic)]
+                for topic in topics if related[topic]}
+
+    def snapshot(self, timestamp: float = None, hot_topic_count: int = 10) -> Dict:
+        """
+        目前的分析結果（格式與 hour_analytics.analyze_hour 相容）
+
+        Returns:
+            {"hour", "message_count",
+             "emotion": {"dominant", "distribution", "turning_points", "current", "series"},
+             "topics": {"hot_topics", "counts", "emerging", "connections", "series"}}
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            total = self.message_count or 1
+            hot = self.topic_totals.most_common(hot_topic_count)
+            emotion_series = {emotion: list(series) for emotion, series in self.emotion_series.items()}
+            topic_series = {topic: list(self.topic_series[topic]) for topic, _ in hot[:5]}
+            result = {
+                "hour": self.hour,
+                "message_count": self.message_count,
+                "emotion": {
+                    "dominant": self.emotion_totals.most_common(1)[0][0] if self.emotion_totals else "neutral",
+                    "distribution": {k: f"{v/total*100:.1f}%" for k, v in self.emotion_totals.items()},
+                    "turning_points": list(self.change_points),
+                    "current": self.regime,
+                    "series": emotion_series
+                },
+                "topics": {
+                    "hot_topics": [topic for topic, _ in hot],
+                    "counts": Counter(dict(hot)),
+                    "series": topic_series
+                }
+            }
+
+        result["topics"]["emerging"] = self.emerging_topics(timestamp)
+        result["topics"]["connections"] = self.connections(result["topics"]["hot_topics"][:5])
+        return result
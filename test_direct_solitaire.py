@@ -11,7 +11,7 @@ from dotenv import load_dotenv
 # 添加當前目錄到 Python 路徑
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from community_features import CommunityFeatures
+from community_features import CommunityFeatures, WORD_CHAIN_KEYS
 from word_chain_formatter import (
     format_word_chain_display, 
     format_chain_complete,
@@ -87,7 +87,7 @@ def main():
     print()
     
     # 清理
-    redis_client.delete("word_chain:current")
+    redis_client.delete(*WORD_CHAIN_KEYS)
     print("\n✅ 測試完成，已清理測試資料")
 
 if __name__ == "__main__":
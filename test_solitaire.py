@@ -7,7 +7,7 @@ import os
 import sys
 import redis
 from dotenv import load_dotenv
-from community_features import CommunityFeatures
+from community_features import CommunityFeatures, WORD_CHAIN_KEYS
 
 # 載入環境變數
 if os.path.exists('.env'):
@@ -77,7 +77,7 @@ def test_community_features(redis_client):
     print(f"錯誤測試: {result}")
     
     # 5. 清理測試資料
-    redis_client.delete("word_chain:current")
+    redis_client.delete(*WORD_CHAIN_KEYS)
     print("\n✅ 測試資料已清理")
 
 def check_redis_data():
@@ -92,8 +92,7 @@ def check_redis_data():
     print("\n接龍相關 keys:")
     keys = redis_client.keys("word_chain:*")
     for key in keys:
-        value = redis_client.get(key)
-        print(f"  {key}: {value}")
+        print(f"  {key}: {redis_client.type(key)}")
     
     # 檢查其他相關 keys
     print("\n其他相關 keys:")
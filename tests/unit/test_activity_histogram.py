@@ -0,0 +1,97 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+from activity_histogram import ActivityHistogram, slot_of
+from collective_memory import CollectiveMemorySystem
+from optimizations.smart_onboarding import SmartOnboarding
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+# 2024-01-02 是週二
+TUESDAY_21 = datetime(2024, 1, 2, 21, 15).timestamp()
+FRIDAY_21 = datetime(2024, 1, 5, 21, 40).timestamp()
+MONDAY_08 = datetime(2024, 1, 1, 8, 5).timestamp()
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestActivityHistogram(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        self.histogram = ActivityHistogram(self.redis)
+
+    def test_slot_of(self):
+        self.assertEqual(slot_of(MONDAY_08), 8)
+        self.assertEqual(slot_of(TUESDAY_21), 24 + 21)
+
+    def test_record_is_compact_and_counts(self):
+        for _ in range(3):
+            self.histogram.record("u1", TUESDAY_21)
+        self.histogram.record("u1", MONDAY_08)
+
+        histogram = self.histogram.get("u1")
+        self.assertEqual(histogram.shape, (7, 24))
+        self.assertEqual(histogram[1, 21], 3)
+        self.assertEqual(histogram[0, 8], 1)
+        self.assertEqual(histogram.sum(), 4)
+        self.assertLessEqual(self.redis.strlen("activity:u1"), 7 * 24 * 2)
+        self.assertGreater(self.redis.ttl("activity:u1"), 0)
+
+    def test_partial_and_saturated_rows_decode(self):
+        self.histogram.record("u1", MONDAY_08)
+        self.redis.bitfield("activity:u2").set("u16", "#0", 65535).execute()
+        self.redis.bitfield("activity:u2").overflow("SAT").incrby("u16", "#0", 1).execute()
+
+        histograms = self.histogram.get_many(["u1", "u2", "u3"])
+        self.assertLess(self.redis.strlen("activity:u1"), 7 * 24 * 2)
+        self.assertEqual(histograms[0].sum(), 1)
+        self.assertEqual(histograms[1, 0, 0], 65535)
+        self.assertEqual(histograms[2].sum(), 0)
+
+    def test_patterns(self):
+        for timestamp in [TUESDAY_21] * 4 + [FRIDAY_21] * 3 + [MONDAY_08]:
+            self.histogram.record("u1", timestamp)
+
+        patterns = self.histogram.patterns(["u1", "nobody"])
+        self.assertEqual(patterns["u1"]["preferred_hour"], 21)
+        self.assertEqual(patterns["u1"]["active_days"], ["週二", "週五"])
+        self.assertEqual(patterns["u1"]["total"], 8)
+        self.assertIsNone(patterns["nobody"]["preferred_hour"])
+
+    def test_typically_active(self):
+        for _ in range(5):
+            self.histogram.record("regular", TUESDAY_21)
+        self.histogram.record("rare", TUESDAY_21)
+        for _ in range(5):
+            self.histogram.record("morning", MONDAY_08)
+
+        regulars = self.histogram.typically_active(["regular", "rare", "morning", "nobody"], TUESDAY_21)
+        self.assertEqual(regulars, ["regular"])
+
+    def test_collective_memory_uses_histogram(self):
+        for _ in range(3):
+            self.histogram.record("u1", TUESDAY_21)
+
+        memory = CollectiveMemorySystem(MagicMock())
+        self.assertIsNone(memory._get_user_active_pattern("u1")["preferred_hour"])
+
+        memory.activity_histogram = self.histogram
+        self.assertEqual(memory._get_user_active_pattern("u1")["preferred_hour"], 21)
+
+    def test_onboarding_message_count(self):
+        onboarding = SmartOnboarding(activity_histogram=self.histogram)
+        self.assertTrue(onboarding.is_new_user("u1"))
+        self.assertEqual(onboarding.get_user_stage("u1"), "new")
+
+        for _ in range(6):
+            self.histogram.record("u1")
+        self.assertFalse(onboarding.is_new_user("u1"))
+        self.assertEqual(onboarding.get_user_stage("u1"), "active")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import unittest
+from datetime import date, datetime
+from unittest.mock import MagicMock
+
+from cache_codec import JsonCodec, MsgpackCodec, MSGPACK_AVAILABLE, codec_for_client
+from response_cache import ResponseCache, TieredCache
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@unittest.skipUnless(MSGPACK_AVAILABLE, "需要 msgpack")
+class TestMsgpackCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = MsgpackCodec(compress_threshold=256)
+
+    def test_round_trip_typed_values(self):
+        value = {
+            "created": datetime(2024, 5, 1, 12, 30, 15, 123),
+            "day": date(2024, 5, 1),
+            "tags": {"a", "b"},
+            "nested": [{"count": 3, "ratio": 0.5, "ok": True, "none": None}],
+            "text": "頻率廣播"
+        }
+        self.assertEqual(self.codec.decode(self.codec.encode(value)), value)
+
+    def test_small_values_are_not_compressed(self):
+        self.assertEqual(self.codec.encode({"a": 1})[:1], b"M")
+
+    def test_large_values_are_compressed(self):
+        value = {"content": "今天大家都在聊天氣與咖啡。" * 100}
+        encoded = self.codec.encode(value)
+        self.assertEqual(encoded[:1], b"Z")
+        self.assertLess(len(encoded), len(json.dumps(value, ensure_ascii=False).encode()))
+        self.assertEqual(self.codec.decode(encoded), value)
+
+    def test_incompressible_values_stay_raw(self):
+        value = {"blob": os.urandom(512)}
+        encoded = self.codec.encode(value)
+        self.assertEqual(encoded[:1], b"M")
+        self.assertEqual(self.codec.decode(encoded), value)
+
+    def test_decodes_legacy_json(self):
+        self.assertEqual(self.codec.decode(b'{"a": [1, 2]}'), {"a": [1, 2]})
+        self.assertEqual(self.codec.decode('{"a": 1}'), {"a": 1})
+
+    def test_unknown_objects_become_strings(self):
+        class Custom:
+            def __str__(self):
+                return "custom"
+        self.assertEqual(self.codec.decode(self.codec.encode([Custom()])), ["custom"])
+
+
+class TestCodecSelection(unittest.TestCase):
+
+    def test_text_connection_uses_json(self):
+        client = MagicMock()
+        client.connection_pool.connection_kwargs = {"decode_responses": True}
+        self.assertIsInstance(codec_for_client(client), JsonCodec)
+
+    def test_mock_client_uses_json(self):
+        self.assertIsInstance(codec_for_client(MagicMock()), JsonCodec)
+
+    @unittest.skipUnless(MSGPACK_AVAILABLE, "需要 msgpack")
+    def test_binary_connection_uses_msgpack(self):
+        client = MagicMock()
+        client.connection_pool.connection_kwargs = {"decode_responses": False}
+        self.assertIsInstance(codec_for_client(client), MsgpackCodec)
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE and MSGPACK_AVAILABLE, "需要 fakeredis 與 msgpack")
+class TestBinaryResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server)
+        self.cache = ResponseCache(self.redis)
+
+    def test_preserves_types(self):
+        value = {"at": datetime(2024, 1, 1, 9, 0), "users": {"u1", "u2"}}
+        self.cache.set("stats:1", value)
+        self.assertEqual(self.redis.get("stats:1")[:1], b"M")
+        self.assertEqual(self.cache.get("stats:1"), value)
+
+    def test_reads_values_written_as_json(self):
+        self.redis.set("old", json.dumps({"a": 1}))
+        self.assertEqual(self.cache.get("old"), {"a": 1})
+
+    def test_tag_invalidation(self):
+        self.cache.set("a", 1, tags=["user:u1"])
+        self.cache.set("b", 2, tags=["user:u2"])
+        self.assertEqual(self.cache.invalidate_tag("user:u1"), 1)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), 2)
+
+    def test_get_or_load(self):
+        loader = MagicMock(return_value={"at": date(2024, 1, 1)})
+        self.assertEqual(self.cache.get_or_load("k", loader, ttl=60), {"at": date(2024, 1, 1)})
+        self.assertEqual(self.cache.get_or_load("k", loader, ttl=60), {"at": date(2024, 1, 1)})
+        self.assertEqual(loader.call_count, 1)
+
+    def test_tiered_invalidation(self):
+        writer = TieredCache(fakeredis.FakeRedis(server=self.server))
+        reader = TieredCache(fakeredis.FakeRedis(server=self.server))
+        try:
+            writer.set("stats:1", {"v": 1})
+            self.assertTrue(wait_for(lambda: reader.stats["invalidations"] == 1))
+            self.assertEqual(reader.get("stats:1"), {"v": 1})
+            writer.set("stats:1", {"v": 2})
+            self.assertTrue(wait_for(lambda: reader.stats["invalidations"] == 2))
+            self.assertEqual(reader.get("stats:1"), {"v": 2})
+        finally:
+            writer.close()
+            reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
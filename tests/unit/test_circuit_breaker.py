@@ -0,0 +1,286 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import redis
+
+from circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, breaker_snapshots, get_breaker, guarded, open_breakers
+)
+from connection_manager import GuardedRedis, InstrumentedRedisPool, PoolExhaustedError
+from knowledge_graph import KnowledgeGraph
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+def fail():
+    raise ConnectionError("down")
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def _expire(self, breaker):
+        breaker.last_failure_time -= breaker.recovery_timeout + 1
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                breaker.call(fail)
+        self.assertEqual(breaker.state, "OPEN")
+        func = MagicMock()
+        with self.assertRaises(CircuitOpenError) as ctx:
+            breaker.call(func)
+        func.assert_not_called()
+        self.assertGreater(ctx.exception.retry_after, 29)
+        self.assertEqual(breaker.stats["rejected"], 1)
+
+    def test_success_resets_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3)
+        for _ in range(5):
+            with self.assertRaises(ConnectionError):
+                breaker.call(fail)
+            breaker.call(lambda: None)
+        self.assertEqual(breaker.state, "CLOSED")
+
+    def test_opens_on_window_failure_rate(self):
+        breaker = CircuitBreaker(failure_threshold=100, failure_rate_threshold=0.5, min_calls=10)
+        for _ in range(5):
+            breaker.call(lambda: None)
+            with self.assertRaises(ConnectionError):
+                breaker.call(fail)
+        self.assertEqual(breaker.state, "OPEN")
+        self.assertIn("失敗率", breaker.transitions[-1]["reason"])
+
+    def test_ignores_unlisted_exceptions(self):
+        breaker = CircuitBreaker(failure_threshold=1, failure_exceptions=(ConnectionError,))
+        with self.assertRaises(ValueError):
+            breaker.call(lambda: int("x"))
+        self.assertEqual(breaker.state, "CLOSED")
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, slow_call_threshold=0.01)
+        for _ in range(2):
+            self.assertEqual(breaker.call(lambda: time.sleep(0.02) or "ok"), "ok")
+        self.assertEqual(breaker.state, "OPEN")
+        self.assertEqual(breaker.stats["slow_calls"], 2)
+
+    def test_half_open_success_closes(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        with self.assertRaises(ConnectionError):
+            breaker.call(fail)
+        self._expire(breaker)
+        self.assertEqual(breaker.call(lambda: "ok"), "ok")
+        self.assertEqual([t["to"] for t in breaker.transitions], ["OPEN", "HALF_OPEN", "CLOSED"])
+
+    def test_half_open_failure_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        with self.assertRaises(ConnectionError):
+            breaker.call(fail)
+        self._expire(breaker)
+        with self.assertRaises(ConnectionError):
+            breaker.call(fail)
+        self.assertEqual(breaker.state, "OPEN")
+        self.assertTrue(breaker.is_open)
+
+    def test_half_open_limits_concurrent_probes(self):
+        breaker = CircuitBreaker(failure_threshold=1, half_open_max_calls=1)
+        with self.assertRaises(ConnectionError):
+            breaker.call(fail)
+        self._expire(breaker)
+
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_probe():
+            entered.set()
+            release.wait(2)
+
+        probe = threading.Thread(target=breaker.call, args=(slow_probe,))
+        probe.start()
+        self.assertTrue(entered.wait(2))
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: None)
+        release.set()
+        probe.join()
+        self.assertEqual(breaker.state, "CLOSED")
+
+    def test_concurrent_calls_are_counted_exactly(self):
+        breaker = CircuitBreaker(failure_threshold=10 ** 6, min_calls=10 ** 6)
+
+        def worker():
+            for i in range(500):
+                try:
+                    breaker.call(fail if i % 2 else (lambda: None))
+                except ConnectionError:
+                    pass
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = breaker.snapshot()
+        self.assertEqual((snapshot["calls"], snapshot["failures"]), (4000, 2000))
+        self.assertEqual(snapshot["window_calls"], 4000)
+
+    def test_listeners_receive_transitions(self):
+        breaker = CircuitBreaker(failure_threshold=1, name="test:listener")
+        events = []
+        breaker.listeners.append(lambda *event: events.append(event))
+        with self.assertRaises(ConnectionError):
+            breaker.call(fail)
+        self.assertEqual(events, [("test:listener", "CLOSED", "OPEN", "連續失敗 1 次")])
+
+    def test_named_breakers_are_exported(self):
+        breaker = CircuitBreaker(name="test:export")
+        self.assertIs(get_breaker("test:export"), breaker)
+        self.assertEqual(breaker_snapshots()["test:export"]["state"], "CLOSED")
+
+    def test_open_breakers_is_time_aware(self):
+        core = CircuitBreaker(failure_threshold=1, recovery_timeout=60, name="test:core")
+        optional = CircuitBreaker(failure_threshold=1, name="test:optional")
+        for breaker in (core, optional):
+            with self.assertRaises(ConnectionError):
+                breaker.call(fail)
+        self.assertEqual(open_breakers(["test:core", "test:missing"]), ["test:core"])
+
+        # 恢復時間已過、尚無流量試探：狀態仍是 OPEN，但已不再拒絕呼叫
+        core.last_failure_time -= 61
+        self.assertEqual(core.state, "OPEN")
+        self.assertEqual(open_breakers(["test:core"]), [])
+
+    def test_for_dependency_is_shared(self):
+        first = CircuitBreaker.for_dependency("test:shared", failure_threshold=2)
+        self.assertIs(CircuitBreaker.for_dependency("test:shared"), first)
+        self.assertEqual(first.failure_threshold, 2)
+
+    def test_guarded_method(self):
+        class Client:
+            def __init__(self):
+                self.breaker = CircuitBreaker(failure_threshold=1)
+
+            @guarded("breaker")
+            def fetch(self, value):
+                if value is None:
+                    raise ConnectionError("down")
+                return value
+
+        client = Client()
+        self.assertEqual(client.fetch(1), 1)
+        with self.assertRaises(ConnectionError):
+            client.fetch(None)
+        with self.assertRaises(CircuitOpenError):
+            client.fetch(1)
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestGuardedRedis(unittest.TestCase):
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        pool = redis.ConnectionPool(
+            connection_class=getattr(fakeredis, "FakeRedisConnection", fakeredis.FakeConnection),
+            server=self.server, decode_responses=True
+        )
+        self.breaker = CircuitBreaker(failure_threshold=2,
+                                      failure_exceptions=(redis.ConnectionError, redis.TimeoutError))
+        self.redis = GuardedRedis(connection_pool=pool, circuit_breaker=self.breaker)
+
+    def test_commands_and_pipelines_are_counted(self):
+        self.redis.set("a", 1)
+        pipe = self.redis.pipeline()
+        pipe.incr("a")
+        pipe.get("a")
+        self.assertEqual(pipe.execute(), [2, "2"])
+        self.assertEqual(self.breaker.stats["calls"], 2)
+
+    def test_command_errors_do_not_open(self):
+        self.redis.set("a", "x")
+        for _ in range(3):
+            with self.assertRaises(redis.ResponseError):
+                self.redis.incr("a")
+        self.assertEqual(self.breaker.state, "CLOSED")
+
+    def test_outage_fails_fast(self):
+        self.server.connected = False
+        for _ in range(2):
+            with self.assertRaises(redis.ConnectionError):
+                self.redis.get("a")
+        self.server.connected = True
+        with self.assertRaises(CircuitOpenError):
+            self.redis.get("a")
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestGuardedRedisPoolWait(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = InstrumentedRedisPool(
+            connection_class=getattr(fakeredis, "FakeRedisConnection", fakeredis.FakeConnection),
+            server=fakeredis.FakeServer(), max_connections=1, timeout=1.0, decode_responses=True
+        )
+        self.breaker = CircuitBreaker(failure_threshold=1, slow_call_threshold=0.1,
+                                      failure_exceptions=(redis.ConnectionError, redis.TimeoutError),
+                                      ignored_exceptions=(PoolExhaustedError,))
+        self.redis = GuardedRedis(connection_pool=self.pool, circuit_breaker=self.breaker)
+
+    def hold_connection(self, seconds):
+        connection = self.pool.get_connection("GET")
+        timer = threading.Timer(seconds, self.pool.release, args=(connection,))
+        timer.start()
+        return timer
+
+    def test_checkout_wait_is_not_a_slow_call(self):
+        self.hold_connection(0.3)
+        self.redis.set("a", 1)
+        pipe = self.redis.pipeline()
+        pipe.get("a")
+        pipe.execute()
+        self.assertEqual((self.breaker.stats["slow_calls"], self.breaker.state), (0, "CLOSED"))
+        self.assertGreaterEqual(self.pool.get_metrics()["wait_p95_ms"], 250)
+
+    def test_pool_exhaustion_is_a_pool_error(self):
+        self.pool.timeout = 0.05
+        timer = self.hold_connection(0.3)
+        with self.assertRaises(PoolExhaustedError):
+            self.redis.get("a")
+        timer.join()
+        self.assertEqual((self.breaker.stats["calls"], self.breaker.state), (0, "CLOSED"))
+        self.assertEqual(self.pool.get_metrics()["timeouts"], 1)
+
+
+class TestKnowledgeGraphBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.kg = KnowledgeGraph(uri=None, user=None, password=None)
+        self.kg.circuit_breaker = CircuitBreaker(failure_threshold=1)
+        self.kg.driver = MagicMock()
+        self.kg.connected = True
+        self.session = self.kg.driver.session.return_value.__enter__.return_value
+
+    def test_queries_go_through_breaker(self):
+        self.kg.log_user_vote("u1", "v1", "topic", "A")
+        self.session.run.assert_called_once()
+        self.assertEqual(self.kg.circuit_breaker.stats["calls"], 1)
+
+    def test_open_breaker_reports_disconnected(self):
+        from neo4j.exceptions import ServiceUnavailable
+        self.kg.circuit_breaker.failure_exceptions = (ServiceUnavailable,)
+        self.session.run.side_effect = ServiceUnavailable("down")
+        with self.assertRaises(ServiceUnavailable):
+            self.kg.add_user("u1")
+        self.assertFalse(self.kg.connected)
+        self.assertEqual(self.kg.add_user("u1"), {"user": {"id": "u1"}})
+        self.assertEqual(self.session.run.call_count, 1)
+
+        self.kg.circuit_breaker.last_failure_time -= self.kg.circuit_breaker.recovery_timeout + 1
+        self.assertTrue(self.kg.connected)
+
+
+if __name__ == "__main__":
+    unittest.main()
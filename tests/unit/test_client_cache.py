@@ -0,0 +1,154 @@
+import time
+import unittest
+
+import redis
+
+from community_features import CommunityFeatures
+from connection_manager import ClientSideCache
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class StandInCache(ClientSideCache):
+    """fakeredis 不支援 CLIENT TRACKING：略過啟用，由測試代替伺服器發布失效通知"""
+
+    def _enable_tracking(self, connection, client_id=None):
+        self.invalidate_all()
+        self.ready = True
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestClientSideCache(unittest.TestCase):
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        pool = redis.ConnectionPool(
+            connection_class=getattr(fakeredis, "FakeRedisConnection", fakeredis.FakeConnection),
+            server=self.server, decode_responses=True
+        )
+        self.redis = redis.Redis(connection_pool=pool)
+        self.cache = StandInCache(self.redis, ["votes:current", "shelters:"])
+        self.cache.start()
+
+    def tearDown(self):
+        self.cache.close()
+
+    def write(self, key, value):
+        """寫入並像伺服器一樣發布失效通知"""
+        self.redis.set(key, value)
+        self.redis.publish(ClientSideCache.INVALIDATE_CHANNEL, key)
+
+    def test_repeated_reads_are_served_from_memory(self):
+        self.redis.set("votes:current", "vote_1")
+        self.assertEqual(self.cache.get("votes:current"), "vote_1")
+        # 不發布通知直接修改：仍讀到快取值，證明沒有經過網路
+        self.redis.set("votes:current", "vote_2")
+        for _ in range(3):
+            self.assertEqual(self.cache.get("votes:current"), "vote_1")
+        self.assertEqual((self.cache.stats["hits"], self.cache.stats["misses"]), (3, 1))
+
+    def test_invalidation_message_drops_entry(self):
+        self.write("votes:current", "vote_1")
+        self.cache.get("votes:current")
+        self.write("votes:current", "vote_2")
+        self.assertTrue(wait_for(lambda: self.cache.stats["invalidations"] == 1))
+        self.assertEqual(self.cache.get("votes:current"), "vote_2")
+
+    def test_untracked_keys_bypass_cache(self):
+        self.redis.set("votes:vote_1", "{}")
+        self.cache.get("votes:vote_1")
+        self.assertEqual(self.cache.report()["keys"], 0)
+        self.assertEqual(self.cache.stats["misses"], 0)
+
+    def test_invalidation_during_read_is_not_cached(self):
+        self.redis.set("votes:current", "vote_1")
+
+        def racing_read():
+            value = self.redis.get("votes:current")
+            self.cache.invalidate(["votes:current"])
+            return value
+
+        self.cache._read("GET", "votes:current", racing_read)
+        self.assertEqual(self.cache.report()["keys"], 0)
+
+    def test_flush_notification_clears_everything(self):
+        self.redis.sadd("shelters:all", "s1")
+        self.cache.smembers("shelters:all")
+        self.cache._handle_invalidation(None)
+        self.assertEqual(self.cache.report()["keys"], 0)
+
+    def test_returns_copies(self):
+        self.redis.sadd("shelters:all", "s1")
+        self.cache.smembers("shelters:all").add("s2")
+        self.assertEqual(self.cache.smembers("shelters:all"), {"s1"})
+
+    def test_evicts_least_recently_used(self):
+        self.cache.max_keys = 2
+        for key in ("shelters:1", "shelters:2", "shelters:1", "shelters:3"):
+            self.cache.get(key)
+        self.assertEqual(list(self.cache._entries), ["shelters:1", "shelters:3"])
+
+    def test_not_ready_bypasses_cache(self):
+        self.cache.ready = False
+        self.redis.set("votes:current", "vote_1")
+        self.cache.get("votes:current")
+        self.redis.set("votes:current", "vote_2")
+        self.assertEqual(self.cache.get("votes:current"), "vote_2")
+
+    def test_report_hit_rate(self):
+        self.redis.set("votes:current", "vote_1")
+        for _ in range(4):
+            self.cache.get("votes:current")
+        self.assertEqual(self.cache.report()["hit_rate"], 0.75)
+
+    def test_community_reads_hot_keys_through_cache(self):
+        community = CommunityFeatures(self.redis)
+        community.attach_client_cache(self.cache)
+        self.assertEqual(community.get_vote_results()["message"], "目前沒有進行中的投票")
+        community.create_vote("午餐", ["麵", "飯"], "u1")
+        self.redis.publish(ClientSideCache.INVALIDATE_CHANNEL, "votes:current")
+        self.assertTrue(wait_for(lambda: self.cache.stats["invalidations"] == 1))
+        self.assertTrue(community.cast_vote(1, "u2")["success"])
+        self.assertTrue(community.get_vote_results()["success"])
+        self.assertEqual(self.cache.stats["hits"], 1)
+
+    def test_word_chain_writes_invalidate_local_entries(self):
+        self.cache.prefixes = tuple(CommunityFeatures.HOT_KEY_PREFIXES)
+        community = CommunityFeatures(self.redis)
+        community.attach_client_cache(self.cache)
+        self.assertFalse(community.has_active_word_chain())
+        community.start_word_chain("蘋果", "u1")
+        community.continue_word_chain("果汁", "u2")
+        self.assertIn("蘋果 → 果汁", community.get_word_chain_status()["message"])
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestClientTrackingUnsupported(unittest.TestCase):
+
+    def test_start_raises_when_server_lacks_tracking(self):
+        pool = redis.ConnectionPool(
+            connection_class=getattr(fakeredis, "FakeRedisConnection", fakeredis.FakeConnection),
+            server=fakeredis.FakeServer(), decode_responses=True
+        )
+        cache = ClientSideCache(redis.Redis(connection_pool=pool), ["votes:current"])
+        with self.assertRaises(redis.ResponseError):
+            cache.start()
+        cache.close()
+        self.assertFalse(cache.ready)
+
+
+if __name__ == "__main__":
+    unittest.main()
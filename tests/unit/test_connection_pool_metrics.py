@@ -0,0 +1,244 @@
+import unittest
+import os
+from unittest.mock import MagicMock, patch
+
+import redis
+
+from connection_manager import (
+    AdaptivePoolPolicy, ConnectionManager, InstrumentedRedisPool, Neo4jConnectionPool, PoolMetrics,
+    RedisConnectionPool
+)
+from knowledge_graph import KnowledgeGraph
+from optimizations.performance_dashboard import PerformanceDashboard
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+class TestPoolMetrics(unittest.TestCase):
+
+    def test_percentile_uses_bucket_upper_bound(self):
+        metrics = PoolMetrics()
+        for wait in [0.0005] * 90 + [0.03] * 10:
+            metrics.record_checkout(wait)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["wait_p50_ms"], 1.0)
+        self.assertEqual(snapshot["wait_p95_ms"], 50.0)
+        self.assertEqual(snapshot["wait_histogram"], {"<=1ms": 90, "<=50ms": 10})
+
+    def test_in_use_gauge_and_peak(self):
+        metrics = PoolMetrics()
+        for _ in range(3):
+            metrics.record_checkout(0)
+        metrics.record_release()
+        snapshot = metrics.snapshot()
+        self.assertEqual((snapshot["in_use"], snapshot["peak_in_use"], snapshot["checkouts"]), (2, 3, 3))
+
+    def test_errors_and_timeouts(self):
+        metrics = PoolMetrics()
+        metrics.record_error()
+        metrics.record_error(timeout=True)
+        self.assertEqual((metrics.errors, metrics.timeouts), (2, 1))
+
+    def test_window_peak_resets(self):
+        metrics = PoolMetrics()
+        metrics.record_checkout(0)
+        metrics.record_checkout(0)
+        metrics.record_release()
+        self.assertEqual(metrics.take_window()[1], 2)
+        self.assertEqual(metrics.take_window()[1], 1)
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestInstrumentedRedisPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = InstrumentedRedisPool(
+            connection_class=getattr(fakeredis, "FakeRedisConnection", fakeredis.FakeConnection),
+            server=fakeredis.FakeServer(),
+            max_connections=2, timeout=0.05, decode_responses=True
+        )
+        self.redis = redis.Redis(connection_pool=self.pool)
+
+    def test_counts_checkouts_and_creations(self):
+        self.redis.set("a", 1)
+        self.redis.get("a")
+        metrics = self.pool.get_metrics()
+        self.assertEqual((metrics["checkouts"], metrics["created"], metrics["in_use"]), (2, 1, 0))
+        self.assertEqual(metrics["max_connections"], 2)
+
+    def test_exhaustion_is_a_timeout(self):
+        held = [self.pool.get_connection("GET") for _ in range(2)]
+        with self.assertRaises(redis.ConnectionError):
+            self.pool.get_connection("GET")
+        metrics = self.pool.get_metrics()
+        self.assertEqual((metrics["in_use"], metrics["errors"], metrics["timeouts"]), (2, 1, 1))
+        for connection in held:
+            self.pool.release(connection)
+        self.assertEqual(self.pool.get_metrics()["in_use"], 0)
+
+    def test_grow_allows_more_connections(self):
+        self.pool.resize(3)
+        held = [self.pool.get_connection("GET") for _ in range(3)]
+        self.assertEqual(self.pool.get_metrics()["in_use"], 3)
+        for connection in held:
+            self.pool.release(connection)
+
+    def test_shrink_closes_connections_on_release(self):
+        held = [self.pool.get_connection("GET") for _ in range(2)]
+        self.pool.resize(1)
+        for connection in held:
+            self.pool.release(connection)
+        self.assertEqual(self.pool.pool.maxsize, 1)
+        self.assertEqual(len(self.pool._connections), 1)
+        self.pool.get_connection("GET")
+        with self.assertRaises(redis.ConnectionError):
+            self.pool.get_connection("GET")
+
+
+class TestRedisCheckoutTimeout(unittest.TestCase):
+
+    def test_checkout_timeout_is_separate_from_socket_timeout(self):
+        with patch.dict(os.environ, {"REDIS_POOL_CHECKOUT_TIMEOUT": "0.25"}):
+            pool = RedisConnectionPool("localhost", 6379, None)._build_pool(decode_responses=True)
+        self.assertEqual(pool.timeout, 0.25)
+        self.assertEqual(pool.connection_kwargs["socket_timeout"], 30)
+
+    def test_default_checkout_timeout(self):
+        with patch.dict(os.environ):
+            os.environ.pop("REDIS_POOL_CHECKOUT_TIMEOUT", None)
+            self.assertEqual(RedisConnectionPool("localhost", 6379, None).checkout_timeout, 1.0)
+
+
+class TestAdaptivePoolPolicy(unittest.TestCase):
+
+    def _pool(self, max_connections, waits, peak):
+        pool = MagicMock()
+        pool.max_connections = max_connections
+        pool.metrics = PoolMetrics()
+        for wait in waits:
+            pool.metrics.record_checkout(wait)
+        pool.metrics.in_use = 0
+        pool.metrics.window_peak = peak
+        return pool
+
+    def test_grows_when_waits_are_slow(self):
+        policy = AdaptivePoolPolicy(max_connections=12, grow_wait_ms=10, step=4)
+        pool = self._pool(10, [0.05] * 30, peak=10)
+        self.assertEqual(policy.evaluate(pool), 12)
+        pool.resize.assert_called_once_with(12)
+
+    def test_shrinks_when_underused(self):
+        policy = AdaptivePoolPolicy(min_connections=5, step=2)
+        pool = self._pool(20, [0.0001] * 30, peak=3)
+        self.assertEqual(policy.evaluate(pool), 18)
+
+    def test_needs_enough_samples(self):
+        policy = AdaptivePoolPolicy(min_samples=20)
+        pool = self._pool(10, [0.05] * 5, peak=10)
+        self.assertIsNone(policy.evaluate(pool))
+        pool.resize.assert_not_called()
+
+    def test_only_counts_new_samples(self):
+        policy = AdaptivePoolPolicy(grow_wait_ms=10, min_samples=20)
+        pool = self._pool(10, [0.05] * 30, peak=10)
+        policy.evaluate(pool)
+        pool.max_connections = 12
+        self.assertIsNone(policy.evaluate(pool))
+
+
+class TestNeo4jPoolMetrics(unittest.TestCase):
+
+    def test_session_acquisition_is_recorded(self):
+        class Session:
+            def __init__(self):
+                self._connection = None
+
+            def _connect(self):
+                if self._connection:
+                    self._disconnect()
+                self._connection = object()
+
+            def _disconnect(self):
+                self._connection = None
+
+        pool = Neo4jConnectionPool("bolt://localhost:7687", ("neo4j", "pw"))
+        pool.driver = MagicMock()
+        pool.driver.session.return_value = Session()
+        session = pool.get_connection()
+
+        session._connect()
+        session._connect()  # 重新取得連線時先歸還前一條
+        self.assertEqual((pool.metrics.checkouts, pool.metrics.in_use), (2, 1))
+        session._disconnect()
+        session._disconnect()
+        metrics = pool.get_metrics()
+        self.assertEqual((metrics["in_use"], metrics["peak_in_use"]), (0, 1))
+
+    def test_knowledge_graph_sessions_use_manager_pool(self):
+        class Session:
+            """查詢時取得連線、離開 with 區塊時歸還，與驅動程式的工作階段相同"""
+            def __init__(self):
+                self._connection = None
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                self._disconnect()
+
+            def _connect(self):
+                if self._connection:
+                    self._disconnect()
+                self._connection = object()
+
+            def _disconnect(self):
+                self._connection = None
+
+            def run(self, *args, **kwargs):
+                self._connect()
+                return MagicMock()
+
+        manager = ConnectionManager()
+        with patch("knowledge_graph.connection_manager", manager), \
+                patch("connection_manager.GraphDatabase.driver") as driver:
+            driver.return_value.session.side_effect = Session
+            graph = KnowledgeGraph(uri="bolt://localhost:7687", user="neo4j", password="pw")
+            checkouts = manager.pool_metrics()["neo4j"]["checkouts"]
+            graph.add_user("u1")
+
+        self.assertIs(graph.pool, manager.neo4j_pool)
+        metrics = manager.pool_metrics()["neo4j"]
+        self.assertEqual(metrics["checkouts"], checkouts + 1)
+        self.assertEqual(metrics["in_use"], 0)
+
+
+class TestPoolReporting(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = ConnectionManager()
+        self.manager.redis_pool = MagicMock()
+        self.manager.redis_pool.get_metrics.return_value = {"main": {
+            "max_connections": 10, "in_use": 4, "peak_in_use": 7, "wait_p95_ms": 100.0,
+            "errors": 0, "timeouts": 0
+        }}
+        self.manager.redis_pool.client_cache = None
+
+    def test_manager_collects_pool_metrics(self):
+        self.assertEqual(list(self.manager.pool_metrics()), ["redis"])
+
+    def test_dashboard_shows_pools(self):
+        dashboard = PerformanceDashboard()
+        dashboard.attach_connection_pools(self.manager)
+        self.assertIn("redis:main: 使用中 4/10 (峰值 7) 等待 p95 100ms", dashboard._format_connection_pools())
+        self.assertTrue(any("redis:main" in s for s in dashboard.generate_optimization_suggestions()))
+
+    def test_dashboard_without_pools(self):
+        self.assertEqual(PerformanceDashboard().get_pool_stats(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from conversation_buffer import ConversationBuffer
+from knowledge_graph import KnowledgeGraph
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+def make_messages(count, start=0):
+    """新到舊排列的訊息"""
+    return [{"id": f"m{i}", "content": f"訊息{i}", "time": 1700000000.0 + i}
+            for i in range(start + count - 1, start - 1, -1)]
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestConversationBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.buffer = ConversationBuffer(self.redis, size=5)
+
+    def test_cold_buffer_misses_and_push_is_skipped(self):
+        self.buffer.push("u1", {"id": "m1", "content": "hi", "time": 1.0})
+        self.assertIsNone(self.buffer.get("u1", 3))
+        self.assertFalse(self.redis.exists("ctx:u1"))
+
+    def test_seeded_buffer_returns_newest_first(self):
+        self.buffer.seed("u1", make_messages(2), complete=True)
+        self.buffer.push("u1", {"id": "m2", "content": "訊息2", "time": 1700000002.0})
+
+        context = self.buffer.get("u1", 3)
+        self.assertEqual([m["id"] for m in context], ["m2", "m1", "m0"])
+
+        # 完整歷史少於 limit 時仍可回答
+        self.assertEqual(len(self.buffer.get("u1", 10)), 3)
+
+    def test_ring_buffer_is_bounded(self):
+        self.buffer.seed("u1", [], complete=True)  # 沒有歷史時無法建立
+        self.buffer.seed("u1", make_messages(1), complete=True)
+        for i in range(1, 20):
+            self.buffer.push("u1", {"id": f"m{i}", "content": "x", "time": float(i)})
+
+        self.assertEqual(self.redis.llen("ctx:u1"), 5)
+        self.assertEqual([m["id"] for m in self.buffer.get("u1", 5)], ["m19", "m18", "m17", "m16", "m15"])
+        # 超過緩衝大小的請求需回到資料庫
+        self.assertIsNone(self.buffer.get("u1", 10))
+
+    def test_incomplete_seed_cannot_answer_larger_limit(self):
+        self.buffer.seed("u1", make_messages(3), complete=False)
+        self.assertEqual(len(self.buffer.get("u1", 3)), 3)
+        self.assertIsNone(self.buffer.get("u1", 4))
+
+    def test_seed_does_not_overwrite_existing_buffer(self):
+        self.buffer.seed("u1", make_messages(2), complete=True)
+        self.buffer.seed("u1", make_messages(3, start=10), complete=True)
+        self.assertEqual([m["id"] for m in self.buffer.get("u1", 5)], ["m1", "m0"])
+        self.assertTrue(0 < self.redis.ttl("ctx:u1") <= 86400)
+
+    def test_get_many_single_round_trip(self):
+        for user_id in ["u1", "u2"]:
+            self.buffer.seed(user_id, make_messages(2), complete=True)
+
+        with patch.object(self.redis, "pipeline", wraps=self.redis.pipeline) as pipeline:
+            contexts = self.buffer.get_many(["u1", "u2", "u3"], 2)
+
+        self.assertEqual(pipeline.call_count, 1)
+        self.assertEqual(len(contexts["u1"]), 2)
+        self.assertIsNone(contexts["u3"])
+        self.assertEqual(self.buffer.stats, {"hits": 2, "misses": 1})
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestKnowledgeGraphContextBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.kg = KnowledgeGraph(uri=None, user=None, password=None)
+        self.kg.uri = "bolt://localhost"
+        self.kg.connected = True
+        self.kg.driver = MagicMock()
+        self.kg.attach_context_buffer(ConversationBuffer(fakeredis.FakeRedis(decode_responses=True), size=5))
+
+    def test_miss_queries_neo4j_once_then_hits_buffer(self):
+        with patch.object(self.kg, "_query_conversation_context", return_value=make_messages(2)) as query:
+            first = self.kg.get_conversation_context("u1", limit=3)
+            second = self.kg.get_conversation_context("u1", limit=3)
+
+        query.assert_called_once_with("u1", 5)
+        self.assertEqual(first, second)
+
+    def test_memories_fall_back_to_buffer_when_disconnected(self):
+        self.kg.connected = False
+        self.kg.context_buffer.seed("u1", make_messages(2), complete=True)
+        memories = self.kg.get_user_memories(["u1", "u2"], context_limit=3)
+
+        self.kg.driver.session.assert_not_called()
+        self.assertEqual([m["id"] for m in memories["u1"]["recent_messages"]], ["m1", "m0"])
+        self.assertEqual(memories["u1"]["preferences"]["preferred_features"], [])
+        self.assertNotIn("u2", memories)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import time
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+from embedding_service import EmbeddingService, normalize_text
+from intent_analyzer import IntentAnalyzer
+
+
+class FakeModel:
+    """記錄每次 encode 呼叫的假模型"""
+
+    def __init__(self, delay: float = 0):
+        self.calls = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def encode(self, texts):
+        with self.lock:
+            self.calls.append(list(texts))
+        time.sleep(self.delay)
+        return [[float(len(text)), float(sum(map(ord, text)) % 97)] for text in texts]
+
+
+class TestEmbeddingService(unittest.TestCase):
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("  Hello   World \n"), "hello world")
+
+    def test_cache_keyed_by_normalized_text(self):
+        model = FakeModel()
+        service = EmbeddingService(model=model, batch_window_ms=0)
+
+        first = service.encode("今天 天氣 好")
+        second = service.encode("  今天   天氣 好 ")
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(model.calls), 1)
+        self.assertEqual(service.get_stats()["hits"], 1)
+
+    def test_lru_eviction(self):
+        model = FakeModel()
+        service = EmbeddingService(model=model, cache_size=2, batch_window_ms=0)
+        service.encode("a")
+        service.encode("b")
+        service.encode("a")  # a 變成最近使用
+        service.encode("c")  # 淘汰 b
+        service.encode("a")
+        service.encode("b")
+        self.assertEqual([call[0] for call in model.calls], ["a", "b", "c", "b"])
+
+    def test_concurrent_requests_are_batched(self):
+        model = FakeModel(delay=0.01)
+        service = EmbeddingService(model=model, batch_window_ms=20, max_batch_size=64)
+        texts = [f"訊息 {i}" for i in range(32)]
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            vectors = list(pool.map(service.encode, texts))
+
+        self.assertEqual(len(vectors), 32)
+        self.assertEqual(vectors[3], model.encode(["訊息 3"])[0])
+        self.assertLess(len(model.calls), 32)
+
+    def test_encode_many_single_model_call(self):
+        model = FakeModel()
+        service = EmbeddingService(model=model, batch_window_ms=0)
+        service.encode("a")
+
+        vectors = service.encode_many(["a", "b", "c", "b"])
+
+        self.assertEqual(len(vectors), 4)
+        self.assertEqual(model.calls[-1], ["b", "c"])
+
+
+class TestIntentAnalyzerLazyEmbedding(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = MagicMock()
+        self.graph.find_similar_intents.return_value = []
+        self.graph.get_user_preferences.return_value = {}
+        self.analyzer = IntentAnalyzer(graph=self.graph)
+        self.analyzer.embedder = MagicMock()
+        self.analyzer.embedder.encode.return_value = [0.1, 0.2]
+
+    def test_fast_path_skips_embedding(self):
+        result = self.analyzer.analyze("看看統計", "user1")
+        self.assertEqual(result["feature"], "統計")
+        self.analyzer.embedder.encode.assert_not_called()
+
+    def test_slow_path_computes_embedding(self):
+        self.analyzer.analyze("今天天氣真好呀", "user1")
+        self.analyzer.embedder.encode.assert_called_once_with("今天天氣真好呀")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from fallback_limiter import FallbackLimiter
+
+NOW = 1_700_000_000.0
+
+
+class TestFallbackLimiter(unittest.TestCase):
+
+    def test_budget_is_split_across_instances(self):
+        limiter = FallbackLimiter(expected_instances=3)
+        results = [limiter.is_allowed("u1", 30, 60, now=NOW)[0] for _ in range(12)]
+        self.assertEqual(results, [True] * 10 + [False] * 2)
+        self.assertEqual(limiter.stats, {"allowed": 10, "rejected": 2})
+
+    def test_refills_over_window(self):
+        limiter = FallbackLimiter(expected_instances=2)
+        for _ in range(10):
+            limiter.is_allowed("u1", 20, 60, now=NOW)
+        allowed, info = limiter.is_allowed("u1", 20, 60, now=NOW)
+        self.assertFalse(allowed)
+        self.assertEqual(info["retry_after"], 6)
+        # 10 個額度 / 60 秒 → 每 6 秒補 1 個
+        self.assertTrue(limiter.is_allowed("u1", 20, 60, now=NOW + 6)[0])
+        self.assertFalse(limiter.is_allowed("u1", 20, 60, now=NOW + 6)[0])
+
+    def test_small_limits_keep_one_token(self):
+        limiter = FallbackLimiter(expected_instances=10)
+        self.assertTrue(limiter.is_allowed("u1", 5, 3600, now=NOW)[0])
+        self.assertFalse(limiter.is_allowed("u1", 5, 3600, now=NOW)[0])
+
+    def test_identifiers_are_independent(self):
+        limiter = FallbackLimiter(expected_instances=1)
+        limiter.is_allowed("u1", 1, 60, now=NOW)
+        self.assertTrue(limiter.is_allowed("u2", 1, 60, now=NOW)[0])
+
+    def test_bucket_count_is_bounded(self):
+        limiter = FallbackLimiter(expected_instances=1, max_buckets=2)
+        for user in ["u1", "u2", "u3"]:
+            limiter.is_allowed(user, 1, 60, now=NOW)
+        self.assertEqual(len(limiter._buckets), 2)
+        # u1 已被淘汰，重新取得完整額度
+        self.assertTrue(limiter.is_allowed("u1", 1, 60, now=NOW)[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from health_prober import HealthProber
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestHealthProber(unittest.TestCase):
+
+    def setUp(self):
+        self.prober = HealthProber()
+
+    def tearDown(self):
+        self.prober.stop()
+
+    def test_pending_before_first_check(self):
+        self.prober.register("redis", MagicMock(), interval=10)
+        self.assertEqual(self.prober.snapshot(), {"redis": {"status": "pending"}})
+        self.assertEqual(self.prober.overall_status(), "healthy")
+
+    def test_records_latency_and_status(self):
+        self.prober.register("redis", lambda: time.sleep(0.01), interval=10)
+        result = self.prober.check_now()["redis"]
+        self.assertEqual(result["status"], "healthy")
+        self.assertGreaterEqual(result["latency_ms"], 10)
+        self.assertIsNone(result["error"])
+
+    def test_failures_are_counted(self):
+        check = MagicMock(side_effect=ConnectionError("down"))
+        self.prober.register("neo4j", check, interval=10)
+        self.prober.check_now()
+        result = self.prober.check_now()["neo4j"]
+        self.assertEqual((result["status"], result["consecutive_failures"], result["error"]),
+                         ("unhealthy", 2, "down"))
+        self.assertEqual(self.prober.overall_status(), "degraded")
+
+        check.side_effect = None
+        self.assertEqual(self.prober.check_now()["neo4j"]["consecutive_failures"], 0)
+
+    def test_false_result_is_unhealthy(self):
+        self.prober.register("neo4j", lambda: False, interval=10)
+        self.assertEqual(self.prober.check_now()["neo4j"]["status"], "unhealthy")
+
+    def test_old_results_are_stale(self):
+        self.prober.register("redis", MagicMock(), interval=10)
+        self.prober.check_now()
+        checked_at = self.prober.snapshot()["redis"]["checked_at"]
+        result = self.prober.snapshot(now=checked_at + 31)["redis"]
+        self.assertEqual(result["status"], "stale")
+        self.assertEqual(result["age_seconds"], 31)
+        self.assertEqual(self.prober.overall_status(self.prober.snapshot(now=checked_at + 31)), "healthy")
+
+    def test_refresh_stale_reprobes_old_results(self):
+        check = MagicMock()
+        self.prober.register("redis", check, interval=10, stale_after=0.01)
+        self.prober.register("firestore", MagicMock(), interval=10)
+        self.prober.check_now()
+        time.sleep(0.02)
+        result = self.prober.refresh_stale(timeout=1)["redis"]
+        self.assertEqual(result["status"], "healthy")
+        self.assertEqual(check.call_count, 2)
+
+    def test_refresh_stale_is_bounded_by_timeout(self):
+        release = threading.Event()
+        check = MagicMock()
+        self.prober.register("hung", check, interval=10, stale_after=0.01)
+        self.prober.check_now()
+        check.side_effect = lambda: release.wait(5)
+        time.sleep(0.02)
+        try:
+            start = time.monotonic()
+            snapshot = self.prober.refresh_stale(timeout=0.05)
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertEqual(snapshot["hung"]["status"], "stale")
+            self.assertEqual(self.prober.overall_status(snapshot), "healthy")
+            # 上一次重新檢查未完成時不重複啟動
+            self.prober.refresh_stale(timeout=0.05)
+            self.assertEqual(check.call_count, 2)
+        finally:
+            release.set()
+
+    def test_snapshot_does_not_call_checks(self):
+        check = MagicMock()
+        self.prober.register("firestore", check, interval=10)
+        self.prober.check_now()
+        for _ in range(5):
+            self.prober.snapshot()
+        self.assertEqual(check.call_count, 1)
+
+    def test_deep_check(self):
+        check, deep_check = MagicMock(), MagicMock()
+        self.prober.register("firestore", check, interval=10, deep_check=deep_check)
+        self.prober.register("redis", MagicMock(), interval=10)
+        self.prober.check_now(deep=True)
+        check.assert_not_called()
+        deep_check.assert_called_once()
+
+    def test_background_checks_each_interval(self):
+        fast, slow = MagicMock(), MagicMock()
+        self.prober.register("fast", fast, interval=0.02)
+        self.prober.register("slow", slow, interval=10)
+        self.prober.start()
+        self.assertTrue(wait_for(lambda: fast.call_count >= 3))
+        self.assertEqual(slow.call_count, 1)
+
+    def test_hanging_check_does_not_block_others(self):
+        release = threading.Event()
+        self.prober.register("hung", lambda: release.wait(5), interval=10)
+        self.prober.register("redis", MagicMock(), interval=10)
+        self.prober.start()
+        try:
+            self.assertTrue(wait_for(lambda: self.prober.snapshot()["redis"]["status"] == "healthy"))
+            self.assertEqual(self.prober.snapshot()["hung"], {"status": "pending"})
+        finally:
+            release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from collections import Counter
+from unittest.mock import MagicMock
+from collective_memory import CollectiveMemorySystem
+from hour_analytics import analyze_hour, emotion_turning_points, extract_topics_batch
+
+TEXTS = [
+    "今天天氣真好，大家一起去散步吧",
+    "好累好累好累",
+    "",
+    "hello world 123",
+    "😀 哈哈哈哈 😀 開心",
+    "為什麼為什麼？因為因為",
+    "咖啡咖啡咖啡廳",
+    "a",
+    "中",
+    "週末要不要一起看電影？看電影好",
+]
+
+
+class TestExtractTopicsBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.memory = CollectiveMemorySystem(MagicMock())
+
+    def test_matches_per_message_extraction(self):
+        """批次結果與逐則 _extract_topics 完全相同（含同次數的排序）"""
+        expected = [self.memory._extract_topics(text) for text in TEXTS]
+        self.assertEqual(extract_topics_batch(TEXTS), expected)
+
+    def test_empty_input(self):
+        self.assertEqual(extract_topics_batch([]), [])
+        self.assertEqual(extract_topics_batch(["", "abc"]), [[], []])
+
+    def test_ngrams_do_not_cross_messages(self):
+        """相鄰訊息首尾不可組成詞組"""
+        self.assertEqual(extract_topics_batch(["你", "好"]), [[], []])
+
+
+class TestEmotionTurningPoints(unittest.TestCase):
+
+    def test_detects_shift(self):
+        emotions = ["happy"] * 10 + ["sad"] * 10
+        points = emotion_turning_points(emotions, window=5)
+        self.assertEqual(len(points), 1)
+        self.assertEqual(points[0]["index"], 10)
+        self.assertEqual((points[0]["from"], points[0]["to"]), ("happy", "sad"))
+
+    def test_stable_sequence_has_no_points(self):
+        self.assertEqual(emotion_turning_points(["neutral"] * 50), [])
+
+    def test_too_few_messages(self):
+        self.assertEqual(emotion_turning_points(["happy", "sad"]), [])
+
+
+class TestAnalyzeHour(unittest.TestCase):
+
+    def setUp(self):
+        self.memory = CollectiveMemorySystem(MagicMock())
+        self.messages = [{"content": text, "timestamp": 1700000000 + i * 60}
+                         for i, text in enumerate(TEXTS * 3)]
+
+    def test_hot_topics_match_counter(self):
+        all_topics = []
+        for msg in self.messages:
+            all_topics.extend(self.memory._extract_topics(msg["content"]))
+        expected = [topic for topic, _ in Counter(all_topics).most_common(10)]
+
+        result = analyze_hour(self.messages, self.memory._detect_emotion)
+        self.assertEqual(result["topics"]["hot_topics"], expected)
+
+    def test_collective_emotion_shape(self):
+        emotion = self.memory._analyze_collective_emotion(self.messages)
+        self.assertIn("dominant", emotion)
+        self.assertAlmostEqual(sum(float(v.rstrip("%")) for v in emotion["distribution"].values()), 100, delta=0.5)
+        self.assertIsInstance(emotion["turning_points"], list)
+
+    def test_empty_hour(self):
+        result = analyze_hour([], self.memory._detect_emotion)
+        self.assertEqual(result["emotion"]["dominant"], "neutral")
+        self.assertEqual(result["topics"]["hot_topics"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
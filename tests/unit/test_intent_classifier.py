@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+from intent_classifier import PrototypeIntentClassifier
+from intent_analyzer import IntentAnalyzer
+from knowledge_graph import KnowledgeGraph
+
+
+class CharEmbedder:
+    """以字元雜湊產生向量的假嵌入服務（共用字元越多越相似）"""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.batches = []
+
+    def encode(self, text):
+        vector = [0.0] * self.dim
+        for char in text:
+            vector[ord(char) % self.dim] += 1.0
+        return vector
+
+    def encode_many(self, texts):
+        self.batches.append(list(texts))
+        return [self.encode(text) for text in texts]
+
+
+FEATURES = {
+    "接龍": ["接龍", "文字接龍"],
+    "投票": ["投票", "表決"],
+    "統計": ["統計", "數據"],
+}
+
+
+class TestPrototypeIntentClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.embedder = CharEmbedder()
+        self.classifier = PrototypeIntentClassifier(self.embedder, FEATURES, examples={"投票": ["大家來決定"]})
+
+    def test_build_is_lazy_and_single_batch(self):
+        self.assertFalse(self.classifier.ready)
+        self.classifier.classify_text("接龍")
+        self.assertTrue(self.classifier.ready)
+        self.classifier.classify_text("投票")
+        self.assertEqual(len(self.embedder.batches), 1)
+        self.assertTrue(self.classifier._matrix.flags["C_CONTIGUOUS"])
+
+    def test_scores_match_brute_force(self):
+        message = "我們來玩文字接龍吧"
+        scores = self.classifier.scores(self.embedder.encode(message))
+
+        query = np.asarray(self.embedder.encode(message))
+        for feature, score in zip(self.classifier.features, scores):
+            prototypes = FEATURES[feature] + ({"投票": ["大家來決定"]}.get(feature, []))
+            expected = max(
+                float(np.dot(query, p) / (np.linalg.norm(query) * np.linalg.norm(p)))
+                for p in (np.asarray(self.embedder.encode(text)) for text in prototypes)
+            )
+            self.assertAlmostEqual(float(score), expected, places=5)
+
+    def test_classify_confident(self):
+        result = self.classifier.classify_text("大家來決定")
+        self.assertEqual(result["feature"], "投票")
+        self.assertTrue(result["confident"])
+        self.assertAlmostEqual(result["confidence"], 1.0, places=3)
+
+    def test_unrelated_text_not_confident(self):
+        result = self.classifier.classify_text("今天天氣好")
+        self.assertFalse(result["confident"])
+
+    def test_zero_vector(self):
+        result = self.classifier.classify([0.0] * 64)
+        self.assertFalse(result["confident"])
+
+
+class TestIntentAnalyzerClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = MagicMock()
+        self.graph.find_similar_intents.return_value = []
+        self.analyzer = IntentAnalyzer(graph=self.graph)
+        self.analyzer.classifier = PrototypeIntentClassifier(CharEmbedder(), FEATURES, examples={})
+
+    def test_confident_prediction_skips_graph(self):
+        embedder = CharEmbedder()
+        similar = self.analyzer._find_similar_intents("user1", embedder.encode("文字接龍"))
+        self.assertEqual(similar[0]["feature"], "接龍")
+        self.graph.find_similar_intents.assert_not_called()
+
+    def test_low_confidence_falls_back_to_graph(self):
+        embedding = CharEmbedder().encode("今天天氣好")
+        self.analyzer._find_similar_intents("user1", embedding)
+        self.graph.find_similar_intents.assert_called_once_with("user1", embedding)
+
+    def test_confident_prediction_skips_user_preferences(self):
+        embedder = CharEmbedder()
+        with patch.object(self.analyzer, "_get_embedding", side_effect=embedder.encode):
+            result = self.analyzer.analyze("龍接字文", "user1")
+        self.assertEqual(result["feature"], "接龍")
+        self.graph.get_user_preferences.assert_not_called()
+
+
+class TestIntentAnalyzerDisconnectedGraph(unittest.TestCase):
+
+    def setUp(self):
+        with patch.dict("os.environ", {"NEO4J_URI": "", "NEO4J_PASSWORD": ""}):
+            self.graph = KnowledgeGraph(uri=None, user=None, password=None)
+        self.analyzer = IntentAnalyzer(graph=self.graph)
+        self.analyzer.classifier = PrototypeIntentClassifier(CharEmbedder(), FEATURES, examples={})
+        self.embedder = CharEmbedder()
+
+    def test_classifier_result_survives_disconnected_graph(self):
+        with patch.object(self.analyzer, "_get_embedding", side_effect=self.embedder.encode):
+            result = self.analyzer.analyze("龍接字文", "user1")
+        self.assertEqual(result["feature"], "接龍")
+        self.assertNotIn("error", result)
+
+    def test_low_confidence_without_graph_is_not_an_error(self):
+        with patch.object(self.analyzer, "_get_embedding", side_effect=self.embedder.encode):
+            result = self.analyzer.analyze("今天天氣好", "user1")
+        self.assertNotIn("error", result)
+
+
+if __name__ == '__main__':
+    unittest.main()
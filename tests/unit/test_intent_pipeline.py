@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import MagicMock
+from intent_pipeline import TieredIntentPipeline, TIER_COMMAND, TIER_KEYWORD, TIER_SEMANTIC
+from intent_analyzer import IntentAnalyzer
+from optimizations.performance_dashboard import PerformanceDashboard
+import command_words
+
+
+class TestTieredIntentPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = MagicMock()
+        self.graph.find_similar_intents.return_value = []
+        self.graph.get_user_preferences.return_value = {}
+        self.analyzer = IntentAnalyzer(graph=self.graph)
+        self.analyzer.embedder = MagicMock()
+        self.analyzer.embedder.encode.return_value = [0.1, 0.2]
+        self.analyzer.classifier = None
+        self.dashboard = PerformanceDashboard(None)
+        self.context_loader = MagicMock(return_value=[])
+        self.pipeline = TieredIntentPipeline(self.analyzer, extra_commands=["玩"], dashboard=self.dashboard)
+
+    def test_exact_commands_zero_io(self):
+        for message in ["統計", "STATS", "3", "接龍 蘋果", "搜尋 天氣", "玩"]:
+            result = self.pipeline.classify(message, "user1", self.context_loader)
+            self.assertEqual(result["tier"], TIER_COMMAND, message)
+            self.assertEqual(result["intent"], "command")
+
+        self.context_loader.assert_not_called()
+        self.analyzer.embedder.encode.assert_not_called()
+        self.graph.get_user_preferences.assert_not_called()
+        self.graph.create_message_with_intent.assert_not_called()
+
+    def test_vote_digits_ignore_whitespace(self):
+        self.assertEqual(command_words.vote_option(" 1 "), 1)
+        self.assertIsNone(command_words.vote_option("²"))
+        self.assertEqual(self.pipeline.match_command(" 1")["feature"], "投票")
+        self.assertIsNone(self.pipeline.match_command("²"))
+
+    def test_keyword_tier(self):
+        result = self.pipeline.classify("我想看看最新廣播", "user1", self.context_loader)
+        self.assertEqual(result["tier"], TIER_KEYWORD)
+        self.assertEqual(result["feature"], "廣播")
+        self.context_loader.assert_not_called()
+        self.analyzer.embedder.encode.assert_not_called()
+
+    def test_semantic_tier_loads_context(self):
+        result = self.pipeline.classify("今天天氣真好呀", "user1", self.context_loader)
+        self.assertEqual(result["tier"], TIER_SEMANTIC)
+        self.context_loader.assert_called_once()
+        self.analyzer.embedder.encode.assert_called_once()
+
+    def test_context_failure_still_classifies(self):
+        self.context_loader.side_effect = RuntimeError("neo4j down")
+        result = self.pipeline.classify("今天天氣真好呀", "user1", self.context_loader)
+        self.assertEqual(result["tier"], TIER_SEMANTIC)
+
+    def test_stats_exported(self):
+        self.pipeline.classify("統計", "user1")
+        self.pipeline.classify("廣播", "user1")
+        self.pipeline.classify("最新廣播是什麼", "user1")
+
+        stats = self.pipeline.get_stats()
+        self.assertEqual(stats["指令"]["hits"], 2)
+        self.assertEqual(stats["關鍵詞"]["hits"], 1)
+        self.assertNotIn("語義", stats)
+        self.assertEqual(self.dashboard.get_intent_tier_stats()[TIER_COMMAND]["hits"], 2)
+        self.assertEqual(TieredIntentPipeline(None).get_stats(), {})
+
+    def test_every_handler_word_is_a_command(self):
+        for words in command_words.EXACT_COMMANDS.values():
+            for word in words:
+                self.assertEqual(self.pipeline.match_command(word.upper())["intent"], "command", word)
+        for prefix, feature in command_words.COMMAND_PREFIXES:
+            self.assertEqual(self.pipeline.match_command(prefix + "x")["feature"], feature)
+
+    def test_without_analyzer_only_commands(self):
+        pipeline = TieredIntentPipeline(None)
+        self.assertEqual(pipeline.classify("統計")["feature"], "統計")
+        self.assertIsNone(pipeline.classify("今天天氣真好"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import MagicMock
+from keyword_automaton import KeywordAutomaton, KeywordIndex, KeywordHit, keyword_index
+from collective_memory import CollectiveMemorySystem, FEATURE_USAGE_KEYWORDS
+from intent_analyzer import IntentAnalyzer
+from optimizations.smart_onboarding import SmartErrorHandler
+
+SAMPLE_MESSAGES = [
+    "我想玩文字接龍",
+    "看看統計",
+    "今天好累，想睡了😴",
+    "哈哈太棒了！我好開心",
+    "為什麼廣播還沒出來？",
+    "有沒有避難所？我需要物資",
+    "投票 晚餐吃什麼",
+    "接龍",
+    "防空 信義區",
+    "今天天氣真好",
+    "",
+]
+
+
+class TestKeywordAutomaton(unittest.TestCase):
+
+    def test_scan_returns_all_overlapping_hits(self):
+        automaton = KeywordAutomaton()
+        for keyword in ["he", "she", "his", "hers"]:
+            automaton.add("ns", keyword, keyword)
+        automaton.build()
+
+        hits = automaton.scan("ushers")
+
+        self.assertEqual(
+            sorted(hits, key=lambda h: (h.position, h.keyword)),
+            [
+                KeywordHit("ns", "she", "she", 1),
+                KeywordHit("ns", "he", "he", 2),
+                KeywordHit("ns", "hers", "hers", 2),
+            ]
+        )
+
+    def test_same_keyword_in_multiple_categories(self):
+        index = KeywordIndex()
+        index.register("emotion", {"negative": ["累", "煩"], "tired": ["累", "睏"]})
+
+        self.assertEqual(index.keyword_counts("好累好睏", "emotion"), {"negative": 1, "tired": 2})
+
+    def test_memo_reused_and_cleared_on_register(self):
+        index = KeywordIndex()
+        index.register("a", {"x": ["接龍"]})
+        index.scan("玩接龍")
+        index.scan("玩接龍")
+        self.assertEqual(index.stats, {"scans": 1, "memo_hits": 1})
+
+        index.register("b", {"y": ["玩"]})
+        self.assertEqual(index.categories("玩接龍", "b"), ["y"])
+        self.assertEqual(index.stats["scans"], 2)
+
+    def test_register_same_mapping_is_noop(self):
+        index = KeywordIndex()
+        index.register("a", {"x": ["接龍"]})
+        automaton = index._automaton
+        index.register("a", {"x": ["接龍"]})
+        self.assertIs(index._automaton, automaton)
+
+
+class TestKeywordIndexConsumers(unittest.TestCase):
+    """確認改用自動機後，各模組結果與原本的巢狀掃描一致"""
+
+    def setUp(self):
+        self.analyzer = IntentAnalyzer(graph=MagicMock())
+        self.memory = CollectiveMemorySystem(MagicMock())
+        self.error_handler = SmartErrorHandler()
+
+    def test_feature_match_matches_naive_scan(self):
+        for text in SAMPLE_MESSAGES:
+            expected = next(
+                (feature for feature, keywords in self.analyzer.feature_keywords.items()
+                 if any(k in text for k in keywords)),
+                None
+            )
+            self.assertEqual(self.analyzer._match_feature_keywords(text), expected, text)
+
+    def test_emotion_matches_naive_scan(self):
+        for text in SAMPLE_MESSAGES:
+            scores = {}
+            for emotion, keywords in self.memory.emotion_keywords.items():
+                score = sum(1 for k in keywords if k in text)
+                if score > 0:
+                    scores[emotion] = score
+            expected = max(scores, key=scores.get) if scores else "neutral"
+            self.assertEqual(self.memory._detect_emotion(text), expected, text)
+
+    def test_feature_usage_matches_naive_scan(self):
+        for text in SAMPLE_MESSAGES:
+            expected = next(
+                (feature for feature, keywords in FEATURE_USAGE_KEYWORDS.items()
+                 if any(k in text for k in keywords)),
+                None
+            )
+            self.assertEqual(self.memory._detect_feature_usage(text), expected, text)
+
+    def test_intent_pattern_keeps_last_matching_type(self):
+        # 「我要開始」同時命中「開始」與「參與」，原邏輯取字典順序最後者
+        result = self.analyzer._determine_intent(message="我要開始", context_features=["接龍"])
+        self.assertEqual(result["intent"], "continue_feature")
+
+    def test_suggest_correction_format_errors(self):
+        self.assertIn("接龍格式", self.error_handler.suggest_correction("接龍"))
+        self.assertIn("投票格式", self.error_handler.suggest_correction("投票 晚餐"))
+        self.assertIn("防空格式", self.error_handler.suggest_correction("防空 信義區"))
+
+    def test_shared_index_has_all_namespaces(self):
+        for namespace in ["feature", "intent", "emotion", "feature_usage", "command_format"]:
+            self.assertIn(namespace, keyword_index._dictionaries)
+
+
+if __name__ == '__main__':
+    unittest.main()
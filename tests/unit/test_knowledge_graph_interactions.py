@@ -1,5 +1,6 @@
 import unittest
 from unittest.mock import patch, MagicMock
+from neo4j.exceptions import CypherSyntaxError
 from knowledge_graph import KnowledgeGraph # Assuming your file is knowledge_graph.py
 # If datetime is used directly in Cypher queries via parameters, it's fine.
 # If KG methods construct datetime objects, ensure they are comparable or mock datetime if needed.
@@ -218,5 +219,55 @@ class TestKnowledgeGraphInteractions(unittest.TestCase):
             mock_logger.warning.assert_called_with("Neo4j not connected, skipping get_friends_who_liked_joke for user u5, joke j3")
 
 
+class TestKnowledgeGraphBatchMemories(unittest.TestCase):
+
+    @patch('knowledge_graph.GraphDatabase.driver')
+    def setUp(self, mock_driver_constructor):
+        self.mock_session = MagicMock()
+        mock_driver_instance = MagicMock()
+        mock_driver_instance.session.return_value.__enter__.return_value = self.mock_session
+        mock_driver_constructor.return_value = mock_driver_instance
+
+        self.kg = KnowledgeGraph(uri="bolt://localhost:7687", user="neo4j", password="password")
+        self.kg.connected = True
+        self.mock_session.run.reset_mock()  # 忽略建立 schema 的查詢
+
+    def test_batch_uses_single_unwind_query(self):
+        self.mock_session.run.return_value = [
+            {"user_id": "u1", "features": [{"name": "投票", "count": 3}], "topics": [],
+             "context": [{"id": "m1", "content": "hi", "time": 1.0}]},
+            {"user_id": "u2", "features": [], "topics": [], "context": []},
+        ]
+
+        memories = self.kg.get_user_memories(["u1", "u2", "u1"], context_limit=5)
+
+        self.mock_session.run.assert_called_once()
+        query = self.mock_session.run.call_args[0][0]
+        params = self.mock_session.run.call_args[1]
+        self.assertIn("UNWIND $user_ids AS user_id", query)
+        self.assertEqual(params["user_ids"], ["u1", "u2"])
+        self.assertEqual(memories["u1"]["preferences"]["preferred_features"][0]["name"], "投票")
+        self.assertEqual(memories["u1"]["recent_messages"][0]["id"], "m1")
+        self.assertEqual(memories["u2"]["recent_messages"], [])
+
+    def test_falls_back_to_thread_pool_when_batch_unsupported(self):
+        self.mock_session.run.side_effect = CypherSyntaxError("CALL subquery not supported")
+
+        with patch.object(self.kg, 'get_user_preferences', return_value={"preferred_features": []}) as prefs, \
+             patch.object(self.kg, '_query_conversation_context', return_value=[]) as context:
+            memories = self.kg.get_user_memories(["u1", "u2", "u3"])
+            self.kg.get_user_memories(["u4"])
+
+        self.assertFalse(self.kg.supports_batch_queries)
+        self.assertEqual(self.mock_session.run.call_count, 1)  # 不再嘗試批次查詢
+        self.assertEqual(prefs.call_count, 4)
+        self.assertEqual(context.call_count, 4)
+        self.assertEqual(set(memories), {"u1", "u2", "u3"})
+
+    def test_not_connected_returns_empty(self):
+        self.kg.connected = False
+        self.assertEqual(self.kg.get_user_memories(["u1"]), {})
+
+
 if __name__ == '__main__':
     unittest.main()
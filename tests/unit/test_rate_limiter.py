@@ -0,0 +1,282 @@
+import math
+import random
+import unittest
+from unittest.mock import MagicMock
+
+import redis
+
+from circuit_breaker import CircuitBreaker
+from connection_manager import GuardedRedis
+from fallback_limiter import FallbackLimiter
+from rate_limiter import LeasedRateLimiter, RateLimiter, UserRateLimiter, line_user_key
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+ALGORITHMS = ["gcra", "sliding_window", "sliding_log"]
+NOW = 1_700_000_000.0
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestRateLimiterAlgorithms(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.limiter = RateLimiter(self.redis)
+
+    def _burst(self, algorithm, count, limit=5, window=10, now=NOW):
+        return [self.limiter.is_allowed("u1", limit, window, algorithm=algorithm, now=now)
+                for _ in range(count)]
+
+    def test_allows_limit_then_rejects(self):
+        for algorithm in ALGORITHMS:
+            with self.subTest(algorithm=algorithm):
+                results = self._burst(algorithm, 7)
+                self.assertEqual([allowed for allowed, _ in results], [True] * 5 + [False] * 2)
+                self.assertEqual([info["remaining"] for _, info in results[:5]], [4, 3, 2, 1, 0])
+                denied = results[-1][1]
+                self.assertGreaterEqual(denied["retry_after"], 1)
+                self.assertGreater(denied["reset"], NOW)
+
+    def test_single_key_per_identifier(self):
+        for algorithm in ALGORITHMS:
+            self._burst(algorithm, 3)
+        self.assertEqual(sorted(self.redis.keys("rate_limit:*")),
+                         ["rate_limit:gcra:u1", "rate_limit:sliding_window:u1", "rate_limit:u1"])
+        self.assertEqual(self.redis.type("rate_limit:gcra:u1"), "string")
+        self.assertEqual(self.redis.hlen("rate_limit:sliding_window:u1"), 3)
+
+    def test_gcra_recovers_one_request_per_interval(self):
+        self._burst("gcra", 5)
+        # 10 秒 5 次 → 每 2 秒恢復一次
+        allowed, info = self.limiter.is_allowed("u1", 5, 10, algorithm="gcra", now=NOW + 1)
+        self.assertFalse(allowed)
+        self.assertEqual(info["retry_after"], 1)
+        allowed, _ = self.limiter.is_allowed("u1", 5, 10, algorithm="gcra", now=NOW + 2)
+        self.assertTrue(allowed)
+        allowed, _ = self.limiter.is_allowed("u1", 5, 10, algorithm="gcra", now=NOW + 2)
+        self.assertFalse(allowed)
+
+    def test_sliding_window_weights_previous_window(self):
+        window_start = (NOW // 10 + 1) * 10
+        self._burst("sliding_window", 5, now=window_start - 1)
+        # 下一窗口過了 20%：上一窗口仍計 80%（4 次），只能再允許 1 次
+        results = self._burst("sliding_window", 2, now=window_start + 2)
+        self.assertEqual([allowed for allowed, _ in results], [True, False])
+        # 過了 60% 後上一窗口只計 2 次
+        results = self._burst("sliding_window", 3, now=window_start + 6)
+        self.assertEqual([allowed for allowed, _ in results], [True, True, False])
+
+    def test_identifiers_are_independent(self):
+        self._burst("gcra", 5)
+        allowed, _ = self.limiter.is_allowed("u2", 5, 10, algorithm="gcra", now=NOW)
+        self.assertTrue(allowed)
+
+    def test_default_algorithm(self):
+        limiter = RateLimiter(self.redis, algorithm="sliding_window")
+        limiter.is_allowed("u3", 5, 10)
+        self.assertTrue(self.redis.exists("rate_limit:sliding_window:u3"))
+
+    def test_unknown_algorithm_raises(self):
+        with self.assertRaises(ValueError):
+            self.limiter.is_allowed("u1", 5, 10, algorithm="leaky")
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestLeasedRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+
+    def _instance(self, fraction=0.1):
+        return LeasedRateLimiter(RateLimiter(self.redis, algorithm="gcra"), lease_fraction=fraction)
+
+    def test_under_limit_stays_local(self):
+        limiter = self._instance()
+        results = [limiter.is_allowed("u1", 120, 60, now=NOW)[0] for _ in range(12)]
+        self.assertTrue(all(results))
+        self.assertEqual(limiter.stats, {"local": 11, "remote": 1})
+
+    def test_single_instance_is_exact(self):
+        limiter = self._instance()
+        results = [limiter.is_allowed("u1", 120, 60, now=NOW)[0] for _ in range(130)]
+        self.assertEqual(sum(results), 120)
+
+    def test_denial_is_cached_until_retry(self):
+        limiter = self._instance()
+        for _ in range(121):
+            limiter.is_allowed("u1", 120, 60, now=NOW)
+        remote = limiter.stats["remote"]
+        allowed, info = limiter.is_allowed("u1", 120, 60, now=NOW + 0.1)
+        self.assertFalse(allowed)
+        self.assertEqual(info["retry_after"], 1)
+        self.assertEqual(limiter.stats["remote"], remote)
+        # 每 0.5 秒恢復一個額度
+        self.assertTrue(limiter.is_allowed("u1", 120, 60, now=NOW + 0.5)[0])
+
+    def test_expired_lease_returns_unused_tokens(self):
+        first, second = self._instance(), self._instance()
+        first.is_allowed("u1", 120, 60, now=NOW)          # 租 12、用 1
+        self.assertEqual(sum(second.is_allowed("u1", 120, 60, now=NOW)[0] for _ in range(120)), 108)
+
+        # first 的租約過期後歸還 11 個，second 可再取得
+        first.is_allowed("u1", 120, 60, now=NOW + 6)
+        allowed = sum(second.is_allowed("u1", 120, 60, now=NOW + 6)[0] for _ in range(40))
+        self.assertEqual(allowed, 11)
+
+    def test_accuracy_bounds_across_instances(self):
+        limit, window, fraction = 120, 60, 0.1
+        lease = math.ceil(limit * fraction)
+        instances = [self._instance(fraction) for _ in range(4)]
+        rng = random.Random(0)
+
+        # 5 個窗口內以約 3 倍限制的速度隨機分配到各執行個體
+        admitted = []
+        now = NOW
+        while now < NOW + 5 * window:
+            if rng.choice(instances).is_allowed("u1", limit, window, now=now)[0]:
+                admitted.append(now)
+            now += window / (limit * 3)
+
+        # GCRA 本身：第一個窗口可先用掉整批額度，之後每個窗口 limit 個
+        for start in [NOW + step for step in range(window, 4 * window, 7)]:
+            in_window = sum(1 for t in admitted if start <= t < start + window)
+            self.assertLessEqual(in_window, limit + lease + 1)
+        self.assertLessEqual(len(admitted), 6 * limit + lease + 1)
+        self.assertGreaterEqual(len(admitted), 6 * limit - len(instances) * lease)
+
+    def test_other_algorithms_are_not_leased(self):
+        limiter = self._instance()
+        limiter.is_allowed("u1", 5, 10, algorithm="sliding_window", now=NOW)
+        self.assertEqual(limiter.stats["remote"], 0)
+        self.assertTrue(self.redis.exists("rate_limit:sliding_window:u1"))
+
+    def test_disabled_leasing_hits_redis(self):
+        limiter = self._instance(fraction=0)
+        results = [limiter.is_allowed("u1", 5, 10, now=NOW)[0] for _ in range(6)]
+        self.assertEqual(results, [True] * 5 + [False])
+        self.assertEqual(limiter.stats["local"], 0)
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestUserRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        leased = LeasedRateLimiter(RateLimiter(self.redis, algorithm="gcra"), lease_fraction=0.25)
+        self.limiter = UserRateLimiter(leased, limits={
+            "chat": {"requests": 8, "window": 60},
+            "search": {"requests": 2, "window": 60}
+        })
+
+    def test_users_have_separate_budgets(self):
+        results = [self.limiter.check("Uspammer", "chat")[0] for _ in range(10)]
+        self.assertEqual(results, [True] * 8 + [False] * 2)
+        self.assertTrue(self.limiter.check("Uquiet", "chat")[0])
+
+    def test_actions_have_separate_budgets(self):
+        for _ in range(8):
+            self.limiter.check("U1", "chat")
+        self.assertFalse(self.limiter.check("U1", "chat")[0])
+        self.assertTrue(self.limiter.check("U1", "search")[0])
+
+    def test_keys_are_anonymized(self):
+        self.limiter.check("U1234567890", "chat")
+        keys = self.redis.keys("rate_limit:*")
+        self.assertEqual(keys, [f"rate_limit:gcra:line:chat:{line_user_key('U1234567890')}"])
+        self.assertNotIn("U1234567890", keys[0])
+
+    def test_burst_uses_one_round_trip(self):
+        for _ in range(2):
+            self.limiter.check("U1", "chat")
+        self.assertEqual(self.limiter.limiter.stats, {"local": 1, "remote": 1})
+
+    def test_missing_user_is_allowed(self):
+        self.assertTrue(self.limiter.check(None, "chat")[0])
+        self.assertEqual(self.redis.keys("*"), [])
+
+    def test_user_key_is_stable(self):
+        self.assertEqual(line_user_key("U1"), line_user_key("U1"))
+        self.assertEqual(len(line_user_key("U1")), 16)
+
+
+class TestRedisOutage(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = MagicMock()
+        self.script = MagicMock(side_effect=redis.ConnectionError("down"))
+        self.redis.register_script.return_value = self.script
+        self.limiter = RateLimiter(self.redis, fallback=FallbackLimiter(expected_instances=4),
+                                   circuit_breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=30))
+
+    def test_outage_uses_fallback_budget(self):
+        results = [self.limiter.is_allowed("u1", 120, 60, now=NOW)[0] for _ in range(40)]
+        self.assertEqual(results.count(True), 30)
+        self.assertTrue(self.limiter.fallback_active)
+
+    def test_breaker_stops_calling_redis(self):
+        for _ in range(10):
+            self.limiter.is_allowed("u1", 120, 60, now=NOW)
+        self.assertEqual(self.limiter.circuit_breaker.state, "OPEN")
+        self.assertEqual(self.script.call_count, 3)
+
+    def test_hands_back_to_redis_after_recovery(self):
+        for _ in range(3):
+            self.limiter.is_allowed("u1", 120, 60, now=NOW)
+        self.script.side_effect = None
+        self.script.return_value = [1, 99, int(NOW * 1000) + 60000, 0]
+        self.limiter.circuit_breaker.last_failure_time -= self.limiter.circuit_breaker.recovery_timeout + 1
+
+        allowed, info = self.limiter.is_allowed("u1", 120, 60, now=NOW)
+        self.assertTrue(allowed)
+        self.assertEqual(info["remaining"], 99)
+        self.assertFalse(self.limiter.fallback_active)
+        self.assertEqual(self.limiter.circuit_breaker.state, "CLOSED")
+
+    def test_leased_limiter_falls_back(self):
+        leased = LeasedRateLimiter(self.limiter)
+        results = [leased.is_allowed("u1", 120, 60, now=NOW)[0] for _ in range(40)]
+        self.assertEqual(results.count(True), 30)
+
+    def test_without_redis_uses_fallback(self):
+        limiter = RateLimiter(None, fallback=FallbackLimiter(expected_instances=1))
+        limiter.redis = None
+        results = [limiter.is_allowed("u1", 5, 10, now=NOW)[0] for _ in range(6)]
+        self.assertEqual(results, [True] * 5 + [False])
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestSharedRedisBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        pool = redis.ConnectionPool(
+            connection_class=getattr(fakeredis, "FakeRedisConnection", fakeredis.FakeConnection),
+            server=self.server, decode_responses=True
+        )
+        self.breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30,
+                                      failure_exceptions=(redis.ConnectionError, redis.TimeoutError))
+        self.redis = GuardedRedis(connection_pool=pool, circuit_breaker=self.breaker)
+        self.limiter = RateLimiter(self.redis, fallback=FallbackLimiter(expected_instances=1))
+
+    def test_follows_the_client_breaker(self):
+        self.assertIs(self.limiter.circuit_breaker, self.breaker)
+        self.server.connected = False
+        for _ in range(2):
+            self.limiter.is_allowed("u1", 5, 60, now=NOW)
+        self.assertTrue(self.limiter.fallback_active)
+        self.assertEqual((self.breaker.state, self.breaker.stats["rejected"]), ("OPEN", 1))
+
+        # Redis 恢復且共用斷路器到了恢復時間：下一個請求就交還 Redis
+        self.server.connected = True
+        self.breaker.last_failure_time -= self.breaker.recovery_timeout + 1
+        allowed, info = self.limiter.is_allowed("u1", 5, 60, now=NOW)
+        self.assertTrue(allowed)
+        self.assertEqual(info["remaining"], 4)
+        self.assertFalse(self.limiter.fallback_active)
+
+
+if __name__ == "__main__":
+    unittest.main()
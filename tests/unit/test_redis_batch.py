@@ -0,0 +1,103 @@
+import unittest
+from unittest.mock import MagicMock
+
+import redis
+from flask import Flask
+
+import redis_batch
+from circuit_breaker import CircuitBreaker
+from community_features import CommunityFeatures
+from connection_manager import GuardedRedis
+from redis_batch import RequestBatch, current_batch, deferred, read_many
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestRequestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        pool = redis.ConnectionPool(
+            connection_class=getattr(fakeredis, "FakeRedisConnection", fakeredis.FakeConnection),
+            server=self.server, decode_responses=True
+        )
+        self.redis = GuardedRedis(connection_pool=pool, circuit_breaker=CircuitBreaker())
+
+    def test_deferred_writes_are_sent_on_exit(self):
+        with RequestBatch() as batch:
+            with deferred(self.redis) as writer:
+                writer.hincrby("stats", "count", 1)
+                writer.expire("stats", 60)
+            with deferred(self.redis) as writer:
+                writer.setex("metric", 60, 1)
+            self.assertIsNone(self.redis.get("metric"))
+        self.assertEqual(self.redis.hgetall("stats"), {"count": "1"})
+        self.assertEqual(self.redis.get("metric"), "1")
+        self.assertEqual(batch.stats(), {"commands": 4, "round_trips": 2, "deferred": 3, "saved": 2})
+        self.assertIsNone(current_batch())
+
+    def test_without_batch_writes_immediately(self):
+        with deferred(self.redis) as writer:
+            writer.set("a", 1)
+            self.assertEqual(self.redis.get("a"), "1")
+
+    def test_read_many_is_one_round_trip(self):
+        self.redis.set("a", 1)
+        self.redis.sadd("s", "x")
+        with RequestBatch() as batch:
+            self.assertEqual(read_many(self.redis, [("get", "a"), ("smembers", "s")]), ["1", {"x"}])
+        self.assertEqual((batch.commands, batch.round_trips), (2, 1))
+
+    def test_read_many_without_pipeline_reads_one_by_one(self):
+        reader = MagicMock(spec=["get"])
+        reader.get.side_effect = lambda key: key.upper()
+        self.assertEqual(read_many(reader, [("get", "a"), ("get", "b")]), ["A", "B"])
+
+    def test_flush_failure_is_logged_not_raised(self):
+        with RequestBatch() as batch:
+            with deferred(self.redis) as writer:
+                writer.set("a", "x")
+                writer.incr("a")
+                writer.set("b", 1)
+        self.assertEqual(self.redis.get("b"), "1")
+
+        self.server.connected = False
+        with self.assertLogs("redis_batch", level="WARNING"):
+            with RequestBatch():
+                with deferred(self.redis) as writer:
+                    writer.set("c", 1)
+
+    def test_community_api_usage_is_batched(self):
+        community = CommunityFeatures(self.redis)
+        with RequestBatch() as batch:
+            community.track_api_usage(tokens_used=10)
+            stats = community.get_api_stats()
+        self.assertEqual(batch.round_trips, 2)  # 讀取 1 次 + 請求結束的寫入 1 次
+        self.assertEqual(stats["daily"]["used"], 0)  # 延後的寫入在請求結束才送出
+        self.assertEqual(community.get_api_stats()["daily"]["used"], 1)
+
+    def test_flask_requests_are_batched(self):
+        app = Flask(__name__)
+        finished = []
+        redis_batch.install(app, on_finish=lambda endpoint, stats: finished.append((endpoint, stats)))
+
+        @app.route("/event")
+        def event():
+            self.redis.get("a")
+            with deferred(self.redis) as writer:
+                writer.setex("metric:1", 60, 1)
+                writer.setex("metric:2", 60, 1)
+            return "OK"
+
+        self.assertEqual(app.test_client().get("/event").status_code, 200)
+        self.assertEqual(self.redis.get("metric:2"), "1")
+        self.assertEqual(finished, [("event", {"commands": 3, "round_trips": 2, "deferred": 2, "saved": 1})])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,364 @@
+import time
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from response_cache import LocalMemoryCache, ResponseCache, TieredCache
+from optimizations.performance_dashboard import PerformanceDashboard
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+def wait_for(condition, timeout=3.0):
+    """等待背景訂閱執行緒處理完通知"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestLocalMemoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LocalMemoryCache(max_size=3, default_ttl=60, sweep_interval=0)
+
+    def test_lru_eviction(self):
+        for key in ["a", "b", "c"]:
+            self.cache.set(key, key)
+        self.cache.get("a")          # a 變成最近使用
+        self.cache.set("d", "d")     # 淘汰 b
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "a")
+        self.assertEqual(self.cache.stats["evictions"], 1)
+
+    def test_overwrite_keeps_size(self):
+        self.cache.set("a", "x" * 100)
+        self.cache.set("a", "y")
+        self.assertEqual(len(self.cache), 1)
+        self.assertLess(self.cache.size_bytes, 100)
+
+    def test_max_bytes(self):
+        cache = LocalMemoryCache(max_size=100, max_bytes=2000, sweep_interval=0)
+        for i in range(10):
+            cache.set(str(i), "x" * 500)
+        self.assertLessEqual(cache.size_bytes, 2000)
+        self.assertIsNotNone(cache.get("9"))
+        self.assertIsNone(cache.get("0"))
+
+    def test_lazy_expiry_and_sweep(self):
+        now = time.time()
+        self.cache.set("a", 1, ttl=10)
+        self.cache.set("b", 2, ttl=100)
+        with patch("response_cache.time.time", return_value=now + 50):
+            self.assertIsNone(self.cache.get("a"))
+            self.cache.set("c", 3, ttl=10)
+        with patch("response_cache.time.time", return_value=now + 70):
+            self.assertEqual(self.cache.sweep(), 1)
+        self.assertEqual(list(self.cache.cache), ["b"])
+        self.assertEqual(self.cache.stats["expirations"], 2)
+
+    def test_background_sweeper(self):
+        cache = LocalMemoryCache(sweep_interval=0.01)
+        try:
+            cache.set("a", 1, ttl=0.01)
+            self.assertTrue(wait_for(lambda: len(cache) == 0))
+        finally:
+            cache.close()
+
+    def test_concurrent_access(self):
+        cache = LocalMemoryCache(max_size=50, sweep_interval=0)
+        errors = []
+
+        def worker(offset):
+            try:
+                for i in range(2000):
+                    cache.set(f"{offset}:{i % 80}", i)
+                    cache.get(f"{offset}:{(i * 7) % 80}")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(cache), 50)
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestTieredCache(unittest.TestCase):
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.dashboard = MagicMock()
+        self.cache = TieredCache(self._client(), dashboard=self.dashboard, listen=False)
+
+    def _client(self):
+        return fakeredis.FakeRedis(server=self.server, decode_responses=True)
+
+    def test_l1_then_l2(self):
+        self.cache.set("stats:1", {"count": 3}, ttl=60)
+        self.assertEqual(self.cache.get("stats:1"), {"count": 3})
+        self.assertEqual(self.cache.stats["l1_hits"], 1)
+
+        # 其他執行個體（L1 為空）由 Redis 取得並回填 L1
+        other = TieredCache(self._client(), listen=False)
+        self.assertEqual(other.get("stats:1"), {"count": 3})
+        self.assertEqual(other.get("stats:1"), {"count": 3})
+        self.assertEqual(other.stats["l2_hits"], 1)
+        self.assertEqual(other.stats["l1_hits"], 1)
+
+    def test_l1_returns_copies(self):
+        self.cache.set("user:1", {"items": [1]})
+        self.cache.get("user:1")["items"].append(2)
+        self.assertEqual(self.cache.get("user:1"), {"items": [1]})
+
+    def test_l1_never_outlives_l2(self):
+        other = TieredCache(self._client(), listen=False)
+        self.cache.set("stats:1", "v", ttl=60)
+        other.get("stats:1")
+        self.assertLessEqual(other.local.cache["stats:1"].expires_at, time.time() + 30)
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get("stats:missing"))
+        self.assertEqual(self.cache.stats["misses"], 1)
+        self.dashboard.record_cache_lookup.assert_called_with("stats", "miss")
+
+    def test_namespace_stats(self):
+        self.cache.set("stats:1", 1)
+        self.cache.get("stats:1")
+        self.cache.get("stats:2")
+        stats = self.cache.get_stats()["namespaces"]["stats"]
+        self.assertEqual(stats["total"], 2)
+        self.assertEqual(stats["l1_hit_rate"], 50.0)
+        self.assertEqual(stats["l2_hit_rate"], 0)
+
+    def test_decorator_namespace(self):
+        calls = []
+
+        @self.cache.cache(ttl=60, key_prefix="search:")
+        def search(query):
+            calls.append(query)
+            return [query]
+
+        self.assertEqual(search("颱風"), ["颱風"])
+        self.assertEqual(search("颱風"), ["颱風"])
+        self.assertEqual(calls, ["颱風"])
+        self.assertIn("search", self.cache.get_namespace_stats())
+
+        search.clear_cache()
+        search("颱風")
+        self.assertEqual(len(calls), 2)
+
+    def test_invalidation_between_instances(self):
+        writer = TieredCache(self._client())
+        reader = TieredCache(self._client())
+        try:
+            writer.set("stats:1", "old")
+            self.assertTrue(wait_for(lambda: reader.stats["invalidations"] == 1))
+            self.assertEqual(reader.get("stats:1"), "old")
+            self.assertIn("stats:1", reader.local.cache)
+
+            writer.set("stats:1", "new")
+            self.assertTrue(wait_for(lambda: "stats:1" not in reader.local.cache))
+            self.assertEqual(reader.get("stats:1"), "new")
+
+            # 自己發出的通知不會清掉自己的 L1
+            self.assertIn("stats:1", writer.local.cache)
+        finally:
+            writer.close()
+            reader.close()
+
+    def test_delete_broadcasts_prefix(self):
+        reader = TieredCache(self._client(), listen=False)
+        self.cache.set(f"{self.cache.cache_prefix}search:a", 1)
+        reader.get(f"{self.cache.cache_prefix}search:a")
+
+        self.cache.delete("search:")
+        reader._on_invalidation({"data": '{"origin": "x", "prefix": "cache:response:search:"}'})
+        self.assertEqual(reader.local.cache, {})
+        self.assertIsNone(reader.get(f"{self.cache.cache_prefix}search:a"))
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestStampedeProtection(unittest.TestCase):
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.cache = ResponseCache(fakeredis.FakeRedis(server=self.server, decode_responses=True))
+        self.calls = []
+
+    def slow_loader(self, value="v", delay=0.05):
+        def load():
+            self.calls.append(value)
+            time.sleep(delay)
+            return value
+        return load
+
+    def run_concurrently(self, func, count=20):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(func())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_single_flight_in_process(self):
+        loader = self.slow_loader()
+        results = self.run_concurrently(lambda: self.cache.get_or_load("stats:current", loader, ttl=60))
+        self.assertEqual(results, ["v"] * 20)
+        self.assertEqual(len(self.calls), 1)
+        self.assertGreater(self.cache.stats["coalesced"], 0)
+
+    def test_single_flight_across_instances(self):
+        other = ResponseCache(fakeredis.FakeRedis(server=self.server, decode_responses=True))
+        loader = self.slow_loader(delay=0.2)
+        results = []
+        threads = [threading.Thread(target=lambda c=c: results.append(c.get_or_load("k", loader, ttl=60)))
+                   for c in (self.cache, other)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["v", "v"])
+        self.assertEqual(len(self.calls), 1)
+
+    def test_fresh_value_is_cached(self):
+        self.cache.get_or_load("k", self.slow_loader(delay=0), ttl=60)
+        self.cache.get_or_load("k", self.slow_loader(delay=0), ttl=60)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_stale_while_revalidate(self):
+        now = time.time()
+        self.cache.get_or_load("k", self.slow_loader("old", delay=0), ttl=10, stale_ttl=60)
+
+        with patch("response_cache.time.time", return_value=now + 20):
+            value = self.cache.get_or_load("k", self.slow_loader("new", delay=0), ttl=10, stale_ttl=60)
+        self.assertEqual(value, "old")
+        self.assertEqual(self.cache.stats["stale_served"], 1)
+        self.assertTrue(wait_for(lambda: self.cache.get_or_load("k", self.slow_loader("x"), ttl=10) == "new"))
+        self.assertEqual(self.calls, ["old", "new"])
+
+    def test_probabilistic_early_refresh(self):
+        self.cache.get_or_load("k", self.slow_loader("old", delay=0), ttl=10)
+        # 計算耗時很長時，即使尚未過期也會提前更新
+        envelope = self.cache.get("k")
+        envelope["delta"] = 1000
+        self.cache.set("k", envelope, 20)
+
+        self.assertEqual(self.cache.get_or_load("k", self.slow_loader("new", delay=0), ttl=10), "old")
+        self.assertEqual(self.cache.stats["early_refreshes"], 1)
+        self.assertTrue(wait_for(lambda: "new" in self.calls))
+
+    def test_loader_error_is_shared(self):
+        def failing():
+            self.calls.append("x")
+            time.sleep(0.05)
+            raise RuntimeError("firestore down")
+
+        errors = []
+
+        def call():
+            try:
+                self.cache.get_or_load("k", failing, ttl=60)
+            except RuntimeError as e:
+                errors.append(e)
+
+        self.run_concurrently(call, count=5)
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(len(self.calls), 1)
+        self.assertIsNone(fakeredis.FakeRedis(server=self.server).get("lock:k"))
+
+    def test_refresh_replaces_value(self):
+        self.cache.get_or_load("k", self.slow_loader("old", delay=0), ttl=60)
+        self.cache.refresh("k", self.slow_loader("new", delay=0), ttl=60)
+        self.assertEqual(self.cache.get_or_load("k", self.slow_loader("x", delay=0), ttl=60), "new")
+
+    def test_without_redis(self):
+        cache = ResponseCache(None)
+        self.assertEqual(cache.get_or_load("k", self.slow_loader(delay=0)), "v")
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestTagInvalidation(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.redis.keys = MagicMock(side_effect=AssertionError("不應使用 KEYS"))
+        self.cache = ResponseCache(self.redis)
+
+    def test_invalidate_tag(self):
+        self.cache.set("a", 1, tags=["user:u1"])
+        self.cache.set("b", 2, tags=["user:u1", "user:u2"])
+        self.cache.set("c", 3, tags=["user:u2"])
+
+        self.assertEqual(self.cache.invalidate_tag("user:u1"), 2)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("c"), 3)
+        self.assertFalse(self.redis.exists(self.cache._tag_key("user:u1")))
+
+    def test_tag_outlives_entries(self):
+        self.cache.set("a", 1, ttl=100, tags=["t"])
+        self.cache.set("b", 1, ttl=10, tags=["t"])
+        self.assertGreaterEqual(self.redis.ttl(self.cache._tag_key("t")), 99)
+
+    def test_decorator_clear_cache_and_user_tags(self):
+        calls = []
+
+        @self.cache.cache(ttl=60, key_prefix="user:", tags=lambda user_id: [f"user:{user_id}"])
+        def profile(user_id):
+            calls.append(user_id)
+            return {"id": user_id}
+
+        profile("u1")
+        profile("u2")
+        profile("u1")
+        self.assertEqual(calls, ["u1", "u2"])
+
+        self.cache.invalidate_tag("user:u1")
+        profile("u1")
+        profile("u2")
+        self.assertEqual(calls, ["u1", "u2", "u1"])
+
+        profile.clear_cache()
+        profile("u2")
+        self.assertEqual(calls, ["u1", "u2", "u1", "u2"])
+
+    def test_delete_pattern_uses_scan(self):
+        for i in range(1200):
+            self.redis.set(f"{self.cache.cache_prefix}search:{i}", i)
+        self.redis.set(f"{self.cache.cache_prefix}stats:1", 1)
+        self.assertEqual(self.cache.delete("search:"), 1200)
+        self.assertEqual(self.redis.dbsize(), 1)
+
+    def test_tiered_invalidate_tag_drops_l1(self):
+        cache = TieredCache(self.redis, listen=False)
+        cache.set("a", 1, tags=["t"])
+        self.assertIn("a", cache.local.cache)
+        cache.invalidate_tag("t")
+        self.assertNotIn("a", cache.local.cache)
+        self.assertIsNone(cache.get("a"))
+
+
+class TestDashboardCacheStats(unittest.TestCase):
+
+    def test_namespace_ratios(self):
+        dashboard = PerformanceDashboard()
+        for level in ["l1", "l1", "l2", "miss"]:
+            dashboard.record_cache_lookup("stats", level)
+        stats = dashboard.get_cache_namespace_stats()["stats"]
+        self.assertEqual(stats, {"requests": 4, "l1_hit_rate": 50.0, "l2_hit_rate": 50.0})
+        self.assertEqual(dashboard.get_cache_efficiency(), 75.0)
+        self.assertIn("cache_namespaces", dashboard.export_metrics())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,10 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import os
+import redis
 import requests # For requests.exceptions.RequestException
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from connection_manager import GuardedRedis
 from search_service import CustomSearchService
 # Assuming search_service.py is in the root directory or accessible via PYTHONPATH
 
@@ -20,24 +23,25 @@ class TestCustomSearchService(unittest.TestCase):
 
     @patch.dict(os.environ, {}, clear=True) # Ensure CUSTOM_SEARCH_API_KEY is not set
     def test_init_no_api_key(self):
-        with patch.object(CustomSearchService, 'logger') as mock_logger:
+        with patch('search_service.logger') as mock_logger:
             service = CustomSearchService(redis_client=None)
             self.assertIsNone(service.api_key)
-            mock_logger.warning.assert_called_with("CUSTOM_SEARCH_API_KEY environment variable not found. Search functionality will be disabled.")
+            mock_logger.warning.assert_any_call("CUSTOM_SEARCH_API_KEY environment variable not found. Search functionality will be disabled.")
 
     def test_init_no_redis_client(self):
-        with patch.object(CustomSearchService, 'logger') as mock_logger:
+        with patch('search_service.logger') as mock_logger:
             service = CustomSearchService(redis_client=None)
             self.assertIsNone(service.redis)
-            mock_logger.warning.assert_called_with("Redis client not provided to CustomSearchService. Rate limiting will be disabled (fail open).")
+            mock_logger.warning.assert_called_with("Redis client not provided to CustomSearchService. Using in-process fallback rate limiting.")
 
     # --- Test _check_and_increment_usage ---
     @patch.dict(os.environ, {"CUSTOM_SEARCH_API_KEY": "test_api_key"})
     def test_check_usage_redis_unavailable(self):
         service = CustomSearchService(redis_client=None) # No Redis
-        with patch.object(service, 'logger') as mock_logger:
+        with patch('search_service.logger') as mock_logger:
             self.assertTrue(service._check_and_increment_usage())
-            mock_logger.warning.assert_called_with("Rate limiting disabled: Redis client not available.")
+            mock_logger.warning.assert_called_with("Redis client not available. Using in-process fallback limit.")
+        self.assertEqual(service.fallback_limiter.stats["allowed"], 1)
 
     @patch.dict(os.environ, {"CUSTOM_SEARCH_API_KEY": "test_api_key"})
     def test_check_usage_first_use_of_day(self):
@@ -68,7 +72,7 @@ class TestCustomSearchService(unittest.TestCase):
         mock_redis.get.return_value = "100" # At daily_limit
         service = CustomSearchService(redis_client=mock_redis)
 
-        with patch.object(service, 'logger') as mock_logger:
+        with patch('search_service.logger') as mock_logger:
             self.assertFalse(service._check_and_increment_usage())
             mock_logger.warning.assert_called()
         mock_redis.incr.assert_not_called()
@@ -76,11 +80,52 @@ class TestCustomSearchService(unittest.TestCase):
     @patch.dict(os.environ, {"CUSTOM_SEARCH_API_KEY": "test_api_key"})
     def test_check_usage_redis_exception(self):
         mock_redis = MagicMock()
-        mock_redis.get.side_effect = Exception("Redis down")
+        mock_redis.get.side_effect = redis.ConnectionError("Redis down")
+        service = CustomSearchService(redis_client=mock_redis, circuit_breaker=CircuitBreaker())
+        with patch('search_service.logger') as mock_logger:
+            self.assertTrue(service._check_and_increment_usage()) # Falls back to the in-process limit
+            mock_logger.error.assert_called_with("Redis error during API usage check: Redis down. Using in-process fallback limit.")
+
+    @patch.dict(os.environ, {"CUSTOM_SEARCH_API_KEY": "test_api_key", "RATE_LIMIT_EXPECTED_INSTANCES": "4"})
+    def test_check_usage_redis_outage_uses_fallback_budget(self):
+        mock_redis = MagicMock()
+        mock_redis.get.side_effect = redis.ConnectionError("Redis down")
+        service = CustomSearchService(redis_client=mock_redis,
+                                      circuit_breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=30))
+
+        # Each instance gets daily_limit / expected_instances requests during the outage
+        results = [service._check_and_increment_usage() for _ in range(30)]
+        self.assertEqual(results.count(True), 25)
+        self.assertEqual(service.circuit_breaker.state, "OPEN")
+        self.assertEqual(mock_redis.get.call_count, 3) # No Redis calls while the breaker is open
+
+    @patch.dict(os.environ, {"CUSTOM_SEARCH_API_KEY": "test_api_key"})
+    def test_check_usage_returns_to_redis_after_recovery(self):
+        mock_redis = MagicMock()
+        mock_redis.get.side_effect = redis.ConnectionError("Redis down")
+        service = CustomSearchService(redis_client=mock_redis,
+                                      circuit_breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=30))
+        for _ in range(3):
+            service._check_and_increment_usage()
+        self.assertEqual(service.circuit_breaker.state, "OPEN")
+
+        # Redis recovers and the breaker's recovery timeout has passed
+        mock_redis.get.side_effect = None
+        mock_redis.get.return_value = "100"
+        service.circuit_breaker.last_failure_time -= service.circuit_breaker.recovery_timeout + 1
+        self.assertFalse(service._check_and_increment_usage()) # Redis counter is authoritative again
+        self.assertEqual(service.circuit_breaker.state, "CLOSED")
+
+    @patch.dict(os.environ, {"CUSTOM_SEARCH_API_KEY": "test_api_key"})
+    def test_check_usage_follows_shared_redis_breaker(self):
+        mock_redis = MagicMock(spec=GuardedRedis)
+        mock_redis.circuit_breaker = CircuitBreaker()
+        mock_redis.get.side_effect = CircuitOpenError("redis", 10)
         service = CustomSearchService(redis_client=mock_redis)
-        with patch.object(service, 'logger') as mock_logger:
-            self.assertTrue(service._check_and_increment_usage()) # Should fail open
-            mock_logger.error.assert_called_with("Redis error during API usage check: Redis down. Allowing request (fail open).")
+
+        self.assertIs(service.circuit_breaker, mock_redis.circuit_breaker)
+        self.assertTrue(service._check_and_increment_usage()) # Falls back while the shared breaker is open
+        self.assertEqual(mock_redis.circuit_breaker.stats["calls"], 0) # Not wrapped a second time
 
     # --- Test perform_search ---
     @patch.dict(os.environ, {"CUSTOM_SEARCH_API_KEY": "test_api_key"})
@@ -0,0 +1,137 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from collective_memory import CollectiveMemorySystem
+from frequency_bot_firestore import FrequencyBotFirestore
+from circuit_breaker import CircuitBreaker
+from stream_analytics import DecayedCounter, HourStream
+
+HOUR = 480000
+START = HOUR * 3600
+
+
+class TestDecayedCounter(unittest.TestCase):
+
+    def test_half_life(self):
+        counter = DecayedCounter(half_life=60)
+        counter.add("a", START)
+        self.assertAlmostEqual(counter.get("a", START + 60), 0.5)
+        self.assertAlmostEqual(counter.get("a", START + 120), 0.25)
+
+    def test_rebase_keeps_values(self):
+        counter = DecayedCounter(half_life=1)
+        counter.add("a", START)
+        counter.add("a", START + 100)  # 觸發重設基準
+        self.assertAlmostEqual(counter.get("a", START + 100), 1.0)
+
+
+class TestHourStream(unittest.TestCase):
+
+    def setUp(self):
+        self.memory = CollectiveMemorySystem(MagicMock())
+        self.stream = self.memory.hour_stream
+
+    def feed(self, messages, start=START, interval=30):
+        for i, message in enumerate(messages):
+            self.stream.observe(message, start + i * interval)
+        return start + len(messages) * interval
+
+    def test_series_and_totals(self):
+        self.feed(["今天好開心哈哈"] * 4, interval=30)
+        snapshot = self.stream.snapshot(START + 120)
+        self.assertEqual(snapshot["message_count"], 4)
+        self.assertEqual(snapshot["emotion"]["dominant"], "positive")
+        self.assertEqual(snapshot["emotion"]["series"]["positive"][:3], [2, 2, 0])
+        self.assertEqual(snapshot["topics"]["series"]["今天"][:2], [2, 2])
+
+    def test_detects_emotion_change(self):
+        end = self.feed(["今天好開心哈哈"] * 20 + ["好累想睡覺"] * 20)
+        points = self.stream.snapshot(end)["emotion"]["turning_points"]
+        self.assertEqual([(p["from"], p["to"]) for p in points], [("positive", "tired")])
+        self.assertGreaterEqual(points[0]["index"], 20)
+        self.assertEqual(self.stream.regime, "tired")
+
+    def test_stable_hour_has_no_change(self):
+        end = self.feed(["今天好開心哈哈"] * 40)
+        self.assertEqual(self.stream.snapshot(end)["emotion"]["turning_points"], [])
+
+    def test_emerging_topic(self):
+        end = self.feed(["今天天氣好好"] * 40, interval=60)
+        end = self.feed(["颱風颱風假放假放假"] * 5, start=end, interval=60)
+        emerging = self.stream.snapshot(end)["topics"]["emerging"]
+        self.assertIn("颱風", emerging)
+        self.assertNotIn("今天", emerging)
+
+    def test_connections(self):
+        self.feed(["颱風颱風假放假放假"] * 3)
+        connections = self.stream.connections(["颱風"])
+        self.assertIn("假放", connections["颱風"])
+
+    def test_new_hour_resets(self):
+        self.feed(["今天好開心哈哈"] * 3)
+        self.stream.observe("好累", START + 3600)
+        self.assertEqual(self.stream.hour, HOUR + 1)
+        self.assertEqual(self.stream.message_count, 1)
+
+        # 上一小時的遲到訊息不影響本小時
+        self.stream.observe("今天", START + 10)
+        self.assertEqual(self.stream.message_count, 1)
+
+    def test_covers(self):
+        self.assertFalse(self.stream.covers(HOUR))
+        self.feed(["今天好開心哈哈"] * 3)
+        self.assertTrue(self.stream.covers(HOUR, 3))
+        self.assertFalse(self.stream.covers(HOUR, 4))
+        self.assertFalse(self.stream.covers(HOUR + 1))
+
+    def test_prune_bounds_topics(self):
+        stream = HourStream(self.memory._detect_emotion, self.memory._extract_topics, max_topics=10)
+        for i in range(30):
+            stream.observe(chr(0x4e00 + i * 2) + chr(0x4e01 + i * 2), START + i)
+        self.assertLessEqual(len(stream.slow_topics.values), 10)
+        self.assertEqual(stream.snapshot(START + 30)["message_count"], 30)
+
+
+class TestStreamInPrompt(unittest.TestCase):
+
+    def test_analyze_hour_uses_stream(self):
+        memory = CollectiveMemorySystem(MagicMock())
+        messages = [{"content": "今天好開心哈哈", "timestamp": START + i} for i in range(3)]
+        for msg in messages:
+            memory.observe_message(msg["content"], msg["timestamp"])
+        memory.hour_stream.snapshot = MagicMock(wraps=memory.hour_stream.snapshot)
+
+        analysis = memory._analyze_hour(messages, HOUR)
+        memory.hour_stream.snapshot.assert_called_once()
+        self.assertIn("emerging", memory._build_topic_network(analysis))
+
+        # 串流未涵蓋全部訊息時改用批次分析
+        memory.hour_stream.snapshot.reset_mock()
+        memory._analyze_hour(messages * 2, HOUR)
+        memory.hour_stream.snapshot.assert_not_called()
+
+    def test_frequency_stats_fall_back_when_stream_is_behind(self):
+        memory = CollectiveMemorySystem(MagicMock())
+        for i in range(3):
+            memory.observe_message("今天好開心哈哈", START + i)
+
+        bot = FrequencyBotFirestore.__new__(FrequencyBotFirestore)
+        bot.db = MagicMock()
+        bot.firestore_breaker = CircuitBreaker()
+        bot.broadcasts_collection = "broadcasts"
+        bot.memory_system = memory
+        doc_ref = bot.db.collection.return_value.document.return_value
+        doc_ref.get.return_value.to_dict.return_value = {"message_count": 5}
+        message = MagicMock()
+        message.to_dict.return_value = {"content": "晚餐 吃什麼"}
+        doc_ref.collection.return_value.limit.return_value.stream.return_value = [message]
+
+        with patch("frequency_bot_firestore.time.time", return_value=START + 10):
+            stats = bot.get_frequency_stats()
+
+        # 串流只看過 3 則、本小時已有 5 則：改以 Firestore 訊息計算
+        self.assertEqual(stats["trends"], {})
+        self.assertEqual(dict(stats["top_frequencies"]), {"晚餐": 1, "吃什麼": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
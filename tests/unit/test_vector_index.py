@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+from vector_index import MemmapVectorIndex
+from collective_memory import CollectiveMemorySystem
+
+
+class TestMemmapVectorIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "index")
+        self.rng = np.random.default_rng(7)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_exact_search_matches_brute_force(self):
+        index = MemmapVectorIndex(self.path, initial_capacity=8)
+        vectors = self.rng.normal(size=(50, 16)).astype(np.float32)
+        for i, vector in enumerate(vectors):
+            index.add(f"v{i}", vector)
+
+        query = self.rng.normal(size=16)
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:3]
+
+        results = index.search(query, k=3)
+        self.assertEqual([item_id for item_id, _ in results], [f"v{i}" for i in expected])
+        self.assertGreaterEqual(results[0][1], results[1][1])
+
+    def test_exclude_and_upsert(self):
+        index = MemmapVectorIndex(self.path)
+        index.add("a", [1, 0, 0])
+        index.add("b", [0.9, 0.1, 0])
+        self.assertEqual(index.search([1, 0, 0], k=1, exclude=["a"])[0][0], "b")
+
+        index.add("b", [0, 0, 1])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.search([0, 0, 1], k=1)[0][0], "b")
+
+    def test_persists_and_reloads(self):
+        index = MemmapVectorIndex(self.path, initial_capacity=2)
+        for i in range(5):
+            index.add(str(i), [float(i), 1.0], metadata={"hour": i})
+
+        reloaded = MemmapVectorIndex(self.path)
+        self.assertEqual(len(reloaded), 5)
+        self.assertEqual(reloaded.dim, 2)
+        self.assertEqual(reloaded.metadata["3"], {"hour": 3})
+        self.assertEqual(reloaded.search([4.0, 1.0], k=1)[0][0], "4")
+
+    def test_dimension_mismatch(self):
+        index = MemmapVectorIndex(self.path)
+        index.add("a", [1, 0])
+        with self.assertRaises(ValueError):
+            index.add("b", [1, 0, 0])
+
+    def test_ivf_finds_nearest_in_clustered_data(self):
+        centers = self.rng.normal(size=(20, 32))
+        vectors = np.repeat(centers, 50, axis=0) + self.rng.normal(scale=0.05, size=(1000, 32))
+        index = MemmapVectorIndex(self.path, ivf_threshold=500, n_probe=4)
+        for i, vector in enumerate(vectors):
+            index.add(str(i), vector)
+
+        hits = 0
+        for i in range(0, 1000, 37):
+            hits += index.search(vectors[i], k=1)[0][0] == str(i)
+        self.assertGreaterEqual(hits / len(range(0, 1000, 37)), 0.9)
+        self.assertIsNotNone(index._centroids)
+
+    def test_ivf_without_candidates_returns_empty(self):
+        index = MemmapVectorIndex(self.path, ivf_threshold=2)
+        for i in range(3):
+            index.add(str(i), [float(i), 1.0])
+        with patch.object(index, "_ivf_candidates", return_value=np.asarray([], dtype=np.intp)):
+            self.assertEqual(index.search([1.0, 1.0], k=2), [])
+
+
+class CharEmbedder:
+    def encode(self, text):
+        vector = [0.0] * 64
+        for char in text:
+            vector[ord(char) % 64] += 1.0
+        return vector
+
+    def encode_many(self, texts):
+        return [self.encode(text) for text in texts]
+
+
+class TestSimilarPastMoment(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.memory = CollectiveMemorySystem(MagicMock())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fallback_without_index(self):
+        self.assertEqual(self.memory._find_similar_past_moment({"messages": [{"content": "hi"}]}), "上週同一時間")
+
+    def test_cites_most_similar_broadcast(self):
+        self.memory.attach_moment_index(CharEmbedder(), MemmapVectorIndex(os.path.join(self.directory, "m")))
+        self.memory.remember_broadcasts([(100, "大家都在聊颱風和停班停課"), (101, "今晚的主題是宵夜與美食")])
+
+        moment = self.memory._find_similar_past_moment({
+            "hour": 200,
+            "messages": [{"content": "宵夜吃什麼"}, {"content": "好想吃美食"}]
+        })
+        self.assertIn("宵夜與美食", moment)
+
+
+if __name__ == '__main__':
+    unittest.main()
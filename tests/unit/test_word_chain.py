@@ -0,0 +1,119 @@
+import json
+import threading
+import unittest
+
+import redis
+
+from community_features import CommunityFeatures, WORD_CHAIN_KEYS
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "需要 fakeredis")
+class TestWordChain(unittest.TestCase):
+
+    def setUp(self):
+        pool = redis.ConnectionPool(
+            connection_class=getattr(fakeredis, "FakeRedisConnection", fakeredis.FakeConnection),
+            server=fakeredis.FakeServer(), decode_responses=True
+        )
+        self.redis = redis.Redis(connection_pool=pool)
+        self.community = CommunityFeatures(self.redis)
+
+    def start(self, word="蘋果", target_length=None):
+        self.assertTrue(self.community.start_word_chain(word, "starter")["success"])
+        if target_length:
+            self.redis.hset(WORD_CHAIN_KEYS[0], "target_length", target_length)
+
+    def concurrently(self, calls):
+        """同時執行 (詞語, 用戶) 的接龍並回傳結果"""
+        results = [None] * len(calls)
+        barrier = threading.Barrier(len(calls))
+
+        def worker(index, word, user_id):
+            barrier.wait()
+            results[index] = self.community.continue_word_chain(word, user_id)
+
+        threads = [threading.Thread(target=worker, args=(i, *call)) for i, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_chain_is_stored_as_structures(self):
+        self.start()
+        self.assertTrue(self.community.continue_word_chain("果汁", "u1")["success"])
+        self.assertEqual(self.redis.lrange(WORD_CHAIN_KEYS[1], 0, -1), ["蘋果", "果汁"])
+        self.assertEqual(self.redis.smembers(WORD_CHAIN_KEYS[3]), {"starter", "u1"})
+        self.assertEqual(self.redis.hget(WORD_CHAIN_KEYS[0], "current_word"), "果汁")
+        self.assertTrue(all(0 < self.redis.ttl(key) <= 3600 for key in WORD_CHAIN_KEYS))
+
+    def test_wrong_start_and_duplicate_are_rejected(self):
+        self.start()
+        result = self.community.continue_word_chain("汽車", "u1")
+        self.assertFalse(result["success"])
+        self.assertIn("必須是「果」", result["message"])
+
+        self.community.continue_word_chain("果蘋果", "u1")
+        result = self.community.continue_word_chain("果蘋果", "u2")
+        self.assertFalse(result["success"])
+        self.assertIn("已經用過了", result["message"])
+        self.assertEqual(self.redis.llen(WORD_CHAIN_KEYS[1]), 2)
+
+    def test_no_chain(self):
+        result = self.community.continue_word_chain("果汁", "u1")
+        self.assertFalse(result["success"])
+        self.assertIn("目前沒有進行中的接龍", result["message"])
+
+    def test_start_with_existing_chain_continues(self):
+        self.start()
+        self.assertIn("接龍成功", self.community.start_word_chain("果汁", "u1")["message"])
+        self.assertEqual(self.redis.llen(WORD_CHAIN_KEYS[1]), 2)
+
+    def test_completion_saves_record(self):
+        self.start(target_length=3)
+        self.community.continue_word_chain("果汁", "u1")
+        result = self.community.continue_word_chain("汁液", "u2")
+        self.assertTrue(result["completed"])
+        self.assertEqual(self.redis.exists(*WORD_CHAIN_KEYS), 0)
+        record = json.loads(self.redis.get(self.redis.keys("word_chain:complete:*")[0]))
+        self.assertEqual(record["chain"], ["蘋果", "果汁", "汁液"])
+        self.assertEqual(sorted(record["participants"]), ["starter", "u1", "u2"])
+
+    def test_status(self):
+        self.assertIn("輸入「接龍 [詞語]」開始新接龍", self.community.get_word_chain_status()["message"])
+        self.start()
+        self.community.continue_word_chain("果汁", "u1")
+        message = self.community.get_word_chain_status()["message"]
+        self.assertIn("蘋果 → 果汁", message)
+        self.assertIn("參與者：2 人", message)
+
+    def test_concurrent_continuations_are_not_lost(self):
+        self.start(target_length=1000)
+        results = self.concurrently([(f"果{i}果", f"user_{i}") for i in range(100)])
+        self.assertTrue(all(result["success"] for result in results))
+        self.assertEqual(self.redis.llen(WORD_CHAIN_KEYS[1]), 101)
+        self.assertEqual(self.redis.scard(WORD_CHAIN_KEYS[3]), 101)
+
+    def test_concurrent_duplicates_succeed_once(self):
+        self.start()
+        results = self.concurrently([("果然", f"user_{i}") for i in range(100)])
+        self.assertEqual(sum(result["success"] for result in results), 1)
+        self.assertEqual(self.redis.lrange(WORD_CHAIN_KEYS[1], 0, -1), ["蘋果", "果然"])
+
+    def test_concurrent_completion_happens_once(self):
+        self.start(target_length=10)
+        results = self.concurrently([(f"果{i}果", f"user_{i}") for i in range(100)])
+        self.assertEqual(sum(bool(result.get("completed")) for result in results), 1)
+        self.assertEqual(sum(result["success"] for result in results), 9)
+        record = json.loads(self.redis.get(self.redis.keys("word_chain:complete:*")[0]))
+        self.assertEqual(len(record["chain"]), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
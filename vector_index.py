@@ -0,0 +1,230 @@
+"""
+記憶體映射向量索引
+向量以正規化 float32 矩陣存放在磁碟（np.memmap），另以 JSON 保存 ID 對照與附帶資料；
+資料量小時精確計算餘弦相似度，超過門檻後改用 IVF（球面 k-means 分群 + 只搜尋最近的幾群）
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MemmapVectorIndex:
+    """以 np.memmap 儲存的向量索引（精確餘弦 / IVF）"""
+
+    def __init__(self, path: str, dim: int = None, ivf_threshold: int = 20000,
+                 n_probe: int = 8, initial_capacity: int = 1024):
+        """
+        初始化索引（已存在時從磁碟載入）
+
+        Args:
+            path: 檔案路徑前綴（產生 <path>.f32 與 <path>.json）
+            dim: 向量維度（None 時由第一筆資料決定）
+            ivf_threshold: 向量數達此值後改用 IVF 搜尋
+            n_probe: IVF 搜尋的群數
+            initial_capacity: 初始可容納的向量數
+        """
+        self.path = path
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.n_probe = n_probe
+        self.initial_capacity = initial_capacity
+
+        self.ids: List[str] = []
+        self.metadata: Dict[str, Dict] = {}
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._capacity = 0
+
+        # IVF 狀態
+        self._centroids = None
+        self._lists: List[List[int]] = []
+        self._trained_count = 0
+
+        self._lock = threading.RLock()
+        self._load()
+
+    @property
+    def _vector_path(self) -> str:
+        return f"{self.path}.f32"
+
+    @property
+    def _meta_path(self) -> str:
+        return f"{self.path}.json"
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _load(self):
+        """從磁碟載入既有索引"""
+        if not os.path.exists(self._meta_path) or not os.path.exists(self._vector_path):
+            return
+
+        with open(self._meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.dim = meta["dim"]
+        self.ids = meta["ids"]
+        self.metadata = meta.get("metadata", {})
+        self._rows = {item_id: row for row, item_id in enumerate(self.ids)}
+        self._capacity = os.path.getsize(self._vector_path) // (self.dim * 4)
+        self._vectors = np.memmap(self._vector_path, dtype=np.float32, mode="r+",
+                                  shape=(self._capacity, self.dim))
+        logger.info(f"載入向量索引: {len(self.ids)} 筆, 維度 {self.dim}")
+
+    def _save_meta(self):
+        """寫入 ID 對照（先寫暫存檔再替換，避免寫到一半）"""
+        temp_path = f"{self._meta_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "ids": self.ids, "metadata": self.metadata}, f, ensure_ascii=False)
+        os.replace(temp_path, self._meta_path)
+
+    def _ensure_capacity(self, rows: int):
+        """容量不足時以倍數擴充檔案並重新映射"""
+        if rows <= self._capacity:
+            return
+
+        capacity = max(self._capacity, self.initial_capacity)
+        while capacity < rows:
+            capacity *= 2
+
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+
+        directory = os.path.dirname(self._vector_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self._vector_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+
+        self._vectors = np.memmap(self._vector_path, dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def add(self, item_id: str, vector: Iterable[float], metadata: Dict = None) -> None:
+        """新增或更新一筆向量"""
+        self.add_many([(item_id, vector, metadata)])
+
+    def add_many(self, items: Iterable[Tuple[str, Iterable[float], Optional[Dict]]]) -> None:
+        """批次新增或更新向量（只寫入一次 ID 對照）"""
+        with self._lock:
+            for item_id, vector, metadata in items:
+                vector = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                if norm == 0:
+                    continue
+                if self.dim is None:
+                    self.dim = len(vector)
+                if len(vector) != self.dim:
+                    raise ValueError(f"向量維度 {len(vector)} 與索引維度 {self.dim} 不符")
+
+                vector = vector / norm
+                row = self._rows.get(item_id)
+                if row is None:
+                    row = len(self.ids)
+                    self._ensure_capacity(row + 1)
+                    self.ids.append(item_id)
+                    self._rows[item_id] = row
+                    if self._centroids is not None:
+                        self._lists[self._nearest_centroid(vector)].append(row)
+                else:
+                    self._centroids = None  # 更新既有向量：IVF 分群需重建
+
+                self._vectors[row] = vector
+                if metadata is not None:
+                    self.metadata[item_id] = metadata
+
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._save_meta()
+
+    def search(self, vector: Iterable[float], k: int = 1,
+               exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """回傳最相似的 k 筆 (id, 餘弦相似度)，由高到低"""
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        exclude = set(exclude)
+
+        with self._lock:
+            count = len(self.ids)
+            if count == 0 or norm == 0:
+                return []
+            query = query / norm
+
+            if count >= self.ivf_threshold:
+                rows = self._ivf_candidates(query)
+                scores = self._vectors[rows] @ query
+            else:
+                rows = None
+                scores = self._vectors[:count] @ query
+
+            # 探測的群可能都是空的（k-means 留下沒有成員的中心）
+            if len(scores) == 0:
+                return []
+
+            wanted = min(len(scores), k + len(exclude))
+            top = np.argpartition(-scores, wanted - 1)[:wanted]
+            top = top[np.argsort(-scores[top])]
+
+            results = []
+            for index in top:
+                row = int(rows[index]) if rows is not None else int(index)
+                item_id = self.ids[row]
+                if item_id in exclude:
+                    continue
+                results.append((item_id, float(scores[index])))
+                if len(results) == k:
+                    break
+            return results
+
+    # ========== IVF ==========
+
+    def _nearest_centroid(self, vector: np.ndarray) -> int:
+        return int(np.argmax(self._centroids @ vector))
+
+    def _ivf_candidates(self, query: np.ndarray) -> np.ndarray:
+        """只取最接近查詢的 n_probe 群中的列"""
+        if self._centroids is None or len(self.ids) >= 2 * self._trained_count:
+            self._train_ivf()
+
+        probe = np.argsort(-(self._centroids @ query))[:self.n_probe]
+        rows = [row for cluster in probe for row in self._lists[cluster]]
+        return np.asarray(rows, dtype=np.intp)
+
+    def _train_ivf(self, iterations: int = 10, sample_per_list: int = 64):
+        """以球面 k-means 分群（群數約為 √N）並建立倒排列表"""
+        count = len(self.ids)
+        n_lists = max(1, int(np.sqrt(count)))
+        rng = np.random.default_rng(0)
+
+        sample_rows = np.sort(rng.choice(count, min(count, n_lists * sample_per_list), replace=False))
+        sample = np.asarray(self._vectors[sample_rows])
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            filled = np.bincount(assignments, minlength=n_lists) > 0
+            centroids[filled] = sums[filled]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        # 分批指派所有向量，避免一次載入整個矩陣
+        assignments = np.empty(count, dtype=np.intp)
+        for start in range(0, count, 65536):
+            chunk = self._vectors[start:min(count, start + 65536)]
+            assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+        order = np.argsort(assignments, kind="stable")
+        boundaries = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+        self._lists = [order[boundaries[i]:boundaries[i + 1]].tolist() for i in range(n_lists)]
+        self._centroids = centroids
+        self._trained_count = count
+        logger.info(f"IVF 分群完成: {count} 筆向量, {n_lists} 群")